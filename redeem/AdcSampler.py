@@ -0,0 +1,137 @@
+"""
+The AdcSampler reads the ADC channels of the temperature sensors in a
+thread of its own, so the heaters, coolers and M105 never wait for the ADC.
+
+The sysfs file of each channel stays open and is read from the start with
+pread, which makes the driver do a new conversion. Every pass reads each
+channel a few times and keeps the median, which drops the odd spike. The
+newest median is kept on the channel, where it can be read without a lock,
+along with the time it was taken, so readers can tell if the thread stalled.
+
+License: GNU GPL v3: http://www.gnu.org/copyleft/gpl.html
+
+ Redeem is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ Redeem is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with Redeem.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from threading import Thread, Event, Lock
+import logging
+import os
+import time
+
+
+def read_from_start(fd, size):
+  """ Read up to size bytes from the start of an open file """
+  if hasattr(os, "pread"):
+    return os.pread(fd, size, 0)
+  os.lseek(fd, 0, os.SEEK_SET)
+  return os.read(fd, size)
+
+
+class AdcChannel(object):
+  def __init__(self, path, max_age):
+    self.path = path
+    self.fd = None    # Kept open between passes
+    # The median of the last pass, or the IOError, OSError or ValueError it
+    # failed with. Replaced in one go, so readers need no lock.
+    self.reading = None
+    self.time = None    # When the reading was taken
+    self.max_age = max_age    # Readings older than this are stale
+
+
+class AdcSampler(object):
+
+  # A channel's reading is stale after this many missed passes, but never
+  # sooner than STALE_AGE seconds, as scheduling alone can hold up a pass
+  STALE_PASSES = 10
+  STALE_AGE = 0.5
+
+  def __init__(self, rate=20.0, oversample=5):
+    """ Read each channel oversample times, rate times a second """
+    self.rate = rate
+    self.oversample = max(int(oversample), 1)
+    self.channels = {}
+    self.lock = Lock()
+    self.wakeup = Event()
+    self.running = False
+    self.t = None
+    self.passes = 0
+
+  def add(self, path):
+    """ Start sampling the channel with the sysfs file path and return its
+    AdcChannel. The channel has a reading once this returns. """
+    with self.lock:
+      channel = self.channels.get(path)
+      if channel is None:
+        channel = AdcChannel(path, max(self.STALE_PASSES / self.rate, self.STALE_AGE))
+        self.sample(channel)
+        self.channels[path] = channel
+      if not self.running:
+        self.running = True
+        self.t = Thread(target=self.loop, name="AdcSampler")
+        self.t.daemon = True
+        self.t.start()
+    return channel
+
+  def stop(self):
+    """ Stop the sampling thread and close the channels """
+    with self.lock:
+      running = self.running
+      self.running = False
+    self.wakeup.set()
+    if running and self.t is not None:
+      self.t.join()
+    for channel in self.channels.values():
+      if channel.fd is not None:
+        os.close(channel.fd)
+        channel.fd = None
+
+  def loop(self):
+    """ Thread that samples all channels at the rate """
+    next_pass = time.time()
+    while True:
+      with self.lock:
+        if not self.running:
+          break
+        channels = list(self.channels.values())
+      for channel in channels:
+        try:
+          self.sample(channel)
+        except Exception:
+          # Keep sampling the other channels, this one's reading goes stale
+          logging.exception("Unable to sample " + channel.path)
+      self.passes += 1
+
+      now = time.time()
+      # Don't try to catch up with passes that were missed
+      next_pass = max(next_pass + 1.0 / self.rate, now)
+      self.wakeup.wait(next_pass - now)
+      self.wakeup.clear()
+
+  def sample(self, channel):
+    """ Read the channel oversample times and keep the median """
+    try:
+      if channel.fd is None:
+        channel.fd = os.open(channel.path, os.O_RDONLY)
+      samples = sorted(
+          float(read_from_start(channel.fd, 16).rstrip()) for _ in range(self.oversample))
+      channel.reading = samples[len(samples) // 2]
+    except (IOError, OSError) as e:
+      if channel.fd is not None:
+        os.close(channel.fd)
+        channel.fd = None
+      channel.reading = e
+    except ValueError as e:
+      # An empty or garbled read, the file is still good
+      channel.reading = e
+    channel.time = time.time()
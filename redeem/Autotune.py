@@ -110,8 +110,8 @@ class Autotune:
 
   def _tune(self):
     logging.debug("Starting Tuning")
-    self.temps = np.array([])
-    self.times = np.array([])
+    # np.append copies the whole array on every sample, a list doesn't
+    self.temps = []
     for cycle in range(self.cycles):
       logging.debug("Doing cycle: " + str(cycle))
 
@@ -119,7 +119,7 @@ class Autotune:
       self.t_high = time.time()
       self.heater.set_target_temperature(self.steady_temperature + self.output_step)
       while self.heater.get_temperature_raw() < self.steady_temperature + self.E:
-        self.temps = np.append(self.temps, self.heater.get_temperature_raw())
+        self.temps.append(self.heater.get_temperature_raw())
         time.sleep(0.01)
       self.t_high = time.time() - self.t_high
 
@@ -127,7 +127,7 @@ class Autotune:
       self.t_low = time.time()
       self.heater.set_target_temperature(self.steady_temperature - self.output_step)
       while self.heater.get_temperature_raw() > self.steady_temperature - self.E:
-        self.temps = np.append(self.temps, self.heater.get_temperature_raw())
+        self.temps.append(self.heater.get_temperature_raw())
         time.sleep(0.01)
       self.t_low = time.time() - self.t_low
 
@@ -140,7 +140,7 @@ class Autotune:
 
         if cycle > 1:
           logging.debug("Smoothing")
-          self.smooth_temps = Util.smooth(self.temps, 1000)
+          self.smooth_temps = Util.smooth(np.array(self.temps), 1000)
           self.smooth_temps = self.smooth_temps[:-1000]    # Remove window length
           self.peaks = Util.detect_peaks(self.smooth_temps)
           self.valleys = Util.detect_peaks(self.smooth_temps, valley=True)
@@ -68,6 +68,38 @@ class BedCompensation:
     else:
       return np.eye(3)
 
+  @staticmethod
+  def create_height_mesh(probe_points, probe_heights):
+    """ Arrange the probed heights on the grid made up by the probe points, all in mm.
+        Returns None if the points aren't a regular grid along X and Y, like G29.2 makes. """
+    # M557 stores the points with two decimals
+    xs = sorted(set(round(p["X"], 2) for p in probe_points))
+    ys = sorted(set(round(p["Y"], 2) for p in probe_points))
+    if len(xs) < 2 or len(ys) < 2 or len(xs) * len(ys) != len(probe_points):
+      return None
+    if len(probe_heights) < len(probe_points):
+      return None
+
+    step_x = (xs[-1] - xs[0]) / (len(xs) - 1)
+    step_y = (ys[-1] - ys[0]) / (len(ys) - 1)
+    if not (np.allclose(np.diff(xs), step_x, atol=0.02)
+            and np.allclose(np.diff(ys), step_y, atol=0.02)):
+      return None
+
+    heights = np.full((len(ys), len(xs)), np.nan)
+    for point, height in zip(probe_points, probe_heights):
+      heights[ys.index(round(point["Y"], 2)), xs.index(round(point["X"], 2))] = height
+    if np.isnan(heights).any():
+      return None
+
+    return {
+        "min_x": xs[0],
+        "min_y": ys[0],
+        "step_x": step_x,
+        "step_y": step_y,
+        "heights": heights.tolist()
+    }
+
   @staticmethod
   def normalize(vec):
     return vec / np.linalg.norm(vec)
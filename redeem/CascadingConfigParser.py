@@ -20,19 +20,139 @@ License: GNU GPL v3: http://www.gnu.org/copyleft/gpl.html
 
 import logging
 import os
+import re
 import struct
+import threading
 from six import PY2
 if PY2:
   from ConfigParser import SafeConfigParser as Parser
 else:
   import configparser as Parser
 
+BOOLEANS = {"true": True, "yes": True, "on": True, "false": False, "no": False, "off": False}
+
+
+def attribute_name(name):
+  """ The attribute a section or option is found under in a ConfigSnapshot """
+  name = re.sub(r'\W', '_', name)
+  if name[:1].isdigit():
+    name = "_" + name
+  return name
+
+
+def parse_value(value):
+  """ A setting as a bool, int or float if it reads as one, otherwise the string """
+  if value.strip().lower() in BOOLEANS:
+    return BOOLEANS[value.strip().lower()]
+  for kind in (int, float):
+    try:
+      return kind(value)
+    except ValueError:
+      pass
+  return value
+
+
+class ConfigSection(object):
+  """
+  The typed options of a section, as attributes named by attribute_name,
+  so "connect-therm-E-fan-0" is read as connect_therm_e_fan_0. Each section
+  gets a subclass with a slot for each of its options, see make_section.
+  """
+  __slots__ = ()
+  _options = ()    # (option, attribute) pairs, set on each subclass
+
+  def __setattr__(self, name, value):
+    raise AttributeError("Config snapshots are read only, set the option in the config instead")
+
+  __delattr__ = __setattr__
+
+  def __getitem__(self, option):
+    # Option names are lower case, like in the config parser
+    return getattr(self, attribute_name(option.lower()))
+
+  def __contains__(self, option):
+    return hasattr(self, attribute_name(option.lower()))
+
+  def __iter__(self):
+    return (option for option, _ in self._options)
+
+
+def make_section(name, items):
+  """ A ConfigSection holding the (option, value) pairs in items """
+  options = []
+  for option, _ in items:
+    if attribute_name(option) not in [attribute for _, attribute in options]:
+      options.append((option, attribute_name(option)))
+  cls = type(str(attribute_name(name)), (ConfigSection, ), {
+      "__slots__": tuple(attribute for _, attribute in options),
+      "_options": tuple(options)
+  })
+  section = cls()
+  for option, value in items:
+    object.__setattr__(section, attribute_name(option), parse_value(value))
+  return section
+
+
+class ConfigSnapshot(object):
+  """
+  The settings of a CascadingConfigParser at one point in time. Sections are
+  attributes named by attribute_name and options are typed attributes of the
+  sections, so config.getfloat('Probe', 'offset_x') is
+  snapshot.Probe.offset_x, without the string lookup, interpolation and
+  parsing. Snapshots never change, the parser makes a new one instead.
+  """
+  __slots__ = ("_sections", )
+
+  def __setattr__(self, name, value):
+    raise AttributeError("Config snapshots are read only, set the option in the config instead")
+
+  __delattr__ = __setattr__
+
+  def __getitem__(self, section):
+    return self._sections[section]
+
+  def __contains__(self, section):
+    return section in self._sections
+
+  def __iter__(self):
+    return iter(self._sections)
+
+
+def make_snapshot(sections):
+  """ A ConfigSnapshot of the (name, ConfigSection) pairs in sections """
+  cls = type("ConfigSnapshot", (ConfigSnapshot, ),
+             {"__slots__": tuple(set(attribute_name(name) for name, _ in sections))})
+  snapshot = cls()
+  object.__setattr__(snapshot, "_sections", dict(sections))
+  for name, section in sections:
+    object.__setattr__(snapshot, attribute_name(name), section)
+  return snapshot
+
+
+def snapshot_changes(old, new):
+  """ The (section, option) pairs that differ between two snapshots """
+  changed = set()
+  for section in set(old) | set(new):
+    old_section = old[section] if section in old else {}
+    new_section = new[section] if section in new else {}
+    for option in set(old_section) | set(new_section):
+      if (option not in old_section or option not in new_section
+          or old_section[option] != new_section[option]):
+        changed.add((section, option))
+  return changed
+
 
 class CascadingConfigParser(Parser):
   def __init__(self, config_files):
 
     Parser.__init__(self)
 
+    # The typed settings, made again when they are next read after a change
+    self._snapshot = None
+    self._snapshot_stale = True
+    self._snapshot_lock = threading.Lock()
+    self._subscribers = []
+
     # Write options in the case it was read.
     # self.optionxform = str
 
@@ -51,6 +171,55 @@ class CascadingConfigParser(Parser):
         logging.warning("Missing config file " + config_file)
         # Might also add command line options for overriding stuff
 
+  def set(self, section, option, value=None):
+    Parser.set(self, section, option, value)
+    self._snapshot_stale = True
+
+  @property
+  def snapshot(self):
+    """ A ConfigSnapshot of the current settings, for code that reads them often """
+    if self._snapshot_stale:
+      self.update_snapshot()
+    return self._snapshot
+
+  def update_snapshot(self):
+    """
+    Make a new snapshot if a setting changed since the last one and tell the
+    subscribers which options changed. The first snapshot is made when it's
+    first read. M500 calls this after it has set the options, other changes
+    are picked up when the snapshot is next read.
+    """
+    with self._snapshot_lock:
+      if not self._snapshot_stale:
+        return
+      # A set while this runs makes the next read build another one
+      self._snapshot_stale = False
+      old = self._snapshot
+      sections = []
+      for section in self.sections():
+        try:
+          items = self.items(section)
+        except Exception:
+          # Macros and the like may hold a % that isn't meant for interpolation
+          items = self.items(section, raw=True)
+        sections.append((section, make_section(section, items)))
+      new = self._snapshot = make_snapshot(sections)
+      subscribers = list(self._subscribers)
+
+    if old is None:
+      return
+    changed = snapshot_changes(old, new)
+    if changed:
+      for callback in subscribers:
+        callback(new, changed)
+
+  def subscribe(self, callback):
+    """
+    Call callback(snapshot, changed) when a new snapshot has other settings,
+    changed is a set of the (section, option) pairs that differ.
+    """
+    self._subscribers.append(callback)
+
   def timestamp(self):
     """ Get the largest (newest) timestamp for all the config files. """
     ts = 0
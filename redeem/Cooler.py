@@ -19,12 +19,11 @@ License: GNU GPL v3: http://www.gnu.org/copyleft/gpl.html
  along with Redeem.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-from threading import Thread, Event
 import logging
 
 
 class Cooler:
-  def __init__(self, cold_end, fan, name, onoff_control):
+  def __init__(self, cold_end, fan, name, onoff_control, thermal_loop):
     """ Init """
     self.cold_end = cold_end
     self.fan = fan
@@ -36,6 +35,7 @@ class Cooler:
     self.max_speed = 1.0
     self.ok_range = 4.0
     self.sleep = 1.0
+    self.thermal_loop = thermal_loop    # Runs the controller
 
   def set_max_speed(self, speed):
     """ Set the desired max speed of the fan """
@@ -58,38 +58,40 @@ class Cooler:
 
   def disable(self):
     """ Stops the fan and the PID controller """
-    self.stop_thread.set()
-    self.t.join()
+    self.thermal_loop.remove(self)
     logging.debug("Cooler {} disabled".format(self.name))
-    self.fan.set_power(0.0)
+    self.fan.set_value(0.0)
 
   def enable(self):
     """ Start the controller """
-    self.stop_thread = Event()
-    self.t = Thread(target=self.keep_temperature, name=self.name)
-    self.t.daemon = True
-    self.t.start()
+    self.thermal_loop.add(self)
 
   def set_p_value(self, P):
     """ Set values for Proportional"""
     self.P = P    # Proportional
 
-  def keep_temperature(self):
-    """ Thread that keeps the temperature stable """
-    while not self.stop_thread.is_set():
-      self.current_temp = self.cold_end.get_temperature()
-      error = self.target_temp - self.current_temp
-
-      if self.onoff_control:
-        power = 1.0 if (self.P * error > 1.0) else 0.0
-      else:
-        power = self.P * error    # The formula for the PID (only P)
-        power = max(min(power, 1.0), 0.0)    # Normalize to 0,1
-
-      # Invert the control since it'a a cooler
-      power = 1.0 - power
-      # Clamp the max speed
-      power = min(power, self.max_speed)
-      #logging.debug("Err: {}, Pwr: {}".format(error, power))
+  def sample(self):
+    """ Measure the temperature, called from the thermal loop """
+    self.current_temp = self.cold_end.get_temperature()
+
+  def control(self):
+    """ Return the fan speed for the last sample, called from the thermal loop """
+    error = self.target_temp - self.current_temp
+
+    if self.onoff_control:
+      power = 1.0 if (self.P * error > 1.0) else 0.0
+    else:
+      power = self.P * error    # The formula for the PID (only P)
+      power = max(min(power, 1.0), 0.0)    # Normalize to 0,1
+
+    # Invert the control since it'a a cooler
+    power = 1.0 - power
+    # Clamp the max speed
+    power = min(power, self.max_speed)
+    #logging.debug("Err: {}, Pwr: {}".format(error, power))
+    return power
+
+  def write_power(self, power):
+    """ Set the fan speed if it changed """
+    if power != getattr(self.fan, "value", None):
       self.fan.set_value(power)
-      self.stop_thread.wait(self.sleep)
@@ -38,3 +38,7 @@ class Delta:
   A_angular = 0.00
   B_angular = 0.00
   C_angular = 0.00
+
+  # How the native planner calculates the step times of the towers
+  STEP_SOLVERS = {"exact": 0, "incremental": 1}
+  step_solver = "exact"
@@ -76,7 +76,20 @@ A_AXIS, B_AXIS, C_AXIS = 0, 1, 2
 
 # this class somewhat duplicates the Delta class of the native path planner
 # but as it is, the Delta class interface doesn't amend itself easily to
-# the purposes of the auto calibration calculation.
+# the purposes of the auto calibration calculation: the calibration also
+# fits the endstop offsets and needs the derivatives of the kinematics.
+# The transforms work on NumPy arrays of positions as well as on single ones.
+
+# the parameters adjusted by the calibration for each supported factor count,
+# in the order of the raw parameter vectors
+RAW_PARAMS = {
+    3: ("xstop", "ystop", "zstop"),
+    4: ("radius", "xstop", "ystop", "zstop"),
+    6: ("radius", "xstop", "ystop", "zstop", "yangular", "zangular"),
+    8: ("radius", "xstop", "ystop", "zstop", "yangular", "zangular", "yradial", "zradial"),
+    9: ("diagonal", "radius", "xstop", "ystop", "zstop", "yangular", "zangular", "yradial",
+        "zradial"),
+}
 
 
 class AutoCalibrationDeltaParameters:
@@ -189,48 +202,31 @@ class AutoCalibrationDeltaParameters:
 
   @classmethod
   def from_base_and_raw_params(cls, base, new_params):
-    ret = None
-
-    if len(new_params) == 3:
-      ret = cls(base.diagonal, base.radius, base.height, new_params[0], new_params[1],
-                new_params[2], base.yangular, base.zangular, base.yradial, base.zradial)
-    elif len(new_params) == 4:
-      ret = cls(base.diagonal, new_params[0], base.height, new_params[1], new_params[2],
-                new_params[3], base.yangular, base.zangular, base.yradial, base.zradial)
-    elif len(new_params) == 6:
-      ret = cls(base.diagonal, new_params[0], base.height, new_params[1], new_params[2],
-                new_params[3], new_params[4], new_params[5], base.yradial, base.zradial)
-    elif len(new_params) == 8:
-      ret = cls(base.diagonal, new_params[0], base.height, new_params[1], new_params[2],
-                new_params[3], new_params[4], new_params[5], new_params[6], new_params[7])
-    elif len(new_params) == 9:
-      ret = cls(new_params[0], new_params[1], base.height, new_params[2], new_params[3],
-                new_params[4], new_params[5], new_params[6], new_params[7], new_params[8])
-    else:
+    if len(new_params) not in RAW_PARAMS:
       raise ValueError("Only 3, 4, 6, 8, or 9 parameters supported")
 
+    params = {
+        "diagonal": base.diagonal,
+        "radius": base.radius,
+        "height": base.height,
+        "xstop": base.xstop,
+        "ystop": base.ystop,
+        "zstop": base.zstop,
+        "yangular": base.yangular,
+        "zangular": base.zangular,
+        "yradial": base.yradial,
+        "zradial": base.zradial
+    }
+    params.update(zip(RAW_PARAMS[len(new_params)], new_params))
+
+    ret = cls(**params)
     ret.update_height(base)
     return ret
 
   def to_raw_params(self, num_factors):
-    if num_factors == 3:
-      return [self.xstop, self.ystop, self.zstop]
-    elif num_factors == 4:
-      return [self.radius, self.xstop, self.ystop, self.zstop]
-    elif num_factors == 6:
-      return [self.radius, self.xstop, self.ystop, self.zstop, self.yangular, self.zangular]
-    elif num_factors == 8:
-      return [
-          self.radius, self.xstop, self.ystop, self.zstop, self.yangular, self.zangular,
-          self.yradial, self.zradial
-      ]
-    elif num_factors == 9:
-      return [
-          self.diagonal, self.radius, self.xstop, self.ystop, self.zstop, self.yangular,
-          self.zangular, self.yradial, self.zradial
-      ]
-    else:
+    if num_factors not in RAW_PARAMS:
       raise ValueError("Only 3, 4, 6, 8, or 9 parameters supported")
+    return [getattr(self, name) for name in RAW_PARAMS[num_factors]]
 
   def to_dict(self):
     L = self.diagonal / 1000.
@@ -305,9 +301,10 @@ class AutoCalibrationDeltaParameters:
     Hb = b
     Hc = c
     if not ignore_endstops:
-      Ha += self.xstop
-      Hb += self.ystop
-      Hc += self.zstop
+      # not +=, that would change the caller's arrays
+      Ha = Ha + self.xstop
+      Hb = Hb + self.ystop
+      Hc = Hc + self.zstop
 
     Fa = self.coreFa + Ha**2
     Fb = self.coreFb + Hb**2
@@ -334,18 +331,77 @@ class AutoCalibrationDeltaParameters:
 
     return x, y, z
 
+  def inverse_transform_z_derivatives(self, a, b, c, num_factors):
+    """
+    Partial derivatives of the z of inverse_transform(a, b, c) with respect
+    to the raw parameters of to_raw_params(num_factors).
+    :param a, b, c: NumPy arrays of carriage positions
+    :return: A matrix with a row per position and a column per parameter
+    """
+    x, y, z = self.inverse_transform(a, b, c)
+    heights = [a + self.xstop, b + self.ystop, c + self.zstop]
+    angles = np.radians([90., 210. + self.yangular, 330. + self.zangular])
+    radii = [self.radius, self.radius + self.yradial, self.radius + self.zradial]
+
+    # Each rod keeps its length, (x - towerX)^2 + (y - towerY)^2 + (H - z)^2 = diagonal^2,
+    # so differentiating these three constraints gives J * d(x, y, z) = -dF with J the
+    # derivatives with respect to x, y and z (halved, like dF below).
+    dxs = [x - self.towerX[i] for i in range(3)]
+    dys = [y - self.towerY[i] for i in range(3)]
+    dzs = [heights[i] - z for i in range(3)]
+    J = np.stack([np.stack([dxs[i], dys[i], -dzs[i]], axis=-1) for i in range(3)], axis=-2)
+
+    # only dz is needed, which is the last row of J^-1 times -dF
+    unit_z = np.broadcast_to([0., 0., 1.], J.shape[:-1])
+    z_row = np.linalg.solve(np.swapaxes(J, -1, -2), unit_z[..., np.newaxis])[..., 0]
+
+    def tower_moved(i, towerdx, towerdy):
+      dF = np.zeros(J.shape[:-1])
+      dF[..., i] = -(dxs[i] * towerdx + dys[i] * towerdy)
+      return dF
+
+    def radial(i):
+      return tower_moved(i, np.cos(angles[i]), np.sin(angles[i]))
+
+    def angular(i):
+      return tower_moved(i, -radii[i] * np.sin(angles[i]) * np.pi / 180.,
+                         radii[i] * np.cos(angles[i]) * np.pi / 180.)
+
+    def stop(i):
+      dF = np.zeros(J.shape[:-1])
+      dF[..., i] = dzs[i]
+      return dF
+
+    dFs = {
+        "diagonal": np.full(J.shape[:-1], -self.diagonal),
+        "radius": radial(0) + radial(1) + radial(2),
+        "xstop": stop(0),
+        "ystop": stop(1),
+        "zstop": stop(2),
+        "yangular": angular(1),
+        "zangular": angular(2),
+        "yradial": radial(1),
+        "zradial": radial(2)
+    }
+
+    return np.stack([-np.sum(z_row * dFs[name], axis=-1) for name in RAW_PARAMS[num_factors]],
+                    axis=-1)
+
 
 def _expected_residuals(new_raw_delta_params, points, base_delta_params, probe_motor_positions):
   new_delta_params = AutoCalibrationDeltaParameters.from_base_and_raw_params(
       base_delta_params, new_raw_delta_params)
-  new_points = map(
-      lambda motor_position: new_delta_params.inverse_transform(motor_position[0], motor_position[1], motor_position[2]),
-      probe_motor_positions)
-  new_residuals = []
-  for i in range(0, len(new_points)):
-    error = points[2][i] - new_points[i][2]
-    new_residuals.append(error)
-  return new_residuals
+  a, b, c = probe_motor_positions.T
+  new_points = new_delta_params.inverse_transform(a, b, c)
+  return points[2] - new_points[2]
+
+
+def _expected_residuals_jacobian(new_raw_delta_params, points, base_delta_params,
+                                 probe_motor_positions):
+  new_delta_params = AutoCalibrationDeltaParameters.from_base_and_raw_params(
+      base_delta_params, new_raw_delta_params)
+  a, b, c = probe_motor_positions.T
+  return -new_delta_params.inverse_transform_z_derivatives(a, b, c, len(new_raw_delta_params))
 
 
 def _calibrate_delta_parameters(pts, num_factors, delta_params):
@@ -361,11 +417,8 @@ def _calibrate_delta_parameters(pts, num_factors, delta_params):
   # Transform the probing points to motor endpoints and store them
   # in a matrix, so that we can do multiple iterations using the same data
 
-  probe_motor_positions = np.zeros((num_points, 3))
-  corrections = np.zeros(num_points)
-
-  for i, (x, y, z) in enumerate(zip(*pts)):
-    probe_motor_positions[i, :] = delta_params.transform([x, y, 0.0])
+  probe_motor_positions = np.column_stack(
+      delta_params.transform([pts[0], pts[1], np.zeros(num_points)]))
 
   initial_sum_of_squares = np.sum(pts[2]**2)
 
@@ -373,8 +426,10 @@ def _calibrate_delta_parameters(pts, num_factors, delta_params):
 
   raw_params = delta_params.to_raw_params(num_factors)
 
-  new_raw_params = least_squares(
-      _expected_residuals, raw_params, args=(pts, delta_params, probe_motor_positions))[0]
+  new_raw_params = least_squares(_expected_residuals,
+                                 raw_params,
+                                 args=(pts, delta_params, probe_motor_positions),
+                                 Dfun=_expected_residuals_jacobian)[0]
 
   return AutoCalibrationDeltaParameters.from_base_and_raw_params(delta_params, new_raw_params)
 
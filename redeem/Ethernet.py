@@ -20,18 +20,82 @@ License: GNU GPL v3: http://www.gnu.org/copyleft/gpl.html
  along with Redeem.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-from threading import Thread
+from threading import Condition, Lock, Thread
+from collections import deque
+import os
+import select
 import socket
 import logging
 from Gcode import Gcode
 
-size = 1024
+READ_SIZE = 65536
+BACKPRESSURE_POLL_INTERVAL = 100    # ms between checks of a full queue or path planner
+
+
+class EthernetClient:
+  """ A connection to a host, replies to its G-codes go back to it """
+  def __init__(self, connection, address, prot):
+    self.connection = connection
+    self.address = address
+    self.prot = prot
+    self.buffer = ""
+    self.pending = deque()    # lines that couldn't be queued yet
+    self.closed = False
+    self.send_lock = Lock()
+
+  def read(self):
+    """ Read what has arrived, returns False once the host has closed the connection """
+    try:
+      data = self.connection.recv(READ_SIZE)
+    except socket.error as e:
+      logging.error("Ethernet " + str(e))
+      data = ""
+    if not data:
+      # the host may close right after sending its last line
+      if self.buffer:
+        self.pending.append(self.buffer)
+        self.buffer = ""
+      self.closed = True
+      return False
+    lines = (self.buffer + data).split("\n")
+    self.buffer = lines.pop()
+    self.pending.extend(lines)
+    return True
+
+  def send_message(self, message):
+    """ Send a message """
+    if self.closed:
+      return
+    if message[-1] != "\n":
+      message += "\n"
+    try:
+      with self.send_lock:
+        self.connection.sendall(message)
+    except socket.error as e:
+      logging.error("Ethernet " + str(e))
+
+  def close(self):
+    self.closed = True
+    try:
+      self.connection.shutdown(socket.SHUT_RDWR)
+    except socket.error:
+      pass
+    self.connection.close()
 
 
 class Ethernet:
+  """
+  Network front end. Every host that connects gets its own protocol name,
+  Eth:<n>, so replies go back to the host that sent the G-code. The poll loop
+  only reads, the lines are queued by a thread of their own, and only while
+  the queue or the path planner they go to has room. A host isn't read from
+  until its lines are queued, which leaves it to TCP to slow it down, and
+  the lines of other hosts, like an M112, aren't held up by it.
+  """
   def __init__(self, printer):
     self.printer = printer
     self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    self.s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     host = ''
     port = 50000
     backlog = 5
@@ -43,66 +107,138 @@ class Ethernet:
         port += 1
 
     logging.info("Ethernet bound to port " + str(port))
+    self.port = port
     self.s.listen(backlog)
-    self.client = None
+    self.clients = {}    # by protocol name
+    self.clients_lock = Lock()
+    self.waiting = []    # clients with lines to queue, in the order they were read
+    self.lines_ready = Condition()
+    self.wake_read, self.wake_write = os.pipe()
     self.running = True
     self.t = Thread(target=self.get_message, name="Ethernet")
     self.t.start()
+    self.queue_thread = Thread(target=self.queue_lines, name="Ethernet queue")
+    self.queue_thread.start()
+
+  def get_client(self, prot):
+    """ The connected client with the given protocol name, or None """
+    with self.clients_lock:
+      return self.clients.get(prot)
 
   def get_message(self):
-    """Loop that gets messages and pushes them on the queue"""
+    """Loop that reads the hosts and hands their lines to the queueing thread"""
+    poller = select.poll()
+    poller.register(self.s, select.POLLIN)
+    poller.register(self.wake_read, select.POLLIN)
+    connections = {}    # clients being read from, by file descriptor
+    held = []    # clients not read from until their lines are queued
+    next_client = 0
+
     while self.running:
-      #logging.info("Ethernet listening")
-      self.s.settimeout(1.0)
-      try:
-        self.client, self.address = self.s.accept()
-      except IOError as e:
-        continue
-      logging.info("Ethernet connection accepted")
-      self.s.settimeout(1.0)
-      while self.running:
-        line = self.read_line()
-        if line is None:
+      for fd, flags in poller.poll():
+        if fd == self.wake_read:
+          os.read(self.wake_read, 1)
+        elif fd == self.s.fileno():
+          client = self._accept("Eth:" + str(next_client))
+          if client is not None:
+            next_client += 1
+            connections[client.connection.fileno()] = client
+            poller.register(client.connection, select.POLLIN)
+        elif fd in connections:
+          client = connections[fd]
+          if not client.read() or client.pending:
+            poller.unregister(fd)
+            del connections[fd]
+          if client.pending:
+            held.append(client)
+            with self.lines_ready:
+              self.waiting.append(client)
+              self.lines_ready.notify()
+          elif client.closed:
+            self._remove(client)
+
+      # held clients aren't read from, so once the queueing thread has emptied them they stay empty
+      for client in [client for client in held if not client.pending]:
+        held.remove(client)
+        if client.closed:
+          self._remove(client)
+        else:
+          connections[client.connection.fileno()] = client
+          poller.register(client.connection, select.POLLIN)
+
+    with self.clients_lock:
+      clients = list(self.clients.values())
+    for client in clients:
+      client.close()
+
+  def queue_lines(self):
+    """ Loop that queues the lines the hosts have sent, while there is room for them """
+    while self.running:
+      with self.lines_ready:
+        while self.running and not self.waiting:
+          self.lines_ready.wait()
+        clients = list(self.waiting)
+      queued = False
+      for client in clients:
+        queued = self._queue_lines(client) or queued
+        if not client.pending:
+          with self.lines_ready:
+            self.waiting.remove(client)
+          os.write(self.wake_write, " ")
+      if clients and not queued:
+        # nothing had room, check again in a while
+        with self.lines_ready:
+          self.lines_ready.wait(BACKPRESSURE_POLL_INTERVAL / 1000.0)
+
+  def _accept(self, prot):
+    try:
+      connection, address = self.s.accept()
+    except socket.error as e:
+      logging.error("Ethernet " + str(e))
+      return None
+    connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    client = EthernetClient(connection, address, prot)
+    with self.clients_lock:
+      self.clients[prot] = client
+    logging.info("Ethernet connection accepted from {} as {}".format(address[0], prot))
+    return client
+
+  def _remove(self, client):
+    logging.info("Ethernet: {} disconnected".format(client.prot))
+    with self.clients_lock:
+      del self.clients[client.prot]
+    client.close()
+
+  def _queue_lines(self, client):
+    """ Queue the client's pending lines while there is room, returns True if any were queued """
+    queued = False
+    while client.pending:
+      message = client.pending[0].strip()
+      if len(message) > 0:
+        g = Gcode({"message": message, "prot": client.prot})
+        if not self.printer.processor.has_room_for(g):
           break
-        message = line.strip("\n")
-        if len(message) > 0:
-          g = Gcode({"message": message, "prot": "Eth"})
-          self.printer.processor.enqueue(g)
+        self.printer.processor.enqueue(g)
+      client.pending.popleft()
+      queued = True
+    return queued
 
   def send_message(self, message):
-    """Send a message"""
+    """Send a message to every connected host"""
     #logging.debug("Eth: "+str(message))
-    if message[-1] != "\n":
-      message += "\n"
-    try:
-      if self.client:
-        self.client.send(message)
-    except socket.error as (value, message):
-      logging.error("Ethernet " + message)
-
-  def read_line(self):
-    """read a line from a socket"""
-    chars = []
-    while self.running:
-      try:
-        char = self.client.recv(1)
-      except socket.error as (value, message):
-        logging.error("Ethernet " + message)
-        char = ""
-      if char == "":
-        logging.warning("Ethernet: Connection reset by peer.")
-        self.client.close()
-        break
-      chars.append(char)
-      if char == "\n":
-        return "".join(chars)
+    with self.clients_lock:
+      clients = list(self.clients.values())
+    for client in clients:
+      client.send_message(message)
 
   def close(self):
     """Stop receiving messages"""
     self.running = False
-    if self.client is not None:
-      self.client.shutdown(socket.SHUT_RDWR)
-      self.client.close()
-    self.s.shutdown(socket.SHUT_RDWR)
-    self.s.close()
+    os.write(self.wake_write, " ")
+    with self.lines_ready:
+      self.lines_ready.notify()
     self.t.join()
+    self.queue_thread.join()
+    self.s.close()
+    os.close(self.wake_read)
+    os.close(self.wake_write)
@@ -20,11 +20,11 @@ License: GNU GPL v3: http://www.gnu.org/copyleft/gpl.html
  along with Redeem.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-from threading import Thread, Event
 import time
 import logging
 import numpy as np
 from Alarm import Alarm
+from RingBuffer import RingBuffer
 
 
 class Heater(object):
@@ -33,7 +33,7 @@ class Heater(object):
   either an extruder, a HBP or could even be a heated chamber
   """
 
-  def __init__(self, thermistor, mosfet, name, onoff_control):
+  def __init__(self, thermistor, mosfet, name, onoff_control, thermal_loop):
     """ Init """
     self.thermistor = thermistor
     self.mosfet = mosfet
@@ -51,6 +51,7 @@ class Heater(object):
     self.prefix = ""
     self.sleep = 0.1    # Time to sleep between measurements
     self.max_power = 1.0    # Maximum power
+    self.thermal_loop = thermal_loop    # Runs the PID controller
 
     self.min_temp_enabled = False    # Temperature error limit
     self.min_temp = 0    # If temperature falls below this point from the target, disable.
@@ -70,7 +71,7 @@ class Heater(object):
 
   def get_temperature(self):
     """ get the temperature of the thermistor"""
-    return np.average(self.temperatures[-self.avg:])
+    return self.temperatures.mean(self.avg)
 
   def get_temperature_raw(self):
     """ Get unaveraged temp measurement """
@@ -92,11 +93,12 @@ class Heater(object):
 
   def is_temperature_stable(self, seconds=10):
     """ Returns true if the temperature has been stable for n seconds """
-    if len(self.temperatures) < int(seconds / self.sleep):
+    samples = int(seconds / self.sleep)
+    if len(self.temperatures) < samples:
       return False
-    if max(self.temperatures[-int(seconds / self.sleep):]) > (self.target_temp + self.ok_range):
+    if self.temperatures.max(samples) > (self.target_temp + self.ok_range):
       return False
-    if min(self.temperatures[-int(seconds / self.sleep):]) < (self.target_temp - self.ok_range):
+    if self.temperatures.min(samples) < (self.target_temp - self.ok_range):
       return False
     return True
 
@@ -104,8 +106,8 @@ class Heater(object):
     """ Calculate and return the magnitude in the noise """
     measurements = min(measurements, len(self.temperatures))
     #logging.debug("Measurements: "+str(self.temperatures))
-    avg = np.average(self.temperatures[-measurements:])
-    mag = np.max(self.temperatures[-measurements:])
+    avg = self.temperatures.mean(measurements)
+    mag = self.temperatures.max(measurements)
     #logging.debug("Avg: "+str(avg))
     #logging.debug("Mag: "+str(mag))
     return abs(mag - avg)
@@ -123,10 +125,8 @@ class Heater(object):
   def disable(self):
     """ Stops the heater and the PID controller """
     self.target_temp = 0
-    self.stop_thread.set()
-    self.mosfet.set_power(0.0)
     # Wait for PID to stop
-    self.t.join()
+    self.thermal_loop.remove(self)
     logging.debug("Heater {} disabled".format(self.name))
     self.mosfet.set_power(0.0)
     self.last_error = 0.0
@@ -137,60 +137,62 @@ class Heater(object):
     """ Start the PID controller """
     self.avg = max(int(1.0 / self.sleep), 3)
     self.error = 0
-    self.errors = [0] * self.avg
+    self.errors = RingBuffer(self.avg, fill=0.0)
     self.average = 0
-    self.averages = [0] * self.avg
+    # Derivatives, averaged over the last 11 (or avg, if that's more). The
+    # window starts out with avg zeros, like the errors, and grows to that.
+    self.averages = RingBuffer(max(self.avg, 11))
+    for _ in range(self.avg):
+      self.averages.append(0.0)
     self.prev_time = self.current_time = time.time()
     self.current_temp = self.thermistor.get_temperature()
-    self.temperatures = [self.current_temp]
-    self.stop_thread = Event()
-    self.t = Thread(target=self.keep_temperature, name=self.name)
-    self.t.start()
-
-  def keep_temperature(self):
-    """ PID Thread that keeps the temperature stable """
-    try:
-      while not self.stop_thread.is_set():
-        self.current_temp = self.thermistor.get_temperature()
-        self.temperatures.append(self.current_temp)
-        self.temperatures[:-max(int(60 / self.sleep), self.avg)] = [
-        ]    # Keep only this much history
-
-        self.error = self.target_temp - self.current_temp
-        self.errors.append(self.error)
-        self.errors.pop(0)
-
-        if self.onoff_control:
-          if self.error > 0.0:
-            power = self.max_power
-          else:
-            power = 0.0
-        else:
-          derivative = self.get_error_derivative()
-          integral = self.get_error_integral()
-          # The standard formula for the PID
-          power = self.Kp * (self.error + (1.0 / self.Ti) * integral + self.Td * derivative)
-          power = max(min(power, self.max_power, 1.0), 0.0)    # Normalize to 0, max
-          #if self.name =="E":
-          #    logging.debug("Err: {0:.3f}, der: {1:.4f} int: {2:.2f}".format(self.error, derivative, integral))
-
-        # Run safety checks
-        self.time_diff = self.current_time - self.prev_time
-        self.prev_time = self.current_time
-        self.current_time = time.time()
-
-        if not self.extruder_error:
-          self.check_temperature_error()
-
-        # Set temp if temperature is OK
-        if not self.extruder_error and self.current_temp > 0:
-          self.mosfet.set_power(power)
-        else:
-          self.mosfet.set_power(0)
-        self.stop_thread.wait(self.sleep)
-    finally:
-      # Disable this mosfet if anything goes wrong
-      self.mosfet.set_power(0)
+    # Keep only this much history
+    self.temperatures = RingBuffer(max(int(60 / self.sleep), self.avg))
+    self.temperatures.append(self.current_temp)
+    self.thermal_loop.add(self)
+
+  def sample(self):
+    """ Measure the temperature, called from the thermal loop """
+    self.current_temp = self.thermistor.get_temperature()
+    self.temperatures.append(self.current_temp)
+
+  def control(self):
+    """ Run the PID controller and the safety checks on the last sample
+    and return the power to set, called from the thermal loop """
+    self.error = self.target_temp - self.current_temp
+    self.errors.append(self.error)
+
+    if self.onoff_control:
+      if self.error > 0.0:
+        power = self.max_power
+      else:
+        power = 0.0
+    else:
+      derivative = self.get_error_derivative()
+      integral = self.get_error_integral()
+      # The standard formula for the PID
+      power = self.Kp * (self.error + (1.0 / self.Ti) * integral + self.Td * derivative)
+      power = max(min(power, self.max_power, 1.0), 0.0)    # Normalize to 0, max
+      #if self.name =="E":
+      #    logging.debug("Err: {0:.3f}, der: {1:.4f} int: {2:.2f}".format(self.error, derivative, integral))
+
+    # Run safety checks
+    self.time_diff = self.current_time - self.prev_time
+    self.prev_time = self.current_time
+    self.current_time = time.time()
+
+    if not self.extruder_error:
+      self.check_temperature_error()
+
+    # Set temp if temperature is OK
+    if not self.extruder_error and self.current_temp > 0:
+      return power
+    return 0.0
+
+  def write_power(self, power):
+    """ Set the mosfet power if it changed """
+    if power != self.mosfet.get_power():
+      self.mosfet.set_power(power)
 
   def get_error_derivative(self):
     """ Get the derivative of the temperature"""
@@ -198,11 +200,7 @@ class Heater(object):
     # gets rid of the derivative kick. dT/dt
     der = (self.temperatures[-2] - self.temperatures[-1]) / self.sleep
     self.averages.append(der)
-    if len(self.averages) > 11:
-      self.averages.pop(0)
-    #if self.name =="E":
-    #    logging.debug(self.averages)
-    return np.average(self.averages)
+    return self.averages.mean()
 
   def get_error_integral(self):
     """ Calculate and return the error integral """
@@ -245,8 +243,8 @@ class Heater(object):
 class Extruder(Heater):
   """ Subclass for Heater, this is an extruder """
 
-  def __init__(self, smd, thermistor, mosfet, name, onoff_control):
-    Heater.__init__(self, thermistor, mosfet, name, onoff_control)
+  def __init__(self, smd, thermistor, mosfet, name, onoff_control, thermal_loop):
+    Heater.__init__(self, thermistor, mosfet, name, onoff_control, thermal_loop)
     self.smd = smd
     self.sleep = 0.25
     self.enable()
@@ -255,7 +253,7 @@ class Extruder(Heater):
 class HBP(Heater):
   """ Subclass for heater, this is a Heated build platform """
 
-  def __init__(self, thermistor, mosfet, onoff_control):
-    Heater.__init__(self, thermistor, mosfet, "HBP", onoff_control)
+  def __init__(self, thermistor, mosfet, onoff_control, thermal_loop):
+    Heater.__init__(self, thermistor, mosfet, "HBP", onoff_control, thermal_loop)
     self.sleep = 0.5    # Heaters have more thermal mass
     self.enable()
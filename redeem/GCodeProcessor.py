@@ -24,11 +24,13 @@ import sys
 import traceback
 import inspect
 import logging
+import pkgutil
 import re
 import importlib
-from threading import Event
+from threading import Event, Lock
 from six import iteritems
 from gcodes.GCodeCommand import GCodeCommand
+from gcodes.index import GCODE_MODULES
 from PathPlanner import SyncCallback
 import Sync
 try:
@@ -43,32 +45,93 @@ class GCodePerformanceCounters:
     self.start_time = 0
 
 
+def find_gcode_classes(package_name="redeem.gcodes"):
+  """
+  Import every module of the package and return the name of every G-code
+  handler class in it with the name of the module that defines it.
+  This is slow, tools/generate_gcode_index.py runs it to make gcodes/index.py.
+  """
+  package = importlib.import_module(package_name)
+  classes = {}
+  for _, module_name, _ in pkgutil.iter_modules(package.__path__):
+    if module_name in ("GCodeCommand", "index"):
+      continue
+    module = importlib.import_module(package_name + "." + module_name)
+    for name, obj in inspect.getmembers(module, inspect.isclass):
+      if not inspect.isabstract(obj) and \
+              issubclass(obj, GCodeCommand) and \
+              name != 'GCodeCommand' and \
+              name != 'ToolChange' and \
+              obj.__module__.startswith(package_name + "."):
+        classes[name] = obj.__module__[len(package_name) + 1:]
+  return classes
+
+
+class GCodeRegistry(object):
+  """
+  The G-code handlers by name. A handler's module is imported and the
+  handler made the first time it's looked up, so starting Redeem doesn't
+  have to import every module in gcodes.
+  """
+  def __init__(self, printer, modules, package_name="redeem.gcodes"):
+    self.printer = printer
+    self.modules = modules    # Handler name to module name, from gcodes/index.py
+    self.package_name = package_name
+    self.commands = {}    # Handlers made so far and the ones plugins added
+    self.lock = Lock()
+
+  def _load(self, name):
+    with self.lock:
+      if name not in self.commands:
+        logging.debug("Loading GCode handler " + name + "...")
+        module = importlib.import_module(self.package_name + "." + self.modules[name])
+        self.commands[name] = getattr(module, name)(self.printer)
+      return self.commands[name]
+
+  def __getitem__(self, name):
+    command = self.commands.get(name)
+    if command is None:
+      if name not in self.modules:
+        raise KeyError(name)
+      command = self._load(name)
+    return command
+
+  def __setitem__(self, name, command):
+    with self.lock:
+      self.commands[name] = command
+
+  def __contains__(self, name):
+    return name in self.commands or name in self.modules
+
+  def get(self, name, default=None):
+    return self[name] if name in self else default
+
+  def keys(self):
+    return list(set(self.modules) | set(self.commands))
+
+  def __iter__(self):
+    return iter(self.keys())
+
+  def __len__(self):
+    return len(self.keys())
+
+  def items(self):
+    """ All handlers, this loads the ones that weren't used yet """
+    return [(name, self[name]) for name in self.keys()]
+
+  iteritems = items
+
+
 class GCodeProcessor:
   def __init__(self, printer):
     self.printer = printer
     self.counters = GCodePerformanceCounters()
     self.sync_event_needed = False
-    self.gcodes = {}
-    module = importlib.import_module("redeem.gcodes")
-    self.load_classes_in_module(module)
+    self.gcodes = GCodeRegistry(printer, GCODE_MODULES)
 
     if len(self.gcodes) is 0:
       logging.error("No gcodes loaded")
 
-  def load_classes_in_module(self, module):
-    for module_name, obj in inspect.getmembers(module):
-      if inspect.ismodule(obj) and \
-              (obj.__name__.startswith('gcodes') or
-               obj.__name__.startswith('redeem.gcodes')):
-        self.load_classes_in_module(obj)
-      elif inspect.isclass(obj) and \
-              not inspect.isabstract(obj) and \
-              issubclass(obj, GCodeCommand) and \
-              module_name != 'GCodeCommand' and \
-              module_name != 'ToolChange':
-        logging.debug("Loading GCode handler " + module_name + "...")
-        self.gcodes[module_name] = obj(self.printer)
-
   def override_command(self, gcode, gcodeClassInstance):
     """
     This methods allow a plugin to replace a GCode command
@@ -152,8 +215,58 @@ class GCodeProcessor:
     if gcode.code() in ["M109", "M190"]:
       self._make_async_queue_wait_for_buffered_queue()
 
+  def has_room_for(self, gcode):
+    """
+    Whether enqueue can take the gcode without waiting, that is whether the
+    queue it goes to, or the path planner for the async ones, has room
+    """
+    c = gcode.code() if not gcode.is_info_command() else gcode.code()[:-1]
+    command = self.gcodes.get(c)
+    if command is None or self._is_peeked(gcode):
+      return True
+    if command.is_async():
+      return self.printer.path_planner.get_available_slots() > 0
+    if command.is_buffered():
+      return not self.printer.commands.full()
+    return not self.printer.unbuffered_commands.full()
+
+  def enqueue_batch(self, gcodes):
+    """
+    Enqueue a batch of gcodes, like a chunk of lines read from a file.
+    Runs of commands that only add a path (G0/G1) are handed to the path
+    planner together, everything else goes through enqueue.
+    """
+    paths = []
+    moves = []
+    for gcode in gcodes:
+      command = self.gcodes.get(gcode.code())
+      path = command.get_path(gcode) if command is not None else None
+      if path is not None:
+        paths.append(path)
+        moves.append(gcode)
+        continue
+      if paths:
+        self._queue_paths(paths, moves)
+        paths = []
+        moves = []
+      self.enqueue(gcode)
+    if paths:
+      self._queue_paths(paths, moves)
+
+  def _queue_paths(self, paths, gcodes):
+    """ Add paths to the path planner in one go, the gcodes they came from are async """
+    self.sync_event_needed = True
+    self.printer.path_planner.add_path_batch(paths)
+    self.counters.gcodes_executed += len(gcodes)
+    for gcode in gcodes:
+      self.printer.reply(gcode)
+
+  def _is_peeked(self, gcode):
+    """ Whether the gcode is executed right away instead of being queued """
+    return self.printer.running_M116 and gcode.code() in ["M108", "M104", "M140"]
+
   def peek(self, gcode):
-    if self.printer.running_M116 and gcode.code() in ["M108", "M104", "M140"]:
+    if self._is_peeked(gcode):
       self.execute(gcode)
       return True
     elif gcode.code() == "M1500":
@@ -25,6 +25,52 @@ License: GNU GPL v3: http://www.gnu.org/copyleft/gpl.html
 import logging
 import re
 
+# Tokenize gcode "words" per RS274/NFC v3, see Gcode.__init__
+_COMMENT = re.compile(r"\(.*\)")
+_WORDS = re.compile(
+    r"^M117(?![A-Z])|[A-Z][-+]?[0-9]*\.?[0-9]*\??")    # note syntax exception for M117
+
+
+def _parse_value(token):
+  """ Parse the number after the letter, None if there is none """
+  if len(token) == 1:
+    return None
+  try:
+    return float(token[1:])
+  except ValueError:
+    return 0.0
+
+
+def _tokenize(message):
+  """
+  Split a message into gcode words. Returns the message without the ;comment
+  and (comment), the words and the parsed value of each word.
+  """
+  message = _COMMENT.sub("", message.strip().split(";")[0].strip(' \t\n\r'))
+  tokens = _WORDS.findall(message.replace(' ', '').upper())
+  return message, tokens, [_parse_value(t) for t in tokens]
+
+
+try:
+  from _GcodeLexer import tokenize
+except ImportError:
+  tokenize = _tokenize
+
+
+class GcodeWords(object):
+  """ The value of the first word of each letter, parsed once """
+  __slots__ = tuple("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+
+  def __init__(self, tokens, values):
+    """ tokens must all start with a letter A-Z """
+    for i in range(len(tokens) - 1, -1, -1):
+      setattr(self, tokens[i][0], values[i])
+
+
+_MISSING = object()
+# never changed, set_tokens makes new words
+_NO_WORDS = GcodeWords((), ())
+
 
 class Gcode:
   """ A command received from pronterface or whatever """
@@ -33,14 +79,16 @@ class Gcode:
   def __init__(self, packet):
     """ Init; parse the token """
     try:
-      self.message = packet["message"].strip().split(";")[0]
-      self.message = self.message.strip(' \t\n\r')
-      self.parent = packet["parent"] if "parent" in packet else None
-      self.prot = packet["prot"] if "prot" in packet else None
+      self.parent = packet.get("parent")
+      self.prot = packet.get("prot")
       if self.prot is None:
         self.prot = self.parent.prot if self.parent else "None"
       self.has_crc = False
       self.answer = "ok"
+      # commands that don't parse have no words
+      self.words = _NO_WORDS
+      # strip comments and split into words
+      self.message, self.tokens, values = tokenize(packet["message"])
       if len(self.message) == 0:
         #logging.debug("Empty message")
         self.gcode = "No-Gcode"
@@ -58,12 +106,6 @@ class Gcode:
 
       CRC (*nn), "(comment)"s are also removed.
       """
-      # strip gcode comments
-      self.message = re.sub(r"\(.*\)", "", self.message)
-      self.tokens = re.findall(
-          r"^M117(?![A-Z])|[A-Z][-+]?[0-9]*\.?[0-9]*\??",    # note syntax exception for M117
-          self.message.replace(' ', '').upper())
-
       # process line numbers and checksum, if present
       if self.tokens[0][0] == "N":    # Ok, checksum
         line_num = re.findall(r"\d+", self.tokens[0])[0]
@@ -75,6 +117,7 @@ class Gcode:
         Gcode.line_number += 1    # Increase the global counter
         self.has_crc = True
         self.tokens.pop(0)    # remove the line number token
+        values.pop(0)
         # Remove crc stuff from messages
         self.message = self.message.\
             split("*")[0][(1+len(line_num))::].strip(" ")
@@ -83,6 +126,8 @@ class Gcode:
       class name compliance. Example: G29_1
       """
       self.gcode = self.tokens.pop(0).replace('.', '_')
+      values.pop(0)
+      self.words = GcodeWords(self.tokens, values)
 
     except Exception as e:
       self.gcode = "No-Gcode"
@@ -118,6 +163,8 @@ class Gcode:
   def set_tokens(self, tokens):
     """ Set the tokens """
     self.tokens = tokens
+    words = [t for t in tokens if t[:1] in GcodeWords.__slots__]
+    self.words = GcodeWords(words, [_parse_value(t) for t in words])
 
   def get_message(self):
     """ 
@@ -128,10 +175,7 @@ class Gcode:
 
   def has_letter(self, letter):
     """ Check if the letter exists as token """
-    for token in self.tokens:
-      if token[0] == letter:
-        return True
-    return False
+    return hasattr(self.words, letter)
 
   def has_value(self, index):
     try:
@@ -149,19 +193,15 @@ class Gcode:
 
   def get_float_by_letter(self, letter, default=0.0):
     """ Get a float or return a default value. """
-    val = default
-    index = self.get_token_index_by_letter(letter)
-    if index != None and self.has_value(index):
-      val = self.token_value(index)
-    return val
+    val = getattr(self.words, letter, None)
+    return default if val is None else val
 
   def get_distance_by_letter(self, letter, default=0.0):
     """ Get a float or return a default value. Factor in curent G20/21 unit setting. """
-    val = default
-    index = self.get_token_index_by_letter(letter)
-    if index != None:
-      val = self.token_distance(index)
-    return val
+    val = getattr(self.words, letter, _MISSING)
+    if val is _MISSING:
+      return default
+    return (val or 0.0) * self.printer.unit_factor
 
   def get_int_by_letter(self, letter, default=0):
     """ Get an int or return a default value. """
@@ -178,6 +218,7 @@ class Gcode:
     for i, token in enumerate(self.tokens):
       if token[0] == letter:
         self.tokens.pop(i)
+    self.set_tokens(self.tokens)
 
   def num_tokens(self):
     return len(self.tokens)
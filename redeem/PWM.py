@@ -2,6 +2,12 @@
 """
 This is an implementation of the PWM DAC
 
+The PCA9685 has a register block of four bytes for each of its 16 channels.
+PWM keeps a copy of the off count it last wrote to each channel, so setting
+a channel to the value it already has doesn't touch the I2C bus. Between
+begin_batch and end_batch, new values are only noted and then go out
+together, neighbouring channels in one auto-increment write.
+
 Author: Elias Bakken
 email: elias(dot)bakken(at)gmail(dot)com
 Website: http://www.thing-printer.com
@@ -26,6 +32,7 @@ from Adafruit_GPIO.I2C import Device as I2C
 import time
 import subprocess
 import logging
+from threading import Lock
 
 
 class PWM(object):
@@ -35,6 +42,16 @@ class PWM(object):
 
   PCA9685_MODE1 = 0x0
   PCA9685_PRESCALE = 0xFE
+  PCA9685_LED0 = 0x06
+  CHANNELS = 16
+  MAX_BLOCK = 8    # Channels in one write, I2C block writes take up to 32 bytes
+
+  lock = Lock()
+  shadow = [None] * CHANNELS    # The off count last written to each channel, None if unknown
+  pending = {}    # Off counts by channel, waiting for end_batch
+  batches = 0    # Nested begin_batch calls
+  updates = 0    # Calls to set_value
+  transactions = 0    # writeList calls made for them
 
   def __init__(self, channel):
     self.channel = channel
@@ -52,6 +69,7 @@ class PWM(object):
       PWM.i2c = I2C(0x70, 1)    # Open device
     PWM.i2c.write8(PWM.PCA9685_MODE1, 0x01)    # Reset
     PWM.i2c._logger.setLevel(logging.WARNING)
+    PWM.shadow = [None] * PWM.CHANNELS
 
   @staticmethod
   def set_frequency(freq):
@@ -79,8 +97,75 @@ class PWM(object):
   def set_value(value, channel):
     """ Set the amount of on-time from 0..1 """
     off = int(value * 4095)
-    byte_list = [0x00, 0x00, off & 0xFF, off >> 8]
-    PWM.i2c.writeList(0x06 + (4 * channel), byte_list)
+    with PWM.lock:
+      PWM.updates += 1
+      PWM.pending[channel] = off
+      if PWM.batches == 0:
+        PWM._flush()
+
+  @staticmethod
+  def begin_batch():
+    """ Hold back the values set from now on until end_batch """
+    with PWM.lock:
+      PWM.batches += 1
+
+  @staticmethod
+  def end_batch():
+    """ Write the values set since begin_batch """
+    with PWM.lock:
+      PWM.batches -= 1
+      if PWM.batches == 0:
+        PWM._flush()
+
+  @staticmethod
+  def get_stats():
+    """ How many values were set, how many I2C writes that took and how many it saved """
+    return {
+        "updates": PWM.updates,
+        "transactions": PWM.transactions,
+        "saved": PWM.updates - PWM.transactions
+    }
+
+  @staticmethod
+  def reset_stats():
+    """ Forget the statistics gathered so far """
+    with PWM.lock:
+      PWM.updates = PWM.transactions = 0
+
+  @staticmethod
+  def _flush():
+    """ Write the pending values that differ from the registers, call with the lock held """
+    values = list(PWM.shadow)
+    dirty = []
+    for c, off in PWM.pending.items():
+      if values[c] != off:
+        values[c] = off
+        dirty.append(c)
+    dirty.sort()
+    PWM.pending = {}
+
+    try:
+      while dirty:
+        # Write on to the last dirty channel within reach. Unchanged channels
+        # in between are written again, that's cheaper than another write.
+        first = last = dirty[0]
+        for c in dirty[1:]:
+          if c >= first + PWM.MAX_BLOCK or None in values[last + 1:c]:
+            break
+          last = c
+        byte_list = []
+        for off in values[first:last + 1]:
+          byte_list += [0x00, 0x00, off & 0xFF, off >> 8]
+        PWM.i2c.writeList(PWM.PCA9685_LED0 + (4 * first), byte_list)
+        PWM.shadow[first:last + 1] = values[first:last + 1]
+        PWM.transactions += 1
+        dirty = [c for c in dirty if c > last]
+    except:
+      # The callers don't set a value again that they think is set, so
+      # keep what wasn't written for the next flush
+      for c in dirty:
+        PWM.pending.setdefault(c, values[c])
+      raise
 
 
 if __name__ == '__main__':
@@ -79,6 +79,19 @@ class SyncCallback(SyncCallbackNative):
 
 
 class PathPlanner:
+
+  # Per-move flags for PathPlannerNative.queueMoves, must match path_planner/config.h
+  QUEUE_MOVE_CANCELABLE = 1 << 0
+  QUEUE_MOVE_OPTIMIZE = 1 << 1
+  QUEUE_MOVE_SOFT_ENDSTOPS = 1 << 2
+  QUEUE_MOVE_BED_MATRIX = 1 << 3
+  QUEUE_MOVE_BACKLASH_COMPENSATION = 1 << 4
+  QUEUE_MOVE_PROBE = 1 << 5
+
+  # [Planner] options that config_changed passes on to the native planner
+  LOOKAHEAD_OPTIONS = ("max_buffered_move_time", "lookahead_time", "lookahead_distance")
+  ARC_OPTIONS = ("arc_segment_length", "arc_tolerance")
+
   def __init__(self, printer, pru_firmware):
     """ Init the planner """
     self.printer = printer
@@ -86,6 +99,7 @@ class PathPlanner:
     self.pru_firmware = pru_firmware
 
     self.printer.path_planner = self
+    self.printer.config.subscribe(self.config_changed)
 
     self.travel_length = {
         "X": 0.0,
@@ -127,30 +141,47 @@ class PathPlanner:
 
   def _init_path_planner(self):
     self.alarm_wrapper = AlarmWrapper()
-    self.native_planner = PathPlannerNative(int(self.printer.move_cache_size), self.alarm_wrapper)
 
-    fw0 = self.pru_firmware.get_firmware(0)
-    fw1 = self.pru_firmware.get_firmware(1)
+    if self.printer.simulate_pru:
+      # the simulator doesn't need the firmware
+      self.native_planner = PathPlannerNative(
+          int(self.printer.move_cache_size), self.alarm_wrapper,
+          float(self.printer.simulated_pru_speed))
+      self.native_planner.initPRU("", "")
+    else:
+      self.native_planner = PathPlannerNative(int(self.printer.move_cache_size), self.alarm_wrapper)
 
-    if fw0 is None or fw1 is None:
-      return
+      fw0 = self.pru_firmware.get_firmware(0)
+      fw1 = self.pru_firmware.get_firmware(1)
+
+      if fw0 is None or fw1 is None:
+        return
 
-    self.native_planner.initPRU(fw0, fw1)
+      self.native_planner.initPRU(fw0, fw1)
 
     self.native_planner.setAxisStepsPerMeter(tuple(self.printer.steps_pr_meter))
     self.native_planner.setMaxSpeeds(tuple(self.printer.max_speeds))
     self.native_planner.setAcceleration(tuple(self.printer.acceleration))
     self.native_planner.setMaxSpeedJumps(tuple(self.printer.max_speed_jumps))
     #    self.native_planner.setPrintMoveBufferWait(int(self.printer.print_move_buffer_wait))
-    #    self.native_planner.setMaxBufferedMoveTime(int(self.printer.max_buffered_move_time))
+    self.update_lookahead()
     self.native_planner.setSoftEndstopsMin(tuple(self.printer.soft_min))
     self.native_planner.setSoftEndstopsMax(tuple(self.printer.soft_max))
     self.native_planner.setSoftEndstopsMax(tuple(self.printer.soft_max))
     self.native_planner.setBedCompensationMatrix(tuple(np.identity(3).ravel()))
     self.native_planner.setAxisConfig(self.printer.axis_config)
+    self.native_planner.setLazyStepGeneration(self.printer.lazy_step_generation)
+    self.native_planner.setStepCommandCompression(self.printer.compress_step_commands)
+    self.native_planner.setArcSegmentLength(self.printer.arc_segment_length)
+    self.native_planner.setArcTolerance(self.printer.arc_tolerance)
+    self.update_bed_mesh()
     self.native_planner.delta_bot.setMainDimensions(Delta.L, Delta.r)
     self.native_planner.delta_bot.setRadialError(Delta.A_radial, Delta.B_radial, Delta.C_radial)
     self.native_planner.delta_bot.setAngularError(Delta.A_angular, Delta.B_angular, Delta.C_angular)
+    if Delta.step_solver not in Delta.STEP_SOLVERS:
+      logging.error("Unknown delta step solver '{}', using 'exact'".format(Delta.step_solver))
+      Delta.step_solver = "exact"
+    self.native_planner.delta_bot.setStepSolver(Delta.STEP_SOLVERS[Delta.step_solver])
     self.configure_slaves()
     self.native_planner.setBacklashCompensation(tuple(self.printer.backlash_compensation))
     self.native_planner.setState(self.prev.end_pos)
@@ -180,6 +211,18 @@ class PathPlanner:
     """ Update steps pr meter from the path """
     self.native_planner.setBacklashCompensation(tuple(self.printer.backlash_compensation))
 
+  def update_bed_mesh(self):
+    """ Hand the probed height mesh to the native planner, which follows it in compensated moves """
+    mesh = self.printer.bed_mesh
+    if mesh is None:
+      self.native_planner.clearBedMesh()
+      return
+    heights = np.array(mesh["heights"], dtype=np.float64) / 1000.0
+    self.native_planner.setBedMesh(mesh["min_x"] / 1000.0, mesh["min_y"] / 1000.0,
+                                   mesh["step_x"] / 1000.0, mesh["step_y"] / 1000.0,
+                                   int(heights.shape[1]), tuple(heights.ravel()),
+                                   self.printer.bed_mesh_interpolation == "bicubic")
+
   def get_current_pos(self, mm=False, ideal=False):
     """ Get the current pos as a dict """
     if mm:
@@ -203,6 +246,49 @@ class PathPlanner:
     """ Wait until the queue is empty """
     self.native_planner.waitUntilFinished()
 
+  def get_available_slots(self):
+    """ The number of moves that can be queued before adding a path blocks """
+    return self.native_planner.getAvailablePathSlots()
+
+  def update_lookahead(self):
+    """ Pass the buffered move time and the look-ahead from the printer to the native planner """
+    self.native_planner.setMaxBufferedMoveTime(self.printer.max_buffered_move_time / 1000.0)
+    self.native_planner.setLookahead(self.printer.lookahead_time / 1000.0,
+                                     self.printer.lookahead_distance / 1000.0)
+
+  def config_changed(self, snapshot, changed):
+    """ Follow changes to the look-ahead and arc options of the config """
+    options = [option for section, option in changed if section == "Planner"]
+    for option in options:
+      if option in self.LOOKAHEAD_OPTIONS + self.ARC_OPTIONS:
+        setattr(self.printer, option, float(snapshot.Planner[option]))
+    if getattr(self, "native_planner", None) is None:
+      return
+    if any(option in self.LOOKAHEAD_OPTIONS for option in options):
+      self.update_lookahead()
+    if "arc_segment_length" in options:
+      self.native_planner.setArcSegmentLength(self.printer.arc_segment_length)
+    if "arc_tolerance" in options:
+      self.native_planner.setArcTolerance(self.printer.arc_tolerance)
+
+  def get_queue_stats(self):
+    """ How the path queue between queueing moves and the planner thread has been doing, times are in seconds """
+    stats = self.native_planner.getPathQueueStats()
+    return {
+        "paths_added": stats.pathsAdded,
+        "paths_removed": stats.pathsRemoved,
+        "consumer_commits": stats.consumerCommits,
+        "contentions": stats.planningContentions,
+        "producer_waits": stats.producerWaits,
+        "consumer_waits": stats.consumerWaits,
+        "max_planning_time": stats.maxPlanningTime / 1e9,
+        "max_pop_time": stats.maxPopTime / 1e9,
+        "safe_speed_stops": stats.safeSpeedStops
+    }
+
+  def reset_queue_stats(self):
+    self.native_planner.resetPathQueueStats()
+
   def wait_until_sync_event(self):
     """ Blocks until a PRU sync event occurs """
     return (self.native_planner.waitUntilSyncEvent() > 0)
@@ -496,13 +582,8 @@ class PathPlanner:
     if new.is_G92():
       self.native_planner.setAxisConfig(int(self.printer.axis_config))
       self.native_planner.setState(tuple(new.end_pos))
-    elif new.needs_splitting():
-      # G2 or G3 movements (arc movements ) need to convert it to linear segments before feeding to the queue
-      # These movements seem only to be used by CNC mills/lathes which have lower gcode throughput
-      # Performance may be acceptable. If it is an issue, move `Path` functionality into `PathPlannerNative`
-      for seg in new.get_segments():
-        self.add_path(seg)
-
+    elif new.is_arc():
+      self._queue_arc(new)
     else:
       self.printer.ensure_steppers_enabled()
 
@@ -518,7 +599,7 @@ class PathPlanner:
           bool(new.cancelable),
           bool(optimize),
           bool(new.enable_soft_endstops),
-          False,    #bool(new.use_bed_matrix),
+          bool(new.use_bed_matrix),    # the path has the matrix in it, this adds the mesh
           bool(new.use_backlash_compensation),
           bool(new.is_probe),
           int(tool_axis))
@@ -534,6 +615,114 @@ class PathPlanner:
       # make sure that the current state of the printer is correct
       self.prev.end_pos = self.native_planner.getState()
 
+  def add_path_batch(self, paths):
+    """ Add a sequence of path segments to the path planner.
+    Runs of linear moves are handed to the native planner in a single call,
+    G92 and arc paths go through add_path as usual. """
+    batch = []
+    for new in paths:
+      if new.is_G92() or new.is_arc():
+        self._queue_batch(batch)
+        batch = []
+        self.add_path(new)
+        continue
+      batch.append(new)
+
+    self._queue_batch(batch)
+
+  def _queue_arc(self, new):
+    """ Let the native planner split a G2 or G3 path into segments and queue them """
+    self.printer.ensure_steppers_enabled()
+
+    center0, center1 = new.get_arc_center()
+    start_pos = np.copy(new.prev.ideal_end_pos)
+    end_pos = np.copy(new.ideal_end_pos)
+    # babystepping, like add_path does for the other paths
+    start_pos[2] += self.printer.offset_z
+    end_pos[2] += self.printer.offset_z
+
+    # the native planner applies the matrix to column vectors, the paths to row vectors
+    if new.use_bed_matrix:
+      bed_matrix = self.printer.matrix_bed_comp.T
+    else:
+      bed_matrix = np.identity(3)
+
+    # the segments are absolute moves without backlash compensation
+    flags = PathPlanner.QUEUE_MOVE_OPTIMIZE
+    if new.cancelable:
+      flags |= PathPlanner.QUEUE_MOVE_CANCELABLE
+    if new.enable_soft_endstops:
+      flags |= PathPlanner.QUEUE_MOVE_SOFT_ENDSTOPS
+    if new.use_bed_matrix:
+      flags |= PathPlanner.QUEUE_MOVE_BED_MATRIX
+    tool_axis = Printer.axis_to_index(self.printer.current_tool)
+
+    self.native_planner.setAxisConfig(int(self.printer.axis_config))
+    self.native_planner.queueArc(tuple(start_pos), tuple(end_pos), float(center0), float(center1),
+                                 int(self.printer.arc_plane), new.movement == Path.G2, new.speed,
+                                 new.accel, flags, tuple(bed_matrix.ravel()), int(tool_axis))
+
+  def _queue_batch(self, batch):
+    """
+    Queue a run of linear paths with one native call. Their end positions are
+    worked out for the whole run at once, instead of linking each path to the
+    one before it.
+    """
+    if not batch:
+      return
+
+    self.printer.ensure_steppers_enabled()
+
+    ideal_end_positions = []
+    position = list(self.prev.ideal_end_pos)
+    for p in batch:
+      position = p.advance(list(position))
+      ideal_end_positions.append(position)
+    ideal_end_positions = np.array(ideal_end_positions, dtype=Path.DTYPE)
+
+    end_positions = np.copy(ideal_end_positions)
+    bed_matrix = np.array([p.use_bed_matrix for p in batch], dtype=bool)
+    end_positions[bed_matrix, :3] = ideal_end_positions[bed_matrix, :3].dot(
+        self.printer.matrix_bed_comp)
+    # Add babystepping
+    end_positions[:, 2] += self.printer.offset_z
+
+    speeds = np.array([p.speed for p in batch], dtype=np.float64)
+    accels = np.array([p.accel for p in batch], dtype=np.float64)
+    flags = np.zeros(len(batch), dtype=np.intc)
+    status = np.zeros(len(batch), dtype=np.uint8)
+
+    flag_is_set = [
+        (PathPlanner.QUEUE_MOVE_CANCELABLE, [p.cancelable for p in batch]),
+        (PathPlanner.QUEUE_MOVE_OPTIMIZE, [p.movement != Path.RELATIVE for p in batch]),
+        (PathPlanner.QUEUE_MOVE_SOFT_ENDSTOPS, [p.enable_soft_endstops for p in batch]),
+        (PathPlanner.QUEUE_MOVE_BED_MATRIX, bed_matrix),
+        (PathPlanner.QUEUE_MOVE_BACKLASH_COMPENSATION, [p.use_backlash_compensation
+                                                        for p in batch]),
+        (PathPlanner.QUEUE_MOVE_PROBE, [p.is_probe for p in batch]),
+    ]
+    for flag, is_set in flag_is_set:
+      flags[np.array(is_set, dtype=bool)] |= flag
+
+    tool_axis = Printer.axis_to_index(self.printer.current_tool)
+
+    self.native_planner.setAxisConfig(int(self.printer.axis_config))
+    state = self.native_planner.queueMoves(end_positions, speeds, accels, flags, status,
+                                           int(tool_axis))
+
+    for i in np.flatnonzero(status):
+      p = batch[i]
+      p.start_pos = end_positions[i - 1] if i > 0 else self.prev.end_pos
+      p.end_pos = end_positions[i]
+      logging.debug("add path failed: " + str(p))
+
+    # Keep only the last queued path, with the actual state of the printer
+    queued = np.flatnonzero(status == 0)
+    if len(queued):
+      self.prev = batch[queued[-1]]
+      self.prev.ideal_end_pos = ideal_end_positions[queued[-1]]
+      self.prev.end_pos = state
+
   def set_extruder(self, ext_nr):
     """
         TODO: does this function do anything? Should it be setting the tool axis?
@@ -33,6 +33,8 @@ import fcntl
 import termios
 from Gcode import Gcode
 
+READ_SIZE = 4096
+
 
 class Pipe:
   def __init__(self, printer, prot, iomanager):
@@ -82,16 +84,24 @@ class Pipe:
     self.wr = os.fdopen(master_fd, "w")
 
     self.send_response = True
+    self.buffer = ""
     self.iomanager.add_file(self.rd, self.get_message)
 
   def get_message(self, flags):
+    # a host may send several lines before waiting for an ok, take all that arrived
     try:
-      message = self.rd.readline().rstrip()
+      data = os.read(self.rd.fileno(), READ_SIZE)
+    except OSError as error:
+      if error.errno != errno.EAGAIN:
+        logging.warning("Could not read from {} pipe".format(self.prot))
+      return
+    lines = (self.buffer + data).split("\n")
+    self.buffer = lines.pop()
+    for line in lines:
+      message = line.rstrip()
       if len(message) > 0:
         g = Gcode({"message": message, "prot": self.prot})
         self.printer.processor.enqueue(g)
-    except IOError:
-      logging.warning("Could not read from {} pipe".format(self.prot))
 
   def send_message(self, message):
     if self.send_response:
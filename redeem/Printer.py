@@ -73,6 +73,15 @@ class Printer:
     self.move_cache_size = 128
     self.print_move_buffer_wait = 250
     self.max_buffered_move_time = 1000
+    self.lookahead_time = 500
+    self.lookahead_distance = 100
+    self.lazy_step_generation = False
+    self.compress_step_commands = False
+    self.simulate_pru = False
+    self.simulated_pru_speed = 1.0
+    self.arc_segment_length = 0.001
+    self.arc_tolerance = 0.00002
+    self.advanced_ok = False
 
     self.probe_points = []
     self.probe_heights = [0, 0, 0]
@@ -96,6 +105,9 @@ class Printer:
 
     # bed compensation
     self.matrix_bed_comp = np.eye((3))
+    # the probed height mesh, see BedCompensation.create_height_mesh
+    self.bed_mesh = None
+    self.bed_mesh_interpolation = "bilinear"
 
     # By default, do not check for slaves
     self.has_slaves = False
@@ -131,20 +143,47 @@ class Printer:
 
   def reply(self, gcode):
     """ Send a reply through the proper channel """
-    if gcode.get_answer() is not None:
-      self.send_message(gcode.prot, gcode.get_answer())
+    answer = gcode.get_answer()
+    if answer is not None:
+      if self.advanced_ok and answer == "ok":
+        answer = self.advanced_ok_answer(gcode)
+      self.send_message(gcode.prot, answer)
+
+  def advanced_ok_answer(self, gcode):
+    """
+    An ok with the room left for more commands, like Marlin's ADVANCED_OK,
+    so a host can keep several lines in flight: ok N<line> P<moves> B<commands>
+    P is the number of free slots in the path planner and B the number of
+    G-codes that fit in the command queue.
+    """
+    answer = "ok"
+    if gcode.is_crc():
+      answer += " N{}".format(gcode.line_number)
+    if self.path_planner is not None:
+      answer += " P{}".format(self.path_planner.get_available_slots())
+    return answer + " B{}".format(self.commands.maxsize - self.commands.qsize())
+
+  def get_comm(self, prot):
+    """ The channel to reply on, a network host (Eth:<n>) gets its own """
+    if prot in self.comms:
+      return self.comms[prot]
+    channel = prot.split(":", 1)[0]
+    if channel != prot and channel in self.comms:
+      return self.comms[channel].get_client(prot)
+    return None
 
   def send_message(self, prot, msg):
     """ Send a message back to host """
-    if prot not in self.comms:
+    comm = self.get_comm(prot)
+    if comm is None:
       return
 
     if "\n" in msg:
       for m in msg.split("\n"):
         if len(m) > 0:
-          self.comms[prot].send_message(m)
+          comm.send_message(m)
     else:
-      self.comms[prot].send_message(msg)
+      comm.send_message(msg)
 
   def homing(self, is_homing):
     """
@@ -152,7 +191,7 @@ class Printer:
     allow for endstops that are only active during the homing procedure
     """
 
-    homing_only_endstops = self.config.get('Endstops', 'homing_only_endstops')
+    homing_only_endstops = self.config.snapshot.Endstops.homing_only_endstops
     if homing_only_endstops:
       for es in self.end_stops.items():
         if es[0] in homing_only_endstops:
@@ -198,6 +237,7 @@ class Printer:
     logging.debug("save_settings: saving bed compensation matrix")
     # Bed compensation
     self.save_bed_compensation_matrix()
+    self.save_bed_mesh()
 
     # Offsets
     logging.debug("save_settings: setting offsets")
@@ -214,6 +254,14 @@ class Printer:
     for opt in opts:
       self.config.set('Delta', opt, str(Delta.__dict__[opt]))
 
+    logging.debug("save_settings: setting planner look-ahead")
+    for opt in ["max_buffered_move_time", "lookahead_time", "lookahead_distance"]:
+      if getattr(self, opt) != self.config.getfloat('Planner', opt):
+        self.config.set('Planner', opt, str(getattr(self, opt)))
+
+    # Let the subscribers know about the changes now rather than when the settings are next read
+    self.config.update_snapshot()
+
     logging.debug("save_settings: saving config to file")
     self.config.save(filename)
     logging.debug("save_settings: done")
@@ -232,6 +280,19 @@ class Printer:
     if mat != self.config.get('Geometry', 'bed_compensation_matrix'):
       self.config.set('Geometry', 'bed_compensation_matrix', mat)
 
+  def load_bed_mesh(self):
+    try:
+      mesh = json.loads(self.config.get('Geometry', 'bed_mesh'))
+    except:
+      mesh = None
+    return mesh
+
+  def save_bed_mesh(self):
+    mesh = json.dumps(self.bed_mesh)
+    # Only update if they are different
+    if mesh != self.config.get('Geometry', 'bed_mesh'):
+      self.config.set('Geometry', 'bed_mesh', mesh)
+
   def movement_axis(self, axis):
     if self.e_axis_active and axis == "E":
       return self.current_tool
@@ -31,6 +31,7 @@ import sys
 
 from threading import Thread
 from threading import enumerate as enumerate_threads
+from .AdcSampler import AdcSampler
 from .Alarm import Alarm, AlarmExecutor
 from .CascadingConfigParser import CascadingConfigParser
 from .ColdEnd import ColdEnd
@@ -59,6 +60,7 @@ from .Servo import Servo
 from .Stepper import *
 from .StepperWatchdog import StepperWatchdog
 from .TemperatureSensor import *
+from .ThermalLoop import ThermalLoop
 from .USB import USB
 from .Watchdog import Watchdog
 from six import PY2, iteritems
@@ -264,6 +266,7 @@ class Redeem:
       opts = ["L", "r", "A_radial", "B_radial", "C_radial", "A_angular", "B_angular", "C_angular"]
       for opt in opts:
         Delta.__dict__[opt] = printer.config.getfloat('Delta', opt)
+      Delta.step_solver = printer.config.get('Delta', 'step_solver')
 
     # Discover and add all DS18B20 cold ends.
     paths = glob.glob("/sys/bus/w1/devices/28-*/w1_slave")
@@ -273,6 +276,9 @@ class Redeem:
       logging.info("Found Cold end " + str(i) + " on " + path)
 
     # Make Mosfets, temperature sensors and extruders
+    printer.thermal_loop = ThermalLoop(PWM)
+    printer.adc_sampler = AdcSampler(self.printer.config.getfloat('Heaters', 'adc_sample_rate'),
+                                     self.printer.config.getint('Heaters', 'adc_oversample'))
     heaters = ["E", "H", "HBP"]
     if self.printer.config.reach_revision:
       heaters.extend(["A", "B", "C"])
@@ -288,7 +294,8 @@ class Redeem:
                         " instead.")
       else:
         sensor = self.printer.config.get("Heaters", "sensor_" + e)
-      self.printer.thermistors[e] = TemperatureSensor(adc, 'MOSFET ' + e, sensor)
+      self.printer.thermistors[e] = TemperatureSensor(adc, 'MOSFET ' + e, sensor,
+                                                      printer.adc_sampler)
       self.printer.thermistors[e].printer = printer
 
       # Extruders
@@ -296,9 +303,10 @@ class Redeem:
       prefix = self.printer.config.get('Heaters', 'prefix_' + e)
       if e != "HBP":
         self.printer.heaters[e] = Extruder(self.printer.steppers[e], self.printer.thermistors[e],
-                                           self.printer.mosfets[e], e, onoff)
+                                           self.printer.mosfets[e], e, onoff, printer.thermal_loop)
       else:
-        self.printer.heaters[e] = HBP(self.printer.thermistors[e], self.printer.mosfets[e], onoff)
+        self.printer.heaters[e] = HBP(self.printer.thermistors[e], self.printer.mosfets[e], onoff,
+                                      printer.thermal_loop)
       self.printer.heaters[e].prefix = prefix
       self.printer.heaters[e].Kp = self.printer.config.getfloat('Heaters', 'pid_Kp_' + e)
       self.printer.heaters[e].Ti = self.printer.config.getfloat('Heaters', 'pid_Ti_' + e)
@@ -359,7 +367,8 @@ class Redeem:
         if not self.printer.config.has_option('Cold-ends', "connect-therm-{}-fan-{}".format(t, f)):
           continue
         if printer.config.getboolean('Cold-ends', "connect-therm-{}-fan-{}".format(t, f)):
-          c = Cooler(therm, fan, "Cooler-{}-{}".format(t, f), True)    # Use ON/OFF on these.
+          c = Cooler(therm, fan, "Cooler-{}-{}".format(t, f), True,
+                     printer.thermal_loop)    # Use ON/OFF on these.
           c.ok_range = 4
           opt_temp = "therm-{}-fan-{}-target_temp".format(t, f)
           if printer.config.has_option('Cold-ends', opt_temp):
@@ -392,7 +401,8 @@ class Redeem:
         option = "connect-ds18b20-{}-fan-{}".format(ce, f)
         if self.printer.config.has_option('Cold-ends', option):
           if self.printer.config.getboolean('Cold-ends', option):
-            c = Cooler(cold_end, fan, "Cooler-ds18b20-{}-{}".format(ce, f), False)
+            c = Cooler(cold_end, fan, "Cooler-ds18b20-{}-{}".format(ce, f), False,
+                       printer.thermal_loop)
             c.ok_range = 4
             opt_temp = "cooler_{}_target_temp".format(ce)
             if printer.config.has_option('Cold-ends', opt_temp):
@@ -426,15 +436,22 @@ class Redeem:
         printer.filament_sensors.append(sensor)
 
     # Make a queue of commands
-    self.printer.commands = queue.Queue(10)
+    self.printer.commands = queue.Queue(printer.config.getint('System', 'command_queue_size'))
 
     # Make a queue of commands that should not be buffered
-    self.printer.unbuffered_commands = queue.Queue(10)
+    self.printer.unbuffered_commands = queue.Queue(
+        printer.config.getint('System', 'unbuffered_command_queue_size'))
+
+    printer.advanced_ok = printer.config.getboolean('System', 'advanced_ok')
 
     # Bed compensation matrix
     printer.matrix_bed_comp = printer.load_bed_compensation_matrix()
     logging.debug("Loaded bed compensation matrix: \n" + str(printer.matrix_bed_comp))
 
+    # Bed height mesh
+    printer.bed_mesh = printer.load_bed_mesh()
+    printer.bed_mesh_interpolation = printer.config.get('Geometry', 'bed_mesh_interpolation')
+
     for axis in printer.steppers.keys():
       i = Printer.axis_to_index(axis)
       printer.max_speeds[i] = printer.config.getfloat('Planner', 'max_speed_' + axis.lower())
@@ -462,6 +479,14 @@ class Redeem:
     printer.move_cache_size = printer.config.getfloat('Planner', 'move_cache_size')
     printer.print_move_buffer_wait = printer.config.getfloat('Planner', 'print_move_buffer_wait')
     printer.max_buffered_move_time = printer.config.getfloat('Planner', 'max_buffered_move_time')
+    printer.lookahead_time = printer.config.getfloat('Planner', 'lookahead_time')
+    printer.lookahead_distance = printer.config.getfloat('Planner', 'lookahead_distance')
+    printer.lazy_step_generation = printer.config.getboolean('Planner', 'lazy_step_generation')
+    printer.compress_step_commands = printer.config.getboolean('Planner', 'compress_step_commands')
+    printer.simulate_pru = printer.config.getboolean('Planner', 'simulate_pru')
+    printer.simulated_pru_speed = printer.config.getfloat('Planner', 'simulated_pru_speed')
+    printer.arc_segment_length = printer.config.getfloat('Planner', 'arc_segment_length')
+    printer.arc_tolerance = printer.config.getfloat('Planner', 'arc_tolerance')
 
     self.printer.processor = GCodeProcessor(self.printer)
     self.printer.plugins = PluginsController(self.printer)
@@ -617,6 +642,8 @@ class Redeem:
     for name, heater in iteritems(self.printer.heaters):
       logging.debug("closing " + name)
       heater.disable()
+    self.printer.thermal_loop.stop()
+    self.printer.adc_sampler.stop()
 
     for name, endstop in iteritems(self.printer.end_stops):
       logging.debug("terminating " + name)
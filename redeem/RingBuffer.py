@@ -0,0 +1,91 @@
+"""
+A fixed size history of samples in a NumPy array.
+
+Appending overwrites the oldest sample and keeps running totals, so the
+mean of the newest samples is a subtraction instead of a copy and a sum.
+The heaters keep their temperatures, errors and derivatives in these.
+
+License: GNU GPL v3: http://www.gnu.org/copyleft/gpl.html
+
+ Redeem is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ Redeem is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with Redeem.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import numpy as np
+
+
+class RingBuffer(object):
+  def __init__(self, size, fill=None):
+    """ Keep the last size samples, starting with size copies of fill if it's given """
+    self.size = size
+    self.count = 0    # Samples appended so far
+    self.samples = np.zeros(size)
+    # totals[k % len(totals)] is the sum of the first k samples. There are two
+    # more than samples, so a reader that got the count just before an append
+    # still finds the totals it needs.
+    self.totals = np.zeros(size + 2)
+    if fill is not None:
+      for _ in range(size):
+        self.append(fill)
+
+  def append(self, sample):
+    """ Add a sample, dropping the oldest one if the buffer is full """
+    count = self.count
+    self.samples[count % self.size] = sample
+    self.totals[(count + 1) % len(self.totals)] = self.totals[count % len(self.totals)] + sample
+    # Readers go by the count, so it changes last
+    self.count = count + 1
+
+  def __len__(self):
+    return min(self.count, self.size)
+
+  def __getitem__(self, index):
+    """ Sample by index, oldest first. Negative indices count from the newest """
+    length = len(self)
+    if index < 0:
+      index += length
+    if not 0 <= index < length:
+      raise IndexError("RingBuffer index out of range")
+    return self.samples[(self.count - length + index) % self.size]
+
+  def _last(self, n):
+    """ The count and number of the last n samples, all of them if n is None """
+    count = self.count
+    length = min(count, self.size)
+    n = length if n is None else min(n, length)
+    if n <= 0:
+      raise ValueError("No samples in the RingBuffer")
+    return count, n
+
+  def _segments(self, n):
+    """ The last n samples as one or two views into the buffer """
+    count, n = self._last(n)
+    start = (count - n) % self.size
+    end = start + n
+    if end <= self.size:
+      return (self.samples[start:end], )
+    return (self.samples[start:], self.samples[:end - self.size])
+
+  def mean(self, n=None):
+    """ Mean of the last n samples, or of all of them """
+    count, n = self._last(n)
+    m = len(self.totals)
+    return (self.totals[count % m] - self.totals[(count - n) % m]) / n
+
+  def max(self, n=None):
+    """ Largest of the last n samples, or of all of them """
+    return max(segment.max() for segment in self._segments(n))
+
+  def min(self, n=None):
+    """ Smallest of the last n samples, or of all of them """
+    return min(segment.min() for segment in self._segments(n))
@@ -2,6 +2,14 @@ from multiprocessing import Lock
 import os
 
 
+def byte_length(line):
+  """ Length of a line in bytes """
+  return len(line) if isinstance(line, bytes) else len(line.encode('utf-8'))
+
+
+READ_SIZE = 65536    # bytes read from the file at a time by read_lines
+
+
 def blocks(files, size=65536):
   while True:
     b = files.read(size)
@@ -22,6 +30,7 @@ class SDCardManager(object):
 
   def __init__(self):
     self.lock = Lock()
+    self.read_ahead = []    # lines read from the file that read_lines hasn't returned yet
 
   def __iter__(self):
     return self
@@ -38,6 +47,7 @@ class SDCardManager(object):
       self.gcode_file.close()
 
     self.gcode_file = open(self.file_name, 'r')
+    self.read_ahead = []
 
     self.line_count = 0
     self.byte_count = 0
@@ -74,8 +84,8 @@ class SDCardManager(object):
 
     if (lc < N):
       self.lock.acquire()
-      line = self.gcode_file.readline()
-      self.byte_count += len(line.encode('utf-8'))
+      line = self.read_ahead.pop(0) if self.read_ahead else self.gcode_file.readline()
+      self.byte_count += byte_length(line)
       self.line_count += 1
       self.lock.release()
       return line
@@ -86,6 +96,36 @@ class SDCardManager(object):
       self.lock.release()
       raise StopIteration()
 
+  def read_lines(self, count=256):
+    """
+    return the next lines in the file, up to count of them, and
+    increment counters. Returns an empty list when the file is done
+    or the print is not active. The file is read READ_SIZE bytes at a
+    time, the lines that aren't returned yet are kept for the next call.
+    """
+    self.lock.acquire()
+    try:
+      if not self.active:
+        return []
+
+      count = min(count, self.file_line_size - self.line_count)
+      while len(self.read_ahead) < count:
+        lines = self.gcode_file.readlines(READ_SIZE)
+        if not lines:
+          break
+        self.read_ahead.extend(lines)
+      lines = self.read_ahead[:count]
+      del self.read_ahead[:count]
+      if lines:
+        self.byte_count += sum(byte_length(line) for line in lines)
+        self.line_count += len(lines)
+      else:
+        self.byte_count = self.file_byte_size
+        self.line_count = self.file_line_size
+      return lines
+    finally:
+      self.lock.release()
+
   def get_file_size(self):
     """
     return the size of the file
@@ -144,6 +184,7 @@ class SDCardManager(object):
 
     # reset file object
     self.gcode_file.seek(0)
+    self.read_ahead = []
 
     # walk through the file line by line until we find a location that
     # matches either line position or byte count
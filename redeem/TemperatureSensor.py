@@ -31,19 +31,52 @@ License: GNU GPL v3: http://www.gnu.org/copyleft/gpl.html
 import numpy as np
 import math
 import logging
+import os
+import re
 from threading import Lock
 import sys
+import time
 import TemperatureSensorConfigs
+from AdcSampler import read_from_start
 from Alarm import Alarm
 
+# Where the .cht charts are, installed by setup.py or in the source tree
+CHART_DIRS = [
+    os.path.join(sys.prefix, "redeem", "data"),
+    os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "data")
+]
+
+
+def voltages_to_resistances(voltages, pullup):
+  """ voltage_to_resistance of the sensors for an array of voltages """
+  resistances = np.full(len(voltages), 10000000.0)
+  measured = (voltages != 0) & (np.abs(voltages - 1.8) >= 0.0001)
+  resistances[measured] = pullup / ((1.8 / voltages[measured]) - 1.0)
+  return resistances
+
+
+def load_chart(filename):
+  """ The (temperature, value) rows of a .cht chart as a 2D array """
+  number = r"\s*([-+0-9.eE]+)\s*"
+  for directory in CHART_DIRS:
+    path = os.path.join(directory, filename)
+    if os.path.isfile(path):
+      with open(path) as f:
+        rows = re.findall(r"\[" + number + "," + number + r"\]", f.read())
+      return np.array([(float(t), float(v)) for t, v in rows])
+  raise IOError("Temperature chart {0} not found in {1}".format(filename, CHART_DIRS))
+
 
 class TemperatureSensor:
 
   mutex = Lock()
 
-  def __init__(self, pin, heater_name, sensorIdentifier):
+  def __init__(self, pin, heater_name, sensorIdentifier, sampler=None):
 
     self.pin = pin
+    self.fd = None    # Kept open between reads
+    # With an AdcSampler, reads take its newest reading instead of the ADC's
+    self.channel = sampler.add(pin) if sampler else None
     self.heater = heater_name
     self.sensorIdentifier = sensorIdentifier
     self.maxAdc = 4095.0
@@ -74,11 +107,25 @@ class TemperatureSensor:
           found = True
           break
 
+    if found == False:
+      for c in TemperatureSensorConfigs.charts:
+        if c[0] == self.sensorIdentifier:
+          self.sensor = Chart(pin, c, self.heater)
+          found = True
+          break
+
     if found == False:
       logging.error("The specified temperature sensor {0} is not implemented. \
             You may add it's config in TemperatureSensorConfigs.".format(sensorIdentifier))
       self.sensor = None
 
+    # The temperature for each ADC code, so a reading is looked up instead of
+    # worked out. A list, as Python indexes it faster than an array.
+    self.table = None
+    if self.sensor:
+      voltages = np.arange(int(self.maxAdc) + 1) / self.maxAdc * 1.8
+      self.table = self.sensor.temperatures(voltages).tolist()
+
   """
     Returns the current temperature in degrees celsius for the given sensor.
     """
@@ -87,7 +134,14 @@ class TemperatureSensor:
     voltage = self.read_adc()
     if not self.sensor:
       return 0.0
-    return self.sensor.get_temperature(voltage)
+    code = voltage / 1.8 * self.maxAdc
+    if not 0.0 <= code < self.maxAdc:
+      # Out of range readings and full scale are rare, work those out
+      return self.sensor.get_temperature(voltage)
+    # Readings fall on an ADC code, interpolate for voltages that don't
+    index = int(code)
+    low = self.table[index]
+    return low + (self.table[index + 1] - low) * (code - index)
 
   """
     Reads the adc pin and returns the actual voltage value
@@ -95,23 +149,51 @@ class TemperatureSensor:
     """
 
   def read_adc(self):
+    if self.channel is not None:
+      return self.read_channel()
+
     voltage = 0
 
     TemperatureSensor.mutex.acquire()
     try:
-      with open(self.pin, "r") as file:
-        signal = float(file.read().rstrip())
-        if (signal > self.maxAdc or signal <= 0.0):
-          voltage = -1.0
-        else:
-          voltage = signal / self.maxAdc * 1.8    #input range is 0 ... 1.8V
-    except IOError as e:
+      # sysfs makes a new reading each time the file is read from the start,
+      # so there is no need to reopen it.
+      if self.fd is None:
+        self.fd = os.open(self.pin, os.O_RDONLY)
+      signal = float(read_from_start(self.fd, 16).rstrip())
+      voltage = self.signal_to_voltage(signal)
+    except (IOError, OSError) as e:
+      if self.fd is not None:
+        os.close(self.fd)
+        self.fd = None
       Alarm(Alarm.THERMISTOR_ERROR, "Unable to get ADC value ({0}): {1}".format(
           e.errno, e.strerror))
 
     TemperatureSensor.mutex.release()
     return voltage
 
+  def read_channel(self):
+    """ read_adc from the newest reading of the AdcSampler """
+    reading = self.channel.reading
+    age = time.time() - self.channel.time
+    if age > self.channel.max_age:
+      Alarm(Alarm.THERMISTOR_ERROR, "ADC value of {0} is {1:.1f} s old".format(self.pin, age))
+      return 0
+    if isinstance(reading, EnvironmentError):
+      Alarm(Alarm.THERMISTOR_ERROR,
+            "Unable to get ADC value ({0}): {1}".format(reading.errno, reading.strerror))
+      return 0
+    if isinstance(reading, ValueError):
+      Alarm(Alarm.THERMISTOR_ERROR, "Unable to parse ADC value: {0}".format(reading))
+      return 0
+    return self.signal_to_voltage(reading)
+
+  def signal_to_voltage(self, signal):
+    """ The voltage of an ADC reading, -1 if it's out of range """
+    if (signal > self.maxAdc or signal <= 0.0):
+      return -1.0
+    return signal / self.maxAdc * 1.8    #input range is 0 ... 1.8V
+
 
 """ This class represents standard thermistor sensors.
     It borrows heavily from Smoothieware's code (https://github.com/Smoothieware/Smoothieware).
@@ -156,6 +238,14 @@ class Thermistor(TemperatureSensor):
           .format(self.sensorIdentifier, self.pin, r, t))
     return max(t, 0.0)    # Cap it at 0
 
+  def temperatures(self, voltages):
+    """ get_temperature for an array of voltages """
+    r = voltages_to_resistances(voltages, self.r1)
+    t = np.full(len(r), -273.15)
+    l = np.log(r[r > 0])
+    t[r > 0] = (1.0 / (self.c1 + self.c2 * l + self.c3 * l**3)) - 273.15
+    return np.maximum(t, 0.0)
+
   def voltage_to_resistance(self, voltage):
     """ Convert the voltage to a resistance value """
     if voltage == 0 or (abs(voltage - 1.8) < 0.0001):
@@ -203,6 +293,12 @@ class PT100(TemperatureSensor):
     r = self.voltage_to_resistance(voltage)
     return (-self.A + np.sqrt(self.A**2 - 4 * self.B * (1 - r / self.R0))) / (2 * self.B)
 
+  def temperatures(self, voltages):
+    """ get_temperature for an array of voltages """
+    r = voltages_to_resistances(voltages, self.pullup)
+    with np.errstate(invalid="ignore"):
+      return (-self.A + np.sqrt(self.A**2 - 4 * self.B * (1 - r / self.R0))) / (2 * self.B)
+
 
 """ Tboard returns a linear temp of 5mv/deg C"""
 
@@ -218,3 +314,41 @@ class Tboard(TemperatureSensor):
 
   def get_temperature(self, voltage):
     return voltage / self.voltage_pr_degree
+
+  def temperatures(self, voltages):
+    return voltages / self.voltage_pr_degree
+
+
+""" Sensors with a chart of the temperature against the resistance or voltage """
+
+
+class Chart(TemperatureSensor):
+  def __init__(self, pin, sensorConfiguration, name):
+
+    self.pin = pin
+    self.name = name
+    self.sensorIdentifier = sensorConfiguration[0]
+    self.pullup = sensorConfiguration[2]
+    try:
+      chart = load_chart(sensorConfiguration[1])
+    except IOError as e:
+      Alarm(Alarm.THERMISTOR_ERROR, str(e))
+      chart = np.zeros((1, 2))
+    # np.interp wants the values in increasing order
+    chart = chart[np.argsort(chart[:, 1])]
+    self.chart_temperatures = chart[:, 0]
+    self.chart_values = chart[:, 1]
+    logging.debug("Initialized temperature sensor at {0} with the chart {1}".format(
+        pin, sensorConfiguration[1]))
+
+  def get_temperature(self, voltage):
+    """ Return the temperature in degrees celsius, interpolated in the chart """
+    return float(self.temperatures(np.array([voltage]))[0])
+
+  def temperatures(self, voltages):
+    """ get_temperature for an array of voltages """
+    if self.pullup:
+      values = voltages_to_resistances(voltages, self.pullup)
+    else:
+      values = voltages
+    return np.interp(values, self.chart_values, self.chart_temperatures)
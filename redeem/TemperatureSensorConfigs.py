@@ -75,3 +75,16 @@ pt100 = [
 tboard = [
     ["Tboard", 0.005],
 ]
+"""
+Temperature charts in data/, for sensors without coefficients above. Each row
+of a chart is a temperature and the resistance of the sensor at it, wired
+like a thermistor with the pullup resistance. A pullup of 0 means the chart
+has the voltage on the ADC instead of the resistance, like the amplifier
+boards. Sensors with coefficients above use those, not their chart.
+"""
+charts = [
+    # identifier,   chart file,     pullup
+    ["QU-BD", "QU-BD.cht", 4700],
+    ["DYZE500", "DYZE500.cht", 4700],
+    ["3950-100K", "HT100K3950.cht", 4700],
+]
@@ -0,0 +1,181 @@
+"""
+The ThermalLoop runs all temperature controllers (heaters and coolers)
+from a single thread.
+
+Each pass samples the sensors of every controller that is due, runs the
+controllers and then writes the outputs that changed, so a slow sensor or
+PWM write delays one pass instead of racing a thread per heater.
+
+License: GNU GPL v3: http://www.gnu.org/copyleft/gpl.html
+
+ Redeem is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ Redeem is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with Redeem.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from threading import Thread, Event, Lock
+import logging
+import math
+import time
+
+
+class ThermalLoop(object):
+  """
+  Controllers added to the loop must have a `sleep` attribute with their
+  update period in seconds and implement:
+
+    sample()            read the sensor
+    control()           return the new output power
+    write_power(power)  set the output, skipping unchanged values
+
+  The outputs, if given, have begin_batch() and end_batch(). The powers of
+  a pass are written between the two, so they can go out together.
+  """
+
+  def __init__(self, outputs=None):
+    self.outputs = outputs
+    self.controllers = []
+    self.next_updates = {}
+    self.lock = Lock()
+    self.wakeup = Event()
+    self.running = False
+    self.t = None
+    self.reset_timing()
+
+  def add(self, controller):
+    """ Start updating a controller, the first update happens right away """
+    with self.lock:
+      if controller not in self.controllers:
+        self.controllers.append(controller)
+      self.next_updates[controller] = time.time()
+      if not self.running:
+        self.running = True
+        self.t = Thread(target=self.loop, name="ThermalLoop")
+        self.t.daemon = True
+        self.t.start()
+    self.wakeup.set()
+
+  def remove(self, controller):
+    """ Stop updating a controller. Once this returns, the loop no longer
+    touches the controller's output. """
+    with self.lock:
+      if controller in self.controllers:
+        self.controllers.remove(controller)
+        del self.next_updates[controller]
+
+  def stop(self):
+    """ Stop the loop thread """
+    with self.lock:
+      running = self.running
+      self.running = False
+    self.wakeup.set()
+    if running and self.t is not None:
+      self.t.join()
+
+  def reset_timing(self):
+    """ Forget the timing statistics gathered so far """
+    self.updates = 0
+    self.lateness_sum = 0.0
+    self.lateness_square_sum = 0.0
+    self.max_lateness = 0.0
+    self.passes = 0
+    self.max_pass_time = 0.0
+
+  def get_timing(self):
+    """ Return how late the controller updates ran compared to their
+    schedule and how long the slowest pass took, all in seconds """
+    updates = max(self.updates, 1)
+    mean = self.lateness_sum / updates
+    variance = max(self.lateness_square_sum / updates - mean * mean, 0.0)
+    return {
+        "updates": self.updates,
+        "mean_lateness": mean,
+        "stddev_lateness": math.sqrt(variance),
+        "max_lateness": self.max_lateness,
+        "passes": self.passes,
+        "max_pass_time": self.max_pass_time
+    }
+
+  def loop(self):
+    """ Thread that runs the controllers as they become due """
+    while True:
+      with self.lock:
+        if not self.running:
+          break
+        next_update = self.run_due_controllers()
+      self.wakeup.wait(max(next_update - time.time(), 0.0))
+      self.wakeup.clear()
+
+  def run_due_controllers(self):
+    """ Run one pass over the controllers that are due and return
+    the time the next one is """
+    start = time.time()
+    due = [c for c in self.controllers if self.next_updates[c] <= start]
+
+    for controller in due:
+      lateness = start - self.next_updates[controller]
+      self.updates += 1
+      self.lateness_sum += lateness
+      self.lateness_square_sum += lateness * lateness
+      self.max_lateness = max(self.max_lateness, lateness)
+
+    # Sample all sensors first, then run the controllers and write the
+    # outputs in one go.
+    powers = []
+    for controller in due:
+      try:
+        controller.sample()
+        powers.append((controller, controller.control()))
+      except Exception:
+        logging.exception("Temperature controller {} failed, turning it off".format(
+            controller.name))
+        self.drop(controller)
+
+    if self.outputs is not None:
+      self.outputs.begin_batch()
+    try:
+      for controller, power in powers:
+        try:
+          controller.write_power(power)
+        except Exception:
+          logging.exception("Unable to set the power of {}".format(controller.name))
+          self.drop(controller)
+    finally:
+      if self.outputs is not None:
+        try:
+          self.outputs.end_batch()
+        except Exception:
+          # The values are written again on the next pass
+          logging.exception("Unable to write the heater and cooler outputs")
+
+    end = time.time()
+    for controller in due:
+      if controller in self.next_updates:
+        next_update = self.next_updates[controller] + controller.sleep
+        # Don't try to catch up with updates that were missed
+        self.next_updates[controller] = next_update if next_update > end else end + controller.sleep
+
+    if due:
+      self.passes += 1
+      self.max_pass_time = max(self.max_pass_time, end - start)
+
+    return min(self.next_updates.values()) if self.next_updates else end + 1.0
+
+  def drop(self, controller):
+    """ Take a failing controller out of the loop and turn it off """
+    if controller in self.controllers:
+      self.controllers.remove(controller)
+      del self.next_updates[controller]
+    try:
+      controller.write_power(0.0)
+    except Exception:
+      logging.exception("Unable to turn off {}".format(controller.name))
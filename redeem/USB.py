@@ -24,8 +24,11 @@ License: GNU GPL v3: http://www.gnu.org/copyleft/gpl.html
 from threading import Thread
 import select
 import logging
+import os
 from Gcode import Gcode
 
+READ_SIZE = 4096
+
 
 class USB:
   def __init__(self, printer, iomanager):
@@ -37,16 +40,26 @@ class USB:
     except IOError:
       logging.warning("USB gadget serial not available as /dev/ttyGS0")
       return
+    self.buffer = ""
     self.iomanager.add_file(self.tty, self.get_message)
 
-  def get_message(self):
-    message = self.tty.readline().strip("\n")
-    if len(message) > 0:
-      g = Gcode({"message": message, "prot": "USB"})
-      self.printer.processor.enqueue(g)
-      # Do not enable sending messages until a
-      # message has been received
-      self.send_response = True
+  def get_message(self, flags):
+    # a host may send several lines before waiting for an ok, take all that arrived
+    try:
+      data = os.read(self.tty.fileno(), READ_SIZE)
+    except OSError as error:
+      logging.warning("Could not read from USB: {}".format(error))
+      return
+    lines = (self.buffer + data).split("\n")
+    self.buffer = lines.pop()
+    for line in lines:
+      message = line.strip("\r")
+      if len(message) > 0:
+        g = Gcode({"message": message, "prot": "USB"})
+        self.printer.processor.enqueue(g)
+        # Do not enable sending messages until a
+        # message has been received
+        self.send_response = True
 
   def send_message(self, message):
     """ Send a message """
@@ -50,6 +50,24 @@ typedef struct SteppersCommand
     uint32_t delay;
 } SteppersCommand;
 
+// Follows a command with the repeat option (0x08)
+typedef struct SteppersCommandRepeat
+{
+    uint32_t count;
+    int32_t delayChange;
+} SteppersCommandRepeat;
+
+// Follows a command with the packed option (0x10), two to a slot. The header doesn't step,
+// its delay is the number of packed commands and they share its cancellableMask and options.
+typedef struct PackedSteppersCommand
+{
+    uint8_t step;
+    uint8_t direction;
+    uint16_t delay;
+} PackedSteppersCommand;
+
+#define PACKED_STEPPERS_COMMAND_DELAY_UNIT 1000
+
 inline void delay(uint32_t until)
 {
     while (PRU0_CTRL.CYCLE < until)
@@ -92,6 +110,15 @@ int main(void)
 
     uint8_t old_direction = 0;
 
+    // the number of times the current command still has to run and what it does this time
+    uint32_t repeatsLeft = 0;
+    uint32_t extraSlots = 0;
+    uint8_t commandStep = 0;
+    uint8_t commandDirection = 0;
+    uint32_t commandDelay = 0;
+    int32_t commandDelayChange = 0;
+    const PackedSteppersCommand* packedCommand = 0;
+
     while (1)
     {
         volatile uint32_t* ddr_addr = *ddr_start;
@@ -114,6 +141,38 @@ int main(void)
 
             while (numCommands)
             {
+                if (repeatsLeft == 0)
+                {
+                    if (curCommand->options & 0x10) // packed
+                    {
+                        packedCommand = (PackedSteppersCommand*)(curCommand + 1);
+                        repeatsLeft = curCommand->delay;
+                        extraSlots = (repeatsLeft + 1) / 2;
+                        commandStep = packedCommand->step;
+                        commandDirection = packedCommand->direction;
+                        commandDelay = packedCommand->delay * PACKED_STEPPERS_COMMAND_DELAY_UNIT;
+                    }
+                    else
+                    {
+                        commandStep = curCommand->step;
+                        commandDirection = curCommand->direction;
+                        commandDelay = curCommand->delay;
+
+                        if (curCommand->options & 0x08) // repeat
+                        {
+                            const SteppersCommandRepeat* repeat = (SteppersCommandRepeat*)(curCommand + 1);
+                            repeatsLeft = repeat->count;
+                            extraSlots = 1;
+                            commandDelayChange = repeat->delayChange;
+                        }
+                        else
+                        {
+                            repeatsLeft = 1;
+                            extraSlots = 0;
+                        }
+                    }
+                }
+
                 // Reset the cycle counter - it stops itself once it reaches 0xFFFFFFFF instead of wrapping around,
                 // so we need to reset it for each command to be sure it'll be working.
                 // (Otherwise it'll stop after 0xFFFFFFFF / 200MHz = 21.5 seconds)
@@ -122,9 +181,9 @@ int main(void)
                 PRU0_CTRL.CTRL_bit.CTR_EN = 1; // Enable counter
 
                 // Handle steppers that have been inverted in the config
-                uint8_t direction = (curCommand->direction ^ DIRECTION_MASK) & 0xFF;
+                uint8_t direction = (commandDirection ^ DIRECTION_MASK) & 0xFF;
                 // dir_updates has a 1 for axes where the direction pin needs updating this loop.
-                uint8_t dir_updates = (direction ^ old_direction) & curCommand->step;
+                uint8_t dir_updates = (direction ^ old_direction) & commandStep;
 
                 if(dir_updates)
                 {
@@ -162,8 +221,8 @@ int main(void)
                 const uint32_t dirSetTime = PRU0_CTRL.CYCLE;
 
                 const uint32_t directionsAllowedMask = g_stepperMask & ~carriedBlockedSteppers;
-                const uint8_t positiveDirectionsAllowed = curCommand->direction & ((directionsAllowedMask >> 8) & 0xFF);
-                const uint8_t negativeDirectionsAllowed = ~curCommand->direction & (directionsAllowedMask & 0xFF);
+                const uint8_t positiveDirectionsAllowed = commandDirection & ((directionsAllowedMask >> 8) & 0xFF);
+                const uint8_t negativeDirectionsAllowed = ~commandDirection & (directionsAllowedMask & 0xFF);
                 const uint8_t allDirectionsAllowed = positiveDirectionsAllowed | negativeDirectionsAllowed;
 
                 if (curCommand->options & 0x04)
@@ -179,6 +238,7 @@ int main(void)
                     g_stepsRemaining += numCommands;
                     curCommand += numCommands;
                     numCommands = 0;
+                    repeatsLeft = 0;
 
 					(*events_counter)++;
 					armPru0Interrupt();
@@ -188,7 +248,7 @@ int main(void)
                     break;
                 }
                 else if (curCommand->cancellableMask == 0
-                    && (allDirectionsAllowed & curCommand->step) != curCommand->step)
+                    && (allDirectionsAllowed & commandStep) != commandStep)
                 {
                     // This move isn't cancellable, but one or more of its axes are blocked.
                     // Stop immediately and sound the alarm.
@@ -207,7 +267,7 @@ int main(void)
                 // whether it's actually used anywhere.
                 g_steppersAllowedToMove = allDirectionsAllowed;
 
-                uint8_t steps = curCommand->step & allDirectionsAllowed;
+                uint8_t steps = commandStep & allDirectionsAllowed;
 
                 gpio0 = gpio1 = gpio2 = gpio3 = 0;
 
@@ -251,19 +311,40 @@ int main(void)
 
                 const uint32_t minimumWait = PRU0_CTRL.CYCLE + MINIMUM_DELAY_AFTER_STEP;
 
-                delay(minimumWait > curCommand->delay ? minimumWait : curCommand->delay);
+                delay(minimumWait > commandDelay ? minimumWait : commandDelay);
 
-                numCommands--;
-                curCommand++;
+                repeatsLeft--;
 
-                if (curCommand->options & 0x01) // synchronize
+                if (repeatsLeft != 0)
                 {
-                    if (curCommand->options & 0x02) // synchronize and suspend
+                    // run the next command of the group - these never have sync options
+                    if (curCommand->options & 0x10)
+                    {
+                        packedCommand++;
+                        commandStep = packedCommand->step;
+                        commandDirection = packedCommand->direction;
+                        commandDelay = packedCommand->delay * PACKED_STEPPERS_COMMAND_DELAY_UNIT;
+                    }
+                    else
                     {
-                        *pru_control = 1;
+                        commandDelay += commandDelayChange;
                     }
+                }
+                else
+                {
+                    // skip the repeat count or packed commands as well
+                    numCommands -= 1 + extraSlots;
+                    curCommand += 1 + extraSlots;
 
-                    armPru1Interrupt();
+                    if (curCommand->options & 0x01) // synchronize
+                    {
+                        if (curCommand->options & 0x02) // synchronize and suspend
+                        {
+                            *pru_control = 1;
+                        }
+
+                        armPru1Interrupt();
+                    }
                 }
 
                 while (*pru_control != 0)
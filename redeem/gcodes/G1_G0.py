@@ -15,20 +15,36 @@ from redeem.Path import Path, RelativePath, AbsolutePath, MixedPath
 
 class G0(GCodeCommand):
   def execute(self, g):
+    path = self.get_path(g)
+    if path is not None:
+      # Add the path. This blocks until the path planner has capacity
+      self.printer.path_planner.add_path(path)
+
+  def get_path(self, g):
     if g.has_letter("F"):    # Get the feed rate & convert from mm/min to SI unit m/s
       self.printer.feed_rate = g.get_distance_by_letter("F") / 60000.
-      g.remove_token_by_letter("F")
     if g.has_letter("Q"):    # Get the Accel & convert from mm/min^2 to SI unit m/s^2
       self.printer.accel = g.get_distance_by_letter("Q") / 3600000.
-      g.remove_token_by_letter("Q")
+
+    # this runs for every move of a print, so it reads the tokens directly
+    unit_factor = self.printer.unit_factor
+    extrude_factor = self.printer.extrude_factor
+    e_axis = self.printer.movement_axis("E")
     smds = {}
-    for i in range(g.num_tokens()):
-      axis = self.printer.movement_axis(g.token_letter(i))
+    for token in g.tokens:
+      letter = token[0]
+      if letter in ('F', 'Q'):
+        continue
+      axis = e_axis if letter == 'E' else letter
 
       # Get the value, new position or vector
-      value = float(g.token_distance(i)) / 1000.0    # mm to SI unit m
+      try:
+        value = float(token[1:])
+      except ValueError:
+        value = 0.0
+      value = value * unit_factor / 1000.0    # mm to SI unit m
       if axis in ('E', 'H', 'A', 'B', 'C'):
-        value *= self.printer.extrude_factor
+        value *= extrude_factor
       smds[axis] = value
 
     if self.printer.movement == Path.ABSOLUTE:
@@ -41,10 +57,9 @@ class G0(GCodeCommand):
       path = MixedPath(smds, self.printer.feed_rate * self.printer.speed_factor, self.printer.accel)
     else:
       logging.error("invalid movement: " + str(self.printer.movement))
-      return
+      return None
 
-    # Add the path. This blocks until the path planner has capacity
-    self.printer.path_planner.add_path(path)
+    return path
 
   def get_description(self):
     return "Control the printer head position as well as the currently " \
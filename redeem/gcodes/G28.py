@@ -19,16 +19,16 @@ except ImportError:
 class G28(GCodeCommand):
   def execute(self, g):
     if g.num_tokens() == 0:    # If no token is given, home all
-      axes_list = self.printer.config.get('Homing', 'G28_default_axes').replace(' ', '')
+      axes_list = self.printer.config.snapshot.Homing.g28_default_axes.replace(' ', '')
       tokens = [ax + '0' for ax in axes_list.split(",")]
       g.set_tokens(tokens)
 
     axis_home = []
+    endstops = self.printer.config.snapshot.Endstops
 
     for i in range(g.num_tokens()):    # Run through all tokens
       axis = g.token_letter(i)
-      if axis.upper() in self.printer.AXES and self.printer.config.getboolean(
-          'Endstops', 'has_' + axis.lower()):
+      if axis.upper() in self.printer.AXES and endstops['has_' + axis.lower()]:
         axis_home.append(axis)
 
     if len(axis_home):
@@ -21,7 +21,7 @@ from redeem.Alarm import Alarm
 
 class G29(GCodeCommand):
   def execute(self, g):
-    gcodes = self.printer.config.get("Macros", "G29").split("\n")
+    gcodes = self.printer.config.snapshot.Macros.g29.split("\n")
     self.printer.path_planner.wait_until_done()
     for gcode in gcodes:
       # If 'S' (imulate) remove M561 and M500 codes
@@ -138,6 +138,7 @@ class G29_2(GCodeCommand):    # was G29S[quare]
     probe_offset_y = g.get_float_by_letter("Y", 0)    # Offset Y from starting point
     invert = 1 if g.has_letter("I") else 0    # Invert probing
     bed_comp = g.get_int_by_letter('B', 1)
+    bed_mesh = g.get_int_by_letter('M', 0)
 
     ppd = np.sqrt(points)
 
@@ -165,6 +166,9 @@ class G29_2(GCodeCommand):    # was G29S[quare]
     if bed_comp:
       gcodes += "    M561 U; (RFS) Update the matrix based on probe data\n"
       gcodes += "    M561 S; Show the current matrix\n"
+    if bed_mesh:
+      gcodes += "    M420 U; (RFS) Update the mesh based on probe data\n"
+      gcodes += "    M420; Show the current mesh\n"
     gcodes += "    M500; (RFS) Save data\n"
 
     self.printer.config.set("Macros", "G29", gcodes)
@@ -182,4 +186,5 @@ class G29_2(GCodeCommand):    # was G29S[quare]
             "K = probe speed, default: 3000.0\n"
             "X = probe offset X, default: 0\n"
             "Y = probe offset y, default: 0\n"
-            "B = bed compensation matrix off, default:1\n")
+            "B = bed compensation matrix off, default:1\n"
+            "M = bed height mesh, default:0\n")
@@ -43,28 +43,29 @@ class G30(GCodeCommand):
       point["Z"] = g.get_float_by_letter("Z")
 
     # Get probe length, if present, else use value from config.
+    probe = self.printer.config.snapshot.Probe
     if g.has_letter("D"):
       probe_length = g.get_float_by_letter("D") / 1000.
     else:
-      probe_length = self.printer.config.getfloat('Probe', 'length')
+      probe_length = probe.length
 
     # Get probe speed, if present, else use value from config.
     if g.has_letter("F"):
       probe_speed = g.get_float_by_letter("F") / 60000.    # m/s
     else:
-      probe_speed = self.printer.config.getfloat('Probe', 'speed')
+      probe_speed = probe.speed
 
     # Get acceleration, if present, else use value from config.
     if g.has_letter("Q"):
       probe_accel = g.get_float_by_letter("Q") / 3600000.    # m/s^2
     else:
-      probe_accel = self.printer.config.getfloat('Probe', 'accel')
+      probe_accel = probe.accel
 
     # Find the Probe offset
     # values in config file are in metres, need to convert to millimetres
-    offset_x = self.printer.config.getfloat('Probe', 'offset_x') * 1000
-    offset_y = self.printer.config.getfloat('Probe', 'offset_y') * 1000
-    offset_z = self.printer.config.getfloat('Probe', 'offset_z') * 1000
+    offset_x = probe.offset_x * 1000
+    offset_y = probe.offset_y * 1000
+    offset_z = probe.offset_z * 1000
 
     logging.debug("G30: probing from point (mm) : X{} Y{} Z{}".format(
         point["X"] + offset_x, point["Y"] + offset_y, point["Z"]))
@@ -146,22 +147,23 @@ class G30_1(GCodeCommand):
 
     # Usable letters listed here
     # Get probe length, if present, else use value from config.
+    probe = self.printer.config.snapshot.Probe
     if g.has_letter("D"):
       probe_length = g.get_float_by_letter("D") / 1000.
     else:
-      probe_length = self.printer.config.getfloat('Probe', 'length')
+      probe_length = probe.length
 
     # Get probe speed. If not preset, use printer's current speed.
     if g.has_letter("F"):
       probe_speed = g.get_float_by_letter("F") / 60000.0
     else:
-      probe_speed = self.printer.config.getfloat('Probe', 'speed')
+      probe_speed = probe.speed
 
     # Get acceleration. If not present, use value from config.
     if g.has_letter("Q"):
       probe_accel = g.get_float_by_letter("Q") / 3600000.0
     else:
-      probe_accel = self.printer.config.getfloat('Probe', 'accel')
+      probe_accel = probe.accel
 
     point = self.printer.path_planner.get_current_pos(mm=True, ideal=True)
     logging.debug("G30.1: current position (mm) :  X{} Y{} Z{}".format(
@@ -170,9 +172,9 @@ class G30_1(GCodeCommand):
 
     # Find the Probe offset
     # values in config file are in metres, need to convert to millimetres
-    offset_x = self.printer.config.getfloat('Probe', 'offset_x') * 1000
-    offset_y = self.printer.config.getfloat('Probe', 'offset_y') * 1000
-    offset_z = self.printer.config.getfloat('Probe', 'offset_z') * 1000
+    offset_x = probe.offset_x * 1000
+    offset_y = probe.offset_y * 1000
+    offset_z = probe.offset_z * 1000
 
     logging.debug("G30.1: probing from point (mm) : X{} Y{} Z{}".format(
         point["X"] + offset_x, point["Y"] + offset_y, point["Z"]))
@@ -15,7 +15,7 @@ from redeem.Gcode import Gcode
 
 class G31(GCodeCommand):
   def execute(self, g):
-    gcodes = self.printer.config.get("Macros", "G31").split("\n")
+    gcodes = self.printer.config.snapshot.Macros.g31.split("\n")
     self.printer.path_planner.wait_until_done()
     for gcode in gcodes:
       G = Gcode({"message": gcode, "parent": g})
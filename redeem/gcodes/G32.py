@@ -15,7 +15,7 @@ from redeem.Gcode import Gcode
 
 class G32(GCodeCommand):
   def execute(self, g):
-    gcodes = self.printer.config.get("Macros", "G32").split("\n")
+    gcodes = self.printer.config.snapshot.Macros.g32.split("\n")
     self.printer.path_planner.wait_until_done()
     for gcode in gcodes:
       G = Gcode({"message": gcode, "parent": g})
@@ -35,7 +35,7 @@ class G33(GCodeCommand):
       return
 
     # we reuse the G29 macro for the autocalibration purposes
-    gcodes = self.printer.config.get("Macros", "G29").split("\n")
+    gcodes = self.printer.config.snapshot.Macros.g29.split("\n")
     self.printer.path_planner.wait_until_done()
     for gcode in gcodes:
       G = Gcode({"message": gcode, "parent": g})
@@ -33,21 +33,22 @@ class G34(GCodeCommand):
     # parse arguments
 
     # Get probe length (in mm), if present, else use config value
+    probe = self.printer.config.snapshot.Probe
     if g.has_letter("D"):
       probe_length = g.get_float_by_letter("D")
     else:
-      probe_length = 1000. * self.printer.config.getfloat('Probe', 'length')    # m
+      probe_length = 1000. * probe.length    # m
     # Get probe speed. If not preset, use config value.
     if g.has_letter("F"):
       probe_speed = g.get_float_by_letter("F") / 60000.0    # mm/min -> m/s
     else:
-      probe_speed = self.printer.config.getfloat('Probe', 'speed')    # m/s
+      probe_speed = probe.speed    # m/s
 
     # Get acceleration. If not present, use value from config.
     if g.has_letter("Q"):
       probe_accel = g.get_float_by_letter("Q") / 3600000    # mm/min^2 -> m/s^2
     else:
-      probe_accel = self.printer.config.getfloat('Probe', 'accel')    # m/s^2
+      probe_accel = probe.accel    # m/s^2
 
     probe_start_height = g.get_float_by_letter("Z", 5.0)
 
@@ -7,8 +7,6 @@ License: CC BY-SA: http://creativecommons.org/licenses/by-sa/2.0/
 """
 
 from abc import ABCMeta, abstractmethod
-from docutils.core import publish_string
-from redeem.TextWriter import text_writer
 
 
 class GCodeCommand(object):
@@ -29,7 +27,14 @@ class GCodeCommand(object):
     """Override method to provide long description as text."""
     # Return formatted description as plain text
     if self.get_formatted_description():
-      return publish_string(self.get_formatted_description(), writer=text_writer)
+      # docutils is slow to import and to render, so that's left until
+      # someone asks for the description, and only done once
+      if getattr(self, "_long_description", None) is None:
+        from docutils.core import publish_string
+        from redeem.TextWriter import text_writer
+        self._long_description = publish_string(self.get_formatted_description(),
+                                                writer=text_writer)
+      return self._long_description
     # If subclass doesn't override, return standard description
     return self.get_description()
 
@@ -50,6 +55,11 @@ class GCodeCommand(object):
     """ Return true if the command executes asynchronously (such as a movement command that queues in the native path planner) """
     return False
 
+  def get_path(self, gcode):
+    """ Commands that only add a single path to the path planner return it here, so
+        that several of them can be handed to the path planner at once. """
+    return None
+
   def __str__(self):
     """ The class name of the gcode """
     return type(self).__name__
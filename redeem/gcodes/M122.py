@@ -0,0 +1,46 @@
+"""
+GCode M122
+Report the timing of the thermal loop
+
+License: CC BY-SA: http://creativecommons.org/licenses/by-sa/2.0/
+"""
+from __future__ import absolute_import
+
+from .GCodeCommand import GCodeCommand
+
+
+class M122(GCodeCommand):
+  def execute(self, g):
+    loop = self.printer.thermal_loop
+    timing = loop.get_timing()
+    g.set_answer("ok updates:{} late avg:{:.1f}ms sd:{:.1f}ms max:{:.1f}ms "
+                 "passes:{} slowest pass:{:.1f}ms".format(timing["updates"],
+                                                          timing["mean_lateness"] * 1000.0,
+                                                          timing["stddev_lateness"] * 1000.0,
+                                                          timing["max_lateness"] * 1000.0,
+                                                          timing["passes"],
+                                                          timing["max_pass_time"] * 1000.0))
+    if loop.outputs is not None:
+      stats = loop.outputs.get_stats()
+      g.set_answer(g.get_answer() + " pwm updates:{} i2c writes:{} saved:{}".format(
+          stats["updates"], stats["transactions"], stats["saved"]))
+    if g.has_letter("R"):
+      loop.reset_timing()
+      if loop.outputs is not None:
+        loop.outputs.reset_stats()
+
+  def get_description(self):
+    return "Report the timing of the thermal loop"
+
+  def get_long_description(self):
+    return ("Reports how many heater and cooler updates the thermal loop has run, "
+            "how late they ran compared to their schedule (average, standard "
+            "deviation and worst case) and the time the slowest pass over the "
+            "controllers took. It also reports how many PWM values were set, "
+            "how many I2C writes that took and how many writes were saved by "
+            "skipping unchanged values and writing neighbouring channels "
+            "together.\n\n"
+            "Add 'R' to reset the statistics after reporting them.")
+
+  def is_buffered(self):
+    return False
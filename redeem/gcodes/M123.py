@@ -0,0 +1,40 @@
+"""
+GCode M123
+Report the statistics of the path queue
+
+License: CC BY-SA: http://creativecommons.org/licenses/by-sa/2.0/
+"""
+from __future__ import absolute_import
+
+from .GCodeCommand import GCodeCommand
+
+
+class M123(GCodeCommand):
+  def execute(self, g):
+    planner = self.printer.path_planner
+    stats = planner.get_queue_stats()
+    g.set_answer("ok added:{} removed:{} planner commits:{} contentions:{} "
+                 "full waits:{} empty waits:{} slowest plan:{:.3f}ms "
+                 "slowest pop:{:.3f}ms safe speed stops:{}".format(
+                     stats["paths_added"], stats["paths_removed"], stats["consumer_commits"],
+                     stats["contentions"], stats["producer_waits"], stats["consumer_waits"],
+                     stats["max_planning_time"] * 1000.0, stats["max_pop_time"] * 1000.0,
+                     stats["safe_speed_stops"]))
+    if g.has_letter("R"):
+      planner.reset_queue_stats()
+
+  def get_description(self):
+    return "Report the statistics of the path queue"
+
+  def get_long_description(self):
+    return ("Reports how many paths have gone through the path queue, how often "
+            "the planner thread had to plan a path itself because none were "
+            "committed yet, how often queueing moves and the planner thread ran "
+            "into each other on the planning lock, how often they waited for a "
+            "full or an empty queue, the slowest replanning pass and pop, and how "
+            "many moves had to slow down to a safe speed at their end because "
+            "nothing was planned after them yet. See M595 for the look-ahead.\n\n"
+            "Add 'R' to reset the statistics after reporting them.")
+
+  def is_buffered(self):
+    return False
@@ -36,11 +36,7 @@ from abc import ABCMeta
 from redeem.Gcode import Gcode
 from thread import start_new_thread
 from time import sleep
-from six import PY2
-if PY2:
-  from io import StringIO
-else:
-  import StringIO
+from six import StringIO
 
 from .GCodeCommand import GCodeCommand
 
@@ -54,6 +50,10 @@ SD_MOUNT_LOCATION = '/media/sdcard'
 
 LCL_MOUNT_LOCATION = '/usr/share/models'
 
+# number of lines read from the file at a time when printing, a pause
+# or abort takes effect before the next lines are read
+FILE_READ_LINES = 256
+
 MOUNT_LOCATIONS = {'/usb': USB_MOUNT_LOCATION, '/sd': SD_MOUNT_LOCATION, '/lcl': LCL_MOUNT_LOCATION}
 
 DEVICE_TABLE = """
@@ -279,26 +279,32 @@ class M23(M2X):
 
 class M24(GCodeCommand):
   def process_gcode(self, g):
-    profile = cProfile.Profile()
+    profile = None
+    if self.printer.config.snapshot.System.profile_file_print:
+      profile = cProfile.Profile()
+      profile.enable()
     self.printer.sd_card_manager.set_status(True)
-    profile.enable()
-    for line in self.printer.sd_card_manager:
-      line = line.strip()
-      if not line or line.startswith(';'):
-        continue
-      file_g = Gcode({"message": line})
-      self.printer.processor.enqueue(file_g)
+    while True:
+      lines = self.printer.sd_card_manager.read_lines(FILE_READ_LINES)
+      if not lines:
+        break
+      gcodes = []
+      for line in lines:
+        line = line.strip()
+        if line and not line.startswith(';'):
+          gcodes.append(Gcode({"message": line}))
+      self.printer.processor.enqueue_batch(gcodes)
     if self.printer.sd_card_manager.get_status():
       logging.info("M24: Print from file complete")
     self.printer.sd_card_manager.set_status(False)
 
     self.printer.send_message(g.prot, "Done printing file")
-    profile.disable()
-    s = StringIO.StringIO()
-    sortby = 'cumulative'
-    ps = pstats.Stats(profile, stream=s).sort_stats(sortby)
-    ps.print_stats()
-    logging.debug(s.getvalue())
+    if profile:
+      profile.disable()
+      s = StringIO()
+      ps = pstats.Stats(profile, stream=s).sort_stats('cumulative')
+      ps.print_stats()
+      logging.debug(s.getvalue())
     self.printer.sd_card_manager.reset()
 
   def execute(self, g):
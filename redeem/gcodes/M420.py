@@ -0,0 +1,58 @@
+"""
+GCode M420
+
+Example: M420 U
+
+Show, update or clear the probed height mesh of the bed. Moves with bed
+compensation follow it, the path planner adds the height of the bed under
+them to Z.
+
+License: CC BY-SA: http://creativecommons.org/licenses/by-sa/2.0/
+"""
+from __future__ import absolute_import
+
+import json
+import logging
+
+from .GCodeCommand import GCodeCommand
+from redeem.BedCompensation import BedCompensation
+
+
+class M420(GCodeCommand):
+  def execute(self, g):
+    # Update mesh
+    if g.has_letter("U"):
+      mesh = BedCompensation.create_height_mesh(self.printer.probe_points,
+                                                self.printer.probe_heights)
+      if mesh is None:
+        logging.warning("M420: the probe points are not a grid, the mesh is unchanged")
+        self.printer.send_message(g.prot, "The probe points are not a grid, use G29.2 to make one")
+        return
+      self.printer.bed_mesh = mesh
+      self.printer.path_planner.update_bed_mesh()
+
+    # Clear mesh
+    elif g.has_letter("R"):
+      self.printer.bed_mesh = None
+      self.printer.path_planner.update_bed_mesh()
+
+    # Show mesh
+    else:
+      self.printer.send_message(g.prot,
+                                "Current bed mesh: {}".format(json.dumps(self.printer.bed_mesh)))
+
+  def get_description(self):
+    return "Show, update or clear the bed height mesh"
+
+  def get_long_description(self):
+    return ("Moves with bed compensation follow the probed height of the bed, "
+            "interpolated between the probe points as set by bed_mesh_interpolation.\n"
+            "Add 'U' to make the mesh from the probe data of a square G29 pattern\n"
+            "Add 'R' to clear the mesh\n"
+            "Without either, the current mesh is shown.")
+
+  def is_buffered(self):
+    return True
+
+  def get_test_gcodes(self):
+    return ["M420"]
@@ -0,0 +1,44 @@
+"""
+GCode M595
+Set the look-ahead of the path planner
+
+Example: M595 T250 D50
+
+License: CC BY-SA: http://creativecommons.org/licenses/by-sa/2.0/
+"""
+from __future__ import absolute_import
+
+from .GCodeCommand import GCodeCommand
+
+
+class M595(GCodeCommand):
+  def execute(self, g):
+    if g.num_tokens() == 0:
+      g.set_answer("ok T:{} D:{} B:{}".format(self.printer.lookahead_time,
+                                              self.printer.lookahead_distance,
+                                              self.printer.max_buffered_move_time))
+      return
+
+    if g.has_letter("T"):
+      self.printer.lookahead_time = max(g.get_float_by_letter("T"), 0.0)
+    if g.has_letter("D"):
+      self.printer.lookahead_distance = max(g.get_float_by_letter("D"), 0.0)
+    if g.has_letter("B"):
+      self.printer.max_buffered_move_time = max(g.get_float_by_letter("B"), 0.0)
+
+    self.printer.path_planner.update_lookahead()
+
+  def get_description(self):
+    return "Set the look-ahead of the path planner"
+
+  def get_long_description(self):
+    return ("The path planner keeps planning a move, so it can still speed up, "
+            "until the moves after it take T ms or go D mm. The move cache size "
+            "only caps how many moves that can be. 0 turns a limit off.\n"
+            "B sets the most time of moves (ms) that can be queued before adding "
+            "another move waits.\n"
+            "Without parameters, the current values are shown. M123 shows how often "
+            "moves had to slow down because nothing was planned after them.")
+
+  def is_buffered(self):
+    return True
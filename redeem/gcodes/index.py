@@ -0,0 +1,111 @@
+"""
+The module in redeem.gcodes that defines each G-code handler.
+
+Generated by tools/generate_gcode_index.py, don't edit it by hand.
+"""
+
+GCODE_MODULES = {
+    "G0": "G1_G0",
+    "G1": "G1_G0",
+    "G2": "G2_G3",
+    "G02": "G2_G3",
+    "G3": "G2_G3",
+    "G03": "G2_G3",
+    "G4": "G4",
+    "G17": "G17_G18_G19",
+    "G18": "G17_G18_G19",
+    "G19": "G17_G18_G19",
+    "G20": "G20_G21",
+    "G21": "G20_G21",
+    "G28": "G28",
+    "G29": "G29",
+    "G30": "G30",
+    "G31": "G31",
+    "G32": "G32",
+    "G33": "G33",
+    "G34": "G34",
+    "G90": "G90_G91",
+    "G91": "G90_G91",
+    "G92": "G92",
+    "G134": "G134",
+    "G": "G",
+    "G29_1": "G29",
+    "G29_2": "G29",
+    "G30_1": "G30",
+    "M17": "M17",
+    "M18": "M18",
+    "M19": "M19",
+    "M20": "M2x",
+    "M21": "M2x",
+    "M22": "M2x",
+    "M23": "M2x",
+    "M24": "M2x",
+    "M25": "M2x",
+    "M26": "M2x",
+    "M27": "M2x",
+    "M81": "M81",
+    "M82": "M82",
+    "M83": "M83",
+    "M84": "M84",
+    "M92": "M92",
+    "M104": "M104",
+    "M105": "M105",
+    "M106": "M106_M107",
+    "M107": "M106_M107",
+    "M108": "M108",
+    "M109": "M109",
+    "M110": "M110",
+    "M111": "M111",
+    "M112": "M112",
+    "M114": "M114",
+    "M115": "M115",
+    "M116": "M116",
+    "M117": "M117",
+    "M119": "M119",
+    "M122": "M122",
+    "M123": "M123",
+    "M130": "M130_M131_M132",
+    "M131": "M130_M131_M132",
+    "M132": "M130_M131_M132",
+    "M140": "M140",
+    "M141": "M141",
+    "M151": "M151",
+    "M190": "M190",
+    "M201": "M201",
+    "M204": "M204",
+    "M206": "M206",
+    "M220": "M220",
+    "M221": "M221",
+    "M270": "M270",
+    "M280": "M280",
+    "M290": "M290",
+    "M301": "M301",
+    "M303": "M303",
+    "M308": "M308",
+    "M360": "M360",
+    "M400": "M400",
+    "M409": "M409",
+    "M420": "M420",
+    "M500": "M500",
+    "M557": "M557",
+    "M558": "M558",
+    "M561": "M561",
+    "M562": "M562",
+    "M569": "M569",
+    "M574": "M574",
+    "M595": "M595",
+    "M608": "M608",
+    "M665": "M665",
+    "M666": "M666",
+    "M668": "M668",
+    "M906": "M906",
+    "M907": "M907",
+    "M909": "M909",
+    "M910": "M910",
+    "M": "M",
+    "T0": "T0_T1",
+    "T1": "T0_T1",
+    "T2": "T0_T1",
+    "T3": "T0_T1",
+    "T4": "T0_T1",
+}
@@ -0,0 +1,156 @@
+/*
+ This file is part of Redeem - 3D Printer control software
+
+ License: GNU GPLv3 http://www.gnu.org/copyleft/gpl.html
+
+ Redeem is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ Redeem is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with Redeem.  If not, see <http://www.gnu.org/licenses/>.
+
+ */
+
+#include "BedMesh.h"
+
+#include <algorithm>
+#include <cmath>
+
+// crossings closer together than this are the same one, like a diagonal move through a grid point
+static const double SAME_CROSSING = 1e-9;
+
+// finds the cell a position is in along one axis of the grid and how far into it the position is
+static void locateCell(double position, double min, double step, int count, int& cell, double& t)
+{
+    const double f = std::min(std::max((position - min) / step, 0.0), count - 1.0);
+    cell = std::min(static_cast<int>(f), count - 2);
+    t = f - cell;
+}
+
+static double catmullRom(double p0, double p1, double p2, double p3, double t)
+{
+    return 0.5 * (2 * p1 + (p2 - p0) * t + (2 * p0 - 5 * p1 + 4 * p2 - p3) * t * t + (3 * p1 - p0 - 3 * p2 + p3) * t * t * t);
+}
+
+static void addLineCrossings(double from, double to, double min, double step, int count, std::vector<double>& fractions)
+{
+    if (from == to)
+    {
+        return;
+    }
+
+    const double a = (from - min) / step;
+    const double b = (to - min) / step;
+
+    // only the lines strictly between the ends, the edges of the grid included
+    const int first = std::max(0, static_cast<int>(std::floor(std::min(a, b))) + 1);
+    const int last = std::min(count - 1, static_cast<int>(std::ceil(std::max(a, b))) - 1);
+
+    for (int line = first; line <= last; line++)
+    {
+        fractions.push_back((line - a) / (b - a));
+    }
+}
+
+BedMesh::BedMesh()
+    : minX(0)
+    , minY(0)
+    , stepX(0)
+    , stepY(0)
+    , columns(0)
+    , rows(0)
+    , bicubic(false)
+{
+}
+
+void BedMesh::set(double minX, double minY, double stepX, double stepY, int columns, std::vector<double> heights, bool bicubic)
+{
+    this->minX = minX;
+    this->minY = minY;
+    this->stepX = stepX;
+    this->stepY = stepY;
+    this->columns = columns;
+    this->rows = heights.size() / columns;
+    this->heights = std::move(heights);
+    this->bicubic = bicubic;
+}
+
+void BedMesh::clear()
+{
+    heights.clear();
+    columns = 0;
+    rows = 0;
+}
+
+double BedMesh::getPointHeight(int column, int row) const
+{
+    column = std::min(std::max(column, 0), columns - 1);
+    row = std::min(std::max(row, 0), rows - 1);
+
+    return heights[row * columns + column];
+}
+
+double BedMesh::getBilinearHeight(int column, int row, double tx, double ty) const
+{
+    const double bottom = getPointHeight(column, row) * (1 - tx) + getPointHeight(column + 1, row) * tx;
+    const double top = getPointHeight(column, row + 1) * (1 - tx) + getPointHeight(column + 1, row + 1) * tx;
+
+    return bottom * (1 - ty) + top * ty;
+}
+
+double BedMesh::getBicubicHeight(int column, int row, double tx, double ty) const
+{
+    double rowHeights[4];
+
+    for (int i = 0; i < 4; i++)
+    {
+        const int r = row + i - 1;
+        rowHeights[i] = catmullRom(getPointHeight(column - 1, r), getPointHeight(column, r),
+            getPointHeight(column + 1, r), getPointHeight(column + 2, r), tx);
+    }
+
+    return catmullRom(rowHeights[0], rowHeights[1], rowHeights[2], rowHeights[3], ty);
+}
+
+double BedMesh::getHeight(double x, double y) const
+{
+    if (!isActive())
+    {
+        return 0;
+    }
+
+    int column, row;
+    double tx, ty;
+
+    locateCell(x, minX, stepX, columns, column, tx);
+    locateCell(y, minY, stepY, rows, row, ty);
+
+    return bicubic ? getBicubicHeight(column, row, tx, ty) : getBilinearHeight(column, row, tx, ty);
+}
+
+std::vector<double> BedMesh::getCellCrossings(double x0, double y0, double x1, double y1) const
+{
+    std::vector<double> fractions;
+
+    if (!isActive())
+    {
+        return fractions;
+    }
+
+    addLineCrossings(x0, x1, minX, stepX, columns, fractions);
+    addLineCrossings(y0, y1, minY, stepY, rows, fractions);
+
+    std::sort(fractions.begin(), fractions.end());
+    fractions.erase(std::unique(fractions.begin(), fractions.end(),
+                        [](double a, double b) { return b - a < SAME_CROSSING; }),
+        fractions.end());
+
+    return fractions;
+}
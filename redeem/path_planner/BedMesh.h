@@ -0,0 +1,69 @@
+/*
+ This file is part of Redeem - 3D Printer control software
+
+ License: GNU GPLv3 http://www.gnu.org/copyleft/gpl.html
+
+ Redeem is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ Redeem is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with Redeem.  If not, see <http://www.gnu.org/licenses/>.
+
+ */
+
+#ifndef __PathPlanner__BedMesh__
+#define __PathPlanner__BedMesh__
+
+#include <vector>
+
+/*
+ * The height of the bed probed on a regular grid of points, in meters.
+ *
+ * Heights between the points are interpolated bilinearly or bicubically (Catmull-Rom),
+ * outside the grid the heights at its edge are used.
+ */
+class BedMesh
+{
+private:
+    double minX;
+    double minY;
+    double stepX;
+    double stepY;
+    int columns;
+    int rows;
+    bool bicubic;
+
+    // rows of heights along X, from minY up
+    std::vector<double> heights;
+
+    double getPointHeight(int column, int row) const;
+    double getBilinearHeight(int column, int row, double tx, double ty) const;
+    double getBicubicHeight(int column, int row, double tx, double ty) const;
+
+public:
+    BedMesh();
+
+    /// heights must hold at least two rows of columns heights, columns must be at least two
+    void set(double minX, double minY, double stepX, double stepY, int columns, std::vector<double> heights, bool bicubic);
+
+    void clear();
+
+    bool isActive() const
+    {
+        return !heights.empty();
+    }
+
+    double getHeight(double x, double y) const;
+
+    /// the fractions of the move from (x0, y0) to (x1, y1) where it crosses the lines of the grid, in order
+    std::vector<double> getCellCrossings(double x0, double y0, double x1, double y1) const;
+};
+
+#endif
@@ -46,11 +46,22 @@ Delta::Delta()
     B_angular = 0.0;
     C_angular = 0.0;
 
+    stepSolver = DELTA_STEP_SOLVER_EXACT;
+
     recalculate();
 }
 
 Delta::~Delta() {}
 
+bool Delta::operator==(const Delta& other) const
+{
+    // the column positions follow from these
+    return L == other.L && r == other.r
+        && A_radial == other.A_radial && B_radial == other.B_radial && C_radial == other.C_radial
+        && A_angular == other.A_angular && B_angular == other.B_angular && C_angular == other.C_angular
+        && stepSolver == other.stepSolver;
+}
+
 void Delta::setMainDimensions(double L_in, double r_in)
 {
     L = L_in;
@@ -76,6 +87,17 @@ void Delta::setAngularError(double A_angular_in, double B_angular_in, double C_a
     recalculate();
 }
 
+void Delta::setStepSolver(int solver)
+{
+    if (solver != DELTA_STEP_SOLVER_EXACT && solver != DELTA_STEP_SOLVER_INCREMENTAL)
+    {
+        LOGERROR("Delta: unknown step solver " << solver << ", using the exact solver" << std::endl);
+        solver = DELTA_STEP_SOLVER_EXACT;
+    }
+
+    stepSolver = solver;
+}
+
 double degreesToRadians(double degrees)
 {
     return degrees * M_PI / 180.0;
@@ -209,6 +231,56 @@ void Delta::verticalOffset(double Az, double Bz, double Cz, double* offset) cons
     return;
 }
 
+void Delta::worldToDeltaBatch(const double* inPositions, int numIn, int numInAxes, double* outPositions, int numOut, int numOutAxes) const
+{
+    if (numInAxes != NUM_MOVING_AXES || numOutAxes != NUM_MOVING_AXES || numOut != numIn)
+    {
+        throw InputSizeError();
+    }
+
+    for (int i = 0; i < numIn; i++)
+    {
+        const double* in = inPositions + i * NUM_MOVING_AXES;
+        const Vector3 result = worldToDelta(Vector3(in[0], in[1], in[2]));
+        double* out = outPositions + i * NUM_MOVING_AXES;
+        out[0] = result.x;
+        out[1] = result.y;
+        out[2] = result.z;
+    }
+}
+
+void Delta::deltaToWorldBatch(const double* inPositions, int numIn, int numInAxes, double* outPositions, int numOut, int numOutAxes) const
+{
+    if (numInAxes != NUM_MOVING_AXES || numOutAxes != NUM_MOVING_AXES || numOut != numIn)
+    {
+        throw InputSizeError();
+    }
+
+    for (int i = 0; i < numIn; i++)
+    {
+        const double* in = inPositions + i * NUM_MOVING_AXES;
+        const Vector3 result = deltaToWorld(Vector3(in[0], in[1], in[2]));
+        double* out = outPositions + i * NUM_MOVING_AXES;
+        out[0] = result.x;
+        out[1] = result.y;
+        out[2] = result.z;
+    }
+}
+
+void Delta::verticalOffsetBatch(const double* inPositions, int numIn, int numInAxes, double* offsets, int numOffsets) const
+{
+    if (numInAxes != NUM_MOVING_AXES || numOffsets != numIn)
+    {
+        throw InputSizeError();
+    }
+
+    for (int i = 0; i < numIn; i++)
+    {
+        const double* in = inPositions + i * NUM_MOVING_AXES;
+        verticalOffset(in[0], in[1], in[2], &offsets[i]);
+    }
+}
+
 DeltaPathConstants Delta::calculatePathConstants(int axis, const IntVector3& deltaMotorStart, const IntVector3& deltaMotorEnd, const Vector3& stepsPerM, double time) const
 {
     DeltaPathConstants result;
@@ -258,18 +330,23 @@ DeltaPathConstants Delta::calculatePathConstants(int axis, const IntVector3& del
     return result;
 }
 
+bool Delta::isLinearMove(const IntVector3& deltaStart, const IntVector3& deltaEnd)
+{
+    // when all the carriages travel the same distance the effector only moves in Z
+    return deltaEnd[0] - deltaStart[0] == deltaEnd[1] - deltaStart[1]
+        && deltaEnd[0] - deltaStart[0] == deltaEnd[2] - deltaStart[2];
+}
+
 void Delta::calculateMove(const IntVector3& deltaStart, const IntVector3& deltaEnd, const Vector3& stepsPerM, double time, std::array<std::vector<Step>, NUM_AXES>& steps) const
 {
     auto const timestamp = std::chrono::system_clock::now();
-    const DeltaPathConstants c = calculatePathConstants(0, deltaStart, deltaEnd, stepsPerM, time);
 
     if (deltaStart == deltaEnd)
     {
         // no motion platform movement - this might be a retraction or somesuch
         return;
     }
-    if ((c.deltaMotorEnd[0] - c.deltaMotorStart[0] == c.deltaMotorEnd[1] - c.deltaMotorStart[1])
-        && (c.deltaMotorEnd[0] - c.deltaMotorStart[0] == c.deltaMotorEnd[2] - c.deltaMotorStart[2]))
+    if (isLinearMove(deltaStart, deltaEnd))
     {
         for (int axis = 0; axis < 3; axis++)
         {
@@ -283,8 +360,11 @@ void Delta::calculateMove(const IntVector3& deltaStart, const IntVector3& deltaE
 
         for (int axis = 0; axis < 3; axis++)
         {
-            const DeltaPathConstants c = calculatePathConstants(axis, deltaStart, deltaEnd, stepsPerM, time);
-            calculateSteps(axis, c, steps[axis]);
+            assert(steps[axis].empty());
+
+            DeltaAxisStepGenerator generator(*this, axis, deltaStart, deltaEnd, stepsPerM, time);
+            steps[axis].reserve(generator.getStepsRemaining());
+            generator.generate(steps[axis], generator.getStepsRemaining());
         }
     }
 
@@ -292,71 +372,205 @@ void Delta::calculateMove(const IntVector3& deltaStart, const IntVector3& deltaE
     LOG("calculating move took " << std::chrono::duration_cast<std::chrono::milliseconds>(timeTaken).count() << " ms" << std::endl);
 }
 
-void Delta::calculateSteps(int axis, const DeltaPathConstants& c, std::vector<Step>& steps) const
+int Delta::calculateStepRuns(int axis, const DeltaPathConstants& c, std::array<DeltaStepRun, 2>& runs) const
 {
     assert(axis >= 0 && axis <= 2);
 
-    const double towerX = (axis == 0 ? Avx : (axis == 1 ? Bvx : Cvx));
-    const double towerY = (axis == 0 ? Avy : (axis == 1 ? Bvy : Cvy));
-
     const double criticalPointTime = calculateCriticalPointTimeForAxis(axis, c);
 
-    assert(steps.empty());
-
     if (std::isnan(criticalPointTime) || criticalPointTime <= 0 || criticalPointTime >= c.time)
     {
         LOG("axis " << axis << " has no critical point - calculating steps from " << c.deltaStart[axis] << " to " << c.deltaEnd[axis] << std::endl);
         // easy case - axis has no critical point
-        steps.reserve(std::abs(c.deltaMotorEnd[axis] - c.deltaMotorStart[axis]));
-
-        calculateStepsInOneDirection(axis, c, 0, c.time,
-            towerX, towerY, c.deltaStart[axis], c.deltaEnd[axis], steps);
+        runs[0] = DeltaStepRun(0, c.time, c.deltaStart[axis], c.deltaEnd[axis], c.stepsPerM[axis]);
+        return 1;
     }
     else
     {
         const Vector3 criticalPointCartesianPosition = c.worldStart + (c.axisSpeeds * criticalPointTime);
         const Vector3 criticalPointDeltaPosition = worldToDelta(criticalPointCartesianPosition);
         const double criticalPointHeight = criticalPointDeltaPosition[axis];
-        const long criticalPointMotorPos = std::lround(criticalPointHeight * c.stepsPerM[axis]);
 
         LOG("axis " << axis << " has a critical point at " << criticalPointTime << " - calculating steps from " << c.deltaStart[axis] << " to " << criticalPointHeight << " to " << c.deltaEnd[axis] << std::endl);
-        steps.reserve(std::abs(c.deltaMotorStart[axis] - criticalPointMotorPos) + std::abs(criticalPointMotorPos - c.deltaMotorEnd[axis]));
-
-        calculateStepsInOneDirection(axis, c, 0, criticalPointTime,
-            towerX, towerY, c.deltaStart[axis], criticalPointHeight, steps);
 
-        calculateStepsInOneDirection(axis, c, criticalPointTime, c.time,
-            towerX, towerY, criticalPointHeight, c.deltaEnd[axis], steps);
+        runs[0] = DeltaStepRun(0, criticalPointTime, c.deltaStart[axis], criticalPointHeight, c.stepsPerM[axis]);
+        runs[1] = DeltaStepRun(criticalPointTime, c.time, criticalPointHeight, c.deltaEnd[axis], c.stepsPerM[axis]);
+        return 2;
     }
 }
 
-void Delta::calculateStepsInOneDirection(int axis, const DeltaPathConstants& c, double startTime, double endTime, double towerX, double towerY, double startHeight, double endHeight, std::vector<Step>& steps) const
+double Delta::calculateStepsInOneDirection(int axis, const DeltaPathConstants& c, const DeltaStepRun& run, int firstStep, int numSteps, double previousTime, std::vector<Step>& steps) const
 {
-    const bool direction = startHeight < endHeight;
-
-    const int startStep = std::lroundl(startHeight * c.stepsPerM[axis]); // m * (steps/m) = step
-    const int endStep = std::lroundl(endHeight * c.stepsPerM[axis]);
+    int step = run.startStep + firstStep * run.stepIncrement;
+    const int lastStep = step + numSteps * run.stepIncrement;
+    const double stepOffset = run.stepIncrement / 2.0;
 
-    const int stepIncrement = direction ? 1 : -1;
-    const double stepOffset = stepIncrement / 2.0;
+    double time = previousTime;
 
-    int step = startStep;
-    double time = startTime;
-
-    while (step != endStep)
+    while (step != lastStep)
     {
         const double height = (step + stepOffset) / c.stepsPerM[axis];
 
-        time = calculateStepTime(axis, c, height, time, endTime);
+        time = calculateStepTime(axis, c, height, time, run.endTime);
 
         assert(steps.empty() || time > steps.back().time);
 
-        steps.emplace_back(Step(time, axis, direction));
+        steps.emplace_back(Step(time, axis, run.direction));
 
         assert(!std::isnan(time));
-        assert(time <= endTime);
+        assert(time <= run.endTime);
+
+        step += run.stepIncrement;
+    }
+
+    return time;
+}
+
+double Delta::calculateStepsInOneDirectionIncremental(int axis, const DeltaPathConstants& c, const DeltaStepRun& run, int firstStep, int numSteps, double previousTime, std::vector<Step>& steps) const
+{
+    /*
+    Same result as calculateStepsInOneDirection, but cheaper per step.
+
+    calculateStepTime finds the step time as
+
+      t = (base + Zd * towerZ +/- sqrt(radicand(towerZ))) / denominator
+
+    where radicand is a quadratic in towerZ. While the carriage moves in one
+    direction the sign in front of the square root doesn't change, so it's
+    picked once for the whole run. towerZ advances by a fixed amount every
+    step, so the radicand and the linear part are updated by forward
+    differencing instead of being evaluated from scratch. To keep the
+    rounding error from building up, both are evaluated exactly again every
+    DELTA_STEP_RESEED_INTERVAL steps.
+  */
+    if (numSteps == 0)
+    {
+        return previousTime;
+    }
+
+    const double stepOffset = run.stepIncrement / 2.0;
+
+    const double& Xo = c.worldStart.x;
+    const double& Yo = c.worldStart.y;
+    const double& Zo = c.worldStart.z;
+    const double& Xd = c.axisSpeeds.x;
+    const double& Yd = c.axisSpeeds.y;
+    const double& Zd = c.axisSpeeds.z;
+    const double& Xd2 = c.axisSpeeds2.x;
+    const double& Yd2 = c.axisSpeeds2.y;
+    const double& Zd2 = c.axisSpeeds2.z;
+
+    const double& towerX = c.towerX[axis];
+    const double& towerY = c.towerY[axis];
+
+    const double quadratic = Xd2 + Yd2;
+    const double base = -(Zd * Zo + Yd * Yo - towerY * Yd + Xd * Xo - towerX * Xd);
+    const double inverseDenominator = 1.0 / (Zd2 + Yd2 + Xd2);
+
+    const double stepHeight = run.stepIncrement / c.stepsPerM[axis];
+
+    auto heightOfStep = [&](int step) { return (run.startStep + step * run.stepIncrement + stepOffset) / c.stepsPerM[axis]; };
+    auto radicandAt = [&](double height) { return c.axisCore1 + height * (c.axisCore2 - quadratic * height); };
+
+    // pick the root the same way calculateStepTime does, using the middle step of the run
+    const double middleHeight = heightOfStep(run.numSteps / 2);
+    const double middleCore = std::sqrt(std::max(radicandAt(middleHeight), 0.0));
+    const double smallerTime = (base + Zd * middleHeight - middleCore) * inverseDenominator;
+    const double rootSign = smallerTime > run.startTime ? -1.0 : 1.0;
+
+    const double linearDelta = Zd * stepHeight;
+    const double radicandSecondDelta = -2.0 * quadratic * stepHeight * stepHeight;
+
+    int step = firstStep;
+    const int lastStep = firstStep + numSteps;
+    double time = previousTime;
+
+    while (step < lastStep)
+    {
+        const double height = heightOfStep(step);
+
+        double linear = base + Zd * height;
+        double radicand = radicandAt(height);
+        double radicandDelta = stepHeight * (c.axisCore2 - quadratic * (2.0 * height + stepHeight));
+
+        const int blockEnd = std::min(lastStep, step + DELTA_STEP_RESEED_INTERVAL);
+
+        for (; step < blockEnd; step++)
+        {
+            time = (linear + rootSign * std::sqrt(std::max(radicand, 0.0))) * inverseDenominator;
+            time = std::min(std::max(time, run.startTime), run.endTime);
+
+            steps.emplace_back(Step(time, axis, run.direction));
+
+            linear += linearDelta;
+            radicand += radicandDelta;
+            radicandDelta += radicandSecondDelta;
+        }
+    }
+
+    return time;
+}
+
+DeltaStepRun::DeltaStepRun(double startTime, double endTime, double startHeight, double endHeight, double stepsPerM)
+    : startTime(startTime)
+    , endTime(endTime)
+    , startStep(std::lroundl(startHeight * stepsPerM)) // m * (steps/m) = step
+    , endStep(std::lroundl(endHeight * stepsPerM))
+    , numSteps(std::abs(endStep - startStep))
+    , stepIncrement(startHeight < endHeight ? 1 : -1)
+    , direction(startHeight < endHeight)
+{
+}
+
+DeltaAxisStepGenerator::DeltaAxisStepGenerator(const Delta& delta, int axis, const IntVector3& deltaStart, const IntVector3& deltaEnd, const Vector3& stepsPerM, double time)
+    : delta(delta)
+    , axis(axis)
+    , constants(delta.calculatePathConstants(axis, deltaStart, deltaEnd, stepsPerM, time))
+    , currentRun(0)
+    , currentStep(0)
+    , previousTime(0)
+    , stepsRemaining(0)
+{
+    numRuns = delta.calculateStepRuns(axis, constants, runs);
+
+    for (int run = 0; run < numRuns; run++)
+    {
+        stepsRemaining += runs[run].numSteps;
+    }
+}
+
+void DeltaAxisStepGenerator::generate(std::vector<Step>& steps, size_t maxSteps)
+{
+    while (maxSteps > 0 && currentRun < numRuns)
+    {
+        const DeltaStepRun& run = runs[currentRun];
+
+        if (currentStep == run.numSteps)
+        {
+            currentRun++;
+            currentStep = 0;
+            continue;
+        }
+
+        const int numSteps = static_cast<int>(std::min<size_t>(maxSteps, run.numSteps - currentStep));
+
+        if (currentStep == 0)
+        {
+            previousTime = run.startTime;
+        }
+
+        if (delta.stepSolver == DELTA_STEP_SOLVER_INCREMENTAL)
+        {
+            previousTime = delta.calculateStepsInOneDirectionIncremental(axis, constants, run, currentStep, numSteps, previousTime, steps);
+        }
+        else
+        {
+            previousTime = delta.calculateStepsInOneDirection(axis, constants, run, currentStep, numSteps, previousTime, steps);
+        }
 
-        step += stepIncrement;
+        currentStep += numSteps;
+        stepsRemaining -= numSteps;
+        maxSteps -= numSteps;
     }
 }
 
@@ -24,6 +24,7 @@ along with Redeem.  If not, see <http://www.gnu.org/licenses/>.
 #ifndef __DELTA__
 #define __DELTA__
 
+#include <array>
 #include <queue>
 
 #include "Logger.h"
@@ -54,8 +55,32 @@ struct DeltaPathConstants
     double axisCore2;
 };
 
+/*
+ * A stretch of a move where one carriage moves in a single direction.
+ * A tower has two of them when the effector passes its critical point.
+ */
+struct DeltaStepRun
+{
+    double startTime;
+    double endTime;
+    int startStep;
+    int endStep;
+    int numSteps;
+    int stepIncrement;
+    bool direction;
+
+    DeltaStepRun() = default;
+    DeltaStepRun(double startTime, double endTime, double startHeight, double endHeight, double stepsPerM);
+};
+
+class InputSizeError
+{
+};
+
 class Delta
 {
+    friend class DeltaAxisStepGenerator;
+
 private:
     double L; // lenth of rod
     double r; // Radius of columns
@@ -64,10 +89,13 @@ private:
     double A_radial, B_radial, C_radial;
     double A_angular, B_angular, C_angular;
 
+    int stepSolver;
+
     void recalculate();
     DeltaPathConstants calculatePathConstants(int axis, const IntVector3& deltaMotorStart, const IntVector3& deltaMotorEnd, const Vector3& stepsPerM, double time) const;
-    void calculateSteps(int axis, const DeltaPathConstants& constants, std::vector<Step>& steps) const;
-    void calculateStepsInOneDirection(int axis, const DeltaPathConstants& constants, double startTime, double endTime, double towerX, double towerY, double startHeight, double endHeight, std::vector<Step>& steps) const;
+    int calculateStepRuns(int axis, const DeltaPathConstants& constants, std::array<DeltaStepRun, 2>& runs) const;
+    double calculateStepsInOneDirection(int axis, const DeltaPathConstants& constants, const DeltaStepRun& run, int firstStep, int numSteps, double previousTime, std::vector<Step>& steps) const;
+    double calculateStepsInOneDirectionIncremental(int axis, const DeltaPathConstants& constants, const DeltaStepRun& run, int firstStep, int numSteps, double previousTime, std::vector<Step>& steps) const;
     double calculateCriticalPointTimeForAxis(int axis, const DeltaPathConstants& constants) const;
     double calculateStepTime(int axis, const DeltaPathConstants& constants, double towerZ, double minTime, double maxTime) const;
 
@@ -78,6 +106,10 @@ public:
     void setMainDimensions(double L_in, double r_in);
     void setRadialError(double A_radial_in, double B_radial_in, double C_radial_in);
     void setAngularError(double A_angular_in, double B_angular_in, double C_angular_in);
+    void setStepSolver(int solver);
+
+    /// whether both have the same geometry and step solver
+    bool operator==(const Delta& other) const;
 
     Vector3 worldToDelta(const Vector3& pos) const;
     void worldToDelta(double X, double Y, double Z, double* Az, double* Bz, double* Cz);
@@ -85,7 +117,44 @@ public:
     void deltaToWorld(double Az, double Bz, double Cz, double* X, double* Y, double* Z);
     IntVector3 worldToDeltaMotorPos(const Vector3& pos, const Vector3& stepsPerM);
     void verticalOffset(double Az, double Bz, double Cz, double* offset) const;
+
+    // Batch versions of the above for arrays with a position of NUM_MOVING_AXES values per row.
+    // The results are written to outPositions and offsets, which must have a row per input row.
+    void worldToDeltaBatch(const double* inPositions, int numIn, int numInAxes, double* outPositions, int numOut, int numOutAxes) const;
+    void deltaToWorldBatch(const double* inPositions, int numIn, int numInAxes, double* outPositions, int numOut, int numOutAxes) const;
+    void verticalOffsetBatch(const double* inPositions, int numIn, int numInAxes, double* offsets, int numOffsets) const;
+
     void calculateMove(const IntVector3& deltaStart, const IntVector3& deltaEnd, const Vector3& stepsPerM, double speed, std::array<std::vector<Step>, NUM_AXES>& steps) const;
+    static bool isLinearMove(const IntVector3& deltaStart, const IntVector3& deltaEnd);
+};
+
+/*
+ * Calculates the steps of one tower for a move a few at a time, so a move
+ * doesn't need to hold all its steps in memory at once.
+ */
+class DeltaAxisStepGenerator
+{
+private:
+    const Delta& delta;
+    int axis;
+    DeltaPathConstants constants;
+    std::array<DeltaStepRun, 2> runs;
+    int numRuns;
+    int currentRun;
+    int currentStep;
+    double previousTime;
+    size_t stepsRemaining;
+
+public:
+    DeltaAxisStepGenerator(const Delta& delta, int axis, const IntVector3& deltaStart, const IntVector3& deltaEnd, const Vector3& stepsPerM, double time);
+
+    /// append up to maxSteps of the next steps to steps
+    void generate(std::vector<Step>& steps, size_t maxSteps);
+
+    size_t getStepsRemaining() const
+    {
+        return stepsRemaining;
+    }
 };
 
 #endif
@@ -0,0 +1,261 @@
+/*
+ This file is part of Redeem - 3D Printer control software
+
+ License: GNU GPLv3 http://www.gnu.org/copyleft/gpl.html
+
+ Redeem is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ Redeem is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with Redeem.  If not, see <http://www.gnu.org/licenses/>.
+
+ */
+
+/*
+ * Native G-code tokenizer used by Gcode.py.
+ *
+ * tokenize(message) returns (message, tokens, values) exactly like the
+ * regular expression based tokenizer in Gcode.py:
+ *  - message is the input up to the first ';', stripped of surrounding
+ *    whitespace and with the "(comment)" removed
+ *  - tokens are the RS274/NGC words, upper case and without spaces,
+ *    with the M117 exception for the first word
+ *  - values holds the parsed number of every token, None for a bare
+ *    letter and 0.0 when the number does not parse
+ */
+
+// "#" formats take a Py_ssize_t length, which Python 3.10 and later require
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#include <cstdlib>
+#include <cstring>
+#include <string>
+
+#if PY_MAJOR_VERSION >= 3
+#define TOKEN_FROM_STRING_AND_SIZE PyUnicode_FromStringAndSize
+#else
+#define TOKEN_FROM_STRING_AND_SIZE PyString_FromStringAndSize
+#endif
+
+static inline bool isLetter(char c)
+{
+    return c >= 'A' && c <= 'Z';
+}
+
+static inline bool isDigit(char c)
+{
+    return c >= '0' && c <= '9';
+}
+
+static inline bool isSpace(char c)
+{
+    return c == ' ' || c == '\t' || c == '\n' || c == '\r' || c == '\v' || c == '\f';
+}
+
+static inline char toUpper(char c)
+{
+    return (c >= 'a' && c <= 'z') ? c - ('a' - 'A') : c;
+}
+
+/*
+ * Parse the number following the letter of a word. Mirrors float(token[1:])
+ * in Gcode.token_value, which falls back to 0.0 on anything float() rejects.
+ */
+static double parseValue(const char* start, size_t length)
+{
+    bool hasDigit = false;
+    for (size_t i = 0; i < length; i++)
+    {
+        if (start[i] == '?')
+        {
+            return 0.0;
+        }
+        hasDigit |= isDigit(start[i]);
+    }
+
+    if (!hasDigit)
+    {
+        return 0.0;
+    }
+
+    const std::string number(start, length);
+    return std::strtod(number.c_str(), nullptr);
+}
+
+static PyObject* tokenize(PyObject* self, PyObject* args)
+{
+    char* input = nullptr;
+    Py_ssize_t inputLength = 0;
+
+    if (!PyArg_ParseTuple(args, "et#", "utf-8", &input, &inputLength))
+    {
+        return nullptr;
+    }
+
+    // message.strip().split(";")[0].strip(' \t\n\r')
+    const char* begin = input;
+    const char* end = input + inputLength;
+    while (begin < end && isSpace(*begin))
+        begin++;
+    const char* semicolon = static_cast<const char*>(memchr(begin, ';', end - begin));
+    if (semicolon)
+        end = semicolon;
+    while (end > begin && isSpace(end[-1]))
+        end--;
+
+    const std::string message(begin, end - begin);
+    PyMem_Free(input);
+
+    // strip "(comment)" - greedy, from the first '(' to the last ')'
+    std::string stripped = message;
+    const size_t commentStart = message.find('(');
+    if (commentStart != std::string::npos)
+    {
+        const size_t commentEnd = message.rfind(')');
+        if (commentEnd != std::string::npos && commentEnd > commentStart
+            && message.find('\n', commentStart) > commentEnd)
+        {
+            stripped = message.substr(0, commentStart) + message.substr(commentEnd + 1);
+        }
+    }
+
+    // words are matched on the upper case message without spaces
+    std::string line;
+    line.reserve(stripped.size());
+    for (const char c : stripped)
+    {
+        if (c != ' ')
+        {
+            line.push_back(toUpper(c));
+        }
+    }
+
+    PyObject* tokens = PyList_New(0);
+    PyObject* values = PyList_New(0);
+    if (!tokens || !values)
+    {
+        Py_XDECREF(tokens);
+        Py_XDECREF(values);
+        return nullptr;
+    }
+
+    const size_t length = line.size();
+    size_t pos = 0;
+
+    // M117 exception: M117 is its own word unless followed by a letter
+    if (line.compare(0, 4, "M117") == 0 && (length == 4 || !isLetter(line[4])))
+    {
+        PyObject* token = TOKEN_FROM_STRING_AND_SIZE("M117", 4);
+        PyObject* value = PyFloat_FromDouble(117.0);
+        if (!token || !value || PyList_Append(tokens, token) || PyList_Append(values, value))
+        {
+            Py_XDECREF(token);
+            Py_XDECREF(value);
+            goto fail;
+        }
+        Py_DECREF(token);
+        Py_DECREF(value);
+        pos = 4;
+    }
+
+    while (pos < length)
+    {
+        if (!isLetter(line[pos]))
+        {
+            pos++;
+            continue;
+        }
+
+        // [A-Z][-+]?[0-9]*\.?[0-9]*\??
+        const size_t start = pos++;
+        if (pos < length && (line[pos] == '-' || line[pos] == '+'))
+            pos++;
+        while (pos < length && isDigit(line[pos]))
+            pos++;
+        if (pos < length && line[pos] == '.')
+            pos++;
+        while (pos < length && isDigit(line[pos]))
+            pos++;
+        if (pos < length && line[pos] == '?')
+            pos++;
+
+        const size_t tokenLength = pos - start;
+        PyObject* token = TOKEN_FROM_STRING_AND_SIZE(line.data() + start, tokenLength);
+        PyObject* value;
+        if (tokenLength == 1)
+        {
+            Py_INCREF(Py_None);
+            value = Py_None;
+        }
+        else
+        {
+            value = PyFloat_FromDouble(parseValue(line.data() + start + 1, tokenLength - 1));
+        }
+
+        if (!token || !value || PyList_Append(tokens, token) || PyList_Append(values, value))
+        {
+            Py_XDECREF(token);
+            Py_XDECREF(value);
+            goto fail;
+        }
+        Py_DECREF(token);
+        Py_DECREF(value);
+    }
+
+    {
+        PyObject* strippedMessage = PyUnicode_DecodeUTF8(stripped.data(), stripped.size(), "replace");
+#if PY_MAJOR_VERSION < 3
+        // keep plain str messages as str on Python 2
+        if (strippedMessage && PyString_Check(PyTuple_GET_ITEM(args, 0)))
+        {
+            Py_DECREF(strippedMessage);
+            strippedMessage = PyString_FromStringAndSize(stripped.data(), stripped.size());
+        }
+#endif
+        if (!strippedMessage)
+        {
+            goto fail;
+        }
+        return Py_BuildValue("(NNN)", strippedMessage, tokens, values);
+    }
+
+fail:
+    Py_DECREF(tokens);
+    Py_DECREF(values);
+    return nullptr;
+}
+
+static PyMethodDef GcodeLexerMethods[] = {
+    { "tokenize", tokenize, METH_VARARGS,
+        "tokenize(message) -> (message, tokens, values)\n\n"
+        "Split a G-code line into its words and parse their values." },
+    { nullptr, nullptr, 0, nullptr }
+};
+
+#if PY_MAJOR_VERSION >= 3
+static struct PyModuleDef GcodeLexerModule = {
+    PyModuleDef_HEAD_INIT,
+    "_GcodeLexer",
+    "Native G-code tokenizer",
+    -1,
+    GcodeLexerMethods
+};
+
+PyMODINIT_FUNC PyInit__GcodeLexer(void)
+{
+    return PyModule_Create(&GcodeLexerModule);
+}
+#else
+PyMODINIT_FUNC init_GcodeLexer(void)
+{
+    Py_InitModule3("_GcodeLexer", GcodeLexerMethods, "Native G-code tokenizer");
+}
+#endif
@@ -89,6 +89,11 @@ void Path::zero()
     endSpeed = 0;
     accel = 0;
     startMachinePos.zero();
+    endMachinePos.zero();
+    stepsPerM.zero();
+    baseMoveTime = 0;
+    axisConfig = AXIS_CONFIG_XY;
+    delta.reset();
 
     stepperPath.zero();
 
@@ -131,6 +136,11 @@ Path& Path::operator=(Path&& path)
     endSpeed = path.endSpeed;
     accel = path.accel;
     startMachinePos = path.startMachinePos;
+    endMachinePos = path.endMachinePos;
+    stepsPerM = path.stepsPerM;
+    baseMoveTime = path.baseMoveTime;
+    axisConfig = path.axisConfig;
+    delta = std::move(path.delta);
 
     stepperPath = path.stepperPath;
     steps = std::move(path.steps);
@@ -199,9 +209,10 @@ void Path::initialize(const IntVectorN& machineStart,
     double requestedSpeed,
     double requestedAccel,
     int axisConfig,
-    const Delta& delta,
+    const std::shared_ptr<const Delta>& delta,
     bool cancelable,
-    bool is_probe)
+    bool is_probe,
+    bool lazySteps)
 {
     this->zero();
 
@@ -261,23 +272,40 @@ void Path::initialize(const IntVectorN& machineStart,
 
     LOG("ideal move should be " << fullSpeed << " m/s and cover " << distance << " m in " << idealTimeForMove << " seconds" << std::endl);
 
-    switch (axisConfig)
+    if (lazySteps)
     {
-    case AXIS_CONFIG_DELTA:
-        delta.calculateMove(machineStart.toIntVector3(), machineEnd.toIntVector3(), stepsPerM.toVector3(), idealTimeForMove, steps);
-        break;
-    case AXIS_CONFIG_XY:
-    case AXIS_CONFIG_H_BELT:
-    case AXIS_CONFIG_CORE_XY:
-        calculateXYMove(machineStart.toIntVector3(), machineEnd.toIntVector3(), stepsPerM.toVector3(), idealTimeForMove, steps);
-        break;
-    default:
-        assert(0);
+        // keep what's needed to calculate the steps later, see PathStepGenerator
+        flags |= FLAG_LAZY_STEPS;
+        endMachinePos = machineEnd;
+        this->stepsPerM = stepsPerM;
+        baseMoveTime = idealTimeForMove;
+        this->axisConfig = axisConfig;
+
+        if (axisConfig == AXIS_CONFIG_DELTA)
+        {
+            this->delta = delta;
+        }
     }
+    else
+    {
+        switch (axisConfig)
+        {
+        case AXIS_CONFIG_DELTA:
+            delta->calculateMove(machineStart.toIntVector3(), machineEnd.toIntVector3(), stepsPerM.toVector3(), idealTimeForMove, steps);
+            break;
+        case AXIS_CONFIG_XY:
+        case AXIS_CONFIG_H_BELT:
+        case AXIS_CONFIG_CORE_XY:
+            calculateXYMove(machineStart.toIntVector3(), machineEnd.toIntVector3(), stepsPerM.toVector3(), idealTimeForMove, steps);
+            break;
+        default:
+            assert(0);
+        }
 
-    calculateExtruderMove(machineStart, machineEnd, idealTimeForMove, steps);
+        calculateExtruderMove(machineStart, machineEnd, idealTimeForMove, steps);
 
-    assert(!steps.empty());
+        assert(!steps.empty());
+    }
 
     if ((isAxisMove(E_AXIS) && !isAxisOnlyMove(E_AXIS)) || (isAxisMove(H_AXIS) && !isAxisOnlyMove(H_AXIS)))
     {
@@ -296,6 +324,7 @@ double Path::runFinalStepCalculations()
 {
     updateStepperPathParameters();
 
+    // lazy steps are dilated as they're calculated
     for (auto& axisSteps : steps)
     {
         for (auto& step : axisSteps)
@@ -34,6 +34,7 @@
 #include <assert.h>
 #include <atomic>
 #include <future>
+#include <memory>
 #if __has_include(<optional>)
 #include <optional>
 #else
@@ -60,6 +61,7 @@ using namespace experimental;
 #define FLAG_SYNC_WAIT (1 << 6)
 #define FLAG_USE_PRESSURE_ADVANCE (1 << 7)
 #define FLAG_PROBE (1 << 8)
+#define FLAG_LAZY_STEPS (1 << 9)
 
 /** Are the step parameter computed */
 #define FLAG_JOIN_STEPPARAMS_COMPUTED (1 << 0)
@@ -144,12 +146,19 @@ struct StepperPathParameters
 
     inline void zero()
     {
+        baseSpeed = 0;
         startSpeed = 0;
         cruiseSpeed = 0;
         endSpeed = 0;
         accel = 0;
         distance = 0;
 
+        baseAccelEnd = 0;
+        baseCruiseEnd = 0;
+        baseMoveEnd = 0;
+
+        moveEnd = 0;
+
         accelSteps = 0;
         cruiseSteps = 0;
         decelSteps = 0;
@@ -181,6 +190,13 @@ private:
     double accel; /// Acceleration in m/s^2
     IntVectorN startMachinePos; /// Starting position of the machine
 
+    // Only kept for paths with lazy steps, which calculate their steps in PathStepGenerator
+    IntVectorN endMachinePos; /// Ending position of the machine
+    VectorN stepsPerM;
+    double baseMoveTime; /// Time for the move at full speed, before acceleration is applied
+    int axisConfig;
+    std::shared_ptr<const Delta> delta; /// The geometry the machine positions were calculated with, for delta paths
+
     StepperPathParameters stepperPath;
     std::array<std::vector<Step>, NUM_AXES> steps;
 
@@ -207,9 +223,10 @@ public:
         double requestedSpeed,
         double requestedAccel,
         int axisConfig,
-        const Delta& delta,
+        const std::shared_ptr<const Delta>& delta,
         bool cancelable,
-        bool is_probe);
+        bool is_probe,
+        bool lazySteps = false);
 
     double runFinalStepCalculations();
 
@@ -356,6 +373,11 @@ public:
         return flags & FLAG_PROBE;
     }
 
+    inline bool hasLazySteps() const
+    {
+        return flags & FLAG_LAZY_STEPS;
+    }
+
     inline bool isNoMove() const
     {
         return (moveMask & 255) == 0;
@@ -475,6 +497,36 @@ public:
         return steps;
     }
 
+    const IntVectorN& getEndMachinePos() const
+    {
+        return endMachinePos;
+    }
+
+    const VectorN& getStepsPerM() const
+    {
+        return stepsPerM;
+    }
+
+    double getBaseMoveTime() const
+    {
+        return baseMoveTime;
+    }
+
+    int getAxisConfig() const
+    {
+        return axisConfig;
+    }
+
+    const Delta& getDelta() const
+    {
+        return *delta;
+    }
+
+    const StepperPathParameters& getStepperPathParameters() const
+    {
+        return stepperPath;
+    }
+
     void updateStepperPathParameters();
 };
 
@@ -22,20 +22,34 @@ void sanityCheckPathSpeeds(const Path& path)
     sanityCheckStartAndEndSpeeds(path.getStartSpeed(), path.getEndSpeed(), path.getDistance(), path.getAcceleration());
 }
 
+PathOptimizer::PathOptimizer()
+    : safeSpeedStops(0)
+{
+}
+
 int64_t PathOptimizer::beforePathRemoval(std::vector<Path>& queue, PathQueueIndex first, PathQueueIndex last)
 {
     int64_t timeChange = -queue[first.value].getEstimatedTime();
 
-    if (first != last)
+    Path& firstPath = queue[first.value];
+
+    // Calculate the maximum possible end speed for firstPath.
+    // We're using the formula vf^2 = v0^2 + 2*a*d.
+    const double maximumEndSpeed = std::min(firstPath.getFullSpeed(),
+        std::sqrt(firstPath.getStartSpeed() * firstPath.getStartSpeed() + firstPath.getAccelerationDistance2()));
+
+    if (first == last)
+    {
+        // nothing is planned after this path, so it has to end at the safe speed
+        if (firstPath.getEndSpeed() < maximumEndSpeed - NEGLIGIBLE_ERROR)
+        {
+            safeSpeedStops++;
+        }
+    }
+    else
     {
-        Path& firstPath = queue[first.value];
         Path& secondPath = queue[(first + 1).value];
 
-        // Calculate the maximum possible end speed for firstPath.
-        // We're using the formula vf^2 = v0^2 + 2*a*d.
-        const double maximumEndSpeed = std::min(firstPath.getFullSpeed(),
-            std::sqrt(firstPath.getStartSpeed() * firstPath.getStartSpeed() + firstPath.getAccelerationDistance2()));
-
         // The end speed was already set in the onPathAdded loop to be the maximum we could allow
         // while still decelerating when we run out of paths. We may need to lower it here to accelerate
         // properly, but we can't make it faster.
@@ -131,6 +145,16 @@ int64_t PathOptimizer::onPathAdded(std::vector<Path>& queue, PathQueueIndex firs
     return timeChange;
 }
 
+uint64_t PathOptimizer::getSafeSpeedStops()
+{
+    return safeSpeedStops;
+}
+
+void PathOptimizer::resetSafeSpeedStops()
+{
+    safeSpeedStops = 0;
+}
+
 bool PathOptimizer::doesJunctionSpeedViolateMaxSpeedJumps(const VectorN& entrySpeeds, const VectorN& exitSpeeds)
 {
     const VectorN speedJumps = entrySpeeds - exitSpeeds;
@@ -1,5 +1,7 @@
 #pragma once
 
+#include <atomic>
+
 #include "PathOptimizerInterface.h"
 
 class PathOptimizer final : public PathOptimizerInterface
@@ -8,6 +10,7 @@ private:
     friend struct PathOptimizerTests;
 
     VectorN maxSpeedJumps;
+    std::atomic<uint64_t> safeSpeedStops;
 
     std::tuple<double, double> calculateJunctionSpeed(const Path& previousPath, const Path& newPath);
     double calculateReachableJunctionSpeed(const Path& firstPath, const double firstOverallSpeed, const Path& secondSpeeds);
@@ -15,7 +18,13 @@ private:
     bool doesJunctionSpeedViolateMaxSpeedJumps(const VectorN& entrySpeeds, const VectorN& exitSpeeds);
 
 public:
+    PathOptimizer();
+
     int64_t beforePathRemoval(std::vector<Path>& queue, PathQueueIndex first, PathQueueIndex last) override;
     int64_t onPathAdded(std::vector<Path>& queue, PathQueueIndex first, PathQueueIndex last) override;
     void setMaxSpeedJumps(const VectorN& maxSpeedJumps);
+
+    /// paths removed with nothing planned after them that had to slow down to the safe speed at their end
+    uint64_t getSafeSpeedStops();
+    void resetSafeSpeedStops();
 };
\ No newline at end of file
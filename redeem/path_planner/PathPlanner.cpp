@@ -25,6 +25,7 @@
 
 #include "PathPlanner.h"
 #include "AlarmCallback.h"
+#include "StepperCommandWriter.h"
 #include <algorithm>
 #include <array>
 #include <assert.h>
@@ -34,8 +35,9 @@
 PathPlanner::PathPlanner(unsigned int cacheSize, AlarmCallback& alarmCallback, PruInterface& pru)
     : alarmCallback(alarmCallback)
     , pru(pru)
+    , pruSimulator(nullptr)
     , optimizer()
-    , pathQueue(optimizer, cacheSize, 10 * F_CPU) // TODO pass time
+    , pathQueue(optimizer, cacheSize, 10 * F_CPU)
 {
     // Force out a log message even if the log level would suppress it
     Logger() << "INFO     "
@@ -44,6 +46,12 @@ PathPlanner::PathPlanner(unsigned int cacheSize, AlarmCallback& alarmCallback, P
     acceptingPaths = true;
 
     axis_config = AXIS_CONFIG_XY;
+    lazy_step_generation = false;
+    compress_step_commands = false;
+    arc_segment_length = 0.001;
+    arc_tolerance = 0.00002;
+    stepCommandsSent = 0;
+    stepCommandSlotsUsed = 0;
     has_slaves = false;
     master.clear();
     slave.clear();
@@ -62,6 +70,7 @@ PathPlanner::PathPlanner(unsigned int cacheSize, AlarmCallback& alarmCallback, P
     matrix_bed_comp[0] = 1.0;
     matrix_bed_comp[4] = 1.0;
     matrix_bed_comp[8] = 1.0;
+    bed_mesh_offset = 0;
 
     recomputeParameters();
 
@@ -75,6 +84,12 @@ PathPlanner::PathPlanner(unsigned int cacheSize, AlarmCallback& alarmCallback)
 }
 #endif
 
+PathPlanner::PathPlanner(unsigned int cacheSize, AlarmCallback& alarmCallback, double simulatedPruSpeed)
+    : PathPlanner(cacheSize, alarmCallback, *new PruSimulator([this]() { this->pruAlarmCallback(); }, simulatedPruSpeed))
+{
+    pruSimulator = static_cast<PruSimulator*>(&pru);
+}
+
 void PathPlanner::recomputeParameters()
 {
     for (int i = 0; i < NUM_AXES; i++)
@@ -164,6 +179,14 @@ void PathPlanner::queueMove(VectorN endWorldPos,
         LOG("Before matrix X: " << endWorldPos[0] << " Y: " << endWorldPos[1] << " Z: " << endWorldPos[2] << "\n");
         applyBedCompensation(endWorldPos);
         LOG("After matrix X: " << endWorldPos[0] << " Y: " << endWorldPos[1] << " Z: " << endWorldPos[2] << "\n");
+
+        // probes have to find the bed where it is, so they don't follow the mesh
+        if (bed_mesh.isActive() && !is_probe)
+        {
+            queueBedMeshSegments(startWorldPos, endWorldPos, speed, accel, cancelable, optimize,
+                use_backlash_compensation, tool_axis);
+            return;
+        }
     }
 
     // clear any movements on slave axes so they don't mess things up later
@@ -228,7 +251,8 @@ void PathPlanner::queueMove(VectorN endWorldPos,
 
     p.initialize(state, tweakedEndPos, startWorldPos, machineToWorld(endPos), axisStepsPerM,
         maxSpeeds, maxAccelerationMPerSquareSecond,
-        speed, accel, axis_config, delta_bot, cancelable, is_probe);
+        speed, accel, axis_config, axis_config == AXIS_CONFIG_DELTA ? getQueuedDelta() : nullptr,
+        cancelable, is_probe, lazy_step_generation);
 
     if (p.isNoMove())
     {
@@ -306,9 +330,203 @@ void PathPlanner::queueMove(VectorN endWorldPos,
 
     //    LOGINFO("Move queued for the worker" << std::endl);
 
+    // the mesh sets its own height once the move is queued
+    bed_mesh_offset = 0;
     queue_move_fail = false;
 }
 
+const std::shared_ptr<const Delta>& PathPlanner::getQueuedDelta()
+{
+    // Python changes delta_bot while the planner thread calculates the steps of paths queued
+    // before, so every path keeps a copy of the geometry its machine positions came from.
+    // The paths share it until delta_bot changes.
+    if (!queuedDelta || !(*queuedDelta == delta_bot))
+    {
+        queuedDelta = std::make_shared<const Delta>(delta_bot);
+    }
+
+    return queuedDelta;
+}
+
+VectorN PathPlanner::queueMoves(double* endPositions, int numMoves, int numAxes,
+    double* speeds, int numSpeeds,
+    double* accels, int numAccels,
+    int* flags, int numFlags,
+    unsigned char* status, int numStatus,
+    int tool_axis)
+{
+    if (numAxes != NUM_AXES || numSpeeds != numMoves || numAccels != numMoves
+        || numFlags != numMoves || numStatus != numMoves)
+    {
+        throw InputSizeError();
+    }
+
+    for (int i = 0; i < numMoves; i++)
+    {
+        VectorN endPos;
+        for (int j = 0; j < NUM_AXES; j++)
+        {
+            endPos[j] = endPositions[i * NUM_AXES + j];
+        }
+
+        const int moveFlags = flags[i];
+
+        queueMove(endPos, speeds[i], accels[i],
+            moveFlags & QUEUE_MOVE_CANCELABLE,
+            moveFlags & QUEUE_MOVE_OPTIMIZE,
+            moveFlags & QUEUE_MOVE_SOFT_ENDSTOPS,
+            moveFlags & QUEUE_MOVE_BED_MATRIX,
+            moveFlags & QUEUE_MOVE_BACKLASH_COMPENSATION,
+            moveFlags & QUEUE_MOVE_PROBE,
+            tool_axis);
+
+        status[i] = queue_move_fail;
+    }
+
+    return getState();
+}
+
+void PathPlanner::queueArc(VectorN startPos, VectorN endPos,
+    double center0, double center1, int plane, bool clockwise,
+    double speed, double accel, int flags,
+    std::vector<double> bedMatrix, int tool_axis)
+{
+    if (bedMatrix.size() != 9)
+    {
+        throw InputSizeError();
+    }
+
+    // the axes of the plane, X is 0, Y is 1 and Z is 2
+    int axis0 = 0;
+    int axis1 = 1;
+
+    if (plane == ARC_PLANE_X_Z)
+    {
+        axis1 = 2;
+    }
+    else if (plane == ARC_PLANE_Y_Z)
+    {
+        axis0 = 1;
+        axis1 = 2;
+    }
+
+    const double radius = std::hypot(startPos[axis0] - center0, startPos[axis1] - center1);
+    const double startAngle = std::atan2(startPos[axis1] - center1, startPos[axis0] - center0);
+    double sweep = std::atan2(endPos[axis1] - center1, endPos[axis0] - center0) - startAngle;
+
+    // clockwise arcs turn in the negative direction, and an arc that ends where it starts is a full circle
+    if (clockwise && sweep >= 0)
+    {
+        sweep -= 2 * M_PI;
+    }
+    else if (!clockwise && sweep <= 0)
+    {
+        sweep += 2 * M_PI;
+    }
+
+    double segmentLength = arc_segment_length;
+
+    if (arc_tolerance > 0 && arc_tolerance < radius)
+    {
+        // the middle of a chord spanning an angle a is r * (1 - cos(a / 2)) away from the arc
+        segmentLength = std::min(segmentLength, 2 * radius * std::acos(1 - arc_tolerance / radius));
+    }
+
+    const int segments = std::max(1, static_cast<int>(std::ceil(radius * std::abs(sweep) / segmentLength)));
+
+    LOG("queueing arc of radius " << radius << " through " << sweep << " rad in " << segments << " segments" << std::endl);
+
+    bool queued = false;
+
+    for (int i = 1; i <= segments; i++)
+    {
+        VectorN segmentEnd = endPos;
+
+        if (i != segments)
+        {
+            const double fraction = static_cast<double>(i) / segments;
+            const double angle = startAngle + sweep * fraction;
+
+            segmentEnd = startPos + (endPos - startPos) * fraction;
+            segmentEnd[axis0] = center0 + radius * std::cos(angle);
+            segmentEnd[axis1] = center1 + radius * std::sin(angle);
+        }
+
+        const double x = segmentEnd[0];
+        const double y = segmentEnd[1];
+        const double z = segmentEnd[2];
+
+        segmentEnd[0] = x * bedMatrix[0] + y * bedMatrix[1] + z * bedMatrix[2];
+        segmentEnd[1] = x * bedMatrix[3] + y * bedMatrix[4] + z * bedMatrix[5];
+        segmentEnd[2] = x * bedMatrix[6] + y * bedMatrix[7] + z * bedMatrix[8];
+
+        queueMove(segmentEnd, speed, accel,
+            flags & QUEUE_MOVE_CANCELABLE,
+            flags & QUEUE_MOVE_OPTIMIZE,
+            flags & QUEUE_MOVE_SOFT_ENDSTOPS,
+            flags & QUEUE_MOVE_BED_MATRIX,
+            flags & QUEUE_MOVE_BACKLASH_COMPENSATION,
+            false,
+            tool_axis);
+
+        if (!queue_move_fail)
+        {
+            queued = true;
+        }
+        else if (!acceptingPaths)
+        {
+            break;
+        }
+    }
+
+    // segments too short to take a step aren't failures as long as the arc moved
+    queue_move_fail = !queued;
+}
+
+void PathPlanner::queueBedMeshSegments(VectorN startWorldPos, const VectorN& endWorldPos,
+    double speed, double accel, bool cancelable, bool optimize,
+    bool use_backlash_compensation, int tool_axis)
+{
+    // where the move starts without the height of the mesh
+    startWorldPos[2] -= bed_mesh_offset;
+
+    // the heights are interpolated differently in each cell, so the segments end where the move leaves one
+    std::vector<double> fractions = bed_mesh.getCellCrossings(startWorldPos[0], startWorldPos[1],
+        endWorldPos[0], endWorldPos[1]);
+    fractions.push_back(1.0);
+
+    bool queued = false;
+
+    for (const double fraction : fractions)
+    {
+        VectorN segmentEnd = endWorldPos;
+
+        if (fraction != 1.0)
+        {
+            segmentEnd = startWorldPos + (endWorldPos - startWorldPos) * fraction;
+        }
+
+        const double height = bed_mesh.getHeight(segmentEnd[0], segmentEnd[1]);
+        segmentEnd[2] += height;
+
+        queueMove(segmentEnd, speed, accel, cancelable, optimize, false, false,
+            use_backlash_compensation, false, tool_axis);
+
+        if (!queue_move_fail)
+        {
+            queued = true;
+            bed_mesh_offset = height;
+        }
+        else if (!acceptingPaths)
+        {
+            break;
+        }
+    }
+
+    // like arcs, segments too short to take a step aren't failures as long as the move happened
+    queue_move_fail = !queued;
+}
+
 void PathPlanner::runThread()
 {
     stop = false;
@@ -363,7 +581,6 @@ void PathPlanner::run()
     LOGINFO("PathPlanner loop starting" << std::endl);
 
     const unsigned int maxCommandsPerBlock = pru.getMaxBytesPerBlock() / sizeof(SteppersCommand);
-    std::unique_ptr<SteppersCommand[]> commandBlock(new SteppersCommand[maxCommandsPerBlock]);
 
     while (!stop)
     {
@@ -407,13 +624,22 @@ void PathPlanner::run()
 
         LOG("Sending, Start speed=" << cur.getStartSpeed() << ", end speed=" << cur.getEndSpeed() << std::endl);
 
+        std::unique_ptr<StepSource> steps;
+        if (cur.hasLazySteps())
+        {
+            steps = std::make_unique<PathStepGenerator>(cur);
+        }
+        else
+        {
+            steps = std::make_unique<StoredStepSource>(cur.getSteps());
+        }
+
         runMove(cur.getAxisMoveMask(),
             cur.isCancelable() ? cur.getAxisMoveMask() : 0,
             cur.isSyncEvent(),
             cur.isSyncWaitEvent(),
             moveEndTime,
-            cur.getSteps(),
-            commandBlock,
+            *steps,
             maxCommandsPerBlock,
             cur.isProbeMove() ? &probeDistanceTraveled : nullptr,
             cur.getSyncCallback());
@@ -442,6 +668,18 @@ inline uint64_t roundStepTime(double stepTime)
     return static_cast<uint64_t>(std::llround(stepTime * (F_CPU_FLOAT / MINIMUM_STEP_INTERVAL))) * MINIMUM_STEP_INTERVAL;
 }
 
+// the rounded time of an axis' next step in runMove
+struct NextStep
+{
+    uint64_t time;
+    int axis;
+
+    bool operator>(const NextStep& o) const
+    {
+        return time > o.time || (time == o.time && axis > o.axis);
+    }
+};
+
 void PathPlanner::runMove(
     const int moveMask,
     const int cancellableMask,
@@ -449,45 +687,71 @@ void PathPlanner::runMove(
     const bool wait,
     const double moveEndTime,
     std::array<std::vector<Step>, NUM_AXES>& steps,
-    std::unique_ptr<SteppersCommand[]> const& commands,
-    const size_t commandsLength,
+    const size_t maxCommandsPerBlock,
+    IntVectorN* probeDistanceTraveled,
+    SyncCallback* callback)
+{
+    StoredStepSource stepSource(steps);
+
+    runMove(moveMask, cancellableMask, sync, wait, moveEndTime, stepSource, maxCommandsPerBlock, probeDistanceTraveled, callback);
+}
+
+void PathPlanner::runMove(
+    const int moveMask,
+    const int cancellableMask,
+    const bool sync,
+    const bool wait,
+    const double moveEndTime,
+    StepSource& stepSource,
+    const size_t maxCommandsPerBlock,
     IntVectorN* probeDistanceTraveled,
     SyncCallback* callback)
 {
 
     std::array<unsigned long long, NUM_AXES> finalStepTimes;
     std::array<size_t, NUM_AXES> stepIndex;
-    size_t commandsIndex = 0;
     std::vector<SteppersCommand> probeSteps;
-    unsigned int totalSteps = 0;
-    uint64_t currentBlockStartTime = 0;
 
     // options applied to a normal command (there are extra options for the last command in a list)
     const uint8_t normalStepOptions = probeDistanceTraveled != nullptr ? STEPPER_COMMAND_OPTION_CARRY_BLOCKED_STEPPERS : 0;
 
+    // probes count the commands the PRU didn't run, so they need one command per step
+    StepperCommandWriter writer(pru, maxCommandsPerBlock, compress_step_commands && probeDistanceTraveled == nullptr,
+        probeDistanceTraveled != nullptr ? &probeSteps : nullptr);
+
     if (probeDistanceTraveled != nullptr)
     {
         pru.resetStepsRemaining();
     }
 
-    assert(commandsLength > 1); // we do not handle single-index command buffers correctly
-
     finalStepTimes.fill(0);
     stepIndex.fill(0);
 
-    for (size_t i = 0; i < commandsLength; i++)
+    // the steps currently being sent for each axis, stepSource hands out more as these run out
+    std::array<const std::vector<Step>*, NUM_AXES> steps;
+
+    // the next step of every axis that still has steps, as a min-heap on the rounded step time
+    std::array<NextStep, NUM_AXES> nextSteps;
+    size_t numNextSteps = 0;
+
+    for (int i = 0; i < NUM_AXES; i++)
     {
-        commands[i] = {};
+        steps[i] = &stepSource.nextSteps(i);
+
+        // axes outside the move mask can have steps too, a delta tower that comes back
+        // to the step it started at has no net move but still climbs and descends
+        if (!steps[i]->empty())
+        {
+            nextSteps[numNextSteps++] = { roundStepTime(steps[i]->front().time), i };
+        }
     }
 
-    unsigned long long lastStepTime = 0;
+    std::make_heap(nextSteps.begin(), nextSteps.begin() + numNextSteps, std::greater<NextStep>());
 
-    // reserve a command to be an opening delay with no steps
-    uint32_t* lastDelay = &commands[commandsIndex].delay;
-    commands[commandsIndex].options = normalStepOptions;
+    unsigned long long lastStepTime = 0;
 
-    commandsIndex++;
-    totalSteps++;
+    // the command that waits for the next step, starting with an opening delay with no steps
+    SteppersCommand command = { 0, 0, 0, normalStepOptions, 0 };
 
     // Note that this opening delay doesn't have cancellableMask set - this is intentional because
     // a command that doesn't step anything shouldn't count towards the number of cancelled commands.
@@ -496,145 +760,99 @@ void PathPlanner::runMove(
     uint64_t stepTime = 0;
     while (foundStep)
     {
-        foundStep = false;
-
         // find a step time
-        stepTime = UINT64_MAX;
+        foundStep = numNextSteps != 0;
 
-        for (int i = 0; i < NUM_AXES; i++)
+        if (foundStep)
         {
-            const auto& axisSteps = steps[i];
-            const auto axisStepIndex = stepIndex[i];
-
-            if (axisSteps.size() > axisStepIndex)
-            {
-                stepTime = std::min(stepTime, roundStepTime(axisSteps[axisStepIndex].time));
-                foundStep = true;
-            }
+            stepTime = nextSteps[0].time;
         }
-
-        if (!foundStep)
+        else
         {
-            assert(stepTime == UINT64_MAX);
             stepTime = roundStepTime(moveEndTime);
             LOG("last step - previousStepTime was " << lastStepTime << " and the move should end at " << stepTime << std::endl);
         }
 
         // set the previous delay
-        assert(lastDelay != nullptr);
         assert(stepTime > lastStepTime || (!foundStep && stepTime == lastStepTime));
         assert(stepTime - lastStepTime >= MINIMUM_STEP_INTERVAL || !foundStep);
         assert(stepTime - lastStepTime < F_CPU / 2);
 
-        *lastDelay = (uint32_t)(stepTime - lastStepTime);
-
-        // find a command to hold the step we're about to take
-        if (commandsIndex == commandsLength)
-        {
-            pru.pushBlock((uint8_t*)&commands[0], sizeof(SteppersCommand) * commandsIndex, sizeof(SteppersCommand), stepTime - currentBlockStartTime);
-
-            if (probeDistanceTraveled)
-            {
-                probeSteps.insert(probeSteps.end(), &commands[0], &commands[commandsLength]);
-            }
-
-            commandsIndex = 0;
-            currentBlockStartTime = stepTime;
-
-            for (size_t i = 0; i < commandsLength; i++)
-            {
-                commands[i] = {};
-            }
-        }
+        command.delay = (uint32_t)(stepTime - lastStepTime);
 
         if (!foundStep)
         {
             break;
         }
 
-        SteppersCommand& cmd = commands[commandsIndex];
-        commandsIndex++;
-        totalSteps++;
+        writer.send(command);
 
-        cmd.cancellableMask = cancellableMask;
-        cmd.options = normalStepOptions;
-
-        lastDelay = &cmd.delay;
+        command = { 0, 0, static_cast<uint8_t>(cancellableMask), normalStepOptions, 0 };
         lastStepTime = stepTime;
 
         // add all the axes that can step at this time
-        for (int i = 0; i < NUM_AXES; i++)
+        while (numNextSteps != 0 && nextSteps[0].time == stepTime)
         {
-            const auto& axisSteps = steps[i];
-            const auto axisStepIndex = stepIndex[i];
+            std::pop_heap(nextSteps.begin(), nextSteps.begin() + numNextSteps, std::greater<NextStep>());
+            const int i = nextSteps[numNextSteps - 1].axis;
 
-            if (axisSteps.size() > axisStepIndex && roundStepTime(axisSteps[axisStepIndex].time) == stepTime)
-            {
-                const auto& step = axisSteps[axisStepIndex];
+            const auto& step = (*steps[i])[stepIndex[i]];
+
+            assert(!(command.step & (1 << i))); // this means we're double-stepping an axis
+            assert(step.axis == i);
+
+            command.step |= axes_stepping_together[i];
+            command.direction |= (step.direction ? 0xff : 0) & axes_stepping_together[i];
 
-                assert(!(cmd.step & (1 << i))); // this means we're double-stepping an axis
-                assert(step.axis == i);
+            stepIndex[i]++;
+            finalStepTimes[i] = stepTime;
 
-                cmd.step |= axes_stepping_together[i];
-                cmd.direction |= (step.direction ? 0xff : 0) & axes_stepping_together[i];
+            if (stepIndex[i] == steps[i]->size())
+            {
+                steps[i] = &stepSource.nextSteps(i);
+                stepIndex[i] = 0;
+            }
 
-                stepIndex[i]++;
-                finalStepTimes[i] = stepTime;
+            if (stepIndex[i] < steps[i]->size())
+            {
+                // round the axis' next step time once, when it becomes the axis' next step
+                nextSteps[numNextSteps - 1] = { roundStepTime((*steps[i])[stepIndex[i]].time), i };
+                std::push_heap(nextSteps.begin(), nextSteps.begin() + numNextSteps, std::greater<NextStep>());
+            }
+            else
+            {
+                numNextSteps--;
             }
         }
 
-        assert(cmd.step != 0);
+        assert(command.step != 0);
     }
 
+    // the last command carries the synchronization options
     if (sync || callback != nullptr)
     {
-        // if we have a callback, we need to make sure there's at least one more command to push
-        if (commandsIndex == 0)
-        {
-            commandsIndex = 1;
-            totalSteps++;
-            LOG("needed a dummy step for synchronization" << std::endl);
-            assert(commandsIndex < commandsLength);
-            assert(commands[commandsIndex].step == 0 && commands[commandsIndex].delay == 0);
-        }
-
-        assert(commandsIndex > 0 && commandsIndex <= commandsLength);
-
-        SteppersCommand& cmd = commands[commandsIndex - 1];
-
-        cmd.options |= normalStepOptions;
-
         if (wait)
         {
-            cmd.options |= STEPPER_COMMAND_OPTION_SYNCWAIT_EVENT;
+            command.options |= STEPPER_COMMAND_OPTION_SYNCWAIT_EVENT;
         }
 
         if (sync)
         {
-            cmd.options |= STEPPER_COMMAND_OPTION_SYNC_EVENT;
+            command.options |= STEPPER_COMMAND_OPTION_SYNC_EVENT;
         }
     }
 
-    if (commandsIndex != 0)
-    {
-        if (probeDistanceTraveled)
-        {
-            probeSteps.insert(probeSteps.end(), &commands[0], &commands[commandsIndex]);
-        }
+    writer.send(command);
+    writer.finish(callback);
 
-        pru.pushBlock((uint8_t*)&commands[0], sizeof(SteppersCommand) * commandsIndex, sizeof(SteppersCommand), stepTime - currentBlockStartTime, callback);
+    stepCommandsSent += writer.getCommandsSent();
+    stepCommandSlotsUsed += writer.getSlotsUsed();
 
-        for (size_t i = 0; i < commandsLength; i++)
-        {
-            commands[i] = {};
-        }
-    }
-
-    LOG("move needed " << totalSteps << " steps" << std::endl);
+    LOG("move needed " << writer.getCommandsSent() << " steps in " << writer.getSlotsUsed() << " command slots" << std::endl);
 
     for (int i = 0; i < NUM_AXES; i++)
     {
-        assert(stepIndex[i] == steps[i].size());
+        assert(stepIndex[i] == steps[i]->size());
     }
 
     if (probeDistanceTraveled)
@@ -708,6 +926,34 @@ VectorN PathPlanner::getState()
     return machineToWorld(state);
 }
 
+size_t PathPlanner::getAvailablePathSlots()
+{
+    return pathQueue.availablePathSlots();
+}
+
+PathQueueStats PathPlanner::getPathQueueStats()
+{
+    PathQueueStats stats = pathQueue.getStats();
+    stats.safeSpeedStops = optimizer.getSafeSpeedStops();
+    return stats;
+}
+
+void PathPlanner::resetPathQueueStats()
+{
+    pathQueue.resetStats();
+    optimizer.resetSafeSpeedStops();
+}
+
+uint64_t PathPlanner::getStepCommandsSent()
+{
+    return stepCommandsSent;
+}
+
+uint64_t PathPlanner::getStepCommandSlotsUsed()
+{
+    return stepCommandSlotsUsed;
+}
+
 bool PathPlanner::getLastQueueMoveStatus()
 {
     return queue_move_fail;
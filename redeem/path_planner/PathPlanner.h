@@ -26,11 +26,14 @@
 #ifndef __PathPlanner__PathPlanner__
 #define __PathPlanner__PathPlanner__
 
+#include "BedMesh.h"
 #include "Delta.h"
 #include "Path.h"
 #include "PathOptimizer.h"
 #include "PathQueue.h"
+#include "PruSimulator.h"
 #include "PruTimer.h"
+#include "StepSource.h"
 #include "config.h"
 #include "vectorN.h"
 #include <assert.h>
@@ -38,6 +41,7 @@
 #include <functional>
 #include <future>
 #include <iostream>
+#include <memory>
 #include <mutex>
 #include <string.h>
 #include <thread>
@@ -84,6 +88,7 @@ private:
     std::atomic_bool acceptingPaths;
 
     PruInterface& pru;
+    PruSimulator* pruSimulator; // the same as pru when it's simulated, null otherwise
     PathOptimizer optimizer;
     PathQueue<PathOptimizer> pathQueue;
     void recomputeParameters();
@@ -96,8 +101,18 @@ private:
         const bool wait,
         const double moveEndTime,
         std::array<std::vector<Step>, NUM_AXES>& steps,
-        std::unique_ptr<SteppersCommand[]> const& commands,
-        const size_t commandsLength,
+        const size_t maxCommandsPerBlock,
+        IntVectorN* probeDistanceTraveled = nullptr,
+        SyncCallback* syncCallback = nullptr);
+
+    void runMove(
+        const int moveMask,
+        const int cancellableMask,
+        const bool sync,
+        const bool wait,
+        const double moveEndTime,
+        StepSource& stepSource,
+        const size_t maxCommandsPerBlock,
         IntVectorN* probeDistanceTraveled = nullptr,
         SyncCallback* syncCallback = nullptr);
 
@@ -117,9 +132,35 @@ private:
     // bed compensation
     std::vector<double> matrix_bed_comp;
 
+    // the probed height of the bed, added to Z after the matrix
+    BedMesh bed_mesh;
+
+    // the height of the mesh added to Z in the current state
+    double bed_mesh_offset;
+
+    void queueBedMeshSegments(VectorN startWorldPos, const VectorN& endWorldPos,
+        double speed, double accel, bool cancelable, bool optimize,
+        bool use_backlash_compensation, int tool_axis);
+
     // axis configuration (see config.h for options)
     int axis_config;
 
+    // calculate steps while running paths instead of when queueing them
+    bool lazy_step_generation;
+
+    // send runs of step commands that only differ by a constant delay change as repeats
+    bool compress_step_commands;
+
+    // arcs are split into segments no longer than this, in m
+    double arc_segment_length;
+
+    // and short enough to stay within this distance of the arc, in m
+    double arc_tolerance;
+
+    // step commands run by the PRU and the command slots they were sent in
+    std::atomic<uint64_t> stepCommandsSent;
+    std::atomic<uint64_t> stepCommandSlotsUsed;
+
     // the current state of the machine
     IntVectorN state;
 
@@ -142,6 +183,10 @@ private:
     Vector3 worldToCoreXY(const Vector3&);
     Vector3 coreXYToWorld(const Vector3&);
 
+    // delta geometry shared by the paths queued since it last changed
+    std::shared_ptr<const Delta> queuedDelta;
+    const std::shared_ptr<const Delta>& getQueuedDelta();
+
 public:
     Delta delta_bot;
 
@@ -153,6 +198,18 @@ public:
     PathPlanner(unsigned int cacheSize, AlarmCallback& alarmCallback, PruInterface& pru);
     PathPlanner(unsigned int cacheSize, AlarmCallback& alarmCallback);
 
+    /**
+   * @brief Create a path planner that runs its moves on a simulated PRU
+   * @param simulatedPruSpeed How fast the simulated PRU runs, 1 for real time and 0 for as fast as possible
+   */
+    PathPlanner(unsigned int cacheSize, AlarmCallback& alarmCallback, double simulatedPruSpeed);
+
+    /// the simulated PRU or null when the planner uses a real one
+    PruSimulator* getPruSimulator()
+    {
+        return pruSimulator;
+    }
+
     /**
    * @brief  Init the internal PRU co-processors
    * @details Init the internal PRU co-processors with the provided firmware
@@ -194,6 +251,55 @@ public:
         bool cancelable, bool optimize,
         bool enable_soft_endstops, bool use_bed_matrix,
         bool use_backlash_compensation, bool is_probe, int tool_axis = 3);
+
+    /**
+   * @brief Queue a batch of line moves for execution
+   * @details Equivalent to calling queueMove once per row, but crosses the
+   * Python/C++ boundary only once. Moves are queued in order; a failed move
+   * does not stop the remaining moves from being attempted.
+   *
+   * @param endPositions numMoves x numAxes row-major array of end positions in meters
+   * @param speeds per-move feedrate in m/s
+   * @param accels per-move acceleration in m/s^2
+   * @param flags per-move combination of the QUEUE_MOVE_* flags from config.h
+   * @param status filled with the getLastQueueMoveStatus() value of every move
+   * @param tool_axis which axis is our tool attached to
+   *
+   * @return the state of the machine after the last move
+   */
+    VectorN queueMoves(double* endPositions, int numMoves, int numAxes,
+        double* speeds, int numSpeeds,
+        double* accels, int numAccels,
+        int* flags, int numFlags,
+        unsigned char* status, int numStatus,
+        int tool_axis = 3);
+
+    /**
+   * @brief Queue an arc (G2/G3) for execution
+   * @details The arc is split into line segments that are queued like queueMove
+   * would queue them, without crossing the Python/C++ boundary for each one. The
+   * segments are as long as arc_segment_length allows, but short enough that the
+   * middle of each one stays within arc_tolerance of the arc. Axes outside the
+   * plane of the arc move linearly from start to end, for helical moves.
+   *
+   * @param startPos The start position of the arc in meters, without bed compensation
+   * @param endPos The end position of the arc in meters, without bed compensation
+   * @param center0 The first coordinate of the arc's center in its plane
+   * @param center1 The second coordinate of the arc's center in its plane
+   * @param plane one of the ARC_PLANE_* values from config.h
+   * @param clockwise true for G2 and false for G3
+   * @param speed The feedrate (aka speed) of the move in m/s
+   * @param accel The acceleration of the move in m/s^2
+   * @param flags combination of the QUEUE_MOVE_* flags from config.h, except the
+   * probe flag. With the bed matrix flag the segments follow the bed mesh as well
+   * @param bedMatrix 3x3 row-major matrix applied to the end of each segment
+   * @param tool_axis which axis is our tool attached to
+   */
+    void queueArc(VectorN startPos, VectorN endPos,
+        double center0, double center1, int plane, bool clockwise,
+        double speed, double accel, int flags,
+        std::vector<double> bedMatrix, int tool_axis = 3);
+
     /**
    * @brief Run the path planner thread
    * @details Run the path planner thread that is in charge to compute the different delays and submit it to the PRU for execution.
@@ -266,7 +372,38 @@ public:
     void setStopPrintOnSoftEndstopHit(bool stop);
     void setStopPrintOnPhysicalEndstopHit(bool stop);
     void setBedCompensationMatrix(std::vector<double> matrix);
+
+    /**
+   * @brief Set the probed height of the bed
+   * @details Moves with bed compensation have the height of the bed under them added
+   * to Z, and are split where they cross the lines of the grid so they follow it.
+   * @param minX X of the first point of the grid in m
+   * @param minY Y of the first point of the grid in m
+   * @param stepX distance between the points along X in m
+   * @param stepY distance between the points along Y in m
+   * @param columns number of points along X
+   * @param heights rows of columns heights along X in m, from minY up
+   * @param bicubic interpolate bicubically instead of bilinearly
+   */
+    void setBedMesh(double minX, double minY, double stepX, double stepY, int columns,
+        std::vector<double> heights, bool bicubic);
+    void clearBedMesh();
     void setAxisConfig(int axis);
+    void setLazyStepGeneration(bool lazy);
+    void setStepCommandCompression(bool compress);
+
+    /// queueMove blocks while more than time seconds of moves are queued
+    void setMaxBufferedMoveTime(double time);
+
+    /**
+   * @brief Set how far ahead moves are planned
+   * @details A move stays in the planning window, where adding moves can still speed up its end,
+   * until the moves after it take time seconds or go distance meters. The size of the path queue
+   * only caps the window. 0 means no limit.
+   */
+    void setLookahead(double time, double distance);
+    void setArcSegmentLength(double length);
+    void setArcTolerance(double tolerance);
     void setState(VectorN set);
     void enableSlaves(bool enable);
     void addSlave(int master_in, int slave_in);
@@ -278,13 +415,22 @@ public:
 
     double getLastProbeDistance();
 
+    /// the number of paths that can still be queued before queueMove blocks
+    size_t getAvailablePathSlots();
+
+    /// how often adding and popping paths waited or contended for the planning window, and how long they took
+    PathQueueStats getPathQueueStats();
+    void resetPathQueueStats();
+
+    /// the number of step commands sent to the PRU so far, before compression
+    uint64_t getStepCommandsSent();
+
+    /// the number of command slots the step commands took up in the PRU's memory
+    uint64_t getStepCommandSlotsUsed();
+
     void reset();
 
     virtual ~PathPlanner();
 };
 
-class InputSizeError
-{
-};
-
 #endif /* defined(__PathPlanner__PathPlanner__) */
@@ -12,8 +12,38 @@
 #include "PathPlanner.h"
 #include "Delta.h"
 #include "AlarmCallback.h"
+#include <numpy/arrayobject.h>
 %}
 
+%init %{
+  import_array();
+%}
+
+// setup.py runs SWIG with -threads, so every call releases the GIL while it runs and the
+// callbacks below take it back before calling into Python. Without it the heaters, IOManager
+// and the comms threads would stop whenever the planner waits for room in its queue.
+%{
+#ifndef SWIG_PYTHON_THREADS
+#error "PathPlannerNative must be built with swig -threads"
+#endif
+%}
+
+// These can block for seconds, until the path queue or the PRU has room, the queued moves
+// are done or the planner thread stops, so they must never hold the GIL.
+%threadallow PathPlanner::queueMove;
+%threadallow PathPlanner::queueMoves;
+%threadallow PathPlanner::queueArc;
+%threadallow PathPlanner::queueSyncEvent;
+%threadallow PathPlanner::queueWaitEvent;
+%threadallow PathPlanner::waitUntilFinished;
+%threadallow PathPlanner::initPRU;
+%threadallow PathPlanner::runThread;
+%threadallow PathPlanner::stopThread;
+%threadallow PathPlanner::suspend;
+%threadallow PathPlanner::resume;
+%threadallow PathPlanner::reset;
+%threadallow PathPlanner::~PathPlanner;
+
 %include "config.h"
 
 %rename(PathPlannerNative) PathPlanner;
@@ -33,9 +63,104 @@
 }
 
 // Instantiate template for vector<>
+struct SimulatedStep
+{
+  uint64_t time;
+  bool direction;
+};
+
+struct PathQueueStats
+{
+  uint64_t pathsAdded;
+  uint64_t pathsRemoved;
+  uint64_t consumerCommits;
+  uint64_t planningContentions;
+  uint64_t producerWaits;
+  uint64_t consumerWaits;
+  uint64_t maxPlanningTime;
+  uint64_t maxPopTime;
+  uint64_t safeSpeedStops;
+};
+
 namespace std {
   %template(vector_double) vector<double>;
+  %template(vector_simulated_step) vector<SimulatedStep>;
+}
+
+// NumPy array arguments. SWIG -threads releases the GIL around the wrapped
+// call, after these conversions have run.
+%define NUMPY_IN_ARRAY1(type, typecode, data, length)
+%typemap(in) (type* data, int length) (PyArrayObject* arrayObject = NULL) {
+  arrayObject = (PyArrayObject*)PyArray_FROM_OTF($input, typecode, NPY_ARRAY_IN_ARRAY);
+  if (!arrayObject || PyArray_NDIM(arrayObject) != 1) {
+    if (!PyErr_Occurred()) {
+      PyErr_SetString(PyExc_ValueError, "Expecting a one dimensional array");
+    }
+    SWIG_fail;
+  }
+  $1 = (type*)PyArray_DATA(arrayObject);
+  $2 = (int)PyArray_DIM(arrayObject, 0);
+}
+%typemap(freearg) (type* data, int length) {
+  Py_XDECREF(arrayObject$argnum);
 }
+%enddef
+
+%define NUMPY_IN_ARRAY2(type, typecode, data, rows, cols)
+%typemap(in) (type* data, int rows, int cols) (PyArrayObject* arrayObject = NULL) {
+  arrayObject = (PyArrayObject*)PyArray_FROM_OTF($input, typecode, NPY_ARRAY_IN_ARRAY);
+  if (!arrayObject || PyArray_NDIM(arrayObject) != 2) {
+    if (!PyErr_Occurred()) {
+      PyErr_SetString(PyExc_ValueError, "Expecting a two dimensional array");
+    }
+    SWIG_fail;
+  }
+  $1 = (type*)PyArray_DATA(arrayObject);
+  $2 = (int)PyArray_DIM(arrayObject, 0);
+  $3 = (int)PyArray_DIM(arrayObject, 1);
+}
+%typemap(freearg) (type* data, int rows, int cols) {
+  Py_XDECREF(arrayObject$argnum);
+}
+%enddef
+
+%define NUMPY_INPLACE_ARRAY1(type, typecode, data, length)
+%typemap(in) (type* data, int length) {
+  if (!PyArray_Check($input) || PyArray_TYPE((PyArrayObject*)$input) != typecode
+      || PyArray_NDIM((PyArrayObject*)$input) != 1
+      || !PyArray_ISCARRAY((PyArrayObject*)$input)) {
+    PyErr_SetString(PyExc_TypeError, "Expecting a writeable contiguous one dimensional array of the right dtype");
+    SWIG_fail;
+  }
+  $1 = (type*)PyArray_DATA((PyArrayObject*)$input);
+  $2 = (int)PyArray_DIM((PyArrayObject*)$input, 0);
+}
+%enddef
+
+%define NUMPY_INPLACE_ARRAY2(type, typecode, data, rows, cols)
+%typemap(in) (type* data, int rows, int cols) {
+  if (!PyArray_Check($input) || PyArray_TYPE((PyArrayObject*)$input) != typecode
+      || PyArray_NDIM((PyArrayObject*)$input) != 2
+      || !PyArray_ISCARRAY((PyArrayObject*)$input)) {
+    PyErr_SetString(PyExc_TypeError, "Expecting a writeable contiguous two dimensional array of the right dtype");
+    SWIG_fail;
+  }
+  $1 = (type*)PyArray_DATA((PyArrayObject*)$input);
+  $2 = (int)PyArray_DIM((PyArrayObject*)$input, 0);
+  $3 = (int)PyArray_DIM((PyArrayObject*)$input, 1);
+}
+%enddef
+
+NUMPY_IN_ARRAY2(double, NPY_DOUBLE, endPositions, numMoves, numAxes)
+NUMPY_IN_ARRAY1(double, NPY_DOUBLE, speeds, numSpeeds)
+NUMPY_IN_ARRAY1(double, NPY_DOUBLE, accels, numAccels)
+NUMPY_IN_ARRAY1(int, NPY_INT, flags, numFlags)
+NUMPY_INPLACE_ARRAY1(unsigned char, NPY_UBYTE, status, numStatus)
+
+// Delta batch kinematics, the results go to arrays the caller allocates
+NUMPY_IN_ARRAY2(double, NPY_DOUBLE, inPositions, numIn, numInAxes)
+NUMPY_INPLACE_ARRAY2(double, NPY_DOUBLE, outPositions, numOut, numOutAxes)
+NUMPY_INPLACE_ARRAY1(double, NPY_DOUBLE, offsets, numOffsets)
 
 %apply double *OUTPUT { double* offset };
 %apply double *OUTPUT { double* X, double* Y , double* Z};
@@ -119,9 +244,16 @@ class Delta {
   void setMainDimensions(double L_in, double r_in);
   void setRadialError(double A_radial_in, double B_radial_in, double C_radial_in);
   void setAngularError(double A_angular_in, double B_angular_in, double C_angular_in);
+  void setStepSolver(int solver);
   void worldToDelta(double X, double Y, double Z, double* Az, double* Bz, double* Cz);
   void deltaToWorld(double Az, double Bz, double Cz, double* X, double* Y, double* Z);
   void verticalOffset(double Az, double Bz, double Cz, double* offset);
+  void worldToDeltaBatch(double* inPositions, int numIn, int numInAxes,
+                        double* outPositions, int numOut, int numOutAxes);
+  void deltaToWorldBatch(double* inPositions, int numIn, int numInAxes,
+                        double* outPositions, int numOut, int numOutAxes);
+  void verticalOffsetBatch(double* inPositions, int numIn, int numInAxes,
+                          double* offsets, int numOffsets);
 };
 
 %feature("director") SyncCallback;
@@ -139,10 +271,27 @@ public:
   void signalWaitComplete();
 };
 
+%nodefaultctor PruSimulator;
+class PruSimulator
+{
+public:
+  void setStepperMask(uint16_t mask);
+  void setRecordSteps(bool record);
+  std::vector<SimulatedStep> getSteps(int axis);
+  void clearStatistics();
+  int64_t getPosition(int axis);
+  uint64_t getSimulatedTime();
+  uint64_t getCommandsRun();
+  uint64_t getBlocksRun();
+  uint64_t getUnderruns();
+};
+
 class PathPlanner {
  public:
   Delta delta_bot;
   PathPlanner(unsigned int cacheSize, AlarmCallback& alarmCallback);
+  PathPlanner(unsigned int cacheSize, AlarmCallback& alarmCallback, double simulatedPruSpeed);
+  PruSimulator* getPruSimulator();
   bool initPRU(const std::string& firmware_stepper, const std::string& firmware_endstops);
   void queueSyncEvent(SyncCallback& callback, bool isBlocking = true);
   %newobject queueWaitEvent;
@@ -152,6 +301,16 @@ class PathPlanner {
 		 bool cancelable, bool optimize,
 		 bool enable_soft_endstops, bool use_bed_matrix,
 		 bool use_backlash_compensation, bool is_probe, int tool_axis);
+  VectorN queueMoves(double* endPositions, int numMoves, int numAxes,
+		     double* speeds, int numSpeeds,
+		     double* accels, int numAccels,
+		     int* flags, int numFlags,
+		     unsigned char* status, int numStatus,
+		     int tool_axis);
+  void queueArc(VectorN startPos, VectorN endPos,
+		double center0, double center1, int plane, bool clockwise,
+		double speed, double accel, int flags,
+		std::vector<double> bedMatrix, int tool_axis);
   void runThread();
   void stopThread(bool join);
   void waitUntilFinished();
@@ -164,7 +323,16 @@ class PathPlanner {
   void setStopPrintOnSoftEndstopHit(bool stop);
   void setStopPrintOnPhysicalEndstopHit(bool stop);
   void setBedCompensationMatrix(std::vector<double> matrix);
+  void setBedMesh(double minX, double minY, double stepX, double stepY, int columns,
+		  std::vector<double> heights, bool bicubic);
+  void clearBedMesh();
   void setAxisConfig(int axis);
+  void setLazyStepGeneration(bool lazy);
+  void setStepCommandCompression(bool compress);
+  void setMaxBufferedMoveTime(double time);
+  void setLookahead(double time, double distance);
+  void setArcSegmentLength(double length);
+  void setArcTolerance(double tolerance);
   void setState(VectorN set);
   void enableSlaves(bool enable);
   void addSlave(int master_in, int slave_in);
@@ -173,6 +341,11 @@ class PathPlanner {
   VectorN getState();
   bool getLastQueueMoveStatus();
   double getLastProbeDistance();
+  size_t getAvailablePathSlots();
+  PathQueueStats getPathQueueStats();
+  void resetPathQueueStats();
+  uint64_t getStepCommandsSent();
+  uint64_t getStepCommandSlotsUsed();
   void suspend();
   void resume();
   void reset();
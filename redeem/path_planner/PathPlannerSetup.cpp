@@ -25,6 +25,7 @@
 
 #include "AlarmCallback.h"
 #include "PathPlanner.h"
+#include <cmath>
 
 // Speeds / accels
 void PathPlanner::setMaxSpeeds(VectorN speeds)
@@ -78,6 +79,23 @@ void PathPlanner::setBedCompensationMatrix(std::vector<double> matrix)
     matrix_bed_comp = matrix;
 }
 
+void PathPlanner::setBedMesh(double minX, double minY, double stepX, double stepY, int columns,
+    std::vector<double> heights, bool bicubic)
+{
+    if (columns < 2 || heights.size() < 2 * static_cast<size_t>(columns) || heights.size() % columns != 0
+        || stepX <= 0 || stepY <= 0)
+    {
+        throw InputSizeError();
+    }
+
+    bed_mesh.set(minX, minY, stepX, stepY, columns, std::move(heights), bicubic);
+}
+
+void PathPlanner::clearBedMesh()
+{
+    bed_mesh.clear();
+}
+
 // axis configuration
 void PathPlanner::setAxisConfig(int axis)
 {
@@ -91,6 +109,38 @@ void PathPlanner::setAxisConfig(int axis)
     }
 }
 
+// step generation
+void PathPlanner::setLazyStepGeneration(bool lazy)
+{
+    lazy_step_generation = lazy;
+}
+
+void PathPlanner::setStepCommandCompression(bool compress)
+{
+    compress_step_commands = compress;
+}
+
+// arc segmentation
+void PathPlanner::setMaxBufferedMoveTime(double time)
+{
+    pathQueue.setMaxTime(static_cast<uint64_t>(time * F_CPU));
+}
+
+void PathPlanner::setLookahead(double time, double distance)
+{
+    pathQueue.setLookahead(static_cast<uint64_t>(time * F_CPU), distance);
+}
+
+void PathPlanner::setArcSegmentLength(double length)
+{
+    arc_segment_length = length;
+}
+
+void PathPlanner::setArcTolerance(double tolerance)
+{
+    arc_tolerance = tolerance;
+}
+
 void PathPlanner::pruAlarmCallback()
 {
     if (stop_on_physical_endstops_hit)
@@ -108,6 +158,19 @@ void PathPlanner::pruAlarmCallback()
 // the state of the machine
 void PathPlanner::setState(VectorN set)
 {
+    // setting the other axes (G92 E0) keeps the height of the mesh in X, Y and Z,
+    // new X, Y or Z positions are where the head is without it
+    const VectorN stateBefore = getState();
+
+    for (int i = 0; i < 3; i++)
+    {
+        if (std::abs(set[i] - stateBefore[i]) * axisStepsPerM[i] >= 0.5)
+        {
+            bed_mesh_offset = 0;
+            break;
+        }
+    }
+
     applyBedCompensation(set);
 
     IntVectorN newState = (set * axisStepsPerM).round();
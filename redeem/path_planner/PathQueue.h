@@ -1,4 +1,7 @@
 #pragma once
+#include <algorithm>
+#include <atomic>
+#include <chrono>
 #include <condition_variable>
 #include <cstdint>
 #include <mutex>
@@ -62,42 +65,208 @@ struct PathQueueIndex
     }
 };
 
+/*
+ * What the path queue has done so far, see PathQueue::getStats. Times are in nanoseconds.
+ */
+struct PathQueueStats
+{
+    uint64_t pathsAdded;
+    uint64_t pathsRemoved;
+
+    // paths the consumer had to plan itself because the producer hadn't committed any
+    uint64_t consumerCommits;
+
+    // times one side found the other one holding the planning lock
+    uint64_t planningContentions;
+
+    // times addPath waited for space and popPath waited for a path
+    uint64_t producerWaits;
+    uint64_t consumerWaits;
+
+    // the longest replanning pass after adding a path and the longest popPath, not counting waiting for a path
+    uint64_t maxPlanningTime;
+    uint64_t maxPopTime;
+
+    // paths that had to slow down to the safe speed at their end because nothing was planned after them,
+    // counted by the path planner's optimizer rather than the queue
+    uint64_t safeSpeedStops;
+};
+
 class PathOptimizerInterface;
 
+/*
+ * A single producer, single consumer ring of paths.
+ *
+ * Paths are counted from the start and kept in slot count % size. The newest paths,
+ * [commitCount, writeCount), are the planning window: the producer replans them whenever it adds a path
+ * and commits the oldest one once the rest of the window covers the look-ahead time or distance, or
+ * once the window holds planningWindow paths. Committed paths, [readCount, commitCount),
+ * belong to the consumer, which pops them without taking a lock. Only if the consumer runs out of
+ * committed paths does it take the planning lock and commit the next path itself.
+ */
 template <typename PathOptimizerType, typename std::enable_if<std::is_base_of<PathOptimizerInterface, PathOptimizerType>::value>::type* = nullptr>
 class PathQueue
 {
 private:
-    std::mutex mutex;
-    std::condition_variable queueHasPaths;
-    std::condition_variable queueHasSpace;
-    std::condition_variable queueIsEmpty;
     PathOptimizerType& optimizer;
     std::vector<Path> queue;
-    uint64_t maxTime;
-    uint64_t curTime;
-    PathQueueIndex writeIndex;
-    PathQueueIndex readIndex;
-    size_t availableSlots;
-    bool running;
+
+    // what beforePathRemoval returned when a path was committed, added to curTime once it's popped
+    std::vector<int64_t> removalTimes;
+
+    // how long and how far the paths in the planning window are, per path and in total
+    std::vector<uint64_t> plannedTimes;
+    std::vector<double> plannedDistances;
+    uint64_t windowTime;
+    double windowDistance;
+
+    std::atomic<uint64_t> maxTime;
+    const size_t planningWindow;
+
+    // 0 when the look-ahead isn't limited by time or distance
+    uint64_t lookaheadTime;
+    double lookaheadDistance;
+
+    std::atomic<uint64_t> writeCount;
+    std::atomic<uint64_t> commitCount;
+    std::atomic<uint64_t> readCount;
+    std::atomic<uint64_t> curTime;
+    std::atomic<bool> running;
+
+    // held while the planning window changes
+    std::mutex planningMutex;
+
+    // only used to sleep until the other side makes progress
+    std::mutex waitMutex;
+    std::condition_variable progress;
+    std::atomic<int> waiters;
+
+    std::atomic<uint64_t> consumerCommits;
+    std::atomic<uint64_t> planningContentions;
+    std::atomic<uint64_t> producerWaits;
+    std::atomic<uint64_t> consumerWaits;
+    std::atomic<uint64_t> maxPlanningTime;
+    std::atomic<uint64_t> maxPopTime;
+    std::atomic<uint64_t> pathsAddedBeforeReset;
+    std::atomic<uint64_t> pathsRemovedBeforeReset;
+
+    PathQueueIndex index(uint64_t count) const
+    {
+        return PathQueueIndex(count % queue.size(), queue.size());
+    }
 
     bool doesQueueHaveSpace()
     {
-        return availableSlots != 0 && (curTime < maxTime || availableSlots == queue.size() - 1);
+        const uint64_t queued = writeCount - readCount;
+        return queued != queue.size() && (curTime < maxTime || queued <= 1);
+    }
+
+    static uint64_t nanosecondsSince(std::chrono::steady_clock::time_point start)
+    {
+        return std::chrono::duration_cast<std::chrono::nanoseconds>(std::chrono::steady_clock::now() - start).count();
+    }
+
+    // only the side that owns a maximum updates it, so this doesn't need a compare and swap
+    static void updateMax(std::atomic<uint64_t>& max, uint64_t value)
+    {
+        if (value > max.load(std::memory_order_relaxed))
+        {
+            max.store(value, std::memory_order_relaxed);
+        }
+    }
+
+    std::unique_lock<std::mutex> lockPlanning()
+    {
+        std::unique_lock<std::mutex> lock(planningMutex, std::try_to_lock);
+
+        if (!lock.owns_lock())
+        {
+            planningContentions++;
+            lock.lock();
+        }
+
+        return lock;
+    }
+
+    // returns whether it had to wait
+    template <typename Predicate>
+    bool waitFor(Predicate predicate)
+    {
+        if (predicate())
+        {
+            return false;
+        }
+
+        std::unique_lock<std::mutex> lock(waitMutex);
+        waiters++;
+        // pairs with the fence in notifyProgress - either the notifier sees this waiter
+        // or the predicate sees the notifier's progress
+        std::atomic_thread_fence(std::memory_order_seq_cst);
+        progress.wait(lock, predicate);
+        waiters--;
+
+        return true;
+    }
+
+    void notifyProgress()
+    {
+        // waiters are counted before they check their condition, so nobody can be missed here.
+        // The progress was published with a release store, which may still be buffered while
+        // waiters is read - without the fence, a waiter could miss it and be missed in turn.
+        std::atomic_thread_fence(std::memory_order_seq_cst);
+        if (waiters != 0)
+        {
+            std::lock_guard<std::mutex> lock(waitMutex);
+            progress.notify_all();
+        }
+    }
+
+    // must hold the planning lock
+    bool isLookaheadCovered()
+    {
+        const uint64_t commit = commitCount.load(std::memory_order_relaxed);
+
+        if (writeCount - commit < 2)
+        {
+            return false;
+        }
+
+        const size_t slot = commit % queue.size();
+
+        return (lookaheadTime != 0 && windowTime - plannedTimes[slot] >= lookaheadTime)
+            || (lookaheadDistance != 0 && windowDistance - plannedDistances[slot] >= lookaheadDistance);
+    }
+
+    // must hold the planning lock and have a path in the planning window
+    void commitPath()
+    {
+        const uint64_t commit = commitCount.load(std::memory_order_relaxed);
+        const size_t slot = commit % queue.size();
+
+        // subtract one because the optimizer does touch the last index
+        removalTimes[slot] = optimizer.beforePathRemoval(queue, index(commit), index(writeCount - 1));
+
+        windowTime -= plannedTimes[slot];
+        windowDistance = commit + 1 == writeCount ? 0 : windowDistance - plannedDistances[slot];
+
+        commitCount.store(commit + 1, std::memory_order_release);
     }
 
-    bool addPathInternal(std::unique_lock<std::mutex>& lock, Path&& path)
+    bool addPathInternal(Path&& path)
     {
         static int logBlock = 10;
         bool logged = false;
         if (logBlock && !doesQueueHaveSpace())
         {
-            LOG("Path Queue blocking - slots: " << availableSlots << "/" << queue.size() << " time: " << curTime << "/" << maxTime << std::endl);
+            LOG("Path Queue blocking - slots: " << availablePathSlots() << "/" << queue.size() << " time: " << curTime << "/" << maxTime << std::endl);
             logBlock--;
             logged = true;
         }
 
-        queueHasSpace.wait(lock, [this] { return !running || doesQueueHaveSpace(); });
+        if (waitFor([this] { return !running || doesQueueHaveSpace(); }))
+        {
+            producerWaits++;
+        }
 
         if (logged)
         {
@@ -109,142 +278,218 @@ private:
             return false;
         }
 
-        queue[writeIndex.value] = std::move(path);
+        {
+            std::unique_lock<std::mutex> lock(lockPlanning());
+            const auto start = std::chrono::steady_clock::now();
+
+            const uint64_t write = writeCount.load(std::memory_order_relaxed);
+            const size_t slot = write % queue.size();
+            queue[slot] = std::move(path);
 
-        curTime += optimizer.onPathAdded(queue, readIndex, writeIndex);
+            plannedTimes[slot] = std::max<int64_t>(queue[slot].getEstimatedTime(), 0);
+            plannedDistances[slot] = queue[slot].getDistance();
+            windowTime += plannedTimes[slot];
+            windowDistance += plannedDistances[slot];
 
-        writeIndex++;
-        availableSlots--;
+            curTime += optimizer.onPathAdded(queue, index(commitCount), index(write));
 
-        if (availableSlots == queue.size() - 1)
-        {
-            queueHasPaths.notify_all();
+            writeCount.store(write + 1, std::memory_order_release);
+
+            while (writeCount - commitCount > planningWindow || isLookaheadCovered())
+            {
+                commitPath();
+            }
+
+            updateMax(maxPlanningTime, nanosecondsSince(start));
         }
 
+        notifyProgress();
+
         return true;
     }
 
 public:
-    PathQueue(PathOptimizerType& optimizer, size_t size, uint64_t maxTime)
+    /// planningWindow is the most of the newest paths that are replanned when a path is added, 0 for all of them
+    PathQueue(PathOptimizerType& optimizer, size_t size, uint64_t maxTime, size_t planningWindow = 0)
         : optimizer(optimizer)
         , queue(size)
+        , removalTimes(size)
+        , plannedTimes(size)
+        , plannedDistances(size)
+        , windowTime(0)
+        , windowDistance(0)
         , maxTime(maxTime)
+        , planningWindow(planningWindow == 0 ? size : std::min(planningWindow, size))
+        , lookaheadTime(0)
+        , lookaheadDistance(0)
+        , writeCount(0)
+        , commitCount(0)
+        , readCount(0)
         , curTime(0)
-        , writeIndex(0, size)
-        , readIndex(0, size)
-        , availableSlots(size)
         , running(true)
+        , waiters(0)
+        , consumerCommits(0)
+        , planningContentions(0)
+        , producerWaits(0)
+        , consumerWaits(0)
+        , maxPlanningTime(0)
+        , maxPopTime(0)
+        , pathsAddedBeforeReset(0)
+        , pathsRemovedBeforeReset(0)
     {
     }
 
     uint64_t getQueuedMoveTime()
     {
-        std::unique_lock<std::mutex> lock(mutex);
-
         return curTime;
     }
 
+    /// addPath blocks while this much time is queued, unless the queue holds a single path
+    void setMaxTime(uint64_t time)
+    {
+        maxTime = time;
+    }
+
+    /// paths are kept in the planning window until the paths after them take this long or go this far, 0 for no limit
+    void setLookahead(uint64_t time, double distance)
+    {
+        std::unique_lock<std::mutex> lock(lockPlanning());
+
+        lookaheadTime = time;
+        lookaheadDistance = distance;
+    }
+
     size_t availablePathSlots()
     {
-        std::unique_lock<std::mutex> lock(mutex);
+        return queue.size() - (writeCount - readCount);
+    }
 
-        return availableSlots;
+    PathQueueStats getStats()
+    {
+        PathQueueStats stats;
+        stats.pathsAdded = writeCount - pathsAddedBeforeReset;
+        stats.pathsRemoved = readCount - pathsRemovedBeforeReset;
+        stats.consumerCommits = consumerCommits;
+        stats.planningContentions = planningContentions;
+        stats.producerWaits = producerWaits;
+        stats.consumerWaits = consumerWaits;
+        stats.maxPlanningTime = maxPlanningTime;
+        stats.maxPopTime = maxPopTime;
+        stats.safeSpeedStops = 0;
+        return stats;
     }
 
-    bool addPath(Path&& path)
+    /// start counting from zero, while paths are still being added and removed this is only approximate
+    void resetStats()
     {
-        std::unique_lock<std::mutex> lock(mutex);
+        pathsAddedBeforeReset = writeCount.load();
+        pathsRemovedBeforeReset = readCount.load();
+        consumerCommits = 0;
+        planningContentions = 0;
+        producerWaits = 0;
+        consumerWaits = 0;
+        maxPlanningTime = 0;
+        maxPopTime = 0;
+    }
 
-        return addPathInternal(lock, std::move(path));
+    bool addPath(Path&& path)
+    {
+        return addPathInternal(std::move(path));
     }
 
     std::optional<Path> popPath()
     {
-        std::unique_lock<std::mutex> lock(mutex);
-
-        queueHasPaths.wait(lock, [this] { return !running || availableSlots != queue.size(); });
+        if (waitFor([this] { return !running || readCount != writeCount; }))
+        {
+            consumerWaits++;
+        }
 
         if (!running)
         {
             return std::optional<Path>();
         }
 
-        const PathQueueIndex currentReadIndex = readIndex;
-        const bool addPathMightBeBlocking = !doesQueueHaveSpace();
-
-        // subtract one because the optimizer does touch the last index
-        curTime += optimizer.beforePathRemoval(queue, readIndex, writeIndex - 1);
-
-        readIndex++;
-        availableSlots++;
+        const auto start = std::chrono::steady_clock::now();
+        const uint64_t read = readCount.load(std::memory_order_relaxed);
 
-        if (addPathMightBeBlocking && doesQueueHaveSpace())
+        if (commitCount.load(std::memory_order_acquire) == read)
         {
-            queueHasSpace.notify_all();
+            // the producer is still planning this path, plan it ourselves
+            std::unique_lock<std::mutex> lock(lockPlanning());
+
+            if (commitCount == read)
+            {
+                commitPath();
+                consumerCommits++;
+            }
         }
 
-        if (availableSlots == queue.size())
+        curTime += removalTimes[read % queue.size()];
+
+        // the producer may reuse the slot as soon as readCount moves past it
+        Path path(std::move(queue[read % queue.size()]));
+
+        readCount.store(read + 1, std::memory_order_release);
+
+        updateMax(maxPopTime, nanosecondsSince(start));
+
+        if (readCount == writeCount)
         {
             LOG("Path Queue underflow" << std::endl);
-            queueIsEmpty.notify_all();
         }
 
-        return std::move(queue[currentReadIndex.value]);
+        notifyProgress();
+
+        return std::move(path);
     }
 
     bool queueSyncEvent(SyncCallback& callback, bool blocking)
     {
-        std::unique_lock<std::mutex> lock(mutex);
-
         if (!running)
         {
             return false;
         }
 
-        const PathQueueIndex lastPathIndex = writeIndex - 1;
-
-        if (queue.size() - availableSlots > 0
-            && !queue[lastPathIndex.value].isSyncEvent()
-            && !queue[lastPathIndex.value].isSyncWaitEvent())
-        {
-            Path& lastPath = queue[lastPathIndex.value];
-            lastPath.setSyncEvent(callback, blocking);
-            return true;
-        }
-        else
         {
-            Path dummyPath;
-            dummyPath.setSyncEvent(callback, blocking);
-            return addPathInternal(lock, std::move(dummyPath));
+            // only paths that are still being planned can take the event, committed ones may be popped at any time
+            std::unique_lock<std::mutex> lock(lockPlanning());
+
+            if (writeCount != commitCount)
+            {
+                Path& lastPath = queue[(writeCount - 1) % queue.size()];
+
+                if (!lastPath.isSyncEvent() && !lastPath.isSyncWaitEvent())
+                {
+                    lastPath.setSyncEvent(callback, blocking);
+                    return true;
+                }
+            }
         }
+
+        Path dummyPath;
+        dummyPath.setSyncEvent(callback, blocking);
+        return addPathInternal(std::move(dummyPath));
     }
 
     bool queueWaitEvent(std::future<void>&& future)
     {
-        std::unique_lock<std::mutex> lock(mutex);
-
         Path dummyPath;
         dummyPath.setWaitEvent(std::move(future));
-        return addPathInternal(lock, std::move(dummyPath));
+        return addPathInternal(std::move(dummyPath));
     }
 
     bool waitForQueueToEmpty()
     {
-        std::unique_lock<std::mutex> lock(mutex);
-
-        queueIsEmpty.wait(lock, [this] { return !running || availableSlots == queue.size(); });
+        waitFor([this] { return !running || readCount == writeCount; });
 
         return running;
     }
 
     void stop()
     {
-        std::unique_lock<std::mutex> lock(mutex);
-
         running = false;
 
-        queueHasPaths.notify_all();
-        queueHasSpace.notify_all();
-        queueIsEmpty.notify_all();
+        std::lock_guard<std::mutex> lock(waitMutex);
+        progress.notify_all();
     }
 };
@@ -1,6 +1,8 @@
 #pragma once
 
+#include <algorithm>
 #include <cstdint>
+#include <cstring>
 #include <string>
 
 #include "SyncCallback.h"
@@ -31,9 +33,49 @@ public:
 
     virtual void reset() = 0;
 
-    virtual void pushBlock(uint8_t* blockMemory, size_t blockLen, unsigned int unit, uint64_t totalTime, SyncCallback* callback = nullptr) = 0;
+    /**
+     * Reserves memory for the next block so it can be written in place.
+     *
+     * Blocks until there is room for one unit. The reserved memory holds as much
+     * of maxBytes as is free, at least one unit (a whole number of units, see
+     * reservedBytes), and its content is undefined, so every byte of the block
+     * has to be written before it is handed to commitBlock. Only one block can
+     * be reserved at a time.
+     */
+    virtual uint8_t* reserveBlock(size_t maxBytes, unsigned int unit, size_t& reservedBytes) = 0;
+
+    /**
+     * Queues the first blockLen bytes of the reserved block, which may be less
+     * than what was reserved (or 0 to just release the reservation).
+     */
+    virtual void commitBlock(size_t blockLen, unsigned int unit, uint64_t totalTime, SyncCallback* callback = nullptr) = 0;
+
+    /// copies a block into as many reserved blocks as it takes
+    void pushBlock(uint8_t* blockMemory, size_t blockLen, unsigned int unit, uint64_t totalTime, SyncCallback* callback = nullptr)
+    {
+        const size_t totalLen = blockLen;
+        uint64_t timeLeft = totalTime;
+
+        while (blockLen)
+        {
+            size_t reservedBytes;
+            uint8_t* block = reserveBlock(blockLen, unit, reservedBytes);
+            const size_t length = std::min(reservedBytes, blockLen);
+            const bool last = length == blockLen;
+
+            // split blocks share the time by length, it only needs to add up
+            const uint64_t time = last ? timeLeft : totalTime * length / totalLen;
+
+            memcpy(block, blockMemory, length);
+            commitBlock(length, unit, time, last ? callback : nullptr);
+
+            blockMemory += length;
+            blockLen -= length;
+            timeLeft -= time;
+        }
+    }
 
     virtual uint32_t getStepsRemaining() = 0;
 
     virtual void resetStepsRemaining() = 0;
-};
\ No newline at end of file
+};
@@ -0,0 +1,511 @@
+/*
+ This file is part of Redeem - 3D Printer control software
+
+ License: GNU GPLv3 http://www.gnu.org/copyleft/gpl.html
+
+ Redeem is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ Redeem is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with Redeem.  If not, see <http://www.gnu.org/licenses/>.
+
+ */
+
+#include "PruSimulator.h"
+
+#include "Logger.h"
+#include <algorithm>
+#include <assert.h>
+#include <chrono>
+
+// don't sleep for less than this when keeping pace with the simulated clock
+static const std::chrono::microseconds MINIMUM_SLEEP(1000);
+
+PruSimulator::PruSimulator(std::function<void()> endstopAlarmCallback, double speed)
+    : endstopAlarmCallback(endstopAlarmCallback)
+    , speed(speed)
+    , memoryUsed(0)
+    , totalQueuedMovesTime(0)
+    , blockReserved(false)
+    , stop(false)
+    , alarmed(false)
+    , generation(0)
+    , suspended(false)
+    , abortBlock(false)
+    , stepperMask(0xffff)
+    , stepsRemaining(0)
+    , recordSteps(false)
+    , simulatedTime(0)
+    , commandsRun(0)
+    , blocksRun(0)
+    , underruns(0)
+    , carriedBlockedSteppers(0)
+    , simulatedTimeStart(0)
+{
+    positions.fill(0);
+}
+
+PruSimulator::~PruSimulator()
+{
+    if (runningThread.joinable())
+    {
+        stopThread(true);
+    }
+}
+
+bool PruSimulator::initPRU(const std::string& firmware_stepper, const std::string& firmware_endstops)
+{
+    LOGINFO("Simulating the PRU at " << speed << " times real time" << std::endl);
+    return true;
+}
+
+void PruSimulator::runThread()
+{
+    {
+        std::lock_guard<std::mutex> lk(mutex);
+        stop = false;
+    }
+
+    runningThread = std::thread([this]() {
+        this->run();
+    });
+}
+
+void PruSimulator::stopThread(bool join)
+{
+    {
+        std::lock_guard<std::mutex> lk(mutex);
+        LOG("Stopping PruSimulator..." << std::endl);
+        stop = true;
+        abortBlock = true;
+
+        blockQueued.notify_all();
+        blockDone.notify_all();
+        resumed.notify_all();
+    }
+
+    if (join && runningThread.joinable())
+    {
+        runningThread.join();
+    }
+
+    LOG("PruSimulator stopped." << std::endl);
+}
+
+void PruSimulator::run()
+{
+    LOG("Starting PruSimulator thread..." << std::endl);
+
+    std::unique_lock<std::mutex> lk(mutex);
+    bool idle = true;
+
+    while (true)
+    {
+        if (blocks.empty() && !idle && !stop)
+        {
+            LOG("PRU Queue underflow" << std::endl);
+            underruns++;
+            idle = true;
+        }
+
+        blockQueued.wait(lk, [this] { return stop || (!blocks.empty() && !alarmed); });
+
+        if (stop)
+        {
+            break;
+        }
+
+        if (idle)
+        {
+            // a real PRU would have waited for this block, so keep pace from here on
+            wallClockStart = std::chrono::steady_clock::now();
+            simulatedTimeStart = simulatedTime;
+            idle = false;
+        }
+
+        // the block stays in the accounting while it runs, as it stays in the PRU's memory
+        const BlockDef block = std::move(blocks.front());
+        blocks.pop_front();
+
+        const uint64_t blockGeneration = generation;
+        abortBlock = false;
+
+        uint64_t time = simulatedTime;
+        std::array<int64_t, NUM_AXES> blockPositions = positions;
+        std::array<std::vector<SimulatedStep>, NUM_AXES> blockSteps;
+        uint64_t blockCommands = 0;
+        const bool record = recordSteps;
+
+        lk.unlock();
+
+        const bool ok = runBlock(block, time, blockPositions, record ? &blockSteps : nullptr, blockCommands);
+
+        lk.lock();
+
+        simulatedTime = time;
+        positions = blockPositions;
+        commandsRun += blockCommands;
+
+        if (recordSteps)
+        {
+            for (int i = 0; i < NUM_AXES; i++)
+            {
+                steps[i].insert(steps[i].end(), blockSteps[i].begin(), blockSteps[i].end());
+            }
+        }
+
+        if (stop || generation != blockGeneration)
+        {
+            // the PRU was stopped or reset while the block was running
+            continue;
+        }
+
+        if (!ok)
+        {
+            // like the firmware, stop until the host resets the PRU
+            alarmed = true;
+            lk.unlock();
+            endstopAlarmCallback();
+            lk.lock();
+            continue;
+        }
+
+        if (block.callback != nullptr)
+        {
+            // before the block's memory is freed, so waitUntilFinished returns after the callbacks
+            lk.unlock();
+            block.callback->syncComplete();
+            lk.lock();
+
+            if (stop || generation != blockGeneration)
+            {
+                continue;
+            }
+        }
+
+        memoryUsed -= block.commands.size() + 4;
+        totalQueuedMovesTime -= block.totalTime;
+        blocksRun++;
+
+        blockDone.notify_all();
+    }
+}
+
+/**
+Runs the commands of a block like firmware_runtime.c, returns false if the PRU raised an endstop alarm.
+*/
+bool PruSimulator::runBlock(const BlockDef& block, uint64_t& time, std::array<int64_t, NUM_AXES>& blockPositions, std::array<std::vector<SimulatedStep>, NUM_AXES>* blockSteps, uint64_t& blockCommands)
+{
+    const SteppersCommand* command = reinterpret_cast<const SteppersCommand*>(block.commands.data());
+    size_t numCommands = block.commands.size() / sizeof(SteppersCommand);
+
+    if (!(command->options & STEPPER_COMMAND_OPTION_CARRY_BLOCKED_STEPPERS))
+    {
+        carriedBlockedSteppers = 0;
+    }
+
+    while (numCommands)
+    {
+        SteppersCommand current = *command;
+        uint32_t count = 1;
+        size_t extraSlots = 0;
+        int32_t delayChange = 0;
+        const PackedSteppersCommand* packed = nullptr;
+
+        if (command->options & STEPPER_COMMAND_OPTION_PACKED)
+        {
+            packed = reinterpret_cast<const PackedSteppersCommand*>(command + 1);
+            count = command->delay;
+            extraSlots = (count + 1) / 2;
+        }
+        else if (command->options & STEPPER_COMMAND_OPTION_REPEAT)
+        {
+            const SteppersCommandRepeat& repeat = reinterpret_cast<const SteppersCommandRepeat&>(command[1]);
+            count = repeat.count;
+            extraSlots = 1;
+            delayChange = repeat.delayChange;
+        }
+
+        for (uint32_t run = 0; run < count; run++)
+        {
+            if (abortBlock)
+            {
+                return true;
+            }
+
+            if (packed != nullptr)
+            {
+                current.step = packed[run].step;
+                current.direction = packed[run].direction;
+                current.delay = packed[run].delay * PACKED_STEPPERS_COMMAND_DELAY_UNIT;
+            }
+
+            const uint32_t directionsAllowedMask = stepperMask & ~carriedBlockedSteppers;
+            const uint8_t positiveDirectionsAllowed = current.direction & ((directionsAllowedMask >> 8) & 0xFF);
+            const uint8_t negativeDirectionsAllowed = ~current.direction & (directionsAllowedMask & 0xFF);
+            const uint8_t allDirectionsAllowed = positiveDirectionsAllowed | negativeDirectionsAllowed;
+
+            if (current.options & STEPPER_COMMAND_OPTION_CARRY_BLOCKED_STEPPERS)
+            {
+                carriedBlockedSteppers |= ~directionsAllowedMask;
+            }
+
+            if (current.cancellableMask != 0
+                && (allDirectionsAllowed & current.cancellableMask) == 0)
+            {
+                // cancel the rest of the block, counting the command slots that didn't run
+                stepsRemaining += numCommands;
+                return true;
+            }
+            else if (current.cancellableMask == 0
+                && (allDirectionsAllowed & current.step) != current.step)
+            {
+                LOGERROR("Simulated PRU hit an endstop during a move that can't be cancelled" << std::endl);
+                return false;
+            }
+
+            const uint8_t stepped = current.step & allDirectionsAllowed;
+
+            for (int i = 0; i < NUM_AXES; i++)
+            {
+                if (stepped & (1 << i))
+                {
+                    const bool positive = current.direction & (1 << i);
+                    blockPositions[i] += positive ? 1 : -1;
+
+                    if (blockSteps != nullptr)
+                    {
+                        (*blockSteps)[i].push_back({ time, positive });
+                    }
+                }
+            }
+
+            time += current.delay;
+            current.delay += delayChange;
+            blockCommands++;
+
+            keepPace(time);
+
+            if (run + 1 < count)
+            {
+                waitWhileSuspended(time);
+            }
+        }
+
+        numCommands -= 1 + extraSlots;
+        command += 1 + extraSlots;
+
+        if (numCommands && (command->options & STEPPER_COMMAND_OPTION_SYNC_EVENT))
+        {
+            if ((command->options & STEPPER_COMMAND_OPTION_SYNCWAIT_EVENT) == STEPPER_COMMAND_OPTION_SYNCWAIT_EVENT)
+            {
+                suspended = true;
+            }
+        }
+
+        waitWhileSuspended(time);
+    }
+
+    return true;
+}
+
+void PruSimulator::waitWhileSuspended(uint64_t time)
+{
+    if (!suspended)
+    {
+        return;
+    }
+
+    std::unique_lock<std::mutex> lk(mutex);
+    resumed.wait(lk, [this] { return !suspended || abortBlock; });
+
+    // the time spent suspended isn't simulated
+    wallClockStart = std::chrono::steady_clock::now();
+    simulatedTimeStart = time;
+}
+
+void PruSimulator::keepPace(uint64_t time)
+{
+    if (speed <= 0)
+    {
+        return;
+    }
+
+    const std::chrono::duration<double> simulated((time - simulatedTimeStart) / (F_CPU_FLOAT * speed));
+    const auto target = wallClockStart + std::chrono::duration_cast<std::chrono::steady_clock::duration>(simulated);
+
+    if (target - std::chrono::steady_clock::now() > MINIMUM_SLEEP)
+    {
+        std::this_thread::sleep_until(target);
+    }
+}
+
+void PruSimulator::waitUntilFinished()
+{
+    std::unique_lock<std::mutex> lk(mutex);
+    blockDone.wait(lk, [this] { return stop || memoryUsed == 0; });
+}
+
+void PruSimulator::suspend()
+{
+    suspended = true;
+}
+
+void PruSimulator::resume()
+{
+    std::lock_guard<std::mutex> lk(mutex);
+    suspended = false;
+    resumed.notify_all();
+}
+
+void PruSimulator::reset()
+{
+    std::lock_guard<std::mutex> lk(mutex);
+
+    LOG("Resetting PruSimulator" << std::endl);
+
+    blocks.clear();
+    memoryUsed = 0;
+    totalQueuedMovesTime = 0;
+    alarmed = false;
+    generation++;
+
+    abortBlock = true;
+    suspended = false;
+
+    resumed.notify_all();
+    blockDone.notify_all();
+}
+
+/**
+maxBytes - the most data bytes the caller wants to write.
+unit - stepSize in bytes.
+reservedBytes - set to the number of data bytes that can be written.
+*/
+uint8_t* PruSimulator::reserveBlock(size_t maxBytes, unsigned int unit, size_t& reservedBytes)
+{
+    std::unique_lock<std::mutex> lk(mutex);
+
+    assert(!blockReserved);
+
+    const size_t blockSize = (std::min(maxBytes, getMaxBytesPerBlock()) / unit) * unit;
+
+    assert(blockSize > 0);
+
+    // like PruTimer, wait for room for one unit and take as much of the free memory as the block can use
+    blockDone.wait(lk, [this, unit] { return isMemoryAvailable(unit) && !isQueueFullByTime(); });
+
+    // when stopped, nothing will run the block, so commitBlock discards it
+    blockReserved = !stop;
+
+    reservedBytes = stop ? blockSize : std::min(blockSize, ((memorySize - memoryUsed - 20) / unit) * unit);
+    reservedBlock.resize(reservedBytes);
+
+    return reservedBlock.data();
+}
+
+/**
+blockLen - number of data bytes written in the reserved block.
+unit - stepSize in bytes.
+totalTime - time it takes to complete the current block, in ticks.
+*/
+void PruSimulator::commitBlock(size_t blockLen, unsigned int unit, uint64_t totalTime, SyncCallback* callback)
+{
+    std::lock_guard<std::mutex> lk(mutex);
+
+    if (!blockReserved)
+    {
+        // the block was discarded
+        return;
+    }
+
+    blockReserved = false;
+
+    if (!blockLen)
+    {
+        return;
+    }
+
+    assert(blockLen % unit == 0);
+    assert(blockLen <= reservedBlock.size());
+
+    //If the caller specified a time of 0, bump it to 1, the same as PruTimer
+    if (totalTime == 0)
+    {
+        totalTime = 1;
+    }
+
+    reservedBlock.resize(blockLen);
+    blocks.emplace_back(std::move(reservedBlock), totalTime, callback);
+    reservedBlock = std::vector<uint8_t>();
+
+    memoryUsed += blockLen + 4;
+    totalQueuedMovesTime += totalTime;
+
+    blockQueued.notify_all();
+}
+
+void PruSimulator::setRecordSteps(bool record)
+{
+    std::lock_guard<std::mutex> lk(mutex);
+    recordSteps = record;
+}
+
+std::vector<SimulatedStep> PruSimulator::getSteps(int axis)
+{
+    std::lock_guard<std::mutex> lk(mutex);
+    assert(axis >= 0 && axis < NUM_AXES);
+    return steps[axis];
+}
+
+void PruSimulator::clearStatistics()
+{
+    std::lock_guard<std::mutex> lk(mutex);
+
+    for (auto& axisSteps : steps)
+    {
+        axisSteps.clear();
+    }
+
+    commandsRun = 0;
+    blocksRun = 0;
+    underruns = 0;
+}
+
+int64_t PruSimulator::getPosition(int axis)
+{
+    std::lock_guard<std::mutex> lk(mutex);
+    assert(axis >= 0 && axis < NUM_AXES);
+    return positions[axis];
+}
+
+uint64_t PruSimulator::getSimulatedTime()
+{
+    std::lock_guard<std::mutex> lk(mutex);
+    return simulatedTime;
+}
+
+uint64_t PruSimulator::getCommandsRun()
+{
+    std::lock_guard<std::mutex> lk(mutex);
+    return commandsRun;
+}
+
+uint64_t PruSimulator::getBlocksRun()
+{
+    std::lock_guard<std::mutex> lk(mutex);
+    return blocksRun;
+}
+
+uint64_t PruSimulator::getUnderruns()
+{
+    std::lock_guard<std::mutex> lk(mutex);
+    return underruns;
+}
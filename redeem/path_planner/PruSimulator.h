@@ -0,0 +1,212 @@
+/*
+ This file is part of Redeem - 3D Printer control software
+
+ License: GNU GPLv3 http://www.gnu.org/copyleft/gpl.html
+
+ Redeem is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ Redeem is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with Redeem.  If not, see <http://www.gnu.org/licenses/>.
+
+ */
+
+#ifndef __PathPlanner__PruSimulator__
+#define __PathPlanner__PruSimulator__
+
+#include <array>
+#include <atomic>
+#include <chrono>
+#include <condition_variable>
+#include <cstdint>
+#include <deque>
+#include <functional>
+#include <mutex>
+#include <string>
+#include <thread>
+#include <vector>
+
+#include "PruInterface.h"
+#include "StepperCommand.h"
+#include "config.h"
+
+struct SimulatedStep
+{
+    uint64_t time; // in PRU cycles since the simulator started
+    bool direction; // true for a step in the positive direction
+};
+
+/*
+ * Runs the stepper firmware's command stream on a host thread instead of the PRU.
+ *
+ * Blocks are consumed the way firmware_runtime.c does it, including repeated and packed
+ * commands, sync and wait events, cancellable moves and endstop alarms. The simulated
+ * clock advances by each command's delay and the thread keeps pace with it at the given
+ * speed (1 for real time, 0 to run as fast as possible). The steps of every axis can be
+ * recorded so benchmarks can look at the resulting timelines.
+ */
+class PruSimulator : public PruInterface
+{
+private:
+    class BlockDef
+    {
+    public:
+        std::vector<uint8_t> commands;
+        uint64_t totalTime;
+        SyncCallback* callback;
+        BlockDef(std::vector<uint8_t>&& commands, uint64_t totalTime, SyncCallback* callback)
+            : commands(std::move(commands))
+            , totalTime(totalTime)
+            , callback(callback)
+        {
+        }
+    };
+
+    std::function<void()> endstopAlarmCallback;
+    const double speed;
+
+    // the same amount of memory as the PRU gets on a BeagleBone
+    const size_t memorySize = 0x40000;
+    const uint64_t maxQueuedMovesTime = 2 * F_CPU;
+
+    /* Should be locked when used */
+    std::mutex mutex;
+    std::deque<BlockDef> blocks;
+    size_t memoryUsed;
+    uint64_t totalQueuedMovesTime;
+    bool blockReserved;
+    std::vector<uint8_t> reservedBlock;
+    bool stop;
+    bool alarmed;
+    uint64_t generation; // counts the resets, so a block that was running during one is dropped
+
+    std::condition_variable blockQueued;
+    std::condition_variable blockDone;
+    std::condition_variable resumed;
+
+    std::atomic<bool> suspended;
+    std::atomic<bool> abortBlock;
+    std::atomic<uint16_t> stepperMask;
+    std::atomic<uint32_t> stepsRemaining;
+
+    // simulation results, also locked with mutex
+    bool recordSteps;
+    uint64_t simulatedTime;
+    uint64_t commandsRun;
+    uint64_t blocksRun;
+    uint64_t underruns;
+    std::array<int64_t, NUM_AXES> positions;
+    std::array<std::vector<SimulatedStep>, NUM_AXES> steps;
+
+    // only used by the simulation thread - the pace is kept from wallClockStart, when the
+    // simulated clock read simulatedTimeStart
+    uint32_t carriedBlockedSteppers;
+    std::chrono::steady_clock::time_point wallClockStart;
+    uint64_t simulatedTimeStart;
+
+    std::thread runningThread;
+
+    inline bool isMemoryAvailable(size_t blockSize)
+    {
+        return stop || memorySize - memoryUsed - 8 >= blockSize + 12;
+    }
+
+    inline bool isQueueFullByTime()
+    {
+        return !stop && totalQueuedMovesTime >= maxQueuedMovesTime && blocks.size() > 1;
+    }
+
+    bool runBlock(const BlockDef& block, uint64_t& time, std::array<int64_t, NUM_AXES>& blockPositions, std::array<std::vector<SimulatedStep>, NUM_AXES>* blockSteps, uint64_t& blockCommands);
+    void waitWhileSuspended(uint64_t time);
+    void keepPace(uint64_t time);
+
+public:
+    PruSimulator(std::function<void()> endstopAlarmCallback, double speed = 1.0);
+    virtual ~PruSimulator();
+
+    bool initPRU(const std::string& firmware_stepper, const std::string& firmware_endstops) override;
+
+    void run() override;
+
+    void runThread() override;
+    void stopThread(bool join) override;
+    void waitUntilFinished() override;
+
+    size_t getFreeMemory() override
+    {
+        std::lock_guard<std::mutex> lk(mutex);
+        return memorySize - memoryUsed - 4;
+    }
+
+    uint64_t getTotalQueuedMovesTime() override
+    {
+        std::lock_guard<std::mutex> lk(mutex);
+        return totalQueuedMovesTime;
+    }
+
+    size_t getMaxBytesPerBlock() override
+    {
+        return (memorySize / 4) - 12;
+    }
+
+    void suspend() override;
+
+    void resume() override;
+
+    void reset() override;
+
+    uint8_t* reserveBlock(size_t maxBytes, unsigned int unit, size_t& reservedBytes) override;
+
+    void commitBlock(size_t blockLen, unsigned int unit, uint64_t totalTime, SyncCallback* callback = nullptr) override;
+
+    uint32_t getStepsRemaining() override
+    {
+        return stepsRemaining;
+    }
+
+    void resetStepsRemaining() override
+    {
+        stepsRemaining = 0;
+    }
+
+    /**
+     * Simulates the endstops - a set bit in the low byte lets that axis move in the negative
+     * direction and a set bit in the high byte lets it move in the positive direction.
+     */
+    void setStepperMask(uint16_t mask)
+    {
+        stepperMask = mask;
+    }
+
+    /// records every step from now on, see getSteps
+    void setRecordSteps(bool record);
+
+    /// the steps recorded for an axis
+    std::vector<SimulatedStep> getSteps(int axis);
+
+    /// clears the recorded steps and the command, block and underrun counters
+    void clearStatistics();
+
+    /// the position of an axis in steps
+    int64_t getPosition(int axis);
+
+    /// the time the simulated PRU has spent running commands, in PRU cycles
+    uint64_t getSimulatedTime();
+
+    /// the number of commands run, with repeated and packed commands counted one by one
+    uint64_t getCommandsRun();
+
+    uint64_t getBlocksRun();
+
+    /// the number of times the PRU ran out of blocks while the simulator was running
+    uint64_t getUnderruns();
+};
+
+#endif
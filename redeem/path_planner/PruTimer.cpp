@@ -25,6 +25,7 @@
 #include "config.h"
 #include "pruss_intc_mapping.h"
 #include "prussdrv.h"
+#include <algorithm>
 #include <assert.h>
 #include <cmath>
 #include <fcntl.h>
@@ -57,6 +58,7 @@ PruTimer::PruTimer(std::function<void()> endstopAlarmCallback)
     totalQueuedMovesTime = 0;
     ddr_mem_used = 0;
     stop = false;
+    blockReserved = false;
 }
 
 bool PruTimer::initPRU(const std::string& firmware_stepper, const std::string& firmware_endstops)
@@ -245,6 +247,7 @@ PruTimer::~PruTimer()
 void PruTimer::reset()
 {
     std::unique_lock<std::mutex> lk(mutex_memory);
+    reservationReleased.wait(lk, [this] { return !blockReserved; });
 
     prussdrv_pru_disable(0);
     prussdrv_pru_disable(1);
@@ -291,10 +294,16 @@ void PruTimer::runThread()
 void PruTimer::stopThread(bool join)
 {
     {
-        std::lock_guard<std::mutex> lk(mutex_memory);
+        std::unique_lock<std::mutex> lk(mutex_memory);
         LOG("Stopping PruTimer..." << std::endl);
         stop = true;
 
+        pruMemoryAvailable.notify_all();
+        pruQueueIsntFullByTime.notify_all();
+
+        // the block being written may still be in DDR
+        reservationReleased.wait(lk, [this] { return !blockReserved; });
+
         /* Disable PRU and close memory mapping*/
         prussdrv_pru_disable(PRU_NUM0);
         prussdrv_pru_disable(PRU_NUM1);
@@ -314,9 +323,6 @@ void PruTimer::stopThread(bool join)
         }
 
         LOG("PRU disabled, DDR released, FD closed." << std::endl);
-
-        pruMemoryAvailable.notify_all();
-        pruQueueIsntFullByTime.notify_all();
     }
 
     if (join && runningThread.joinable())
@@ -329,276 +335,137 @@ void PruTimer::stopThread(bool join)
 }
 
 /**
-blockMemory - the data.
-blockLen - number of data bytes.
+maxBytes - the most data bytes the caller wants to write.
 unit - stepSize in bytes.
-totalTime - time it takes to complete the current block, in ticks.
+reservedBytes - set to the number of data bytes that can be written.
 */
-void PruTimer::pushBlock(uint8_t* blockMemory, size_t blockLen, unsigned int unit, uint64_t totalTime, SyncCallback* callback)
+uint8_t* PruTimer::reserveBlock(size_t maxBytes, unsigned int unit, size_t& reservedBytes)
 {
+    std::unique_lock<std::mutex> lk(mutex_memory);
 
-    if (!ddr_write_location)
-        return;
-
-    //If the caller specified a time of 0, bump it to 1
-    //This has a negligible effect on queue accounting but makes queue leaks much easier to find
-    if (totalTime == 0)
-    {
-        totalTime = 1;
-    }
-
-    //Split the block in smaller blocks if needed
-    size_t nbBlocks = ceil((blockLen + 12) / ((ddr_size / 4.0) - 12.0));
-
-    LOG("nbBlocks: " << nbBlocks << std::endl);
-
-    size_t blockSize = blockLen / nbBlocks;
-
-    //Make sure block size is a multiple of unit
-    blockSize = (blockSize / unit) * unit;
+    assert(!blockReserved);
 
-    if (blockSize * nbBlocks < blockLen)
-        nbBlocks++;
+    size_t blockSize = (std::min(maxBytes, getMaxBytesPerBlock()) / unit) * unit;
 
-    assert(blockSize * nbBlocks >= blockLen);
+    assert(blockSize > 0);
+    assert(ddr_size >= blockSize + 12);
 
-    size_t nbStepsWritten = 0;
+    // Only wait for room for one unit, the block grows into as much of the free memory as
+    // it can use. Short moves don't use most of what they could reserve, so waiting for a
+    // whole block would keep the memory from ever filling up.
+    blockSizeToWaitFor = unit;
+    pruMemoryAvailable.wait(lk, [this] { return isPruMemoryAvailable(); });
 
-    for (unsigned int i = 0; i < nbBlocks; i++)
+    static int logBlock = 10;
+    bool logged = false;
+    if (logBlock && isPruQueueFullByTime())
     {
+        LOG("PRU Queue is full by time - " << totalQueuedMovesTime << "/" << maxQueuedMovesTime << std::endl);
+        logBlock--;
+        logged = true;
+    }
 
-        uint8_t* blockStart = blockMemory + i * blockSize;
-
-        size_t currentBlockSize;
-
-        if (i + 1 < nbBlocks)
-        {
-            currentBlockSize = blockSize;
-        }
-        else
-        {
-            currentBlockSize = blockLen - i * blockSize;
-        }
-
-        assert(ddr_size >= currentBlockSize + 12);
-
-        {
-            //LOG( "Waiting for " << std::dec << currentBlockSize+12 << " bytes available. Currently: " << getFreeMemory() << std::endl);
-
-            std::unique_lock<std::mutex> lk(mutex_memory);
-            blockSizeToWaitFor = currentBlockSize;
-            pruMemoryAvailable.wait(lk, [this] { return isPruMemoryAvailable(); });
-
-            static int logBlock = 10;
-            bool logged = false;
-            if (logBlock && isPruQueueFullByTime())
-            {
-                LOG("PRU Queue is full by time - " << totalQueuedMovesTime << "/" << maxQueuedMovesTime << std::endl);
-                logBlock--;
-                logged = true;
-            }
-
-            pruQueueIsntFullByTime.wait(lk, [this] { return !isPruQueueFullByTime(); });
-
-            if (logged)
-            {
-                LOG("PRU Queue has space again" << std::endl);
-            }
-
-            if (!ddr_mem || stop)
-                return;
-
-            //Copy at the right location
-            if (ddr_write_location + currentBlockSize + 12 > ddr_mem_end)
-            {
-                //Split into two blocks
-
-                //First block size
-                size_t maxSize = ddr_mem_end - ddr_write_location - 8;
-
-                //make sure we are in a multiple of unit size
-                maxSize = (maxSize / unit) * unit;
-
-                bool resetDDR = false;
-
-                if (!maxSize)
-                {
-                    //Dont have the size for a single command! Reset the DDR
-                    //LOG( "No more space at 0x" << std::hex << ddr_write_location << ". Resetting DDR..." << std::endl);
-                    uint32_t nb;
-
-                    //First put 0 for next command
-                    nb = 0;
-                    memcpy(ddr_mem, &nb, sizeof(nb));
-                    msync(ddr_mem, sizeof(nb), MS_SYNC);
-
-                    nb = DDR_MAGIC;
-                    memcpy(ddr_write_location, &nb, sizeof(nb));
-
-                    msync(ddr_write_location, sizeof(nb), MS_SYNC);
-
-                    //It is now the begining
-                    ddr_write_location = ddr_mem;
-
-                    resetDDR = true;
-
-                    if (ddr_write_location + currentBlockSize + 12 > ddr_mem_end)
-                    {
-                        maxSize = ddr_mem_end - ddr_write_location - 8;
-
-                        //make sure we are in a multiple of unit size
-                        maxSize = (maxSize / unit) * unit;
-                    }
-                    else
-                    {
-                        maxSize = currentBlockSize;
-                    }
-                }
-
-                assert(maxSize > 0);
-
-                bool moreToWrite = currentBlockSize > maxSize;
-
-                uint64_t timeSoFar = moreToWrite ? totalTime / 2 : totalTime;
-
-                blocksID.emplace(maxSize + 4, timeSoFar, moreToWrite ? nullptr : callback); // totalTime is not /2 but doesn't need to be precise to make it work...
-
-                ddr_mem_used += maxSize + 4;
-                totalQueuedMovesTime += timeSoFar;
-
-                // First copy the data
-                // LOG( std::dec << "Writing " << maxSize+4 << " bytes to 0x" << std::hex << (unsigned long)ddr_write_location << std::endl);
-
-                memcpy(ddr_write_location + 4, blockStart, maxSize);
-
-                // Then write on the next free area OF DDR MAGIC
-                uint32_t nb;
-
-                if (resetDDR)
-                {
-                    nb = 0;
-                }
-                else
-                {
-                    nb = DDR_MAGIC;
-                }
-
-                assert(ddr_write_location + maxSize + sizeof(nb) * 2 <= ddr_mem_end);
-
-                memcpy(ddr_write_location + maxSize + sizeof(nb), &nb, sizeof(nb));
-
-                if (!resetDDR)
-                {
-                    nb = 0;
-                    memcpy(ddr_mem, &nb, sizeof(nb));
-                    msync(ddr_mem, sizeof(nb), MS_SYNC);
-                }
-
-                // Need it?
-                msync(ddr_write_location + 4, maxSize + 4, MS_SYNC);
-
-                // Then signal how much data we have to the PRU
-                nb = (uint32_t)maxSize / unit;
-
-                nbStepsWritten += nb;
-
-                memcpy(ddr_write_location, &nb, sizeof(nb));
-
-                // LOG( "Written " << std::dec << maxSize << " bytes of stepper commands." << std::endl);
-
-                // LOG( "Remaining free memory: " << std::dec << ddr_size-ddr_mem_used << " bytes." << std::endl);
-
-                msync(ddr_write_location, 4, MS_SYNC);
+    pruQueueIsntFullByTime.wait(lk, [this] { return !isPruQueueFullByTime(); });
 
-                if (resetDDR)
-                {
-                    ddr_write_location += maxSize + sizeof(nb);
-                    ;
-                }
-                else
-                {
-                    // It is now the begining
-                    ddr_write_location = ddr_mem;
-                }
+    if (logged)
+    {
+        LOG("PRU Queue has space again" << std::endl);
+    }
 
-                size_t remainingSize = currentBlockSize - maxSize;
+    if (!ddr_mem || stop)
+    {
+        // nothing will reach the PRU anymore, let the caller write somewhere harmless
+        discardedBlock.resize(blockSize);
+        reservedBytes = blockSize;
+        return discardedBlock.data();
+    }
 
-                if (remainingSize)
-                {
-                    assert(moreToWrite);
+    if (ddr_write_location + unit + 8 > ddr_mem_end)
+    {
+        //Dont have the size for a single command! Reset the DDR
+        //LOG( "No more space at 0x" << std::hex << ddr_write_location << ". Resetting DDR..." << std::endl);
+        uint32_t nb;
 
-                    assert(remainingSize == (remainingSize / unit) * unit);
+        //First put 0 for next command
+        nb = 0;
+        memcpy(ddr_mem, &nb, sizeof(nb));
+        msync(ddr_mem, sizeof(nb), MS_SYNC);
 
-                    blocksID.emplace(remainingSize + 4, totalTime - timeSoFar, callback); // totalTime is not /2 but it doesn't need to be precise to make it work...
+        nb = DDR_MAGIC;
+        memcpy(ddr_write_location, &nb, sizeof(nb));
 
-                    ddr_mem_used += remainingSize + 4;
-                    totalQueuedMovesTime += totalTime - timeSoFar;
+        msync(ddr_write_location, sizeof(nb), MS_SYNC);
 
-                    assert(ddr_write_location + remainingSize + sizeof(nb) * 2 <= ddr_mem_end);
+        //It is now the begining
+        ddr_write_location = ddr_mem;
+    }
 
-                    //First copy the data
-                    //LOG( std::dec << "Writing " << remainingSize+4 << " bytes to 0x" << std::hex << (unsigned long)ddr_write_location << std::endl);
+    //Leave room for the number of commands and the 0 after the block, in a multiple of unit size
+    const size_t maxSize = ((ddr_mem_end - ddr_write_location - 8) / unit) * unit;
 
-                    //LOG( std::hex << "Writing second part of data to 0x" << (unsigned long)ddr_write_location+4 << std::endl);
+    assert(maxSize > 0);
 
-                    memcpy(ddr_write_location + 4, blockStart + maxSize, remainingSize);
+    // and no more than the queued blocks leave free, less this block's overhead
+    const size_t freeSize = ((ddr_size - ddr_mem_used - 20) / unit) * unit;
 
-                    //Then write on the next free area OF DDR MAGIC
-                    uint32_t nb = 0;
+    assert(freeSize > 0);
 
-                    assert(ddr_write_location + remainingSize + sizeof(nb) * 2 <= ddr_mem_end);
+    reservedBytes = std::min({ blockSize, maxSize, freeSize });
+    blockReserved = true;
 
-                    memcpy(ddr_write_location + remainingSize + sizeof(nb), &nb, sizeof(nb));
+    return ddr_write_location + 4;
+}
 
-                    //Need it?
-                    msync(ddr_write_location + sizeof(nb), remainingSize, MS_SYNC);
+/**
+blockLen - number of data bytes written in the reserved block.
+unit - stepSize in bytes.
+totalTime - time it takes to complete the current block, in ticks.
+*/
+void PruTimer::commitBlock(size_t blockLen, unsigned int unit, uint64_t totalTime, SyncCallback* callback)
+{
+    std::lock_guard<std::mutex> lk(mutex_memory);
 
-                    //Then signal how much data we have to the PRU
-                    nb = (uint32_t)remainingSize / unit;
-                    nbStepsWritten += nb;
-                    //LOG( std::hex << "Writing nb command to 0x" << (unsigned long)ddr_write_location << std::endl);
-                    memcpy(ddr_write_location, &nb, sizeof(nb));
+    if (!blockReserved)
+    {
+        // the block was discarded
+        return;
+    }
 
-                    //LOG( "Written " << std::dec << remainingSize << " bytes of stepper commands." << std::endl);
+    blockReserved = false;
+    reservationReleased.notify_all();
 
-                    //LOG( "Remaining free memory: " << std::dec << ddr_size-ddr_mem_used << " bytes." << std::endl);
+    if (!blockLen)
+    {
+        return;
+    }
 
-                    msync(ddr_write_location, sizeof(nb), MS_SYNC);
+    assert(blockLen % unit == 0);
 
-                    //It is now the begining
-                    ddr_write_location += remainingSize + sizeof(nb);
-                }
-            }
-            else
-            {
-                blocksID.emplace(currentBlockSize + 4, totalTime, callback); // totalTime is not /2 but doesn't it to be precise to make it work...
-                ddr_mem_used += currentBlockSize + 4;
-                totalQueuedMovesTime += totalTime;
-                //First copy the data
-                //LOG( std::hex << "Writing data to 0x" << (unsigned long)ddr_write_location+4 << std::endl);
-                //LOG( std::dec << "Writing " << currentBlockSize+4 << " bytes to 0x" << std::hex << (unsigned long)ddr_write_location << std::endl);
-
-                memcpy(ddr_write_location + 4, blockStart, currentBlockSize);
-
-                //Then write on the next free area than there is no command to execute
-                uint32_t nb = 0;
-                assert(ddr_write_location + currentBlockSize + sizeof(nb) * 2 <= ddr_mem_end);
-                memcpy(ddr_write_location + currentBlockSize + sizeof(nb), &nb, sizeof(nb));
-                //Need it?
-                msync(ddr_write_location + sizeof(nb), currentBlockSize, MS_SYNC);
-                //Then signal how much data we have to the PRU
-                nb = (uint32_t)currentBlockSize / unit;
-                nbStepsWritten += nb;
-                //LOG( std::hex << "Writing nb command to 0x" << (unsigned long)ddr_write_location << std::endl);
-                memcpy(ddr_write_location, &nb, sizeof(nb));
-                //LOG( "Written " << std::dec << currentBlockSize << " bytes of stepper commands." << std::endl);
-                //LOG( "Remaining free memory: " << std::dec << ddr_size-ddr_mem_used << " bytes." << std::endl);
-                ddr_write_location += currentBlockSize + sizeof(nb);
-                msync(ddr_write_location, sizeof(nb), MS_SYNC);
-            }
-        }
+    //If the caller specified a time of 0, bump it to 1
+    //This has a negligible effect on queue accounting but makes queue leaks much easier to find
+    if (totalTime == 0)
+    {
+        totalTime = 1;
     }
-    assert(nbStepsWritten == blockLen / unit);
+
+    blocksID.emplace(blockLen + 4, totalTime, callback);
+    ddr_mem_used += blockLen + 4;
+    totalQueuedMovesTime += totalTime;
+
+    //Then write on the next free area than there is no command to execute
+    uint32_t nb = 0;
+    assert(ddr_write_location + blockLen + sizeof(nb) * 2 <= ddr_mem_end);
+    memcpy(ddr_write_location + blockLen + sizeof(nb), &nb, sizeof(nb));
+    //Need it?
+    msync(ddr_write_location + sizeof(nb), blockLen + sizeof(nb), MS_SYNC);
+    //Then signal how much data we have to the PRU
+    nb = (uint32_t)blockLen / unit;
+    //LOG( std::hex << "Writing nb command to 0x" << (unsigned long)ddr_write_location << std::endl);
+    memcpy(ddr_write_location, &nb, sizeof(nb));
+    msync(ddr_write_location, sizeof(nb), MS_SYNC);
+    //LOG( "Written " << std::dec << blockLen << " bytes of stepper commands." << std::endl);
+    //LOG( "Remaining free memory: " << std::dec << ddr_size-ddr_mem_used << " bytes." << std::endl);
+    ddr_write_location += blockLen + sizeof(nb);
 }
 
 void PruTimer::waitUntilFinished()
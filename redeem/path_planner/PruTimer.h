@@ -20,6 +20,7 @@
 #include <queue>
 #include <string.h>
 #include <thread>
+#include <vector>
 
 //#define DEMO_PRU
 
@@ -101,6 +102,13 @@ class PruTimer : public PruInterface
 
     std::condition_variable pruQueueIsntFullByTime;
 
+    /* Set while the block returned by reserveBlock is being written in DDR */
+    bool blockReserved;
+    std::condition_variable reservationReleased;
+
+    /* Handed out by reserveBlock when the PRU isn't running */
+    std::vector<uint8_t> discardedBlock;
+
     inline bool isPruQueueFullByTime()
     {
         return !stop && totalQueuedMovesTime >= maxQueuedMovesTime && blocksID.size() > 1;
@@ -157,7 +165,9 @@ public:
 
     void reset() override;
 
-    void pushBlock(uint8_t* blockMemory, size_t blockLen, unsigned int unit, uint64_t totalTime, SyncCallback* callback = nullptr) override;
+    uint8_t* reserveBlock(size_t maxBytes, unsigned int unit, size_t& reservedBytes) override;
+
+    void commitBlock(size_t blockLen, unsigned int unit, uint64_t totalTime, SyncCallback* callback = nullptr) override;
 
     uint32_t getStepsRemaining() override;
     void resetStepsRemaining() override;
@@ -0,0 +1,115 @@
+/*
+ This file is part of Redeem - 3D Printer control software
+
+ License: GNU GPLv3 http://www.gnu.org/copyleft/gpl.html
+
+ Redeem is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ Redeem is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with Redeem.  If not, see <http://www.gnu.org/licenses/>.
+
+ */
+
+#include "StepSource.h"
+
+#include <algorithm>
+#include <assert.h>
+
+StoredStepSource::StoredStepSource(std::array<std::vector<Step>, NUM_AXES>& steps)
+    : steps(steps)
+{
+    handedOut.fill(false);
+}
+
+const std::vector<Step>& StoredStepSource::nextSteps(int axis)
+{
+    if (handedOut[axis])
+    {
+        return noSteps;
+    }
+
+    handedOut[axis] = true;
+    return steps[axis];
+}
+
+PathStepGenerator::PathStepGenerator(const Path& path)
+    : path(path)
+{
+    assert(path.hasLazySteps());
+
+    const IntVectorN& start = path.getStartMachinePos();
+    const IntVectorN& end = path.getEndMachinePos();
+
+    for (int axis = 0; axis < NUM_AXES; axis++)
+    {
+        nextStep[axis] = start[axis];
+        endStep[axis] = end[axis];
+    }
+
+    if (path.getAxisConfig() == AXIS_CONFIG_DELTA && !Delta::isLinearMove(start.toIntVector3(), end.toIntVector3()))
+    {
+        deltaAxes.reserve(NUM_MOVING_AXES);
+
+        for (int axis = 0; axis < NUM_MOVING_AXES; axis++)
+        {
+            deltaAxes.emplace_back(path.getDelta(), axis, start.toIntVector3(), end.toIntVector3(),
+                path.getStepsPerM().toVector3(), path.getBaseMoveTime());
+        }
+    }
+}
+
+void PathStepGenerator::generateLinearSteps(int axis, std::vector<Step>& steps)
+{
+    // the same steps as calculateLinearMove, starting from nextStep
+    const int startStep = path.getStartMachinePos()[axis];
+    const double distance = endStep[axis] - startStep;
+    const double time = path.getBaseMoveTime();
+
+    const bool direction = startStep < endStep[axis];
+    const int stepIncrement = direction ? 1 : -1;
+    const double stepOffset = stepIncrement / 2.0;
+
+    int& step = nextStep[axis];
+
+    while (step != endStep[axis] && steps.size() < LAZY_STEP_CHUNK_SIZE)
+    {
+        const double position = step + stepOffset;
+        const double stepTime = (position - startStep) / distance * time;
+
+        steps.emplace_back(Step(stepTime, axis, direction));
+
+        step += stepIncrement;
+    }
+}
+
+const std::vector<Step>& PathStepGenerator::nextSteps(int axis)
+{
+    std::vector<Step>& steps = chunks[axis];
+    steps.clear();
+
+    if (axis < static_cast<int>(deltaAxes.size()))
+    {
+        deltaAxes[axis].generate(steps, LAZY_STEP_CHUNK_SIZE);
+    }
+    else
+    {
+        generateLinearSteps(axis, steps);
+    }
+
+    const StepperPathParameters& stepperPath = path.getStepperPathParameters();
+
+    for (auto& step : steps)
+    {
+        step.time = stepperPath.dilateTime(step.time);
+    }
+
+    return steps;
+}
@@ -0,0 +1,81 @@
+/*
+ This file is part of Redeem - 3D Printer control software
+
+ License: GNU GPLv3 http://www.gnu.org/copyleft/gpl.html
+
+ Redeem is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ Redeem is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with Redeem.  If not, see <http://www.gnu.org/licenses/>.
+
+ */
+
+#ifndef __PathPlanner__StepSource__
+#define __PathPlanner__StepSource__
+
+#include <array>
+#include <vector>
+
+#include "Delta.h"
+#include "Path.h"
+#include "config.h"
+
+/*
+ * Hands the steps of a move to PathPlanner::runMove, one axis at a time and
+ * in time order.
+ */
+class StepSource
+{
+public:
+    virtual ~StepSource() { }
+
+    /// the next steps of an axis, empty once the axis has no more steps
+    virtual const std::vector<Step>& nextSteps(int axis) = 0;
+};
+
+/*
+ * Steps that were all calculated up front, like Path::getSteps().
+ */
+class StoredStepSource : public StepSource
+{
+private:
+    std::array<std::vector<Step>, NUM_AXES>& steps;
+    std::array<bool, NUM_AXES> handedOut;
+    const std::vector<Step> noSteps;
+
+public:
+    StoredStepSource(std::array<std::vector<Step>, NUM_AXES>& steps);
+
+    const std::vector<Step>& nextSteps(int axis) override;
+};
+
+/*
+ * Calculates the steps of a path that was initialized with lazy steps while
+ * they are sent to the PRU, LAZY_STEP_CHUNK_SIZE steps per axis at a time.
+ */
+class PathStepGenerator : public StepSource
+{
+private:
+    const Path& path;
+    std::array<std::vector<Step>, NUM_AXES> chunks;
+    std::array<int, NUM_AXES> nextStep;
+    std::array<int, NUM_AXES> endStep;
+    std::vector<DeltaAxisStepGenerator> deltaAxes;
+
+    void generateLinearSteps(int axis, std::vector<Step>& steps);
+
+public:
+    PathStepGenerator(const Path& path);
+
+    const std::vector<Step>& nextSteps(int axis) override;
+};
+
+#endif
@@ -22,11 +22,18 @@
 #ifndef PathPlanner_StepperCommand_h
 #define PathPlanner_StepperCommand_h
 
+#include <stddef.h>
 #include <stdint.h>
+#include <vector>
 
 #define STEPPER_COMMAND_OPTION_SYNC_EVENT 1
 #define STEPPER_COMMAND_OPTION_SYNCWAIT_EVENT 3
 #define STEPPER_COMMAND_OPTION_CARRY_BLOCKED_STEPPERS 4
+#define STEPPER_COMMAND_OPTION_REPEAT 8
+#define STEPPER_COMMAND_OPTION_PACKED 16
+
+// packed commands store their delay in units of this many PRU cycles
+#define PACKED_STEPPERS_COMMAND_DELAY_UNIT 1000
 
 struct SteppersCommand
 {
@@ -39,4 +46,68 @@ struct SteppersCommand
 
 static_assert(sizeof(SteppersCommand) == 8, "Invalid stepper command size");
 
+/*
+ * Takes the place of the command after one with STEPPER_COMMAND_OPTION_REPEAT. The PRU runs
+ * the repeated command count times, adding delayChange to its delay after each run.
+ */
+struct SteppersCommandRepeat
+{
+    uint32_t count;
+    int32_t delayChange;
+};
+
+static_assert(sizeof(SteppersCommandRepeat) == sizeof(SteppersCommand), "Invalid stepper command repeat size");
+
+/*
+ * A command with STEPPER_COMMAND_OPTION_PACKED doesn't step. Its delay is the number of packed
+ * commands that follow it, two to a command slot. They share the header's cancellableMask and
+ * options (without STEPPER_COMMAND_OPTION_PACKED).
+ */
+struct PackedSteppersCommand
+{
+    uint8_t step;
+    uint8_t direction;
+    uint16_t delay; // in PACKED_STEPPERS_COMMAND_DELAY_UNIT cycles
+};
+
+static_assert(2 * sizeof(PackedSteppersCommand) == sizeof(SteppersCommand), "Invalid packed stepper command size");
+
+/// appends the commands the PRU runs for a list of commands that may contain repeats and packed commands
+inline void expandSteppersCommands(const SteppersCommand* commands, size_t length, std::vector<SteppersCommand>& expanded)
+{
+    for (size_t i = 0; i < length; i++)
+    {
+        SteppersCommand command = commands[i];
+
+        if (command.options & STEPPER_COMMAND_OPTION_REPEAT)
+        {
+            const SteppersCommandRepeat& repeat = reinterpret_cast<const SteppersCommandRepeat&>(commands[++i]);
+            command.options &= ~STEPPER_COMMAND_OPTION_REPEAT;
+
+            for (uint32_t run = 0; run < repeat.count; run++)
+            {
+                expanded.push_back(command);
+                command.delay += repeat.delayChange;
+            }
+        }
+        else if (command.options & STEPPER_COMMAND_OPTION_PACKED)
+        {
+            const PackedSteppersCommand* packed = reinterpret_cast<const PackedSteppersCommand*>(&commands[i + 1]);
+            command.options &= ~STEPPER_COMMAND_OPTION_PACKED;
+
+            for (uint32_t packedIndex = 0; packedIndex < command.delay; packedIndex++)
+            {
+                expanded.push_back({ packed[packedIndex].step, packed[packedIndex].direction, command.cancellableMask, command.options,
+                    static_cast<uint32_t>(packed[packedIndex].delay) * PACKED_STEPPERS_COMMAND_DELAY_UNIT });
+            }
+
+            i += (command.delay + 1) / 2;
+        }
+        else
+        {
+            expanded.push_back(command);
+        }
+    }
+}
+
 #endif
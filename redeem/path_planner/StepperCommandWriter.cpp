@@ -0,0 +1,278 @@
+/*
+ This file is part of Redeem - 3D Printer control software
+
+ License: GNU GPLv3 http://www.gnu.org/copyleft/gpl.html
+
+ Redeem is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ Redeem is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with Redeem.  If not, see <http://www.gnu.org/licenses/>.
+
+ */
+
+#include "StepperCommandWriter.h"
+
+#include <algorithm>
+#include <assert.h>
+
+// a repeat takes two slots, the same as four packed commands
+static const uint32_t MINIMUM_REPEAT_LENGTH = 4;
+
+// packed commands wait until a header is written, so don't let too many pile up
+static const size_t MAXIMUM_PACKED_COMMANDS = 256;
+
+static bool isPackable(const SteppersCommand& command)
+{
+    return command.delay % PACKED_STEPPERS_COMMAND_DELAY_UNIT == 0
+        && command.delay / PACKED_STEPPERS_COMMAND_DELAY_UNIT <= UINT16_MAX;
+}
+
+StepperCommandWriter::StepperCommandWriter(PruInterface& pru, size_t maxCommandsPerBlock, bool compress, std::vector<SteppersCommand>* sentCommands)
+    : pru(pru)
+    , maxCommandsPerBlock(maxCommandsPerBlock)
+    , compress(compress)
+    , sentCommands(sentCommands)
+    , commands(nullptr)
+    , commandsLength(0)
+    , commandsIndex(0)
+    , blockTime(0)
+    , run()
+    , runLength(0)
+    , runDelayChange(0)
+    , commandsSent(0)
+    , slotsUsed(0)
+{
+    assert(maxCommandsPerBlock > 0);
+
+    if (compress)
+    {
+        packed.reserve(MAXIMUM_PACKED_COMMANDS);
+    }
+}
+
+// Makes sure there is room for at least one more command and returns how much there is.
+// A full block is only committed once the next command needs room, so the last block of a
+// move is never empty.
+size_t StepperCommandWriter::reserve()
+{
+    if (commands != nullptr && commandsIndex == commandsLength)
+    {
+        commit(nullptr);
+    }
+
+    if (commands == nullptr)
+    {
+        // the block's content is undefined, so every command is written whole
+        size_t reservedBytes;
+        commands = reinterpret_cast<SteppersCommand*>(pru.reserveBlock(sizeof(SteppersCommand) * maxCommandsPerBlock, sizeof(SteppersCommand), reservedBytes));
+        commandsLength = reservedBytes / sizeof(SteppersCommand);
+        assert(commandsLength > 0);
+    }
+
+    return commandsLength - commandsIndex;
+}
+
+void StepperCommandWriter::commit(SyncCallback* callback)
+{
+    pru.commitBlock(sizeof(SteppersCommand) * commandsIndex, sizeof(SteppersCommand), blockTime, callback);
+    slotsUsed += commandsIndex;
+
+    commands = nullptr;
+    commandsLength = 0;
+    commandsIndex = 0;
+    blockTime = 0;
+}
+
+void StepperCommandWriter::writeCommand(const SteppersCommand& command)
+{
+    reserve();
+    commands[commandsIndex++] = command;
+    blockTime += command.delay;
+}
+
+void StepperCommandWriter::send(const SteppersCommand& command)
+{
+    commandsSent++;
+
+    if (sentCommands != nullptr)
+    {
+        sentCommands->push_back(command);
+    }
+
+    if (!compress)
+    {
+        writeCommand(command);
+        return;
+    }
+
+    // the PRU only checks for synchronization between slots, so these are sent as they are
+    if (command.options & STEPPER_COMMAND_OPTION_SYNC_EVENT)
+    {
+        flushRun();
+        flushPacked();
+        writeCommand(command);
+        return;
+    }
+
+    if (runLength != 0
+        && command.step == run.step
+        && command.direction == run.direction
+        && command.cancellableMask == run.cancellableMask
+        && command.options == run.options
+        && runLength != UINT32_MAX)
+    {
+        const int64_t lastDelay = run.delay + static_cast<int64_t>(runDelayChange) * (runLength - 1);
+        const int64_t delayChange = static_cast<int64_t>(command.delay) - lastDelay;
+
+        if (runLength == 1 || delayChange == runDelayChange)
+        {
+            runDelayChange = static_cast<int32_t>(delayChange);
+            runLength++;
+            return;
+        }
+    }
+
+    flushRun();
+
+    run = command;
+    runLength = 1;
+    runDelayChange = 0;
+}
+
+void StepperCommandWriter::flushRun()
+{
+    if (runLength >= MINIMUM_REPEAT_LENGTH)
+    {
+        flushPacked();
+    }
+
+    while (runLength >= MINIMUM_REPEAT_LENGTH)
+    {
+        const size_t room = reserve();
+
+        if (room >= 2)
+        {
+            SteppersCommand repeated = run;
+            repeated.options |= STEPPER_COMMAND_OPTION_REPEAT;
+            commands[commandsIndex++] = repeated;
+            reinterpret_cast<SteppersCommandRepeat&>(commands[commandsIndex++]) = { runLength, runDelayChange };
+
+            blockTime += runLength * static_cast<uint64_t>(run.delay)
+                + static_cast<int64_t>(runDelayChange) * runLength * (runLength - 1) / 2;
+            runLength = 0;
+        }
+        else if (commandsIndex != 0)
+        {
+            // the repeat has to fit in one block
+            commit(nullptr);
+        }
+        else
+        {
+            writeCommand(run);
+            run.delay += runDelayChange;
+            runLength--;
+        }
+    }
+
+    for (; runLength != 0; runLength--)
+    {
+        addPacked(run);
+        run.delay += runDelayChange;
+    }
+}
+
+void StepperCommandWriter::addPacked(const SteppersCommand& command)
+{
+    if (!packed.empty() && (command.cancellableMask != packed.front().cancellableMask || command.options != packed.front().options))
+    {
+        flushPacked();
+    }
+
+    if (!isPackable(command))
+    {
+        flushPacked();
+        writeCommand(command);
+        return;
+    }
+
+    packed.push_back(command);
+
+    if (packed.size() == MAXIMUM_PACKED_COMMANDS)
+    {
+        flushPacked();
+    }
+}
+
+void StepperCommandWriter::flushPacked()
+{
+    size_t index = 0;
+
+    while (index < packed.size())
+    {
+        const size_t remaining = packed.size() - index;
+
+        // a lone command is cheaper without a header
+        if (remaining == 1)
+        {
+            writeCommand(packed[index++]);
+            continue;
+        }
+
+        const size_t room = reserve();
+
+        if (room < 2)
+        {
+            if (commandsIndex != 0)
+            {
+                commit(nullptr);
+            }
+            else
+            {
+                writeCommand(packed[index++]);
+            }
+            continue;
+        }
+
+        const size_t count = std::min(remaining, 2 * (room - 1));
+        const SteppersCommand& first = packed[index];
+
+        commands[commandsIndex++] = { 0, 0, first.cancellableMask, static_cast<uint8_t>(first.options | STEPPER_COMMAND_OPTION_PACKED), static_cast<uint32_t>(count) };
+
+        PackedSteppersCommand* packedCommands = reinterpret_cast<PackedSteppersCommand*>(&commands[commandsIndex]);
+
+        for (size_t packedIndex = 0; packedIndex < count; packedIndex++)
+        {
+            const SteppersCommand& command = packed[index + packedIndex];
+            packedCommands[packedIndex] = { command.step, command.direction, static_cast<uint16_t>(command.delay / PACKED_STEPPERS_COMMAND_DELAY_UNIT) };
+            blockTime += command.delay;
+        }
+
+        if (count % 2)
+        {
+            // fill the rest of the last slot
+            packedCommands[count] = { 0, 0, 0 };
+        }
+
+        commandsIndex += (count + 1) / 2;
+        index += count;
+    }
+
+    packed.clear();
+}
+
+void StepperCommandWriter::finish(SyncCallback* callback)
+{
+    flushRun();
+    flushPacked();
+
+    assert(commands != nullptr && commandsIndex != 0);
+    commit(callback);
+}
@@ -0,0 +1,91 @@
+/*
+ This file is part of Redeem - 3D Printer control software
+
+ License: GNU GPLv3 http://www.gnu.org/copyleft/gpl.html
+
+ Redeem is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ Redeem is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with Redeem.  If not, see <http://www.gnu.org/licenses/>.
+
+ */
+
+#ifndef __PathPlanner__StepperCommandWriter__
+#define __PathPlanner__StepperCommandWriter__
+
+#include <stdint.h>
+#include <vector>
+
+#include "PruInterface.h"
+#include "StepperCommand.h"
+
+/*
+ * Writes the commands of a move straight into blocks reserved in the PRU's memory.
+ *
+ * With compression, runs of commands that only differ by a constant delay change are sent
+ * as repeats and other commands are packed two to a command slot where their delays allow it.
+ */
+class StepperCommandWriter
+{
+private:
+    PruInterface& pru;
+    const size_t maxCommandsPerBlock;
+    const bool compress;
+    std::vector<SteppersCommand>* sentCommands;
+
+    // the reserved block
+    SteppersCommand* commands;
+    size_t commandsLength;
+    size_t commandsIndex;
+    uint64_t blockTime;
+
+    // a run of commands that only differ in their delay, which changes by runDelayChange each time
+    SteppersCommand run;
+    uint32_t runLength;
+    int32_t runDelayChange;
+
+    // commands waiting to be packed, they all have the same cancellableMask and options
+    std::vector<SteppersCommand> packed;
+
+    uint64_t commandsSent;
+    uint64_t slotsUsed;
+
+    size_t reserve();
+    void commit(SyncCallback* callback);
+    void writeCommand(const SteppersCommand& command);
+    void flushRun();
+    void addPacked(const SteppersCommand& command);
+    void flushPacked();
+
+public:
+    /// sentCommands receives a copy of every command sent, if it isn't null
+    StepperCommandWriter(PruInterface& pru, size_t maxCommandsPerBlock, bool compress, std::vector<SteppersCommand>* sentCommands = nullptr);
+
+    /// sends a command once its delay is known
+    void send(const SteppersCommand& command);
+
+    /// writes the commands that are still waiting and commits the last block with the callback
+    void finish(SyncCallback* callback);
+
+    /// the number of commands the PRU will run
+    uint64_t getCommandsSent() const
+    {
+        return commandsSent;
+    }
+
+    /// the number of command slots they took up in the PRU's memory
+    uint64_t getSlotsUsed() const
+    {
+        return slotsUsed;
+    }
+};
+
+#endif
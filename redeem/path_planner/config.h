@@ -57,4 +57,27 @@
 
 #define MINIMUM_STEP_INTERVAL 1000
 
+// Step time solvers for delta towers, see Delta::setStepSolver
+#define DELTA_STEP_SOLVER_EXACT 0
+#define DELTA_STEP_SOLVER_INCREMENTAL 1
+
+/* Steps between exact re-evaluations in the incremental delta step solver */
+#define DELTA_STEP_RESEED_INTERVAL 64
+
+/* Steps per axis calculated at a time for paths with lazy steps */
+#define LAZY_STEP_CHUNK_SIZE 1024
+
+// Per-move flags accepted by PathPlanner::queueMoves and PathPlanner::queueArc
+#define QUEUE_MOVE_CANCELABLE (1 << 0)
+#define QUEUE_MOVE_OPTIMIZE (1 << 1)
+#define QUEUE_MOVE_SOFT_ENDSTOPS (1 << 2)
+#define QUEUE_MOVE_BED_MATRIX (1 << 3)
+#define QUEUE_MOVE_BACKLASH_COMPENSATION (1 << 4)
+#define QUEUE_MOVE_PROBE (1 << 5)
+
+// Planes for PathPlanner::queueArc, the same as Path.X_Y_ARC_PLANE etc.
+#define ARC_PLANE_X_Y 0
+#define ARC_PLANE_X_Z 1
+#define ARC_PLANE_Y_Z 2
+
 #endif
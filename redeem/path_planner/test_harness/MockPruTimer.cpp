@@ -83,11 +83,8 @@ void PruTimer::push_block(uint8_t* blockMemory, size_t blockLen, unsigned int un
 
     RenderedPath renderedPath;
 
-    renderedPath.stepperCommands.reserve(blockLen / sizeof(SteppersCommand));
-    for (size_t i = 0; i < blockLen / sizeof(SteppersCommand); i++)
-    {
-        renderedPath.stepperCommands.push_back(commands[i]);
-    }
+    // check the commands the PRU runs, with repeats expanded
+    expandSteppersCommands(commands, blockLen / sizeof(SteppersCommand), renderedPath.stepperCommands);
 
     PruDump::get()->dumpPath(renderedPath);
 }
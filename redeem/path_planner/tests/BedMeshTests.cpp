@@ -0,0 +1,105 @@
+#include "gtest/gtest.h"
+
+#include "BedMesh.h"
+
+class BedMeshTest : public ::testing::Test
+{
+protected:
+    BedMesh mesh;
+
+    // a 3x3 grid of points 10mm apart, starting at (0, 0)
+    void setHeights(std::vector<double> heights, bool bicubic = false)
+    {
+        mesh.set(0, 0, 0.01, 0.01, 3, heights, bicubic);
+    }
+};
+
+TEST_F(BedMeshTest, IsFlatWithoutHeights)
+{
+    EXPECT_FALSE(mesh.isActive());
+    EXPECT_EQ(mesh.getHeight(0.01, 0.01), 0);
+    EXPECT_TRUE(mesh.getCellCrossings(0, 0, 0.1, 0.1).empty());
+}
+
+TEST_F(BedMeshTest, InterpolatesBilinearly)
+{
+    setHeights({
+        0, 0.001, 0.002,
+        0.001, 0.002, 0.003,
+        0, 0, 0.004,
+    });
+
+    EXPECT_TRUE(mesh.isActive());
+    EXPECT_NEAR(mesh.getHeight(0.01, 0), 0.001, 1e-12);
+    EXPECT_NEAR(mesh.getHeight(0.02, 0.02), 0.004, 1e-12);
+    EXPECT_NEAR(mesh.getHeight(0.005, 0.005), 0.001, 1e-12);
+    EXPECT_NEAR(mesh.getHeight(0.015, 0.0125), (0.0025 * 3 + 0.002) / 4, 1e-12);
+
+    mesh.clear();
+    EXPECT_FALSE(mesh.isActive());
+}
+
+TEST_F(BedMeshTest, UsesTheEdgeOutsideTheGrid)
+{
+    setHeights({
+        0, 0.001, 0.002,
+        0, 0.001, 0.002,
+        0.003, 0.003, 0.003,
+    });
+
+    EXPECT_NEAR(mesh.getHeight(-0.01, -0.01), 0, 1e-12);
+    EXPECT_NEAR(mesh.getHeight(0.015, -0.1), 0.0015, 1e-12);
+    EXPECT_NEAR(mesh.getHeight(0.1, 0.03), 0.003, 1e-12);
+}
+
+TEST_F(BedMeshTest, InterpolatesBicubically)
+{
+    // a plane with a bump in the middle
+    setHeights({
+        0, 0.001, 0.002,
+        0.001, 0.004, 0.003,
+        0.002, 0.003, 0.004,
+    },
+        true);
+
+    // it goes through the points
+    EXPECT_NEAR(mesh.getHeight(0.01, 0.01), 0.004, 1e-12);
+    EXPECT_NEAR(mesh.getHeight(0.02, 0), 0.002, 1e-12);
+
+    // and rounds the bump off, where bilinear interpolation has a ridge
+    EXPECT_GT(mesh.getHeight(0.009, 0.01), 0.0037);
+    EXPECT_GT(mesh.getHeight(0.01, 0.009), 0.0037);
+    EXPECT_LT(mesh.getHeight(0.009, 0.01), 0.004);
+}
+
+TEST_F(BedMeshTest, FindsCellCrossingsInOrder)
+{
+    setHeights(std::vector<double>(9, 0));
+
+    const auto crossings = mesh.getCellCrossings(0.005, 0.005, 0.025, 0.015);
+
+    ASSERT_EQ(crossings.size(), 3);
+    EXPECT_NEAR(crossings[0], 0.25, 1e-12);
+    EXPECT_NEAR(crossings[1], 0.5, 1e-12);
+    EXPECT_NEAR(crossings[2], 0.75, 1e-12);
+
+    // backwards, and leaving the grid across its edge
+    const auto backwards = mesh.getCellCrossings(0.015, 0.005, -0.005, 0.005);
+
+    ASSERT_EQ(backwards.size(), 2);
+    EXPECT_NEAR(backwards[0], 0.25, 1e-12);
+    EXPECT_NEAR(backwards[1], 0.75, 1e-12);
+}
+
+TEST_F(BedMeshTest, CrossesGridPointsOnce)
+{
+    setHeights(std::vector<double>(9, 0));
+
+    const auto crossings = mesh.getCellCrossings(0.005, 0.005, 0.015, 0.015);
+
+    ASSERT_EQ(crossings.size(), 1);
+    EXPECT_NEAR(crossings[0], 0.5, 1e-12);
+
+    // moves that start or end on a line don't cross it
+    EXPECT_TRUE(mesh.getCellCrossings(0.01, 0.005, 0.02, 0.005).empty());
+}
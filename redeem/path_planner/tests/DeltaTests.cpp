@@ -0,0 +1,154 @@
+#include "gtest/gtest.h"
+
+#include <chrono>
+#include <iostream>
+
+#include "Delta.h"
+#include "vector3.h"
+
+class DeltaStepsTest : public ::testing::Test
+{
+protected:
+    Delta delta;
+    const Vector3 stepsPerM = Vector3(160000, 160000, 160000); // 1/32 microstepping on 20 tooth GT2
+
+    void SetUp() override
+    {
+        delta.setMainDimensions(0.322, 0.175);
+        delta.setRadialError(0.001, -0.0005, 0.0);
+        delta.setAngularError(0.2, -0.1, 0.0);
+    }
+
+    std::array<std::vector<Step>, NUM_AXES> calculateMove(const Vector3& start, const Vector3& end, double time, int solver)
+    {
+        std::array<std::vector<Step>, NUM_AXES> steps;
+        delta.setStepSolver(solver);
+        delta.calculateMove(delta.worldToDeltaMotorPos(start, stepsPerM),
+            delta.worldToDeltaMotorPos(end, stepsPerM),
+            stepsPerM, time, steps);
+        return steps;
+    }
+
+    void expectSameSteps(const Vector3& start, const Vector3& end, double time)
+    {
+        const auto exact = calculateMove(start, end, time, DELTA_STEP_SOLVER_EXACT);
+        const auto incremental = calculateMove(start, end, time, DELTA_STEP_SOLVER_INCREMENTAL);
+
+        for (int axis = 0; axis < 3; axis++)
+        {
+            ASSERT_EQ(exact[axis].size(), incremental[axis].size()) << "axis " << axis;
+
+            for (size_t i = 0; i < exact[axis].size(); i++)
+            {
+                const Step& expected = exact[axis][i];
+                const Step& actual = incremental[axis][i];
+
+                ASSERT_EQ(expected.axis, actual.axis);
+                ASSERT_EQ(expected.direction, actual.direction) << "axis " << axis << " step " << i;
+                // well within a PRU cycle
+                ASSERT_NEAR(expected.time, actual.time, CPU_CYCLE_LENGTH / 10) << "axis " << axis << " step " << i;
+            }
+        }
+    }
+};
+
+TEST_F(DeltaStepsTest, IncrementalMatchesExactForLongXMove)
+{
+    expectSameSteps(Vector3(-0.1, 0.0, 0.05), Vector3(0.1, 0.0, 0.05), 1.0);
+}
+
+TEST_F(DeltaStepsTest, IncrementalMatchesExactForDiagonalMove)
+{
+    expectSameSteps(Vector3(-0.08, -0.06, 0.01), Vector3(0.07, 0.09, 0.01), 0.5);
+}
+
+TEST_F(DeltaStepsTest, IncrementalMatchesExactThroughCriticalPoint)
+{
+    // passes right in front of tower A, so its carriage goes up and then down again
+    const Vector3 start(-0.1, 0.1, 0.02);
+    const Vector3 end(0.1, 0.1, 0.02);
+    const auto steps = calculateMove(start, end, 1.0, DELTA_STEP_SOLVER_EXACT);
+    ASSERT_FALSE(steps[0].empty());
+    ASSERT_NE(steps[0].front().direction, steps[0].back().direction);
+
+    expectSameSteps(start, end, 1.0);
+}
+
+TEST_F(DeltaStepsTest, IncrementalMatchesExactForMoveWithZ)
+{
+    expectSameSteps(Vector3(0.05, -0.09, 0.0), Vector3(-0.06, 0.04, 0.02), 0.8);
+    expectSameSteps(Vector3(-0.02, 0.1, 0.1), Vector3(0.03, -0.1, 0.0), 0.8);
+}
+
+TEST_F(DeltaStepsTest, IncrementalMatchesExactForShortMoves)
+{
+    expectSameSteps(Vector3(0.0, 0.0, 0.0), Vector3(0.0001, 0.00005, 0.0), 0.001);
+    expectSameSteps(Vector3(0.03, 0.02, 0.0), Vector3(0.0302, 0.0199, 0.0), 0.002);
+}
+
+TEST_F(DeltaStepsTest, StepGenerationThroughput)
+{
+    for (int solver : { DELTA_STEP_SOLVER_EXACT, DELTA_STEP_SOLVER_INCREMENTAL })
+    {
+        size_t totalSteps = 0;
+        const auto start = std::chrono::steady_clock::now();
+
+        for (int i = 0; i < 20; i++)
+        {
+            const auto steps = calculateMove(Vector3(-0.1, -0.05, 0.0), Vector3(0.1, 0.07, 0.01), 1.0, solver);
+            totalSteps += steps[0].size() + steps[1].size() + steps[2].size();
+        }
+
+        const double seconds = std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
+        std::cout << (solver == DELTA_STEP_SOLVER_EXACT ? "exact" : "incremental") << " solver: "
+                  << totalSteps / seconds / 1e6 << " million steps/s" << std::endl;
+        EXPECT_GT(totalSteps, 0u);
+    }
+}
+
+TEST_F(DeltaStepsTest, BatchKinematicsMatchSinglePositions)
+{
+    const double world[] = {
+        0.0, 0.0, 0.0,
+        0.05, -0.03, 0.01,
+        -0.08, 0.06, 0.12,
+        0.1, 0.1, 0.2,
+    };
+    const int numPositions = sizeof(world) / sizeof(world[0]) / NUM_MOVING_AXES;
+    double towers[sizeof(world) / sizeof(world[0])];
+    double roundTrip[sizeof(world) / sizeof(world[0])];
+    double offsets[numPositions];
+
+    delta.worldToDeltaBatch(world, numPositions, NUM_MOVING_AXES, towers, numPositions, NUM_MOVING_AXES);
+    delta.deltaToWorldBatch(towers, numPositions, NUM_MOVING_AXES, roundTrip, numPositions, NUM_MOVING_AXES);
+    delta.verticalOffsetBatch(towers, numPositions, NUM_MOVING_AXES, offsets, numPositions);
+
+    for (int i = 0; i < numPositions; i++)
+    {
+        const double* position = world + i * NUM_MOVING_AXES;
+        const Vector3 expected = delta.worldToDelta(Vector3(position[0], position[1], position[2]));
+        EXPECT_DOUBLE_EQ(expected.x, towers[i * NUM_MOVING_AXES]);
+        EXPECT_DOUBLE_EQ(expected.y, towers[i * NUM_MOVING_AXES + 1]);
+        EXPECT_DOUBLE_EQ(expected.z, towers[i * NUM_MOVING_AXES + 2]);
+
+        for (int axis = 0; axis < NUM_MOVING_AXES; axis++)
+        {
+            EXPECT_NEAR(position[axis], roundTrip[i * NUM_MOVING_AXES + axis], 1e-9) << "position " << i << " axis " << axis;
+        }
+
+        double offset;
+        delta.verticalOffset(expected.x, expected.y, expected.z, &offset);
+        EXPECT_DOUBLE_EQ(offset, offsets[i]);
+    }
+}
+
+TEST_F(DeltaStepsTest, BatchKinematicsRejectMismatchedArrays)
+{
+    const double world[] = { 0.0, 0.0, 0.0, 0.01, 0.02, 0.03 };
+    double towers[6];
+    double offsets[2];
+
+    EXPECT_THROW(delta.worldToDeltaBatch(world, 2, 3, towers, 1, 3), InputSizeError);
+    EXPECT_THROW(delta.deltaToWorldBatch(world, 3, 2, towers, 3, 2), InputSizeError);
+    EXPECT_THROW(delta.verticalOffsetBatch(world, 2, 3, offsets, 1), InputSizeError);
+}
@@ -96,6 +96,25 @@ TEST_F(PathOptimizerTests, TwoMovesSameDirection)
     EXPECT_DOUBLE_EQ(paths[1].getEndSpeed(), 0.005);
 }
 
+TEST_F(PathOptimizerTests, CountsStopsAtTheEndOfThePlannedPaths)
+{
+    addPath(builder.makePath(0.1, 0, 0, 0.005));
+    popPath();
+
+    // the move never went faster than the safe speed
+    EXPECT_EQ(optimizer.getSafeSpeedStops(), 0);
+
+    addPath(builder.makePath(0.1, 0, 0, 0.02));
+    addPath(builder.makePath(0.1, 0, 0, 0.02));
+    popPath();
+    popPath();
+
+    EXPECT_EQ(optimizer.getSafeSpeedStops(), 1);
+
+    optimizer.resetSafeSpeedStops();
+    EXPECT_EQ(optimizer.getSafeSpeedStops(), 0);
+}
+
 TEST_F(PathOptimizerTests, TwoMovesSameDirectionWithSecondOneSlowerThanJerk)
 {
     addPath(builder.makePath(0.1, 0, 0, 0.02));
@@ -3,8 +3,11 @@
 #include "gmock/gmock.h"
 #include "gtest/gtest.h"
 
+#include <algorithm>
+#include <chrono>
 #include <condition_variable>
 #include <cstring>
+#include <functional>
 #include <mutex>
 #include <numeric>
 #include <string>
@@ -46,14 +49,48 @@ public:
     MOCK_METHOD0(getStepsRemaining, uint32_t());
     MOCK_METHOD0(resetStepsRemaining, void());
 
-    void pushBlock(uint8_t* start, size_t length, unsigned int unit, uint64_t time, SyncCallback* callback) override
+    // the PRU's memory holds whatever was written there before, and a guard after the block catches overruns
+    const uint8_t garbage = 0xa5;
+    const size_t guardBytes = sizeof(SteppersCommand);
+    std::vector<uint8_t> reservedBlock;
+    size_t reservedBytes = 0;
+    size_t maxReservedBytes = SIZE_MAX; // like the space left before the end of the PRU's ring buffer
+    uint32_t numberOfBlocksReserved = 0;
+
+    uint8_t* reserveBlock(size_t maxBytes, unsigned int unit, size_t& reserved) override
+    {
+        EXPECT_EQ(reservedBytes, 0); // only one block is reserved at a time
+
+        reserved = std::max<size_t>(std::min(maxBytes, maxReservedBytes) / unit, 1) * unit;
+        reservedBlock.assign(reserved + guardBytes, garbage);
+        reservedBytes = reserved;
+        numberOfBlocksReserved++;
+
+        return reservedBlock.data();
+    }
+
+    bool guardIsIntact() const
+    {
+        return std::all_of(reservedBlock.end() - guardBytes, reservedBlock.end(), [this](uint8_t b) { return b == garbage; });
+    }
+
+    void commitBlock(size_t length, unsigned int unit, uint64_t time, SyncCallback* callback) override
     {
         std::unique_lock<std::mutex> lock(mutex);
 
         ASSERT_EQ(unit, sizeof(SteppersCommand));
         ASSERT_EQ(length % sizeof(SteppersCommand), 0);
+        ASSERT_LE(length, reservedBytes);
+        ASSERT_TRUE(guardIsIntact());
+
+        reservedBytes = 0;
+
+        if (length == 0)
+        {
+            return;
+        }
 
-        auto commandStart = reinterpret_cast<SteppersCommand*>(start);
+        auto commandStart = reinterpret_cast<SteppersCommand*>(reservedBlock.data());
 
         stepperCommands.insert(stepperCommands.end(), commandStart, commandStart + (length / sizeof(SteppersCommand)));
         blockTimes.push_back(time);
@@ -65,7 +102,6 @@ public:
 
         totalTime += time;
 
-        std::memset(start, 0, length);
         numberOfBlocksPushed++;
 
         onBlockPushed.notify_all();
@@ -118,11 +154,10 @@ public:
         const bool wait,
         const double moveEndTime,
         std::array<std::vector<Step>, NUM_AXES>& steps,
-        std::unique_ptr<SteppersCommand[]> const& commands,
-        const size_t commandsLength,
+        const size_t maxCommandsPerBlock,
         IntVectorN* probeDistanceTraveled)
     {
-        planner.runMove(moveMask, cancellableMask, sync, wait, moveEndTime, steps, commands, commandsLength, probeDistanceTraveled);
+        planner.runMove(moveMask, cancellableMask, sync, wait, moveEndTime, steps, maxCommandsPerBlock, probeDistanceTraveled);
     }
 };
 
@@ -158,13 +193,11 @@ TEST_F(PathPlannerRunMoveTest, WritesWithinBufferLength)
     steps[X_AXIS].push_back(Step(0.2, X_AXIS, true));
 
     const size_t commandLength = 2;
-    std::unique_ptr<SteppersCommand[]> commands = std::make_unique<SteppersCommand[]>(commandLength + 1);
-
-    std::memset(&commands[commandLength], 0xffffffff, sizeof(SteppersCommand));
 
-    runMove(1, 0, false, false, 0.3, steps, commands, commandLength, nullptr);
+    runMove(1, 0, false, false, 0.3, steps, commandLength, nullptr);
 
-    EXPECT_EQ(commands[commandLength].step, 0xff);
+    EXPECT_TRUE(pru.guardIsIntact());
+    EXPECT_EQ(pru.stepperCommands.size(), 3);
 }
 
 TEST_F(PathPlannerRunMoveTest, PushesCorrectNumberOfBlocks)
@@ -175,9 +208,8 @@ TEST_F(PathPlannerRunMoveTest, PushesCorrectNumberOfBlocks)
     steps[X_AXIS].push_back(Step(0.2, X_AXIS, true));
 
     const size_t commandLength = 2;
-    std::unique_ptr<SteppersCommand[]> commands = std::make_unique<SteppersCommand[]>(commandLength);
 
-    runMove(1, 0, false, false, 0.3, steps, commands, commandLength, nullptr);
+    runMove(1, 0, false, false, 0.3, steps, commandLength, nullptr);
 
     EXPECT_EQ(pru.stepperCommands.size(), 3); // one for opening wait, then two steps
 }
@@ -193,9 +225,8 @@ TEST_F(PathPlannerRunMoveTest, CalculatesWaitsCorrectly)
     steps[X_AXIS].push_back(Step(0.15, X_AXIS, true));
 
     const size_t commandLength = 2;
-    std::unique_ptr<SteppersCommand[]> commands = std::make_unique<SteppersCommand[]>(commandLength);
 
-    runMove(1, 0, false, false, 0.21, steps, commands, commandLength, nullptr);
+    runMove(1, 0, false, false, 0.21, steps, commandLength, nullptr);
 
     auto& stepsTaken = pru.stepperCommands;
     ASSERT_EQ(stepsTaken.size(), 6);
@@ -226,9 +257,8 @@ TEST_F(PathPlannerRunMoveTest, WrapsStepListsCorrectly)
     EXPECT_EQ(steps[X_AXIS].size(), 100);
 
     const size_t commandLength = 10;
-    std::unique_ptr<SteppersCommand[]> commands = std::make_unique<SteppersCommand[]>(commandLength);
 
-    runMove(0x1, 0, false, false, 1.0, steps, commands, commandLength, nullptr);
+    runMove(0x1, 0, false, false, 1.0, steps, commandLength, nullptr);
 
     // we're moving at one step every 0.01 seconds, which is 2,000,000 PRU cycles
     const SteppersCommand openingWait = { 0, 0, 0, 0, 1000000 };
@@ -262,9 +292,8 @@ TEST_F(PathPlannerRunMoveTest, SpecifiesCorrectBlockTimes)
     steps[X_AXIS].push_back(Step(0.15, X_AXIS, true));
 
     const size_t commandLength = 2;
-    std::unique_ptr<SteppersCommand[]> commands = std::make_unique<SteppersCommand[]>(commandLength);
 
-    runMove(1, 0, false, false, 0.21, steps, commands, commandLength, nullptr);
+    runMove(1, 0, false, false, 0.21, steps, commandLength, nullptr);
 
     auto& blockTimes = pru.blockTimes;
     ASSERT_EQ(blockTimes.size(), 3);
@@ -273,6 +302,179 @@ TEST_F(PathPlannerRunMoveTest, SpecifiesCorrectBlockTimes)
     EXPECT_DOUBLE_EQ(static_cast<double>(blockTimes[2]), (0.05 + 0.06) * F_CPU);
 }
 
+TEST_F(PathPlannerRunMoveTest, FillsShortReservations)
+{
+    std::array<std::vector<Step>, NUM_AXES> steps;
+
+    for (int stepIndex = 0; stepIndex < 100; stepIndex++)
+    {
+        steps[X_AXIS].push_back(Step(0.01 * stepIndex + 0.005, X_AXIS, true));
+        if (stepIndex % 3 == 0)
+        {
+            steps[Y_AXIS].push_back(Step(0.01 * stepIndex + 0.005, Y_AXIS, false));
+        }
+    }
+
+    runMove(0x3, 0, false, false, 1.0, steps, 10, nullptr);
+    const std::vector<SteppersCommand> fullBlocks = pru.stepperCommands;
+    const uint64_t fullBlocksTime = pru.totalTime;
+
+    // like reservations that run into the end of the PRU's ring buffer
+    pru.stepperCommands.clear();
+    pru.totalTime = 0;
+    pru.numberOfBlocksReserved = 0;
+    pru.maxReservedBytes = 3 * sizeof(SteppersCommand);
+
+    runMove(0x3, 0, false, false, 1.0, steps, 10, nullptr);
+
+    EXPECT_EQ(pru.numberOfBlocksReserved, 34);
+    EXPECT_EQ(pru.stepperCommands, fullBlocks);
+    EXPECT_EQ(pru.totalTime, fullBlocksTime);
+}
+
+TEST_F(PathPlannerRunMoveTest, PushBlockSplitsAcrossReservations)
+{
+    std::vector<SteppersCommand> commands(10);
+    for (size_t i = 0; i < commands.size(); i++)
+    {
+        commands[i] = { 1, 1, 0, 0, static_cast<uint32_t>(i) };
+    }
+
+    SyncCallback* callback = reinterpret_cast<SyncCallback*>(&commands);
+    pru.maxReservedBytes = 4 * sizeof(SteppersCommand);
+
+    pru.pushBlock(reinterpret_cast<uint8_t*>(commands.data()), commands.size() * sizeof(SteppersCommand), sizeof(SteppersCommand), 1000, callback);
+
+    EXPECT_EQ(pru.stepperCommands, commands);
+    ASSERT_EQ(pru.blockTimes.size(), 3);
+    EXPECT_EQ(pru.blockTimes[0], 400);
+    EXPECT_EQ(pru.blockTimes[1], 400);
+    EXPECT_EQ(pru.blockTimes[2], 200);
+    ASSERT_EQ(pru.callbacks.size(), 1);
+    EXPECT_EQ(pru.callbacks[0], callback);
+}
+
+TEST_F(PathPlannerRunMoveTest, RepeatsConstantRateSteps)
+{
+    std::array<std::vector<Step>, NUM_AXES> steps;
+
+    // a cruise with X and Y stepping together, then X speeding up alone
+    for (int stepIndex = 0; stepIndex < 100; stepIndex++)
+    {
+        steps[X_AXIS].push_back(Step(0.001 * stepIndex + 0.0005, X_AXIS, true));
+        steps[Y_AXIS].push_back(Step(0.001 * stepIndex + 0.0005, Y_AXIS, false));
+    }
+    for (int stepIndex = 0; stepIndex < 50; stepIndex++)
+    {
+        steps[X_AXIS].push_back(Step(0.1 + 0.0001 * stepIndex * (21 - stepIndex / 5.0), X_AXIS, true));
+    }
+
+    runMove(0x3, 0, false, false, 0.6, steps, 1024, nullptr);
+    const std::vector<SteppersCommand> uncompressed = pru.stepperCommands;
+    const uint64_t uncompressedTime = pru.totalTime;
+
+    pru.stepperCommands.clear();
+    pru.blockTimes.clear();
+    pru.totalTime = 0;
+    planner.setStepCommandCompression(true);
+
+    runMove(0x3, 0, false, false, 0.6, steps, 1024, nullptr);
+
+    std::vector<SteppersCommand> expanded;
+    expandSteppersCommands(pru.stepperCommands.data(), pru.stepperCommands.size(), expanded);
+
+    EXPECT_EQ(expanded, uncompressed);
+    EXPECT_EQ(pru.totalTime, uncompressedTime);
+    EXPECT_LT(pru.stepperCommands.size(), uncompressed.size() / 4);
+    ASSERT_GE(pru.stepperCommands.size(), 3);
+    EXPECT_EQ(pru.stepperCommands[1].options, STEPPER_COMMAND_OPTION_REPEAT);
+    EXPECT_EQ(reinterpret_cast<const SteppersCommandRepeat&>(pru.stepperCommands[2]).count, 99);
+    EXPECT_EQ(planner.getStepCommandsSent(), 2 * uncompressed.size());
+    EXPECT_EQ(planner.getStepCommandSlotsUsed(), uncompressed.size() + pru.stepperCommands.size());
+}
+
+TEST_F(PathPlannerRunMoveTest, RepeatsFitShortReservations)
+{
+    std::array<std::vector<Step>, NUM_AXES> steps;
+
+    for (int stepIndex = 0; stepIndex < 20; stepIndex++)
+    {
+        steps[X_AXIS].push_back(Step(0.01 * stepIndex + 0.005, X_AXIS, stepIndex < 10));
+    }
+
+    runMove(1, 0, true, false, 0.3, steps, 10, nullptr);
+    const std::vector<SteppersCommand> uncompressed = pru.stepperCommands;
+    const uint64_t uncompressedTime = pru.totalTime;
+
+    // every reservation has an odd number of slots, so repeats have to wait for the next block
+    pru.stepperCommands.clear();
+    pru.totalTime = 0;
+    pru.maxReservedBytes = 3 * sizeof(SteppersCommand);
+    planner.setStepCommandCompression(true);
+
+    runMove(1, 0, true, false, 0.3, steps, 10, nullptr);
+
+    std::vector<SteppersCommand> expanded;
+    expandSteppersCommands(pru.stepperCommands.data(), pru.stepperCommands.size(), expanded);
+
+    EXPECT_EQ(expanded, uncompressed);
+    EXPECT_EQ(pru.totalTime, uncompressedTime);
+    EXPECT_LT(pru.stepperCommands.size(), uncompressed.size());
+    EXPECT_TRUE(expanded.back().options & STEPPER_COMMAND_OPTION_SYNC_EVENT);
+}
+
+TEST_F(PathPlannerRunMoveTest, DoesntRepeatProbeSteps)
+{
+    std::array<std::vector<Step>, NUM_AXES> steps;
+
+    for (int stepIndex = 0; stepIndex < 20; stepIndex++)
+    {
+        steps[Z_AXIS].push_back(Step(0.01 * stepIndex + 0.005, Z_AXIS, false));
+    }
+
+    planner.setStepCommandCompression(true);
+    EXPECT_CALL(pru, resetStepsRemaining()).Times(2);
+    EXPECT_CALL(pru, getStepsRemaining()).WillOnce(::testing::Return(0));
+
+    IntVectorN probeDistanceTraveled;
+    runMove(4, 4, false, false, 0.3, steps, 1024, &probeDistanceTraveled);
+
+    EXPECT_EQ(pru.stepperCommands.size(), 21);
+    EXPECT_EQ(probeDistanceTraveled[Z_AXIS], -20);
+}
+
+TEST_F(PathPlannerRunMoveTest, InterleavingThroughput)
+{
+    // four axes stepping at unrelated rates, like a diagonal print move with extrusion
+    std::array<std::vector<Step>, NUM_AXES> steps;
+    const std::array<int, 4> stepCounts = { 200000, 150000, 7000, 90000 };
+
+    for (int axis = 0; axis < 4; axis++)
+    {
+        steps[axis].reserve(stepCounts[axis]);
+        for (int step = 0; step < stepCounts[axis]; step++)
+        {
+            steps[axis].push_back(Step((step + 0.5) / stepCounts[axis] * 100.0, axis, axis % 2 == 0));
+        }
+    }
+
+    const size_t commandLength = 1024;
+
+    const auto start = std::chrono::steady_clock::now();
+    runMove(0xf, 0, false, false, 100.0, steps, commandLength, nullptr);
+    const double seconds = std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
+
+    std::cout << "interleaved " << pru.stepperCommands.size() << " commands at "
+              << pru.stepperCommands.size() / seconds / 1e6 << " million commands/s" << std::endl;
+
+    size_t stepsTaken = 0;
+    for (const auto& command : pru.stepperCommands)
+    {
+        stepsTaken += __builtin_popcount(command.step);
+    }
+    EXPECT_EQ(stepsTaken, 200000 + 150000 + 7000 + 90000);
+}
+
 class PathPlannerTest : public ::testing::Test
 {
 protected:
@@ -297,6 +499,11 @@ public:
     {
         return planner.pathQueue.getQueuedMoveTime();
     }
+
+    VectorN popQueuedPathMove()
+    {
+        return planner.pathQueue.popPath()->getWorldMove();
+    }
 };
 
 TEST_F(PathPlannerTest, RunsSimplePath)
@@ -376,6 +583,23 @@ TEST_F(PathPlannerTest, TracksBufferedMoveTime)
     EXPECT_EQ(getQueuedMoveTime(), 0);
 }
 
+TEST_F(PathPlannerTest, ReportsAvailablePathSlots)
+{
+    const size_t emptySlots = planner.getAvailablePathSlots();
+    EXPECT_EQ(emptySlots, 1024);
+
+    planner.queueMove(VectorN(0.001, 0, 0), 0.001, 1.0, false, false, false, false, false, false);
+    planner.queueMove(VectorN(0.002, 0, 0), 0.001, 1.0, false, false, false, false, false, false);
+
+    EXPECT_EQ(planner.getAvailablePathSlots(), emptySlots - 2);
+
+    planner.runThread();
+    planner.waitUntilFinished();
+    planner.stopThread(true);
+
+    EXPECT_EQ(planner.getAvailablePathSlots(), emptySlots);
+}
+
 struct TestSyncCallback : public SyncCallback
 {
     std::promise<void> syncPromise;
@@ -518,4 +742,391 @@ TEST_F(PathPlannerTest, SetsCarryBlockedSteppersFlag)
     }
 
     planner.stopThread(true);
-}
\ No newline at end of file
+}
+TEST_F(PathPlannerTest, QueuesMoveBatches)
+{
+    double endPositions[] = {
+        0.0001, 0, 0, 0, 0, 0, 0, 0,
+        0.0001, 0, 0, 0, 0, 0, 0, 0, // no move - reported as a failure
+        0.0002, 0.0001, 0, 0, 0, 0, 0, 0
+    };
+    double speeds[] = { 0.0001, 0.0001, 0.0001 };
+    double accels[] = { 1.0, 1.0, 1.0 };
+    int flags[] = { QUEUE_MOVE_CANCELABLE, 0, QUEUE_MOVE_OPTIMIZE };
+    unsigned char status[] = { 0xff, 0xff, 0xff };
+
+    const VectorN finalState = planner.queueMoves(endPositions, 3, NUM_AXES, speeds, 3, accels, 3, flags, 3, status, 3);
+
+    EXPECT_EQ(status[0], 0);
+    EXPECT_EQ(status[1], 1);
+    EXPECT_EQ(status[2], 0);
+    EXPECT_EQ(finalState, VectorN(0.0002, 0.0001, 0));
+    EXPECT_EQ(planner.getState(), finalState);
+
+    planner.runThread();
+    planner.waitUntilFinished();
+    planner.stopThread(true);
+
+    ASSERT_EQ(pru.stepperCommands.size(), 22);
+    EXPECT_EQ(pru.stepperCommands[1].cancellableMask, 1);
+    EXPECT_EQ(pru.stepperCommands[12].cancellableMask, 0);
+}
+
+TEST_F(PathPlannerTest, RejectsMismatchedMoveBatches)
+{
+    double endPositions[NUM_AXES * 2] = {};
+    double speeds[] = { 0.001, 0.001 };
+    double accels[] = { 1.0 };
+    int flags[] = { 0, 0 };
+    unsigned char status[2];
+
+    EXPECT_THROW(planner.queueMoves(endPositions, 2, NUM_AXES, speeds, 2, accels, 1, flags, 2, status, 2), InputSizeError);
+    EXPECT_THROW(planner.queueMoves(endPositions, 2, 3, speeds, 2, accels, 1, flags, 2, status, 2), InputSizeError);
+}
+
+static const std::vector<double> identityMatrix = { 1, 0, 0, 0, 1, 0, 0, 0, 1 };
+
+TEST_F(PathPlannerTest, QueuesArcSegmentsWithinTolerance)
+{
+    planner.setArcSegmentLength(0.001);
+    planner.setArcTolerance(0.000001);
+    planner.setState(VectorN(0.01, 0, 0));
+
+    // a counter-clockwise quarter circle of 10mm around the origin
+    planner.queueArc(VectorN(0.01, 0, 0), VectorN(0, 0.01, 0), 0, 0, ARC_PLANE_X_Y, false,
+        0.01, 1.0, QUEUE_MOVE_OPTIMIZE, identityMatrix);
+
+    EXPECT_FALSE(planner.getLastQueueMoveStatus());
+    EXPECT_EQ(planner.getState(), VectorN(0, 0.01, 0));
+
+    // a chord of 0.283mm is 1um away from the arc in the middle
+    const size_t segments = 1024 - planner.getAvailablePathSlots();
+    EXPECT_EQ(segments, 56);
+
+    VectorN end(0.01, 0, 0);
+
+    for (size_t i = 0; i < segments; i++)
+    {
+        end += popQueuedPathMove();
+
+        // 10mm from the origin, turning counter-clockwise
+        EXPECT_NEAR(std::hypot(end[0], end[1]), 0.01, 0.00001);
+        EXPECT_NEAR(std::atan2(end[1], end[0]), M_PI / 2 * (i + 1) / segments, 0.002);
+    }
+}
+
+TEST_F(PathPlannerTest, LimitsArcSegmentLength)
+{
+    planner.setArcSegmentLength(0.001);
+    planner.setArcTolerance(0.0001);
+
+    planner.queueArc(VectorN(0.01, 0, 0), VectorN(0, 0.01, 0), 0, 0, ARC_PLANE_X_Y, false,
+        0.01, 1.0, QUEUE_MOVE_OPTIMIZE, identityMatrix);
+
+    // the tolerance would allow 2.8mm, so 15.7mm take 16 segments of at most 1mm
+    EXPECT_EQ(1024 - planner.getAvailablePathSlots(), 16);
+}
+
+TEST_F(PathPlannerTest, QueuesFullCircleArcs)
+{
+    planner.setArcSegmentLength(0.001);
+    planner.setArcTolerance(0);
+
+    planner.queueArc(VectorN(), VectorN(), 0.005, 0, ARC_PLANE_X_Y, true,
+        0.01, 1.0, QUEUE_MOVE_OPTIMIZE, identityMatrix);
+
+    EXPECT_FALSE(planner.getLastQueueMoveStatus());
+    EXPECT_EQ(planner.getState(), VectorN());
+    EXPECT_EQ(1024 - planner.getAvailablePathSlots(), 32);
+
+    // clockwise from the left of the center goes up first
+    EXPECT_GT(popQueuedPathMove()[1], 0);
+}
+
+TEST_F(PathPlannerTest, QueuesHelicalArcsInOtherPlanes)
+{
+    planner.setArcSegmentLength(0.001);
+    planner.setArcTolerance(0);
+
+    // a clockwise half circle in the YZ plane over the center, moving X and E along the way
+    planner.queueArc(VectorN(0, 0, 0, 0), VectorN(0.004, 0.01, 0, 0.002), 0.005, 0, ARC_PLANE_Y_Z, true,
+        0.01, 1.0, QUEUE_MOVE_OPTIMIZE, identityMatrix);
+
+    EXPECT_EQ(planner.getState(), VectorN(0.004, 0.01, 0, 0.002));
+
+    const size_t segments = 1024 - planner.getAvailablePathSlots();
+    EXPECT_EQ(segments, 16);
+
+    VectorN end;
+
+    for (size_t i = 0; i < segments; i++)
+    {
+        end += popQueuedPathMove();
+
+        EXPECT_NEAR(std::hypot(end[1] - 0.005, end[2]), 0.005, 0.00001);
+        EXPECT_GE(end[2], -0.00001);
+        EXPECT_NEAR(end[0], 0.004 * (i + 1) / segments, 0.00001);
+        EXPECT_NEAR(end[3], 0.002 * (i + 1) / segments, 0.00001);
+    }
+}
+
+TEST_F(PathPlannerTest, AppliesBedMatrixToArcSegments)
+{
+    planner.setArcSegmentLength(0.001);
+    planner.setState(VectorN(0.01, 0, 0.001));
+
+    // raises Z by a tenth of X
+    planner.queueArc(VectorN(0.01, 0, 0), VectorN(0, 0.01, 0), 0, 0, ARC_PLANE_X_Y, false,
+        0.01, 1.0, QUEUE_MOVE_OPTIMIZE, { 1, 0, 0, 0, 1, 0, 0.1, 0, 1 });
+
+    EXPECT_EQ(planner.getState(), VectorN(0, 0.01, 0));
+
+    const VectorN end = VectorN(0.01, 0, 0.001) + popQueuedPathMove();
+    EXPECT_NEAR(end[2], end[0] / 10.0, 0.00001);
+    EXPECT_GT(end[2], 0.0009);
+}
+
+TEST_F(PathPlannerTest, RejectsArcsWithMismatchedBedMatrix)
+{
+    EXPECT_THROW(planner.queueArc(VectorN(0.01, 0, 0), VectorN(0, 0.01, 0), 0, 0, ARC_PLANE_X_Y, false,
+                     0.01, 1.0, 0, { 1, 0, 0 }),
+        InputSizeError);
+}
+
+// a 3x3 grid 10mm apart, rising by a tenth of X
+static const std::vector<double> tiltedMesh = { 0, 0.001, 0.002, 0, 0.001, 0.002, 0, 0.001, 0.002 };
+
+TEST_F(PathPlannerTest, SplitsMovesAtBedMeshCells)
+{
+    planner.setBedMesh(0, 0, 0.01, 0.01, 3, tiltedMesh, false);
+    planner.setState(VectorN(0.005, 0.005, 0));
+
+    planner.queueMove(VectorN(0.025, 0.015, 0.001), 0.01, 1.0, false, true, false, true, false, false);
+
+    EXPECT_FALSE(planner.getLastQueueMoveStatus());
+    // the mesh ends at X = 20mm, its edge is used beyond it
+    EXPECT_EQ(planner.getState(), VectorN(0.025, 0.015, 0.003));
+
+    // split where the move crosses X = 10mm, Y = 10mm and X = 20mm
+    ASSERT_EQ(1024 - planner.getAvailablePathSlots(), 4);
+
+    VectorN end(0.005, 0.005, 0);
+    const double crossings[] = { 0.01, 0.015, 0.02, 0.025 };
+
+    for (const double x : crossings)
+    {
+        end += popQueuedPathMove();
+
+        EXPECT_NEAR(end[0], x, 0.00001);
+        EXPECT_NEAR(end[2], 0.001 * (x - 0.005) / 0.02 + std::min(x, 0.02) / 10.0, 0.00001);
+    }
+}
+
+TEST_F(PathPlannerTest, KeepsBedMeshHeightWhenSettingOtherAxes)
+{
+    planner.setBedMesh(0, 0, 0.01, 0.01, 3, tiltedMesh, false);
+    planner.queueMove(VectorN(0.015, 0.005, 0), 0.01, 1.0, false, true, false, true, false, false);
+    EXPECT_EQ(planner.getState(), VectorN(0.015, 0.005, 0.0015));
+
+    // G92 E1
+    VectorN state = planner.getState();
+    state[3] = 0.001;
+    planner.setState(state);
+
+    planner.queueMove(VectorN(0.005, 0.005, 0, 0.001), 0.01, 1.0, false, true, false, true, false, false);
+    EXPECT_EQ(planner.getState(), VectorN(0.005, 0.005, 0.0005, 0.001));
+
+    popQueuedPathMove();
+    popQueuedPathMove();
+
+    // Z follows the mesh down from where the first move ended
+    EXPECT_NEAR(popQueuedPathMove()[2], -0.0005, 0.00001);
+    EXPECT_NEAR(popQueuedPathMove()[2], -0.0005, 0.00001);
+}
+
+TEST_F(PathPlannerTest, OnlyAppliesBedMeshToCompensatedMoves)
+{
+    planner.setBedMesh(0, 0, 0.01, 0.01, 3, tiltedMesh, false);
+
+    planner.queueMove(VectorN(0.02, 0, 0), 0.01, 1.0, false, true, false, false, false, false);
+
+    EXPECT_EQ(planner.getState(), VectorN(0.02, 0, 0));
+    EXPECT_EQ(1024 - planner.getAvailablePathSlots(), 1);
+
+    planner.clearBedMesh();
+    planner.queueMove(VectorN(0, 0, 0), 0.01, 1.0, false, true, false, true, false, false);
+
+    EXPECT_EQ(planner.getState(), VectorN());
+    EXPECT_EQ(1024 - planner.getAvailablePathSlots(), 2);
+}
+
+TEST_F(PathPlannerTest, RejectsInvalidBedMeshes)
+{
+    EXPECT_THROW(planner.setBedMesh(0, 0, 0.01, 0.01, 3, { 0, 0, 0, 0 }, false), InputSizeError);
+    EXPECT_THROW(planner.setBedMesh(0, 0, 0.01, 0.01, 1, { 0, 0 }, false), InputSizeError);
+    EXPECT_THROW(planner.setBedMesh(0, 0, 0, 0.01, 2, { 0, 0, 0, 0 }, false), InputSizeError);
+}
+
+std::vector<SteppersCommand> runMovesWithStepGeneration(int axisConfig, bool lazy, bool compress = false,
+    std::function<void(PathPlanner&)> afterQueueing = nullptr)
+{
+    MockAlarmCallback alarmCallback;
+    MockPru pru;
+    PathPlanner planner(1024, alarmCallback, pru);
+
+    planner.delta_bot.setMainDimensions(0.322, 0.175);
+    planner.setAxisConfig(axisConfig);
+    planner.setLazyStepGeneration(lazy);
+    planner.setStepCommandCompression(compress);
+    planner.setState(VectorN());
+    planner.setMaxSpeeds(VectorN(1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0));
+    planner.setAxisStepsPerMeter(VectorN(100000, 100000, 100000, 100000, 100000, 100000, 100000, 100000));
+    planner.setAcceleration(VectorN(1, 1, 1, 1, 1, 1, 1, 1));
+    planner.setMaxSpeedJumps(VectorN(0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0.01));
+
+    // long enough for several chunks of steps, with a Z only move and an extruder only move
+    const std::vector<VectorN> moves = {
+        VectorN(0.03, 0.01, 0, 0.002),
+        VectorN(-0.01, 0.04, 0.002, 0.004),
+        VectorN(-0.01, 0.04, 0.005, 0.004),
+        VectorN(-0.01, 0.04, 0.005, 0.001),
+    };
+
+    for (const auto& move : moves)
+    {
+        planner.queueMove(move, 0.05, 0.5, false, true, false, false, false, false);
+    }
+
+    if (afterQueueing)
+    {
+        afterQueueing(planner);
+    }
+
+    planner.runThread();
+    planner.waitUntilFinished();
+    planner.stopThread(true);
+
+    EXPECT_EQ(planner.getStepCommandSlotsUsed(), pru.stepperCommands.size());
+
+    if (compress)
+    {
+        std::vector<SteppersCommand> expanded;
+        expandSteppersCommands(pru.stepperCommands.data(), pru.stepperCommands.size(), expanded);
+        EXPECT_EQ(planner.getStepCommandsSent(), expanded.size());
+
+        std::cout << "compressed " << expanded.size() << " commands into " << pru.stepperCommands.size()
+                  << " slots, " << static_cast<double>(expanded.size()) / pru.stepperCommands.size() << ":1" << std::endl;
+
+        return expanded;
+    }
+
+    EXPECT_EQ(planner.getStepCommandsSent(), pru.stepperCommands.size());
+
+    return pru.stepperCommands;
+}
+
+TEST(PathPlannerLazySteps, MatchesStoredStepsForCartesian)
+{
+    const auto stored = runMovesWithStepGeneration(AXIS_CONFIG_XY, false);
+    const auto lazy = runMovesWithStepGeneration(AXIS_CONFIG_XY, true);
+
+    ASSERT_GT(stored.size(), 2 * LAZY_STEP_CHUNK_SIZE);
+    EXPECT_EQ(stored, lazy);
+}
+
+TEST(PathPlannerLazySteps, MatchesStoredStepsForDelta)
+{
+    const auto stored = runMovesWithStepGeneration(AXIS_CONFIG_DELTA, false);
+    const auto lazy = runMovesWithStepGeneration(AXIS_CONFIG_DELTA, true);
+
+    ASSERT_GT(stored.size(), 2 * LAZY_STEP_CHUNK_SIZE);
+    EXPECT_EQ(stored, lazy);
+}
+
+TEST(PathPlannerLazySteps, KeepsTheDeltaGeometryPathsWereQueuedWith)
+{
+    const auto stored = runMovesWithStepGeneration(AXIS_CONFIG_DELTA, false);
+    const auto lazy = runMovesWithStepGeneration(AXIS_CONFIG_DELTA, true, false, [](PathPlanner& planner) {
+        // what M665 does while the queued moves wait for the planner thread
+        planner.delta_bot.setMainDimensions(0.3, 0.16);
+        planner.delta_bot.setRadialError(0.001, -0.001, 0);
+    });
+
+    EXPECT_EQ(stored, lazy);
+}
+
+TEST(PathPlannerStepCompression, MatchesUncompressedStepsForCartesian)
+{
+    const auto uncompressed = runMovesWithStepGeneration(AXIS_CONFIG_XY, false);
+    const auto compressed = runMovesWithStepGeneration(AXIS_CONFIG_XY, false, true);
+
+    EXPECT_EQ(uncompressed, compressed);
+}
+
+TEST(PathPlannerStepCompression, MatchesUncompressedStepsForDelta)
+{
+    const auto uncompressed = runMovesWithStepGeneration(AXIS_CONFIG_DELTA, true);
+    const auto compressed = runMovesWithStepGeneration(AXIS_CONFIG_DELTA, true, true);
+
+    EXPECT_EQ(uncompressed, compressed);
+}
+
+TEST(PathPlannerDelta, RunsTowersThatReturnToTheirStartHeight)
+{
+    for (const bool lazy : { false, true })
+    {
+        MockAlarmCallback alarmCallback;
+        MockPru pru;
+        PathPlanner planner(1024, alarmCallback, pru);
+
+        planner.delta_bot.setMainDimensions(0.322, 0.175);
+        planner.setAxisConfig(AXIS_CONFIG_DELTA);
+        planner.setLazyStepGeneration(lazy);
+        planner.setMaxSpeeds(VectorN(1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0));
+        planner.setAxisStepsPerMeter(VectorN(100000, 100000, 100000, 100000, 100000, 100000, 100000, 100000));
+        planner.setState(VectorN(-0.05, 0.05, 0));
+        planner.setAcceleration(VectorN(1, 1, 1, 1, 1, 1, 1, 1));
+        planner.setMaxSpeedJumps(VectorN(0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0.01));
+
+        // the A tower's carriage climbs and comes back down to the step it started at,
+        // so the X axis steps although it isn't in the move mask
+        planner.queueMove(VectorN(0.05, 0.05, 0), 0.05, 0.5, false, true, false, false, false, false);
+
+        planner.runThread();
+        planner.waitUntilFinished();
+        planner.stopThread(true);
+
+        std::array<int, NUM_AXES> stepsTaken = {};
+        std::array<int, NUM_AXES> netSteps = {};
+        for (const auto& command : pru.stepperCommands)
+        {
+            for (int axis = 0; axis < NUM_AXES; axis++)
+            {
+                if (command.step & (1 << axis))
+                {
+                    stepsTaken[axis]++;
+                    netSteps[axis] += (command.direction & (1 << axis)) ? 1 : -1;
+                }
+            }
+        }
+
+        EXPECT_GT(stepsTaken[X_AXIS], 0);
+        EXPECT_EQ(netSteps[X_AXIS], 0);
+    }
+}
+
+TEST(PathPlannerLazySteps, PathsDontStoreLazySteps)
+{
+    PathBuilder builder = PathBuilder::CartesianBuilder();
+    const VectorN end(0.01, 0.02, 0, 0, 0, 0, 0, 0);
+
+    Path path;
+    path.initialize(IntVectorN(), (end * builder.stepsPerM).round(), VectorN(), end, builder.stepsPerM,
+        builder.maxSpeeds, builder.maxAccelMPerSquareSecond, 0.1, 0.5, AXIS_CONFIG_XY, nullptr, false, false, true);
+
+    EXPECT_TRUE(path.hasLazySteps());
+    for (const auto& axisSteps : path.getSteps())
+    {
+        EXPECT_TRUE(axisSteps.empty());
+    }
+}
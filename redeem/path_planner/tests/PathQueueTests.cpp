@@ -605,4 +605,117 @@ TEST(PathQueueBasics, SignalsEmptyAfterOneBigPath)
     queue.popPath();
 
     thread.waitAndJoin();
-}
\ No newline at end of file
+}
+TEST(PathQueueBasics, CommitsPathsOutsideThePlanningWindow)
+{
+    constexpr size_t queueSize = 8;
+    MockPathOptimizer optimizer;
+    MockPathQueue queue(optimizer, queueSize, 100, 2);
+
+    std::function<PathQueueIndex(size_t)> index = [queueSize](size_t index) {
+        return PathQueueIndex(index, queueSize);
+    };
+
+    Path path;
+
+    {
+        ::testing::InSequence sequence;
+        EXPECT_CALL(optimizer, onPathAdded(::testing::_, index(0), index(0)));
+        EXPECT_CALL(optimizer, onPathAdded(::testing::_, index(0), index(1)));
+        EXPECT_CALL(optimizer, onPathAdded(::testing::_, index(0), index(2)));
+        EXPECT_CALL(optimizer, beforePathRemoval(::testing::_, index(0), index(2)));
+        EXPECT_CALL(optimizer, beforePathRemoval(::testing::_, index(1), index(2)));
+    }
+
+    ASSERT_TRUE(queue.addPath(std::move(path)));
+    ASSERT_TRUE(queue.addPath(std::move(path)));
+    ASSERT_TRUE(queue.addPath(std::move(path)));
+
+    // the first path was committed when the third was added, the second has to be committed by popPath
+    ASSERT_TRUE(queue.popPath());
+    EXPECT_EQ(queue.getStats().consumerCommits, 0);
+
+    ASSERT_TRUE(queue.popPath());
+    EXPECT_EQ(queue.getStats().consumerCommits, 1);
+    EXPECT_EQ(queue.getStats().pathsAdded, 3);
+    EXPECT_EQ(queue.getStats().pathsRemoved, 2);
+
+    queue.resetStats();
+    EXPECT_EQ(queue.getStats().consumerCommits, 0);
+    EXPECT_EQ(queue.getStats().pathsAdded, 0);
+}
+
+TEST(PathQueueBasics, PassesPathsBetweenThreadsInOrder)
+{
+    constexpr int pathCount = 50000;
+    DummyPathOptimizer optimizer;
+    SimplePathQueue queue(optimizer, 64, std::numeric_limits<uint64_t>::max(), 8);
+
+    WorkerThread producer([&queue]() {
+        for (int i = 1; i <= pathCount; i++)
+        {
+            Path path;
+            path.setEstimatedTime(i);
+            ASSERT_TRUE(queue.addPath(std::move(path)));
+        }
+    });
+
+    for (int i = 1; i <= pathCount; i++)
+    {
+        auto path = queue.popPath();
+        ASSERT_TRUE(path);
+        ASSERT_EQ(path.value().getEstimatedTime(), i);
+    }
+
+    producer.waitAndJoin();
+
+    const PathQueueStats stats = queue.getStats();
+    EXPECT_EQ(stats.pathsAdded, pathCount);
+    EXPECT_EQ(stats.pathsRemoved, pathCount);
+    EXPECT_LE(stats.consumerCommits, pathCount);
+    EXPECT_EQ(queue.getQueuedMoveTime(), 0);
+    EXPECT_EQ(queue.availablePathSlots(), 64);
+    EXPECT_TRUE(queue.waitForQueueToEmpty());
+}
+
+TEST(PathQueueBasics, CommitsPathsOnceTheLookaheadTimeIsCovered)
+{
+    DummyPathOptimizer optimizer;
+    SimplePathQueue queue(optimizer, 16, std::numeric_limits<uint64_t>::max());
+    queue.setLookahead(10, 0);
+
+    for (int i = 0; i < 4; i++)
+    {
+        Path path;
+        path.setEstimatedTime(4);
+        ASSERT_TRUE(queue.addPath(std::move(path)));
+    }
+
+    // the last three paths take 12, so the first one was committed
+    ASSERT_TRUE(queue.popPath());
+    EXPECT_EQ(queue.getStats().consumerCommits, 0);
+
+    // but the last two only take 8
+    ASSERT_TRUE(queue.popPath());
+    EXPECT_EQ(queue.getStats().consumerCommits, 1);
+}
+
+TEST(PathQueueBasics, CommitsPathsOnceTheLookaheadDistanceIsCovered)
+{
+    DummyPathOptimizer optimizer;
+    SimplePathQueue queue(optimizer, 16, std::numeric_limits<uint64_t>::max());
+    queue.setLookahead(0, 0.025);
+
+    PathBuilder builder = PathBuilder::CartesianBuilder();
+
+    for (int i = 0; i < 4; i++)
+    {
+        ASSERT_TRUE(queue.addPath(builder.makePath(0.01, 0, 0, 0.01)));
+    }
+
+    ASSERT_TRUE(queue.popPath());
+    EXPECT_EQ(queue.getStats().consumerCommits, 0);
+
+    ASSERT_TRUE(queue.popPath());
+    EXPECT_EQ(queue.getStats().consumerCommits, 1);
+}
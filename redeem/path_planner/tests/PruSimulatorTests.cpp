@@ -0,0 +1,316 @@
+#include <chrono>
+#include <future>
+
+#include "gmock/gmock.h"
+#include "gtest/gtest.h"
+
+#include "AlarmCallback.h"
+#include "PathPlanner.h"
+#include "PruSimulator.h"
+#include "StepperCommandWriter.h"
+
+#include "TestUtils.h"
+
+namespace
+{
+
+struct SimulatorSyncCallback : public SyncCallback
+{
+    std::promise<void> syncPromise;
+    std::future<void> syncFuture;
+
+    SimulatorSyncCallback()
+        : syncPromise()
+        , syncFuture(syncPromise.get_future())
+    {
+    }
+
+    void syncComplete() override
+    {
+        syncPromise.set_value();
+    }
+};
+
+class SimulatorAlarmCallback : public AlarmCallback
+{
+public:
+    MOCK_METHOD3(call, void(int type, std::string message, std::string shortMessage));
+};
+
+class PruSimulatorTest : public ::testing::Test
+{
+protected:
+    std::promise<void> alarmPromise;
+    std::future<void> alarmFuture;
+    PruSimulator pru;
+
+public:
+    PruSimulatorTest()
+        : alarmPromise()
+        , alarmFuture(alarmPromise.get_future())
+        , pru([this]() { alarmPromise.set_value(); }, 0.0)
+    {
+        pru.setRecordSteps(true);
+        pru.runThread();
+    }
+
+    ~PruSimulatorTest()
+    {
+        pru.stopThread(true);
+    }
+
+    void push(std::vector<SteppersCommand> commands, SyncCallback* callback = nullptr)
+    {
+        uint64_t totalTime = 0;
+
+        for (const auto& command : commands)
+        {
+            totalTime += command.delay;
+        }
+
+        pru.pushBlock(reinterpret_cast<uint8_t*>(commands.data()), commands.size() * sizeof(SteppersCommand), sizeof(SteppersCommand), totalTime, callback);
+    }
+};
+
+}
+
+TEST_F(PruSimulatorTest, RunsCommands)
+{
+    SimulatorSyncCallback callback;
+
+    push({
+             { 0, 0, 0, 0, 1000 },
+             { 0b011, 0b001, 0, 0, 2000 },
+             { 0b001, 0b001, 0, 0, 3000 },
+         },
+        &callback);
+
+    pru.waitUntilFinished();
+
+    EXPECT_TRUE(is_ready(callback.syncFuture));
+    EXPECT_EQ(pru.getPosition(0), 2);
+    EXPECT_EQ(pru.getPosition(1), -1);
+    EXPECT_EQ(pru.getSimulatedTime(), 6000);
+    EXPECT_EQ(pru.getCommandsRun(), 3);
+    EXPECT_EQ(pru.getBlocksRun(), 1);
+
+    const auto xSteps = pru.getSteps(0);
+    ASSERT_EQ(xSteps.size(), 2);
+    EXPECT_EQ(xSteps[0].time, 1000);
+    EXPECT_TRUE(xSteps[0].direction);
+    EXPECT_EQ(xSteps[1].time, 3000);
+
+    const auto ySteps = pru.getSteps(1);
+    ASSERT_EQ(ySteps.size(), 1);
+    EXPECT_FALSE(ySteps[0].direction);
+}
+
+TEST_F(PruSimulatorTest, RunsCompressedCommandsLikeTheOriginals)
+{
+    std::vector<SteppersCommand> commands;
+
+    for (uint32_t i = 0; i < 50; i++)
+    {
+        commands.push_back({ 0b001, 0b001, 0, 0, 20000 + 100 * i });
+    }
+
+    for (uint32_t i = 0; i < 50; i++)
+    {
+        commands.push_back({ static_cast<uint8_t>(i % 2 ? 0b010 : 0b100), 0, 0, 0, 3000 + 1000 * (i % 7) });
+    }
+
+    StepperCommandWriter writer(pru, 32, true);
+
+    for (const auto& command : commands)
+    {
+        writer.send(command);
+    }
+
+    writer.finish(nullptr);
+    pru.waitUntilFinished();
+
+    EXPECT_LT(writer.getSlotsUsed(), commands.size());
+    EXPECT_EQ(pru.getCommandsRun(), commands.size());
+
+    uint64_t time = 0;
+    std::vector<uint64_t> expectedTimes[3];
+
+    for (const auto& command : commands)
+    {
+        for (int i = 0; i < 3; i++)
+        {
+            if (command.step & (1 << i))
+            {
+                expectedTimes[i].push_back(time);
+            }
+        }
+
+        time += command.delay;
+    }
+
+    EXPECT_EQ(pru.getSimulatedTime(), time);
+
+    for (int i = 0; i < 3; i++)
+    {
+        const auto steps = pru.getSteps(i);
+        ASSERT_EQ(steps.size(), expectedTimes[i].size());
+
+        for (size_t j = 0; j < steps.size(); j++)
+        {
+            EXPECT_EQ(steps[j].time, expectedTimes[i][j]);
+        }
+    }
+}
+
+TEST_F(PruSimulatorTest, CancelsBlockedMoves)
+{
+    // X can't move in the negative direction
+    pru.setStepperMask(0xfffe);
+
+    SimulatorSyncCallback callback;
+
+    push({
+             { 0b001, 0, 0b001, 0, 1000 },
+             { 0b001, 0, 0b001, 0, 1000 },
+             { 0b001, 0, 0b001, 0, 1000 },
+         },
+        &callback);
+
+    pru.waitUntilFinished();
+
+    EXPECT_TRUE(is_ready(callback.syncFuture));
+    EXPECT_FALSE(is_ready(alarmFuture));
+    EXPECT_EQ(pru.getStepsRemaining(), 3);
+    EXPECT_EQ(pru.getPosition(0), 0);
+}
+
+TEST_F(PruSimulatorTest, RaisesAlarmForBlockedMovesThatCantBeCancelled)
+{
+    pru.setStepperMask(0xfffe);
+
+    push({
+        { 0b010, 0, 0, 0, 1000 },
+        { 0b001, 0, 0, 0, 1000 },
+        { 0b001, 0, 0, 0, 1000 },
+    });
+
+    ASSERT_EQ(alarmFuture.wait_for(std::chrono::seconds(5)), std::future_status::ready);
+    EXPECT_EQ(pru.getPosition(1), -1);
+    EXPECT_EQ(pru.getPosition(0), 0);
+
+    // the PRU stops until it's reset
+    EXPECT_GT(pru.getTotalQueuedMovesTime(), 0);
+    pru.reset();
+    pru.waitUntilFinished();
+    EXPECT_EQ(pru.getTotalQueuedMovesTime(), 0);
+}
+
+TEST_F(PruSimulatorTest, SuspendsOnSyncWaitEvents)
+{
+    SimulatorSyncCallback callback;
+
+    push({
+             { 0b001, 0b001, 0, 0, 1000 },
+             { 0, 0, 0, STEPPER_COMMAND_OPTION_SYNCWAIT_EVENT, 1000 },
+             { 0b001, 0b001, 0, 0, 1000 },
+         },
+        &callback);
+
+    EXPECT_EQ(callback.syncFuture.wait_for(std::chrono::milliseconds(100)), std::future_status::timeout);
+    EXPECT_EQ(pru.getCommandsRun(), 0);
+
+    pru.resume();
+
+    ASSERT_EQ(callback.syncFuture.wait_for(std::chrono::seconds(5)), std::future_status::ready);
+    EXPECT_EQ(pru.getPosition(0), 2);
+}
+
+TEST_F(PruSimulatorTest, ReservesWhatIsFreeWithoutWaitingForAWholeBlock)
+{
+    const size_t unit = sizeof(SteppersCommand);
+    const size_t maxBytes = (pru.getMaxBytesPerBlock() / unit) * unit;
+
+    // nothing runs while suspended, so the memory stays in use
+    pru.suspend();
+
+    std::vector<SteppersCommand> commands(maxBytes / unit, { 1, 0, 0, 0, 1000 });
+    while (pru.getFreeMemory() >= 2 * maxBytes)
+    {
+        push(commands);
+    }
+    push(std::vector<SteppersCommand>(commands.size() / 2, commands[0]));
+
+    auto reservation = std::async(std::launch::async, [this, maxBytes, unit]() {
+        size_t reservedBytes = 0;
+        pru.reserveBlock(maxBytes, unit, reservedBytes);
+        return reservedBytes;
+    });
+
+    const bool reservedAtOnce = reservation.wait_for(std::chrono::seconds(5)) == std::future_status::ready;
+    const size_t freeMemory = pru.getFreeMemory();
+
+    pru.resume();
+    const size_t reservedBytes = reservation.get();
+    pru.commitBlock(0, unit, 0);
+
+    EXPECT_TRUE(reservedAtOnce);
+    EXPECT_GT(reservedBytes, 0);
+    EXPECT_LT(reservedBytes, maxBytes);
+    EXPECT_EQ(reservedBytes % unit, 0);
+    EXPECT_GE(freeMemory, reservedBytes + 16);
+}
+
+TEST(PruSimulatorTiming, KeepsPaceWithRealTime)
+{
+    PruSimulator pru([]() {}, 1.0);
+    pru.runThread();
+
+    // 50ms of steps
+    std::vector<SteppersCommand> commands(50, { 0b001, 0b001, 0, 0, F_CPU / 1000 });
+
+    const auto start = std::chrono::steady_clock::now();
+    pru.pushBlock(reinterpret_cast<uint8_t*>(commands.data()), commands.size() * sizeof(SteppersCommand), sizeof(SteppersCommand), 50ULL * F_CPU / 1000);
+    pru.waitUntilFinished();
+    const auto elapsed = std::chrono::steady_clock::now() - start;
+
+    pru.stopThread(true);
+
+    EXPECT_GE(elapsed, std::chrono::milliseconds(45));
+    EXPECT_EQ(pru.getPosition(0), 50);
+}
+
+TEST(PruSimulatorPlanner, RunsPlannedMoves)
+{
+    SimulatorAlarmCallback alarmCallback;
+    PathPlanner planner(1024, alarmCallback, 0.0);
+
+    ASSERT_NE(planner.getPruSimulator(), nullptr);
+
+    planner.setState(VectorN());
+    planner.setMaxSpeeds(VectorN(1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0));
+    planner.setAxisStepsPerMeter(VectorN(100000, 100000, 100000, 100000, 100000, 100000, 100000, 100000));
+    planner.setAcceleration(VectorN(1, 1, 1, 1, 1, 1, 1, 1));
+    planner.setMaxSpeedJumps(VectorN(0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0.01));
+    planner.setStepCommandCompression(true);
+
+    planner.queueMove(VectorN(0.01, 0.005, 0, 0.001), 0.05, 0.5, false, true, false, false, false, false);
+    planner.queueMove(VectorN(-0.002, 0.001, 0.001, 0.002), 0.05, 0.5, false, true, false, false, false, false);
+
+    // the planner's queue is empty as soon as the last move is taken from it, so wait for a
+    // sync event behind the moves to know they were sent
+    SimulatorSyncCallback callback;
+    planner.queueSyncEvent(callback);
+
+    planner.runThread();
+    ASSERT_EQ(callback.syncFuture.wait_for(std::chrono::seconds(5)), std::future_status::ready);
+    planner.waitUntilFinished();
+    planner.stopThread(true);
+
+    PruSimulator& pru = *planner.getPruSimulator();
+    // the steppers end up where the last move ends
+    EXPECT_EQ(pru.getPosition(0), -200);
+    EXPECT_EQ(pru.getPosition(1), 100);
+    EXPECT_EQ(pru.getPosition(2), 100);
+    EXPECT_EQ(pru.getPosition(3), 200);
+    EXPECT_EQ(pru.getCommandsRun(), planner.getStepCommandsSent());
+}
@@ -61,7 +61,7 @@ struct PathBuilder
             speed,
             std::numeric_limits<double>::infinity(),
             AXIS_CONFIG_XY,
-            *(Delta*)nullptr,
+            nullptr,
             false,
             false);
 
@@ -20,13 +20,17 @@ pathplanner = Extension(
         'redeem/path_planner/Preprocessor.cpp',
         'redeem/path_planner/Path.cpp',
         'redeem/path_planner/Delta.cpp',
+        'redeem/path_planner/BedMesh.cpp',
         'redeem/path_planner/vector3.cpp',
         'redeem/path_planner/vectorN.cpp',
         'redeem/path_planner/PruTimer.cpp',
+        'redeem/path_planner/PruSimulator.cpp',
         'redeem/path_planner/prussdrv.c',
         'redeem/path_planner/Logger.cpp',
         'redeem/path_planner/PathOptimizer.cpp',
-        'redeem/path_planner/PathQueue.cpp'],
+        'redeem/path_planner/PathQueue.cpp',
+        'redeem/path_planner/StepSource.cpp',
+        'redeem/path_planner/StepperCommandWriter.cpp'],
     swig_opts=['-c++', '-builtin', '-threads'],
     include_dirs=[np.get_include()],
     extra_compile_args=[
@@ -40,6 +44,15 @@ pathplanner = Extension(
         '-UNDEBUG',
     ])
 
+gcodelexer = Extension(
+    '_GcodeLexer',
+    sources=['redeem/path_planner/GcodeLexer.cpp'],
+    extra_compile_args=[
+        '-std=c++17',
+        '-O3',
+        '-Wall',
+    ])
+
 from redeem.__init__ import __url__
 import versioneer
 
@@ -95,7 +108,6 @@ setup(
       'pyusb==1.0.2',
       'six>=1.11.0',
       'sh',
-      'sympy',
       'testfixtures==6.2.0',
       'configobj==5.0.6',
       'scipy',
@@ -104,7 +116,7 @@ setup(
       'evdev',
     ],
     url=__url__,
-    ext_modules=[pathplanner],
+    ext_modules=[pathplanner, gcodelexer],
     entry_points= {
         'console_scripts': [
             'redeem = redeem.Redeem:main'
@@ -0,0 +1,23 @@
+class FakeI2CDevice(object):
+  """
+  A stand in for Adafruit_GPIO.I2C.Device with the registers of the chip in
+  a list. Block writes auto-increment the register, like on the PCA9685.
+  Every transaction on the bus is kept in transactions.
+  """
+  def __init__(self, size=256):
+    self.registers = [0] * size
+    self.transactions = []
+
+  def write8(self, register, value):
+    self.transactions.append(("write8", register, [value]))
+    self.registers[register] = value
+
+  def readU8(self, register):
+    self.transactions.append(("readU8", register, []))
+    return self.registers[register]
+
+  def writeList(self, register, data):
+    if len(data) > 32:
+      raise IOError("I2C block writes take at most 32 bytes")
+    self.transactions.append(("writeList", register, list(data)))
+    self.registers[register:register + len(data)] = data
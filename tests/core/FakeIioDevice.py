@@ -0,0 +1,27 @@
+import os
+import shutil
+import tempfile
+
+
+class FakeIioDevice(object):
+  """
+  A stand in for /sys/bus/iio/devices/iio:device0 in a temporary directory,
+  with an in_voltageN_raw file for each channel that is written to.
+  """
+  def __init__(self):
+    self.path = tempfile.mkdtemp()
+
+  def channel(self, n):
+    """ The path of the sysfs file of channel n """
+    return os.path.join(self.path, "in_voltage{}_raw".format(n))
+
+  def write(self, n, value):
+    """ Make channel n read value from now on """
+    with open(self.channel(n), "w") as f:
+      f.write("{}\n".format(value))
+
+  def remove(self, n):
+    os.remove(self.channel(n))
+
+  def close(self):
+    shutil.rmtree(self.path)
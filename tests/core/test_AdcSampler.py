@@ -0,0 +1,92 @@
+from __future__ import absolute_import
+
+import mock
+import os
+import time
+import unittest
+
+from redeem.AdcSampler import AdcSampler
+from .FakeIioDevice import FakeIioDevice
+
+
+class TestAdcSampler(unittest.TestCase):
+  def setUp(self):
+    self.device = FakeIioDevice()
+    self.sampler = AdcSampler(rate=200.0, oversample=3)
+
+  def tearDown(self):
+    self.sampler.stop()
+    self.device.close()
+
+  def wait_for(self, condition):
+    deadline = time.time() + 2
+    while not condition() and time.time() < deadline:
+      time.sleep(0.01)
+    self.assertTrue(condition())
+
+  def test_channels_have_a_reading_once_added(self):
+    self.device.write(4, 1234)
+    self.device.write(5, 2000)
+    e = self.sampler.add(self.device.channel(4))
+    h = self.sampler.add(self.device.channel(5))
+    self.assertEqual(e.reading, 1234.0)
+    self.assertEqual(h.reading, 2000.0)
+    self.assertIs(self.sampler.add(self.device.channel(4)), e)
+
+  def test_readings_follow_the_adc(self):
+    self.device.write(4, 1000)
+    channel = self.sampler.add(self.device.channel(4))
+    fd = channel.fd
+    self.device.write(4, 3000)
+    self.wait_for(lambda: channel.reading == 3000.0)
+    # The file stays open between passes
+    self.assertEqual(channel.fd, fd)
+
+  def test_median_of_the_oversampled_readings(self):
+    self.device.write(4, 1000)
+    channel = self.sampler.add(self.device.channel(4))
+    self.sampler.stop()
+    with mock.patch("redeem.AdcSampler.read_from_start", side_effect=["1001\n", "4095\n", "999\n"]):
+      self.sampler.sample(channel)
+    self.assertEqual(channel.reading, 1001.0)
+
+  def test_garbled_reads_are_kept_as_errors(self):
+    self.device.write(4, 1000)
+    channel = self.sampler.add(self.device.channel(4))
+    self.sampler.stop()
+    channel.fd = fd = os.open(self.device.channel(4), os.O_RDONLY)
+    before = channel.time
+    with mock.patch("redeem.AdcSampler.read_from_start", return_value=""):
+      self.sampler.sample(channel)
+    self.assertIsInstance(channel.reading, ValueError)
+    self.assertGreaterEqual(channel.time, before)
+    self.assertEqual(channel.fd, fd)
+
+  def test_sampling_errors_dont_stop_the_thread(self):
+    self.device.write(4, 1000)
+    channel = self.sampler.add(self.device.channel(4))
+    with mock.patch.object(self.sampler, "sample", side_effect=RuntimeError("boom")):
+      passes = self.sampler.passes
+      self.wait_for(lambda: self.sampler.passes > passes + 2)
+    self.assertTrue(self.sampler.t.is_alive())
+
+    self.device.write(4, 2000)
+    self.wait_for(lambda: channel.reading == 2000.0)
+
+  def test_missing_channel_recovers(self):
+    channel = self.sampler.add(self.device.channel(6))
+    self.assertIsInstance(channel.reading, EnvironmentError)
+    self.assertIsNone(channel.fd)
+
+    self.device.write(6, 500)
+    self.wait_for(lambda: channel.reading == 500.0)
+
+  def test_stop_closes_the_channels(self):
+    self.device.write(4, 1000)
+    channel = self.sampler.add(self.device.channel(4))
+    fd = channel.fd
+    self.sampler.stop()
+    self.assertIsNone(channel.fd)
+    self.assertFalse(self.sampler.t.is_alive())
+    with self.assertRaises(OSError):
+      os.fstat(fd)
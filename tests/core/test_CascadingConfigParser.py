@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from CascadingConfigParser import CascadingConfigParser, parse_value
+
+CONFIGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "configs")
+
+
+class TestConfigSnapshot(unittest.TestCase):
+  def setUp(self):
+    self.tmp = tempfile.mkdtemp()
+    with open(os.path.join(self.tmp, "local.cfg"), "w") as f:
+      f.write("[Probe]\noffset_x = 0.01\n\n[Macros]\nG31 = M280 P0 S320 F3000\n")
+    self.config = CascadingConfigParser(
+        [os.path.join(CONFIGS, "default.cfg"),
+         os.path.join(self.tmp, "local.cfg")])
+
+  def tearDown(self):
+    shutil.rmtree(self.tmp)
+
+  def test_values_are_typed(self):
+    self.assertEqual(parse_value("0.25"), 0.25)
+    self.assertEqual(parse_value("3"), 3)
+    self.assertIs(parse_value("True"), True)
+    self.assertIs(parse_value("off"), False)
+    self.assertEqual(parse_value("X,Y,Z"), "X,Y,Z")
+    self.assertEqual(parse_value(""), "")
+
+  def test_snapshot_matches_the_parser(self):
+    snapshot = self.config.snapshot
+    for section in self.config.sections():
+      for option in self.config.options(section):
+        self.assertEqual(snapshot[section][option], parse_value(self.config.get(section, option)))
+
+    self.assertEqual(snapshot.Probe.offset_x, 0.01)
+    self.assertEqual(snapshot.Macros.g31, "M280 P0 S320 F3000")
+    self.assertIs(snapshot.System.log_to_file, self.config.getboolean('System', 'log_to_file'))
+    self.assertEqual(snapshot.Cold_ends.connect_therm_e_fan_0,
+                     snapshot["Cold-ends"]["connect-therm-E-fan-0"])
+    self.assertIn("Probe", snapshot)
+    self.assertIn("offset_y", snapshot.Probe)
+
+  def test_snapshot_is_read_only(self):
+    snapshot = self.config.snapshot
+    with self.assertRaises(AttributeError):
+      snapshot.Probe.offset_x = 1.0
+    with self.assertRaises(AttributeError):
+      snapshot.Probe.new_option = 1.0
+    with self.assertRaises(AttributeError):
+      snapshot.Probe = None
+
+  def test_snapshot_is_made_again_after_a_change(self):
+    snapshot = self.config.snapshot
+    self.assertIs(self.config.snapshot, snapshot)
+
+    self.config.set('Probe', 'offset_x', '0.02')
+    self.assertEqual(snapshot.Probe.offset_x, 0.01)
+    self.assertEqual(self.config.snapshot.Probe.offset_x, 0.02)
+
+  def test_subscribers_hear_about_changes(self):
+    calls = []
+    self.config.subscribe(lambda snapshot, changed: calls.append((snapshot, changed)))
+    self.config.snapshot
+    self.assertEqual(calls, [])
+
+    self.config.set('Probe', 'offset_x', '0.02')
+    # Reading the snapshot makes the first call, setting the same value again isn't a change
+    self.config.set('Probe', 'offset_y', str(self.config.snapshot.Probe.offset_y))
+    self.config.set('Planner', 'arc_tolerance', '0.0001')
+    self.config.update_snapshot()
+    self.config.update_snapshot()
+
+    self.assertEqual(len(calls), 2)
+    self.assertEqual(calls[0][1], set([('Probe', 'offset_x')]))
+    self.assertEqual(calls[1][1], set([('Planner', 'arc_tolerance')]))
+    self.assertIs(calls[1][0], self.config.snapshot)
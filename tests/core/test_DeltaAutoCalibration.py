@@ -0,0 +1,136 @@
+from __future__ import absolute_import
+
+import unittest
+
+import numpy as np
+
+from redeem.DeltaAutoCalibration import (AutoCalibrationDeltaParameters, RAW_PARAMS,
+                                         _calibrate_delta_parameters, _expected_residuals,
+                                         _expected_residuals_jacobian, calculate_probe_points)
+
+try:
+  from _PathPlannerNative import Delta
+except ImportError:
+  Delta = None
+
+
+class DeltaAutoCalibrationTests(unittest.TestCase):
+  def setUp(self):
+    self.assumed = AutoCalibrationDeltaParameters(300., 150., 250., 0., 0., 0., 0., 0., 0., 0.)
+    self.real = AutoCalibrationDeltaParameters(300.8, 151.2, 250., 0.3, -0.4, 0.2, 0.25, -0.15, 0.4,
+                                               -0.3)
+
+  def probe(self, max_radius=100., radius_steps=4, angle_steps=12):
+    """ The heights a probe finds on the real printer at points the assumed one thinks are at z=0 """
+    xs, ys = np.array(list(calculate_probe_points(max_radius, radius_steps, angle_steps))).T
+    a, b, c = self.assumed.transform([xs, ys, np.zeros(len(xs))])
+    zs = self.real.inverse_transform(a, b, c)[2]
+    return xs, ys, zs
+
+  def motor_positions(self, pts):
+    return np.column_stack(self.assumed.transform([pts[0], pts[1], np.zeros(len(pts[0]))]))
+
+  def test_transforms_take_arrays_of_positions(self):
+    xs, ys, zs = self.probe()
+    a, b, c = self.real.transform([xs, ys, zs])
+    x, y, z = self.real.inverse_transform(a, b, c)
+
+    for i in range(len(xs)):
+      expected = self.real.inverse_transform(a[i], b[i], c[i])
+      np.testing.assert_allclose([x[i], y[i], z[i]], expected)
+    np.testing.assert_allclose(x, xs, atol=1e-9)
+    np.testing.assert_allclose(y, ys, atol=1e-9)
+    np.testing.assert_allclose(z, zs, atol=1e-9)
+
+  def test_residuals_leave_the_motor_positions_alone(self):
+    pts = self.probe()
+    motor_positions = self.motor_positions(pts)
+    before = motor_positions.copy()
+
+    residuals = _expected_residuals(self.real.to_raw_params(9), pts, self.assumed, motor_positions)
+
+    np.testing.assert_array_equal(motor_positions, before)
+    np.testing.assert_allclose(residuals, 0., atol=1e-9)
+
+  def test_jacobian_matches_finite_differences(self):
+    pts = self.probe()
+    motor_positions = self.motor_positions(pts)
+
+    for num_factors in sorted(RAW_PARAMS):
+      params = np.array(self.real.to_raw_params(num_factors))
+      jacobian = _expected_residuals_jacobian(params, pts, self.assumed, motor_positions)
+      self.assertEqual(jacobian.shape, (len(pts[0]), num_factors))
+
+      for i in range(num_factors):
+        step = np.zeros(num_factors)
+        step[i] = 1e-6
+        difference = (_expected_residuals(params + step, pts, self.assumed, motor_positions) -
+                      _expected_residuals(params - step, pts, self.assumed, motor_positions)) / 2e-6
+        np.testing.assert_allclose(jacobian[:, i],
+                                   difference,
+                                   atol=1e-6,
+                                   err_msg="{} factors, {}".format(num_factors,
+                                                                   RAW_PARAMS[num_factors][i]))
+
+  def test_calibration_finds_the_real_parameters(self):
+    pts = self.probe()
+
+    for num_factors in sorted(RAW_PARAMS):
+      # the factors that aren't calibrated have to match for the others to be found
+      base = AutoCalibrationDeltaParameters.from_base_and_raw_params(
+          self.real, self.assumed.to_raw_params(num_factors))
+      motor_positions = np.column_stack(base.transform([pts[0], pts[1], np.zeros(len(pts[0]))]))
+      a, b, c = motor_positions.T
+      zs = self.real.inverse_transform(a, b, c)[2]
+
+      calibrated = _calibrate_delta_parameters((pts[0], pts[1], zs), num_factors, base)
+
+      residuals = _expected_residuals(calibrated.to_raw_params(num_factors), (pts[0], pts[1], zs),
+                                      base, motor_positions)
+      np.testing.assert_allclose(residuals, 0., atol=1e-6, err_msg="{} factors".format(num_factors))
+
+      # probing heights alone doesn't pin down the tower errors of 8 and 9 factors,
+      # many of them fit the heights equally well
+      if num_factors <= 6:
+        np.testing.assert_allclose(calibrated.to_raw_params(num_factors),
+                                   self.real.to_raw_params(num_factors),
+                                   atol=1e-4,
+                                   err_msg="{} factors".format(num_factors))
+
+
+@unittest.skipIf(Delta is None, "native path planner is not built")
+class DeltaBatchKinematicsTests(unittest.TestCase):
+  """ The calibration model has to agree with the kinematics the planner moves by """
+  def setUp(self):
+    self.params = AutoCalibrationDeltaParameters(300.8, 151.2, 250., 0., 0., 0., 0.25, -0.15, 0.4,
+                                                 -0.3)
+    self.delta = Delta()
+    self.delta.setMainDimensions(self.params.diagonal / 1000., self.params.radius / 1000.)
+    self.delta.setRadialError(0., self.params.yradial / 1000., self.params.zradial / 1000.)
+    self.delta.setAngularError(0., self.params.yangular, self.params.zangular)
+
+    xs, ys = np.array(list(calculate_probe_points(100., 4, 12))).T
+    self.world = np.column_stack([xs, ys, np.linspace(0., 50., len(xs))]) / 1000.
+
+  def test_batch_kinematics_match_the_calibration_model(self):
+    towers = np.empty_like(self.world)
+    self.delta.worldToDeltaBatch(self.world, towers)
+    expected = np.column_stack(self.params.transform((self.world * 1000.).T)) / 1000.
+    np.testing.assert_allclose(towers, expected, atol=1e-12)
+
+    world = np.empty_like(towers)
+    self.delta.deltaToWorldBatch(towers, world)
+    np.testing.assert_allclose(world, self.world, atol=1e-12)
+
+    offsets = np.empty(len(towers))
+    self.delta.verticalOffsetBatch(towers, offsets)
+    for i, tower in enumerate(towers):
+      self.assertAlmostEqual(offsets[i], self.delta.verticalOffset(*tower))
+
+  def test_batch_kinematics_check_the_array_shapes(self):
+    with self.assertRaises(RuntimeError):
+      self.delta.worldToDeltaBatch(self.world, np.empty((len(self.world) + 1, 3)))
+    with self.assertRaises(RuntimeError):
+      self.delta.verticalOffsetBatch(np.empty((4, 2)), np.empty(4))
+    with self.assertRaises(TypeError):
+      self.delta.deltaToWorldBatch(self.world, np.empty(self.world.shape, dtype=np.float32))
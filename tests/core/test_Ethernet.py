@@ -0,0 +1,130 @@
+import mock
+import socket
+import threading
+import time
+import unittest
+
+from six import PY2
+if PY2:
+  from Queue import Queue
+else:
+  from queue import Queue
+
+from Ethernet import Ethernet
+
+
+class TestEthernet(unittest.TestCase):
+  def setUp(self):
+    self.printer = mock.Mock()
+    self.printer.commands = Queue(4)
+    self.path_slots = 100
+    self.printer.processor.has_room_for.side_effect = self.has_room_for
+    self.printer.processor.enqueue.side_effect = lambda g: self.printer.commands.put(g)
+    self.ethernet = Ethernet(self.printer)
+    self.hosts = []
+
+  def tearDown(self):
+    for host in self.hosts:
+      host.close()
+    self.ethernet.close()
+
+  def has_room_for(self, g):
+    if g.message.startswith("G1"):
+      return self.path_slots > 0
+    return not self.printer.commands.full()
+
+  def connect(self):
+    host = socket.create_connection(("localhost", self.ethernet.port))
+    self.hosts.append(host)
+    return host
+
+  def wait_for(self, condition):
+    deadline = time.time() + 2
+    while not condition() and time.time() < deadline:
+      time.sleep(0.01)
+    self.assertTrue(condition())
+
+  def take_commands(self, count):
+    gcodes = []
+    for _ in range(count):
+      gcodes.append(self.printer.commands.get(timeout=2))
+    return gcodes
+
+  def test_splits_lines_from_one_read(self):
+    host = self.connect()
+    host.sendall("G1 X1\nG1 X2\r\n\nG1 X3\nG1 X")
+    host.sendall("4\n")
+    gcodes = self.take_commands(4)
+    self.assertEqual([g.message for g in gcodes], ["G1 X1", "G1 X2", "G1 X3", "G1 X4"])
+    self.assertTrue(self.printer.commands.empty())
+
+  def test_queues_last_line_when_host_closes(self):
+    host = self.connect()
+    host.sendall("M105\nM114")
+    host.shutdown(socket.SHUT_WR)
+    gcodes = self.take_commands(2)
+    self.assertEqual([g.message for g in gcodes], ["M105", "M114"])
+
+  def test_replies_go_to_the_sending_host(self):
+    first = self.connect()
+    second = self.connect()
+    first.sendall("M105\n")
+    second.sendall("M114\n")
+    gcodes = sorted(self.take_commands(2), key=lambda g: g.message)
+    self.assertNotEqual(gcodes[0].prot, gcodes[1].prot)
+
+    self.ethernet.get_client(gcodes[1].prot).send_message("ok C: X:0")
+    self.ethernet.get_client(gcodes[0].prot).send_message("ok T:20")
+    self.assertEqual(second.recv(100), "ok C: X:0\n")
+    self.assertEqual(first.recv(100), "ok T:20\n")
+
+  def test_forgets_disconnected_hosts(self):
+    host = self.connect()
+    host.sendall("M105\n")
+    prot = self.take_commands(1)[0].prot
+    host.close()
+    self.wait_for(lambda: self.ethernet.get_client(prot) is None)
+
+  def test_holds_lines_back_while_queue_is_full(self):
+    host = self.connect()
+    host.sendall("".join("M117 {}\n".format(i) for i in range(10)))
+    self.wait_for(self.printer.commands.full)
+    time.sleep(0.2)
+    self.assertEqual(self.printer.processor.enqueue.call_count, 4)
+
+    # the reader isn't stuck, other hosts still get replies
+    other = self.connect()
+    self.wait_for(lambda: len(self.ethernet.clients) == 2)
+    self.ethernet.send_message("echo")
+    self.assertEqual(other.recv(100), "echo\n")
+
+    gcodes = self.take_commands(10)
+    self.assertEqual([g.message for g in gcodes], ["M117 {}".format(i) for i in range(10)])
+
+  def test_queues_lines_off_the_reading_thread(self):
+    threads = []
+
+    def enqueue(g):
+      threads.append(threading.current_thread().name)
+      self.printer.commands.put(g)
+
+    self.printer.processor.enqueue.side_effect = enqueue
+    host = self.connect()
+    host.sendall("M105\n")
+    self.take_commands(1)
+    self.assertEqual(threads, ["Ethernet queue"])
+
+  def test_other_hosts_get_through_while_moves_wait_for_the_planner(self):
+    self.path_slots = 0
+    moves = self.connect()
+    moves.sendall("G1 X1\nG1 X2\n")
+    self.wait_for(lambda: self.printer.processor.has_room_for.call_count > 0)
+
+    stop = self.connect()
+    stop.sendall("M112\n")
+    self.assertEqual(self.take_commands(1)[0].message, "M112")
+    self.assertEqual(self.printer.processor.enqueue.call_count, 1)
+
+    self.path_slots = 10
+    gcodes = self.take_commands(2)
+    self.assertEqual([g.message for g in gcodes], ["G1 X1", "G1 X2"])
@@ -0,0 +1,37 @@
+import mock
+import unittest
+
+from Extruder import Heater
+
+
+class TestHeaterDerivative(unittest.TestCase):
+  def heater(self, sleep):
+    thermistor = mock.Mock()
+    thermistor.get_temperature.return_value = 20.0
+    heater = Heater(thermistor, mock.Mock(), "E", False, mock.Mock())
+    heater.sleep = sleep
+    heater.enable()
+    return heater
+
+  def expected_derivatives(self, avg, temperatures, sleep):
+    """ The derivatives of the list based window the heaters had before """
+    averages = [0] * avg
+    derivatives = []
+    for previous, current in zip(temperatures, temperatures[1:]):
+      averages.append((previous - current) / sleep)
+      if len(averages) > 11:
+        averages.pop(0)
+      derivatives.append(sum(averages) / float(len(averages)))
+    return derivatives
+
+  def test_window_grows_from_the_first_errors(self):
+    for sleep in [0.25, 0.5, 0.05]:
+      heater = self.heater(sleep)
+      temperatures = [20.0 + 1.5 * i for i in range(30)]
+      derivatives = []
+      for temperature in temperatures[1:]:
+        heater.temperatures.append(temperature)
+        derivatives.append(heater.get_error_derivative())
+      expected = self.expected_derivatives(heater.avg, temperatures, sleep)
+      for derivative, e in zip(derivatives, expected):
+        self.assertAlmostEqual(derivative, e)
@@ -0,0 +1,121 @@
+from __future__ import absolute_import
+
+import mock
+import sys
+import unittest
+
+sys.modules.setdefault('Adafruit_GPIO', mock.Mock())
+sys.modules.setdefault('Adafruit_GPIO.I2C', mock.MagicMock())
+
+from PWM import PWM
+from .FakeI2CDevice import FakeI2CDevice
+
+
+class TestPWM(unittest.TestCase):
+  def setUp(self):
+    self.i2c = PWM.i2c = FakeI2CDevice()
+    PWM.shadow = [None] * PWM.CHANNELS
+    PWM.pending = {}
+    PWM.batches = 0
+    PWM.updates = PWM.transactions = 0
+
+  def tearDown(self):
+    PWM.i2c = None
+
+  def off_count(self, channel):
+    register = PWM.PCA9685_LED0 + 4 * channel
+    return self.i2c.registers[register + 2] | (self.i2c.registers[register + 3] << 8)
+
+  def test_set_value_writes_the_channel(self):
+    PWM.set_value(0.5, 3)
+    self.assertEqual(self.i2c.transactions, [("writeList", 0x12, [0x00, 0x00, 0xFF, 0x07])])
+    self.assertEqual(self.off_count(3), 2047)
+
+  def test_unchanged_values_are_not_written(self):
+    PWM.set_value(0.5, 3)
+    PWM.set_value(0.5, 3)
+    PWM.set_value(0.25, 3)
+    self.assertEqual(len(self.i2c.transactions), 2)
+    self.assertEqual(PWM.get_stats(), {"updates": 3, "transactions": 2, "saved": 1})
+
+  def test_batched_values_go_out_together(self):
+    for channel in range(PWM.CHANNELS):
+      PWM.set_value(0.0, channel)
+    self.i2c.transactions = []
+
+    PWM.begin_batch()
+    PWM.set_value(0.2, 5)
+    PWM.set_value(0.3, 7)
+    PWM.set_value(0.4, 5)
+    PWM.set_value(1.0, 13)
+    PWM.set_value(0.0, 15)
+    self.assertEqual(self.i2c.transactions, [])
+    PWM.end_batch()
+
+    # 5 to 7 in one write with 6 written again, 13 is too far for that and 15 is unchanged
+    self.assertEqual([(t[1], len(t[2])) for t in self.i2c.transactions], [(0x1A, 12), (0x3A, 4)])
+    self.assertEqual(self.off_count(5), int(0.4 * 4095))
+    self.assertEqual(self.off_count(6), 0)
+    self.assertEqual(self.off_count(7), int(0.3 * 4095))
+    self.assertEqual(self.off_count(13), 4095)
+
+  def test_blocks_fit_in_one_i2c_write(self):
+    for channel in range(PWM.CHANNELS):
+      PWM.set_value(0.0, channel)
+    self.i2c.transactions = []
+
+    PWM.begin_batch()
+    for channel in range(PWM.CHANNELS):
+      PWM.set_value(0.5, channel)
+    PWM.end_batch()
+
+    self.assertEqual(len(self.i2c.transactions), 2)
+    for channel in range(PWM.CHANNELS):
+      self.assertEqual(self.off_count(channel), 2047)
+
+  def test_unknown_channels_are_not_written(self):
+    PWM.begin_batch()
+    PWM.set_value(0.5, 0)
+    PWM.set_value(0.5, 2)
+    PWM.end_batch()
+    self.assertEqual([t[1] for t in self.i2c.transactions], [0x06, 0x0E])
+
+  def test_nested_batches(self):
+    PWM.begin_batch()
+    PWM.begin_batch()
+    PWM.set_value(0.5, 1)
+    PWM.end_batch()
+    self.assertEqual(self.i2c.transactions, [])
+    PWM.end_batch()
+    self.assertEqual(len(self.i2c.transactions), 1)
+
+  def test_failed_writes_are_tried_again(self):
+    self.i2c.writeList = mock.Mock(side_effect=IOError(121, "Remote I/O error"))
+    with self.assertRaises(IOError):
+      PWM.set_value(0.5, 3)
+    del self.i2c.writeList
+    PWM.set_value(0.5, 3)
+    self.assertEqual(self.off_count(3), 2047)
+
+  def test_failed_batches_are_written_by_the_next_flush(self):
+    PWM.set_value(1.0, 3)
+    PWM.set_value(1.0, 12)
+
+    # The first block goes out, the second fails
+    write_list = self.i2c.writeList
+    self.i2c.writeList = mock.Mock(side_effect=[None, IOError(121, "Remote I/O error")])
+    PWM.begin_batch()
+    PWM.set_value(0.0, 3)
+    PWM.set_value(0.0, 12)
+    with self.assertRaises(IOError):
+      PWM.end_batch()
+    self.assertEqual(PWM.pending, {12: 0})
+
+    # A heater that was turned off doesn't set its value again
+    self.i2c.writeList = write_list
+    self.i2c.transactions = []
+    PWM.begin_batch()
+    PWM.end_batch()
+    self.assertEqual([t[1] for t in self.i2c.transactions], [0x36])
+    self.assertEqual(self.off_count(12), 0)
+    self.assertEqual(PWM.pending, {})
@@ -0,0 +1,226 @@
+from __future__ import absolute_import
+
+import numpy as np
+from mock import Mock
+
+from ..gcode.MockPrinter import MockPrinter
+from redeem.Path import Path, AbsolutePath, RelativePath, G92Path
+from redeem.PathPlanner import PathPlanner
+
+
+class PathPlannerBatchTests(MockPrinter):
+  @classmethod
+  def setUpPatch(cls):
+    cls.printer.ensure_steppers_enabled = Mock()
+
+  def setUp(self):
+    self.printer.offset_z = 0.0
+    self.planner = self.printer.path_planner
+    self.planner.prev = G92Path(dict.fromkeys(self.printer.AXES, 0.0), 0)
+    self.planner.prev.set_prev(None)
+    self.native = self.planner.native_planner = Mock()
+
+  def _fake_queue_moves(self, failed=()):
+    def queue_moves(end_positions, speeds, accels, flags, status, tool_axis):
+      for i in failed:
+        status[i] = 1
+      return list(end_positions[-1])
+
+    self.native.queueMoves.side_effect = queue_moves
+
+  def test_linear_moves_are_queued_in_one_call(self):
+    self._fake_queue_moves()
+    self.planner.add_path_batch([
+        AbsolutePath({"X": 0.01}, 0.1, 1.0, use_bed_matrix=False),
+        RelativePath({"Y": 0.02}, 0.2, 2.0, cancelable=True, use_bed_matrix=False),
+        AbsolutePath({
+            "X": 0.0,
+            "E": 0.001
+        }, 0.3, 3.0, use_bed_matrix=False),
+    ])
+
+    self.assertEqual(self.native.queueMoves.call_count, 1)
+    self.native.queueMove.assert_not_called()
+
+    end_positions, speeds, accels, flags, status, tool_axis = self.native.queueMoves.call_args[0]
+    self.assertEqual(end_positions.shape, (3, self.printer.MAX_AXES))
+    np.testing.assert_allclose(end_positions[1][:3], [0.01, 0.02, 0.0])
+    np.testing.assert_allclose(end_positions[2][:4], [0.0, 0.02, 0.0, 0.001])
+    np.testing.assert_allclose(speeds, [0.1, 0.2, 0.3])
+    np.testing.assert_allclose(accels, [1.0, 2.0, 3.0])
+
+    default = (PathPlanner.QUEUE_MOVE_SOFT_ENDSTOPS | PathPlanner.QUEUE_MOVE_BACKLASH_COMPENSATION)
+    self.assertEqual(flags[0], default | PathPlanner.QUEUE_MOVE_OPTIMIZE)
+    self.assertEqual(flags[1], default | PathPlanner.QUEUE_MOVE_CANCELABLE)
+    self.assertEqual(flags[2], default | PathPlanner.QUEUE_MOVE_OPTIMIZE)
+
+    self.assertEqual(list(self.planner.prev.end_pos[:4]), [0.0, 0.02, 0.0, 0.001])
+    self.assertIsNone(self.planner.prev.prev)
+
+  def test_batch_ends_where_linked_paths_do(self):
+    def paths():
+      return [
+          AbsolutePath({
+              "X": 0.01,
+              "Y": 0.02
+          }, 0.1, 1.0),
+          RelativePath({
+              "Y": 0.005,
+              "E": 0.001
+          }, 0.1, 1.0),
+          AbsolutePath({"Z": 0.002}, 0.1, 1.0, use_bed_matrix=False),
+          RelativePath({
+              "X": -0.003,
+              "Z": 0.001
+          }, 0.1, 1.0),
+      ]
+
+    self._fake_queue_moves()
+    matrix = self.printer.matrix_bed_comp
+    self.printer.matrix_bed_comp = np.array([[1.0, 0.0, 0.01], [0.0, 1.0, -0.02], [0.0, 0.0, 1.0]])
+    self.printer.offset_z = 0.0005
+    try:
+      start = self.planner.prev
+      self.planner.add_path_batch(paths())
+      end_positions = self.native.queueMoves.call_args[0][0]
+
+      prev = start
+      for i, path in enumerate(paths()):
+        path.set_prev(prev)
+        expected = np.copy(path.end_pos)
+        expected[2] += self.printer.offset_z
+        np.testing.assert_allclose(end_positions[i], expected)
+        prev = path
+      np.testing.assert_allclose(self.planner.prev.ideal_end_pos, prev.ideal_end_pos)
+    finally:
+      self.printer.matrix_bed_comp = matrix
+
+  def test_g92_splits_batch(self):
+    self._fake_queue_moves()
+    self.planner.add_path_batch([
+        AbsolutePath({"X": 0.01}, 0.1, 1.0, use_bed_matrix=False),
+        G92Path({"X": 0.0}),
+        AbsolutePath({"X": 0.01}, 0.1, 1.0, use_bed_matrix=False),
+    ])
+
+    self.assertEqual(self.native.queueMoves.call_count, 2)
+    self.native.setState.assert_called_once()
+
+  def test_failed_moves_are_not_kept_as_previous(self):
+    self._fake_queue_moves(failed=(1, ))
+    first = AbsolutePath({"X": 0.01}, 0.1, 1.0, use_bed_matrix=False)
+    self.planner.add_path_batch([first, AbsolutePath({"X": 0.02}, 0.1, 1.0, use_bed_matrix=False)])
+
+    self.assertIs(self.planner.prev, first)
+
+  def test_bed_compensated_moves_follow_the_mesh(self):
+    self._fake_queue_moves()
+    self.planner.add_path_batch([AbsolutePath({"X": 0.01}, 0.1, 1.0)])
+
+    flags = self.native.queueMoves.call_args[0][3]
+    self.assertTrue(flags[0] & PathPlanner.QUEUE_MOVE_BED_MATRIX)
+
+
+class PathPlannerBedMeshTests(MockPrinter):
+  @classmethod
+  def setUpPatch(cls):
+    pass
+
+  def setUp(self):
+    self.planner = self.printer.path_planner
+    self.native = self.planner.native_planner = Mock()
+    self.printer.bed_mesh_interpolation = "bilinear"
+
+  def tearDown(self):
+    self.printer.bed_mesh = None
+
+  def test_mesh_is_passed_in_meters(self):
+    self.printer.bed_mesh = {
+        "min_x": 10.0,
+        "min_y": 20.0,
+        "step_x": 50.0,
+        "step_y": 40.0,
+        "heights": [[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]]
+    }
+    self.printer.bed_mesh_interpolation = "bicubic"
+    self.planner.update_bed_mesh()
+
+    args = self.native.setBedMesh.call_args[0]
+    np.testing.assert_allclose(args[:4], [0.01, 0.02, 0.05, 0.04])
+    self.assertEqual(args[4], 3)
+    np.testing.assert_allclose(args[5], [0.0001, 0.0002, 0.0003, 0.0004, 0.0005, 0.0006])
+    self.assertTrue(args[6])
+
+  def test_no_mesh_clears_it(self):
+    self.printer.bed_mesh = None
+    self.planner.update_bed_mesh()
+
+    self.native.clearBedMesh.assert_called_once_with()
+    self.native.setBedMesh.assert_not_called()
+
+
+class PathPlannerQueueStatsTests(MockPrinter):
+  @classmethod
+  def setUpPatch(cls):
+    pass
+
+  def setUp(self):
+    self.planner = self.printer.path_planner
+    self.native = self.planner.native_planner = Mock()
+
+  def test_times_are_in_seconds(self):
+    self.native.getPathQueueStats.return_value = Mock(pathsAdded=10,
+                                                      pathsRemoved=8,
+                                                      consumerCommits=1,
+                                                      planningContentions=2,
+                                                      producerWaits=3,
+                                                      consumerWaits=4,
+                                                      maxPlanningTime=125000,
+                                                      maxPopTime=2000)
+
+    stats = self.planner.get_queue_stats()
+
+    self.assertEqual(stats["paths_added"], 10)
+    self.assertEqual(stats["contentions"], 2)
+    self.assertAlmostEqual(stats["max_planning_time"], 0.000125)
+    self.assertAlmostEqual(stats["max_pop_time"], 0.000002)
+
+  def test_lookahead_is_passed_in_seconds_and_meters(self):
+    self.printer.max_buffered_move_time = 1000
+    self.printer.lookahead_time = 250
+    self.printer.lookahead_distance = 50
+    self.planner.update_lookahead()
+
+    self.native.setMaxBufferedMoveTime.assert_called_once_with(1.0)
+    time, distance = self.native.setLookahead.call_args[0]
+    self.assertAlmostEqual(time, 0.25)
+    self.assertAlmostEqual(distance, 0.05)
+
+
+class PathPlannerConfigTests(MockPrinter):
+  @classmethod
+  def setUpPatch(cls):
+    pass
+
+  def setUp(self):
+    self.planner = self.printer.path_planner
+    self.native = self.planner.native_planner = Mock()
+    self.printer.config.snapshot
+
+  def test_planner_options_follow_the_config(self):
+    self.printer.config.set('Planner', 'arc_segment_length', '0.0005')
+    self.printer.config.set('Planner', 'lookahead_time', '750')
+    self.printer.config.update_snapshot()
+
+    self.assertEqual(self.printer.arc_segment_length, 0.0005)
+    self.assertEqual(self.printer.lookahead_time, 750.0)
+    self.native.setArcSegmentLength.assert_called_once_with(0.0005)
+    self.native.setArcTolerance.assert_not_called()
+    self.assertAlmostEqual(self.native.setLookahead.call_args[0][0], 0.75)
+
+  def test_other_options_are_left_alone(self):
+    self.printer.config.set('Probe', 'offset_z', '0.002')
+    self.printer.config.update_snapshot()
+
+    self.native.setArcSegmentLength.assert_not_called()
+    self.native.setLookahead.assert_not_called()
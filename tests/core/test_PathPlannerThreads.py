@@ -0,0 +1,71 @@
+import threading
+import time
+import unittest
+
+from ThermalLoop import ThermalLoop
+
+try:
+  from _PathPlannerNative import PathPlannerNative, AlarmCallbackNative
+except ImportError:
+  PathPlannerNative = None
+
+
+class FakeHeater(object):
+  name = "fake"
+  sleep = 0.01
+
+  def sample(self):
+    pass
+
+  def control(self):
+    return 0.5
+
+  def write_power(self, power):
+    pass
+
+
+@unittest.skipIf(PathPlannerNative is None, "native path planner is not built")
+class TestPathPlannerThreads(unittest.TestCase):
+  """ The native planner has to release the GIL while it blocks, or every
+  other Python thread stops until the planner has room for the next move """
+  def setUp(self):
+    self.alarm = AlarmCallbackNative()
+    self.planner = PathPlannerNative(8, self.alarm, 1.0)
+    self.planner.initPRU("", "")
+    self.planner.setAxisStepsPerMeter((50000.0, ) * 8)
+    self.planner.setMaxSpeeds((0.1, ) * 8)
+    self.planner.setAcceleration((1.0, ) * 8)
+    self.planner.setMaxSpeedJumps((0.01, ) * 8)
+    self.planner.setMaxBufferedMoveTime(0.1)
+    self.planner.runThread()
+    self.loop = ThermalLoop()
+
+  def tearDown(self):
+    self.loop.stop()
+
+  def saturate_queue(self, stop):
+    x = 0.0
+    while not stop.is_set():
+      x = 0.001 - x
+      self.planner.queueMove((x, 0, 0, 0, 0, 0, 0, 0), 0.05, 1.0, False, False, False, False, False,
+                             False, 0)
+
+  def test_heaters_keep_running_while_the_queue_is_full(self):
+    stop = threading.Event()
+    producer = threading.Thread(target=self.saturate_queue, args=(stop, ))
+    producer.start()
+
+    # let the queue fill up before timing the heater
+    time.sleep(0.2)
+    self.loop.add(FakeHeater())
+    time.sleep(1.0)
+    self.loop.stop()
+
+    stop.set()
+    self.planner.stopThread(True)
+    producer.join()
+
+    timing = self.loop.get_timing()
+    self.assertGreater(self.planner.getPathQueueStats().producerWaits, 0)
+    self.assertGreater(timing["updates"], 50)
+    self.assertLess(timing["max_lateness"], 0.05)
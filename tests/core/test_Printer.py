@@ -0,0 +1,42 @@
+from __future__ import absolute_import
+
+import mock
+
+from tests.gcode.MockPrinter import MockPrinter
+from redeem.Gcode import Gcode
+
+
+class PrinterReplyTests(MockPrinter):
+  def setUp(self):
+    self.printer.send_message = mock.Mock()
+    self.printer.path_planner.get_available_slots = mock.Mock(return_value=1020)
+    while not self.printer.commands.empty():
+      self.printer.commands.get_nowait()
+
+  def tearDown(self):
+    self.printer.advanced_ok = False
+    del self.printer.send_message
+
+  def test_plain_ok(self):
+    self.printer.reply(Gcode({"message": "G1 X10", "prot": "testing"}))
+    self.printer.send_message.assert_called_with("testing", "ok")
+
+  def test_advanced_ok_reports_free_slots(self):
+    self.printer.advanced_ok = True
+    self.printer.commands.put(Gcode({"message": "G1 X10"}))
+    self.printer.reply(Gcode({"message": "G1 X10", "prot": "testing"}))
+    free = self.printer.commands.maxsize - 1
+    self.printer.send_message.assert_called_with("testing", "ok P1020 B{}".format(free))
+
+  def test_advanced_ok_reports_line_number(self):
+    self.printer.advanced_ok = True
+    self.printer.reply(Gcode({"message": "N7 G1 X10*86", "prot": "testing"}))
+    self.printer.send_message.assert_called_with(
+        "testing", "ok N7 P1020 B{}".format(self.printer.commands.maxsize))
+
+  def test_advanced_ok_leaves_answers_alone(self):
+    self.printer.advanced_ok = True
+    g = Gcode({"message": "M105", "prot": "testing"})
+    g.set_answer("ok T:20.0")
+    self.printer.reply(g)
+    self.printer.send_message.assert_called_with("testing", "ok T:20.0")
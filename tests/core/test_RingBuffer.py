@@ -0,0 +1,50 @@
+import unittest
+
+import numpy as np
+
+from RingBuffer import RingBuffer
+
+
+class TestRingBuffer(unittest.TestCase):
+  def test_starts_empty(self):
+    buffer = RingBuffer(4)
+    self.assertEqual(len(buffer), 0)
+    with self.assertRaises(IndexError):
+      buffer[-1]
+    with self.assertRaises(ValueError):
+      buffer.mean()
+
+  def test_fill(self):
+    buffer = RingBuffer(3, fill=2.0)
+    self.assertEqual(len(buffer), 3)
+    self.assertEqual(buffer.mean(), 2.0)
+    self.assertEqual(buffer[0], 2.0)
+
+  def test_keeps_the_newest_samples(self):
+    buffer = RingBuffer(4)
+    for sample in range(10):
+      buffer.append(sample)
+
+    self.assertEqual(len(buffer), 4)
+    self.assertEqual([buffer[i] for i in range(4)], [6, 7, 8, 9])
+    self.assertEqual(buffer[-1], 9)
+    self.assertEqual(buffer[-4], 6)
+    with self.assertRaises(IndexError):
+      buffer[4]
+    with self.assertRaises(IndexError):
+      buffer[-5]
+
+  def test_statistics_match_the_history(self):
+    history = []
+    buffer = RingBuffer(7)
+    for sample in np.random.RandomState(1).uniform(20.0, 250.0, 100):
+      history.append(sample)
+      buffer.append(sample)
+
+      for n in (1, 3, 7, 20):
+        # asking for more than it holds gives all of it
+        expected = history[-min(n, 7):]
+        self.assertAlmostEqual(buffer.mean(n), np.mean(expected))
+        self.assertEqual(buffer.max(n), max(expected))
+        self.assertEqual(buffer.min(n), min(expected))
+      self.assertAlmostEqual(buffer.mean(), np.mean(history[-7:]))
@@ -0,0 +1,61 @@
+from __future__ import absolute_import
+
+import os
+import tempfile
+import unittest
+
+from redeem.SDCardManager import SDCardManager
+
+
+class SDCardManagerTests(unittest.TestCase):
+  def setUp(self):
+    fd, self.file_name = tempfile.mkstemp(suffix=".gcode")
+    with os.fdopen(fd, "w") as f:
+      f.write("".join("G1 X{} Y{}\n".format(i, i) for i in range(1000)))
+      f.write("M400")
+    self.manager = SDCardManager()
+    self.manager.load_file(self.file_name)
+
+  def tearDown(self):
+    self.manager.gcode_file.close()
+    os.remove(self.file_name)
+
+  def test_read_lines_in_chunks(self):
+    self.manager.set_status(True)
+    chunks = []
+    while True:
+      lines = self.manager.read_lines(256)
+      if not lines:
+        break
+      chunks.append(lines)
+    self.assertEqual([len(chunk) for chunk in chunks], [256, 256, 256, 233])
+    lines = [line for chunk in chunks for line in chunk]
+    self.assertEqual(len(lines), 1001)
+    self.assertEqual(lines[-1], "M400")
+    self.assertEqual(self.manager.get_position(), (1001, os.path.getsize(self.file_name)))
+
+  def test_read_lines_keeps_what_it_read_ahead(self):
+    self.manager.set_status(True)
+    self.assertEqual(self.manager.read_lines(10)[-1], "G1 X9 Y9\n")
+    # the file is read in blocks, not line by line
+    self.assertGreater(self.manager.gcode_file.tell(), self.manager.byte_count)
+
+    # a pause doesn't lose the lines that were read ahead
+    self.manager.set_status(False)
+    self.assertEqual(self.manager.read_lines(10), [])
+    self.manager.set_status(True)
+    self.assertEqual(self.manager.read_lines(10)[0], "G1 X10 Y10\n")
+    self.assertEqual(self.manager.get_position()[0], 20)
+
+  def test_read_lines_counts_bytes(self):
+    self.manager.set_status(True)
+    lines = self.manager.read_lines(100)
+    self.assertEqual(self.manager.line_count, len(lines))
+    self.assertEqual(self.manager.byte_count, sum(len(line) for line in lines))
+
+  def test_read_lines_when_inactive(self):
+    self.assertEqual(self.manager.read_lines(), [])
+    self.manager.set_status(True)
+    self.manager.read_lines(100)
+    self.manager.set_status(False)
+    self.assertEqual(self.manager.read_lines(), [])
@@ -20,17 +20,21 @@ License: GNU GPL v3: http://www.gnu.org/copyleft/gpl.html
  You should have received a copy of the GNU General Public License
  along with Redeem.  If not, see <http://www.gnu.org/licenses/>.
 """
-from mock import mock_open, patch, mock
+from __future__ import absolute_import
+
+from mock import patch, mock
+import os
+import shutil
+import tempfile
+import time
 import unittest
 
-#Make test version- agnostic:
-from sys import version_info
-if version_info.major == 2:
-  import __builtin__ as builtins    # pylint:disable=import-error
-else:
-  import builtins    # pylint:disable=import-error
+import numpy as np
 
+from redeem import TemperatureSensorConfigs
+from redeem.AdcSampler import AdcSampler
 from redeem.TemperatureSensor import *
+from .FakeIioDevice import FakeIioDevice
 
 
 class TestTemperatureSensor(unittest.TestCase):
@@ -44,26 +48,57 @@ class TestTemperatureSensor(unittest.TestCase):
     self.ts.c1 = 0.000722378300319346
     self.ts.c2 = 0.000216301852054578
     self.ts.c3 = 9.2641025635702e-08
+    self.adc_dir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    if self.ts.fd is not None:
+      os.close(self.ts.fd)
+      self.ts.fd = None
+    shutil.rmtree(self.adc_dir)
+
+  def write_adc(self, value):
+    """ Stand in for the sysfs file of the ADC channel """
+    self.ts.pin = os.path.join(self.adc_dir, "in_voltage4_raw")
+    with open(self.ts.pin, "w") as f:
+      f.write(value + "\n")
 
   def test_init_working(self):
     #If this passes, tables were loaded successfully
     self.assertEqual(self.ts.sensorIdentifier, "B57540G0104F000")
 
   def test_read_adc_lower_boundary(self):
-    with patch.object(builtins, 'open', mock_open(read_data="0")):
-      self.assertEqual(self.ts.read_adc(), -1.0)
+    self.write_adc("0")
+    self.assertEqual(self.ts.read_adc(), -1.0)
 
   def test_read_adc_upper_boundary(self):
-    with patch.object(builtins, 'open', mock_open(read_data="100000")):
-      self.assertEqual(self.ts.read_adc(), -1.0)
+    self.write_adc("100000")
+    self.assertEqual(self.ts.read_adc(), -1.0)
 
   def test_read_adc(self):
 
     adc = str(4095.0 / 2)
     expected_voltage = 0.9002198339032731
 
-    with patch.object(builtins, 'open', mock_open(read_data=adc)):
-      self.assertTrue(abs(self.ts.read_adc() - expected_voltage) < 0.001)
+    self.write_adc(adc)
+    self.assertTrue(abs(self.ts.read_adc() - expected_voltage) < 0.001)
+
+  def test_read_adc_keeps_file_open(self):
+    self.write_adc("1000")
+    self.ts.read_adc()
+    fd = self.ts.fd
+
+    self.write_adc("4095")
+    self.assertAlmostEqual(self.ts.read_adc(), 1.8)
+    self.write_adc("100000")
+    self.assertEqual(self.ts.read_adc(), -1.0)
+    self.assertEqual(self.ts.fd, fd)
+
+  @patch("redeem.TemperatureSensor.Alarm")
+  def test_read_adc_missing_file(self, alarm):
+    self.ts.pin = os.path.join(self.adc_dir, "missing")
+    self.assertEqual(self.ts.read_adc(), 0)
+    self.assertEqual(alarm.call_args[0][0], alarm.THERMISTOR_ERROR)
+    self.assertIsNone(self.ts.fd)
 
   def test_voltage_to_resistance(self):
 
@@ -81,5 +116,107 @@ class TestTemperatureSensor(unittest.TestCase):
       self.assertTrue(abs(self.ts.get_temperature() - expected_temperature) < 0.0001)
 
 
+class TestSampledTemperatureSensor(unittest.TestCase):
+  def setUp(self):
+    self.device = FakeIioDevice()
+    self.device.write(4, 2275)
+    self.sampler = AdcSampler(rate=200.0)
+    self.ts = TemperatureSensor(self.device.channel(4), "E", "B57540G0104F000", self.sampler)
+
+  def tearDown(self):
+    self.sampler.stop()
+    self.device.close()
+
+  def test_reads_come_from_the_sampler(self):
+    self.assertIsNone(self.ts.fd)
+    self.assertAlmostEqual(self.ts.read_adc(), 1.0)
+    self.assertAlmostEqual(self.ts.get_temperature(), 102.776, places=3)
+
+    self.device.write(4, 100000)
+    deadline = time.time() + 2
+    while self.ts.read_adc() != -1.0 and time.time() < deadline:
+      time.sleep(0.01)
+    self.assertEqual(self.ts.read_adc(), -1.0)
+
+  @patch("redeem.TemperatureSensor.Alarm")
+  def test_sampler_errors_raise_an_alarm(self, alarm):
+    self.sampler.stop()
+    self.ts.channel.reading = OSError(2, "No such file or directory")
+    self.assertEqual(self.ts.read_adc(), 0)
+    self.assertEqual(alarm.call_args[0][0], alarm.THERMISTOR_ERROR)
+
+  @patch("redeem.TemperatureSensor.Alarm")
+  def test_garbled_readings_raise_an_alarm(self, alarm):
+    self.sampler.stop()
+    self.ts.channel.reading = ValueError("could not convert string to float: ")
+    self.ts.channel.time = time.time()
+    self.assertEqual(self.ts.read_adc(), 0)
+    self.assertEqual(alarm.call_args[0][0], alarm.THERMISTOR_ERROR)
+
+  @patch("redeem.TemperatureSensor.Alarm")
+  def test_stale_readings_raise_an_alarm(self, alarm):
+    self.sampler.stop()
+    self.ts.channel.time = time.time()
+    self.assertAlmostEqual(self.ts.read_adc(), 1.0)
+    self.assertFalse(alarm.called)
+
+    self.ts.channel.time -= self.ts.channel.max_age + 0.1
+    self.assertEqual(self.ts.read_adc(), 0)
+    self.assertEqual(alarm.call_args[0][0], alarm.THERMISTOR_ERROR)
+
+
+class TestTemperatureTables(unittest.TestCase):
+  """ The tables have to agree with the formulas and charts they are made from """
+  def sensors(self):
+    configs = (TemperatureSensorConfigs.thermistors_shh + TemperatureSensorConfigs.pt100 +
+               TemperatureSensorConfigs.tboard + TemperatureSensorConfigs.charts)
+    for config in configs:
+      yield TemperatureSensor("/sys/bus/iio/devices/iio:device0/in_voltage4_raw", "0", config[0])
+
+  def temperature_at(self, ts, voltage):
+    ts.read_adc = lambda: voltage
+    return ts.get_temperature()
+
+  def test_one_entry_per_adc_code(self):
+    for ts in self.sensors():
+      self.assertIsNotNone(ts.sensor, ts.sensorIdentifier)
+      self.assertEqual(len(ts.table), 4096)
+
+  def test_adc_codes_match_the_formulas(self):
+    for ts in self.sensors():
+      for code in range(0, 4095, 7):
+        voltage = code / ts.maxAdc * 1.8
+        np.testing.assert_allclose(self.temperature_at(ts, voltage),
+                                   ts.sensor.get_temperature(voltage),
+                                   rtol=1e-9,
+                                   err_msg=ts.sensorIdentifier)
+
+  def test_interpolation_between_codes(self):
+    voltages = np.random.RandomState(0).uniform(1.8 / 4095, 1.8, 2000)
+    for ts in self.sensors():
+      for voltage in voltages:
+        expected = ts.sensor.get_temperature(voltage)
+        # Where a sensor changes by a degree or more per ADC code, it can't tell between them anyway
+        code = int(voltage / 1.8 * ts.maxAdc)
+        if 0 <= expected <= 400 and abs(ts.table[code + 1] - ts.table[code]) < 1.0:
+          self.assertAlmostEqual(self.temperature_at(ts, voltage),
+                                 expected,
+                                 delta=0.1,
+                                 msg=ts.sensorIdentifier)
+
+  @patch("redeem.TemperatureSensor.Alarm")
+  def test_out_of_range_readings_use_the_formula(self, alarm):
+    ts = TemperatureSensor("/sys/bus/iio/devices/iio:device0/in_voltage4_raw", "0",
+                           "B57540G0104F000")
+    self.assertEqual(self.temperature_at(ts, -1.0), 0.0)
+    self.assertEqual(self.temperature_at(ts, 1.8), ts.sensor.get_temperature(1.8))
+
+  def test_charts(self):
+    ts = TemperatureSensor("/sys/bus/iio/devices/iio:device0/in_voltage4_raw", "0", "QU-BD")
+    # 100 kOhm at 25 C in the chart, against the 4.7 kOhm pullup
+    self.assertAlmostEqual(self.temperature_at(ts, 1.8 * 100000 / 104700), 25.0, places=2)
+    self.assertEqual(load_chart("DYZE500.cht").shape, (29, 2))
+
+
 #if __name__ == '__main__':
 #    unittest.main()
@@ -0,0 +1,121 @@
+import mock
+import time
+import unittest
+
+from ThermalLoop import ThermalLoop
+
+
+class FakeController(object):
+  def __init__(self, name, calls, sleep=0.01, power=0.5):
+    self.name = name
+    self.calls = calls
+    self.sleep = sleep
+    self.power = power
+    self.written = []
+
+  def sample(self):
+    self.calls.append(("sample", self.name))
+
+  def control(self):
+    self.calls.append(("control", self.name))
+    return self.power
+
+  def write_power(self, power):
+    self.calls.append(("write", self.name))
+    self.written.append(power)
+
+
+class TestThermalLoop(unittest.TestCase):
+  def setUp(self):
+    self.loop = ThermalLoop()
+    self.calls = []
+
+  def tearDown(self):
+    self.loop.stop()
+
+  def wait_for(self, condition):
+    deadline = time.time() + 2
+    while not condition() and time.time() < deadline:
+      time.sleep(0.01)
+    self.assertTrue(condition())
+
+  def test_samples_all_sensors_before_writing(self):
+    first = FakeController("first", self.calls, sleep=10)
+    second = FakeController("second", self.calls, sleep=10)
+    self.loop.controllers = [first, second]
+    self.loop.next_updates = {first: 0.0, second: 0.0}
+    self.loop.run_due_controllers()
+
+    self.assertEqual([c[0] for c in self.calls],
+                     ["sample", "control", "sample", "control", "write", "write"])
+
+  def test_runs_controllers_at_their_own_rate(self):
+    fast = FakeController("fast", self.calls, sleep=0.01)
+    slow = FakeController("slow", self.calls, sleep=0.2)
+    self.loop.add(fast)
+    self.loop.add(slow)
+    time.sleep(0.3)
+    self.loop.stop()
+
+    self.assertGreater(len(fast.written), 10)
+    self.assertIn(len(slow.written), [2, 3])
+
+  def test_removed_controllers_are_left_alone(self):
+    controller = FakeController("heater", self.calls)
+    self.loop.add(controller)
+    self.wait_for(lambda: controller.written)
+    self.loop.remove(controller)
+    written = len(controller.written)
+    time.sleep(0.05)
+    self.assertEqual(len(controller.written), written)
+
+  def test_failing_controller_is_turned_off(self):
+    broken = FakeController("broken", self.calls)
+    broken.control = mock.Mock(side_effect=ValueError("bad sample"))
+    working = FakeController("working", self.calls)
+    self.loop.add(broken)
+    self.loop.add(working)
+    self.wait_for(lambda: len(working.written) > 2)
+
+    self.assertEqual(broken.written, [0.0])
+    self.assertNotIn(broken, self.loop.controllers)
+
+  def test_reports_timing(self):
+    controller = FakeController("heater", self.calls)
+    self.loop.add(controller)
+    self.wait_for(lambda: len(controller.written) > 5)
+    self.loop.stop()
+
+    timing = self.loop.get_timing()
+    self.assertEqual(timing["updates"], len(controller.written))
+    self.assertEqual(timing["passes"], len(controller.written))
+    self.assertGreaterEqual(timing["max_lateness"], timing["mean_lateness"])
+    self.assertGreaterEqual(timing["stddev_lateness"], 0.0)
+
+    self.loop.reset_timing()
+    self.assertEqual(self.loop.get_timing()["updates"], 0)
+
+  def test_outputs_are_written_in_one_batch(self):
+    outputs = mock.Mock()
+    outputs.begin_batch.side_effect = lambda: self.calls.append(("begin", None))
+    outputs.end_batch.side_effect = lambda: self.calls.append(("end", None))
+    self.loop = ThermalLoop(outputs)
+    first = FakeController("first", self.calls, sleep=10)
+    second = FakeController("second", self.calls, sleep=10)
+    self.loop.controllers = [first, second]
+    self.loop.next_updates = {first: 0.0, second: 0.0}
+    self.loop.run_due_controllers()
+
+    self.assertEqual([c[0] for c in self.calls],
+                     ["sample", "control", "sample", "control", "begin", "write", "write", "end"])
+
+  def test_failed_batch_keeps_the_controllers(self):
+    outputs = mock.Mock()
+    outputs.end_batch.side_effect = IOError(121, "Remote I/O error")
+    self.loop = ThermalLoop(outputs)
+    controller = FakeController("heater", self.calls, sleep=10)
+    self.loop.controllers = [controller]
+    self.loop.next_updates = {controller: 0.0}
+    self.loop.run_due_controllers()
+
+    self.assertIn(controller, self.loop.controllers)
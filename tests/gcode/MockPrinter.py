@@ -37,6 +37,7 @@ sys.modules['redeem.IOManager'] = mock.Mock()
 sys.modules['redeem.IOManager'].IOManager = mock.MagicMock()
 
 from redeem.CascadingConfigParser import CascadingConfigParser
+from redeem.RingBuffer import RingBuffer
 from redeem.Redeem import *
 from redeem.EndStop import EndStop
 from redeem.Extruder import Heater
@@ -108,7 +109,8 @@ version = 1
 
     def disabled_extruder_enable(self):
       self.avg = 1
-      self.temperatures = [100]
+      self.temperatures = RingBuffer(1)
+      self.temperatures.append(100)
       pass
 
     def disabled_hbp_enable(self):
@@ -152,6 +154,7 @@ version = 1
 
   @classmethod
   def tearDownClass(cls):
+    cls.printer.adc_sampler.stop()
     cls.R = cls.printer = None
     if os.path.exists("../configs/local.cfg"):
       os.remove("../configs/local.cfg")
@@ -1,6 +1,9 @@
 from __future__ import absolute_import
 
+import mock
+
 from .MockPrinter import MockPrinter
+from redeem.Gcode import Gcode
 from redeem.Path import *
 
 
@@ -60,3 +63,16 @@ class G1_G0_Tests(MockPrinter):
     self.assertEqual(g.gcode, 'M117')
     self.assertEqual(g.tokens[0], "G1")
     self.assertEqual(g.message, "M117     123G1X1Y2.3 z-0.456E+7.89ab c")
+
+  def test_gcodes_G1_G0_batch(self):
+    self.printer.movement = Path.ABSOLUTE
+    self.printer.path_planner.reset_mock()
+    gcodes = [Gcode({"message": m}) for m in ["G1 X10 F3000", "G0 Y10", "M105", "G1 X20"]]
+    with mock.patch.object(self.printer.processor, "enqueue") as enqueue:
+      self.printer.processor.enqueue_batch(gcodes)
+    enqueue.assert_called_once_with(gcodes[2])
+    self.printer.path_planner.add_path.assert_not_called()
+    batches = [c[0][0] for c in self.printer.path_planner.add_path_batch.call_args_list]
+    self.assertEqual([len(b) for b in batches], [2, 1])
+    self.assertEqual(batches[0][0].speed, 3000.0 / 60000 * self.f * self.printer.speed_factor)
+    self.assertIsInstance(batches[1][0], AbsolutePath)
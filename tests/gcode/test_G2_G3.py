@@ -2,17 +2,11 @@ from __future__ import absolute_import
 
 import os
 import logging
-import itertools
 import numpy as np
 from mock import Mock
 
 from .MockPrinter import MockPrinter
-
-show_plots = False
-try:
-  import pygal
-except:
-  show_plots = False
+from redeem.Path import Path
 
 base_dir = os.path.dirname(os.path.dirname(__file__))
 
@@ -31,20 +25,6 @@ class G2G3CircleTests(MockPrinter):
   def setUp(self):
     self.printer.unit_factor = self.f = 1
 
-  def _show_plot(self, start, finish, center, points, title):
-
-    from pygal.style import Style
-
-    custom_style = Style(colors=('#aaaaaa', '#00ff00', '#ff0000', '#0000ff'))
-
-    xy_chart = pygal.XY(stroke=False, style=custom_style)
-    xy_chart.title = title
-    xy_chart.add('path', points)
-    xy_chart.add('start', [(start['X'], start['Y'])])
-    xy_chart.add('finish', [(finish['X'], finish['Y'])])
-    xy_chart.add('center', [(center['X'], center['Y'])])
-    xy_chart.render_to_file('{}.svg'.format(title))
-
   def _build_start_code(self, start):
     gcode = 'G1'
     for axis, val in start.items():
@@ -77,45 +57,30 @@ class G2G3CircleTests(MockPrinter):
     for gcode in gcodes:
       self.execute_gcode(gcode)
 
-    queue_mock = self.printer.path_planner.native_planner.queueMove
-
-    queued_points = [args[0][0] for args in queue_mock.call_args_list]
-
-    for point in queued_points:
-      logging.debug("queued point: {}".format(point))
-
-    # pop the G1 positioning command (start point)
-    initial = queued_points.pop(0)
-
-    points = [(point[0] * 1000, (point[1] * 1000)) for point in queued_points]
-
-    if show_plots:
-      self._show_plot(start, finish, center, points, title)
-
-    logging.debug("initial: {}".format(initial))
-    logging.debug("start: {}".format(start))
+    native_planner = self.printer.path_planner.native_planner
 
+    # the G1 positioning command (start point)
+    initial = native_planner.queueMove.call_args[0][0]
     self.assertCloseTo(initial[0], start['X'] / 1000)
     self.assertCloseTo(initial[1], start['Y'] / 1000)
 
-    radius = np.sqrt((offset['I'] / 1000)**2 + (offset['J'] / 1000)**2)
-
-    for idx, point in enumerate(queued_points):
+    # the arc is split by the native planner
+    self.assertEqual(native_planner.queueArc.call_count, 1)
+    args = native_planner.queueArc.call_args[0]
+    start_pos, end_pos, center0, center1, plane, clockwise = args[:6]
 
-      x = point[0]
-      y = point[1]
-      xc = center['X'] / 1000
-      yc = center['Y'] / 1000
+    logging.debug("arc from {} to {} around {}".format(start_pos, end_pos, (center0, center1)))
 
-      circle = (x - xc)**2 + (y - yc)**2
-      rsquared = radius**2
-      self.assertCloseTo(rsquared, circle)
+    self.assertCloseTo(start_pos[0], start['X'] / 1000)
+    self.assertCloseTo(start_pos[1], start['Y'] / 1000)
+    self.assertCloseTo(end_pos[0], finish['X'] / 1000)
+    self.assertCloseTo(end_pos[1], finish['Y'] / 1000)
+    self.assertCloseTo(center0, center['X'] / 1000)
+    self.assertCloseTo(center1, center['Y'] / 1000)
+    self.assertEqual(plane, Path.X_Y_ARC_PLANE)
+    self.assertEqual(clockwise, direction is self.CW)
 
-    final = queued_points[-1]
-    self.assertCloseTo(final[0], finish['X'] / 1000)
-    self.assertCloseTo(final[1], finish['Y'] / 1000)
-
-    queue_mock.reset_mock()
+    native_planner.reset_mock()
 
   def test_very_small_arc(self):
     start = {'X': 0.0, 'Y': 1.0}
@@ -257,10 +222,58 @@ class G2G3CircleTests(MockPrinter):
 
     self._test_arc(start, end, center, self.CCW, 'test_three_quarter_circle_quadrant_2_ccw')
 
-  # def test_pos_radius_variant_cw
-  # def test_pos_radius_variant_ccw
-  # def test_neg_radius_variant_cw
-  # def test_neg_radius_variant_ccw
+  def _test_radius_arc(self, radius, direction, center):
+    arc = 'G{} X10 Y0 R{}'.format(2 if direction is self.CW else 3, radius)
+    for gcode in ['G17', 'G1 X0 Y10', arc]:
+      self.execute_gcode(gcode)
+
+    native_planner = self.printer.path_planner.native_planner
+    center0, center1 = native_planner.queueArc.call_args[0][2:4]
+    self.assertCloseTo(center0, center[0] / 1000.0)
+    self.assertCloseTo(center1, center[1] / 1000.0)
+
+    native_planner.reset_mock()
+
+  def test_pos_radius_variant_cw(self):
+    # a quarter circle
+    self._test_radius_arc(10, self.CW, (0, 0))
+
+  def test_pos_radius_variant_ccw(self):
+    self._test_radius_arc(10, self.CCW, (10, 10))
+
+  def test_neg_radius_variant_cw(self):
+    # three quarters of a circle
+    self._test_radius_arc(-10, self.CW, (10, 10))
+
+  def test_neg_radius_variant_ccw(self):
+    self._test_radius_arc(-10, self.CCW, (0, 0))
+
+  def test_half_circle_radius_variant(self):
+    self._test_radius_arc(7.0710678, self.CW, (5, 5))
+
+  def test_too_small_radius(self):
+    self.execute_gcode('G17')
+    self.execute_gcode('G1 X0 Y10')
+    with self.assertRaises(Exception):
+      self.execute_gcode('G2 X10 Y0 R5')
+    self.printer.path_planner.native_planner.reset_mock()
+
+  def test_xz_plane(self):
+    for gcode in ['G18', 'G1 X0 Y5 Z10', 'G3 X10 Z0 I10 K0', 'G17']:
+      self.execute_gcode(gcode)
+
+    native_planner = self.printer.path_planner.native_planner
+    args = native_planner.queueArc.call_args[0]
+    start_pos, end_pos, center0, center1, plane, clockwise = args[:6]
+    self.assertCloseTo(end_pos[0], 10.0 / 1000)
+    self.assertCloseTo(end_pos[1], 5.0 / 1000)
+    self.assertCloseTo(end_pos[2], 0)
+    self.assertCloseTo(center0, 10.0 / 1000)
+    self.assertCloseTo(center1, 10.0 / 1000)
+    self.assertEqual(plane, Path.X_Z_ARC_PLANE)
+    self.assertFalse(clockwise)
+
+    native_planner.reset_mock()
 
 
 class G2G3ExtrusionTests(MockPrinter):
@@ -273,37 +286,20 @@ class G2G3ExtrusionTests(MockPrinter):
   def setUp(self):
     self.printer.unit_factor = self.f = 1
 
-  def pairwise(self, iterable):
-    """s -> (s0,s1), (s1,s2), (s2, s3), ..."""
-    a, b = itertools.tee(iterable)
-    next(b, None)
-    return itertools.izip(a, b)
-
   def _test_linear_dimensions(self, gcodes, dim, start, end):
 
     for gcode in gcodes:
       self.execute_gcode(gcode)
 
-    queue_mock = self.printer.path_planner.native_planner.queueMove
-    queued_points = [args[0][0] for args in queue_mock.call_args_list]
-
-    extrusion_points = [point[self.printer.axes_absolute.index(dim)] for point in queued_points]
-
-    extrusion_point_pairs = self.pairwise(extrusion_points)
-
-    # assert start and end
-    self.assertEqual(extrusion_points[0], start)
-    self.assertEqual(extrusion_points[-1], end)
+    queue_mock = self.printer.path_planner.native_planner.queueArc
+    start_pos, end_pos = queue_mock.call_args[0][:2]
+    index = self.printer.axes_absolute.index(dim)
 
-    # assert equal distance between the points
-    diff = None
-    for pair in extrusion_point_pairs:
-      d = pair[1] - pair[0]
-      if diff:
-        self.assertCloseTo(diff, d)
-      diff = d
+    # the native planner moves the other axes linearly along the arc
+    self.assertCloseTo(start_pos[index], start)
+    self.assertCloseTo(end_pos[index], end)
 
-    queue_mock.reset_mock()
+    self.printer.path_planner.native_planner.reset_mock()
 
   def test_linear_e_extrusion(self):
 
@@ -0,0 +1,82 @@
+from __future__ import absolute_import
+
+import mock
+
+from .MockPrinter import MockPrinter
+from redeem.Gcode import Gcode
+from redeem.GCodeProcessor import GCodeRegistry, find_gcode_classes
+from redeem.gcodes.index import GCODE_MODULES
+
+
+class GCodeProcessorTests(MockPrinter):
+  def test_index_is_up_to_date(self):
+    self.assertEqual(GCODE_MODULES, find_gcode_classes(),
+                     "redeem/gcodes/index.py is out of date, run tools/generate_gcode_index.py")
+
+  def test_handlers_are_made_when_first_used(self):
+    registry = GCodeRegistry(self.printer, GCODE_MODULES)
+    self.assertIn("G1", registry)
+    self.assertIn("M105", registry)
+    self.assertEqual(registry.commands, {})
+
+    g1 = registry["G1"]
+    self.assertEqual(type(g1).__name__, "G1")
+    self.assertIs(registry["G1"], g1)
+    self.assertEqual(list(registry.commands), ["G1"])
+    self.assertEqual(sorted(registry), sorted(GCODE_MODULES))
+
+  def test_unknown_handlers(self):
+    registry = GCodeRegistry(self.printer, GCODE_MODULES)
+    self.assertNotIn("M9999", registry)
+    self.assertIsNone(registry.get("M9999"))
+    with self.assertRaises(KeyError):
+      registry["M9999"]
+
+  def test_override_command(self):
+    command = mock.Mock()
+    processor = self.printer.processor
+    processor.override_command("M9999", command)
+    try:
+      self.assertIs(processor.gcodes["M9999"], command)
+      self.assertIn("M9999", processor.get_supported_commands())
+    finally:
+      del processor.gcodes.commands["M9999"]
+
+  def test_long_description_is_rendered_once(self):
+    registry = GCodeRegistry(self.printer, GCODE_MODULES)
+    m20 = registry["M20"]
+    self.assertTrue(m20.get_formatted_description())
+
+    with mock.patch("docutils.core.publish_string", return_value="help") as publish_string:
+      self.assertEqual(m20.get_long_description(), "help")
+      self.assertEqual(m20.get_long_description(), "help")
+    self.assertEqual(publish_string.call_count, 1)
+
+  def test_processor_resolves_lazily_loaded_handlers(self):
+    g = Gcode({"message": "M114", "prot": "test"})
+    self.printer.processor.resolve(g)
+    self.assertEqual(type(g.command).__name__, "M114")
+
+  def test_has_room_for_looks_where_the_gcode_goes(self):
+    processor = self.printer.processor
+    move = Gcode({"message": "G1 X1", "prot": "test"})
+    buffered = Gcode({"message": "M108", "prot": "test"})
+    unbuffered = Gcode({"message": "M112", "prot": "test"})
+
+    with mock.patch.object(self.printer.path_planner, "get_available_slots", return_value=0):
+      self.assertFalse(processor.has_room_for(move))
+      self.assertTrue(processor.has_room_for(buffered))
+    with mock.patch.object(self.printer.path_planner, "get_available_slots", return_value=1):
+      self.assertTrue(processor.has_room_for(move))
+
+    with mock.patch.object(self.printer, "commands") as commands:
+      commands.full.return_value = True
+      self.assertFalse(processor.has_room_for(buffered))
+      self.assertTrue(processor.has_room_for(unbuffered))
+      # M116 takes M108 right away
+      with mock.patch.object(self.printer, "running_M116", True):
+        self.assertTrue(processor.has_room_for(buffered))
+
+    with mock.patch.object(self.printer, "unbuffered_commands") as unbuffered_commands:
+      unbuffered_commands.full.return_value = True
+      self.assertFalse(processor.has_room_for(unbuffered))
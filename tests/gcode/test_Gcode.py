@@ -1,7 +1,14 @@
 from __future__ import absolute_import
 
+import unittest
+
 from .MockPrinter import MockPrinter
-from redeem.Gcode import Gcode
+from redeem.Gcode import Gcode, _tokenize
+
+try:
+  from _GcodeLexer import tokenize as native_tokenize
+except ImportError:
+  native_tokenize = None
 """ 
 We want to keeps our tests within the scope of just the file we're testing,
 as much as possible. So we won't instantiate an entire Printer object, when the
@@ -77,6 +84,13 @@ class GcodeTest(MockPrinter):
     self.assertEqual(self.g.has_letter("B"), True)
     self.assertEqual(self.g.has_letter("C"), True)
 
+  def test_gcode_without_words(self):
+    for message in ["; noise", "N1 G1 X1*99"]:    # empty, invalid checksum
+      g = Gcode({"message": message})
+      self.assertEqual(g.has_letter("X"), False)
+      self.assertEqual(g.get_float_by_letter("X", 2.0), 2.0)
+      self.assertEqual(g.get_distance_by_letter("X", 3.0), 3.0)
+
   def test_gcode_has_value(self):
     self.assertEqual(self.g.has_value(0), True)
     self.assertEqual(self.g.has_value(1), True)
@@ -139,3 +153,30 @@ class GcodeTest(MockPrinter):
     self.assertEqual(self.g.is_info_command(), False)
     g = Gcode({"message": "G28?"})
     self.assertEqual(g.is_info_command(), True)
+
+
+@unittest.skipIf(native_tokenize is None, "native G-code lexer is not built")
+class GcodeLexerTest(unittest.TestCase):
+  messages = [
+      "G1 X10 Y10 E3.1 F3000 Q3000",
+      "G1X1Y2.3 z-0.456E+7.89ab c",
+      "N99  G2 8 x0 Y-0.2345 z +12.345 67 ab C(comment)*92",
+      "M117     123G1X1Y2.3 z-0.456E+7.89ab c",
+      "M117this will work",
+      "M117.5 X1",
+      "M1175",
+      "G28?",
+      "G29.1 X.5 Y5. Z- E+ F-.25",
+      "G1 X1.2.3 (one) Y2 (two) Z3",
+      "G1\tX1 Y2",
+      "M109 S210 T0",
+      "*17",
+      "  G1 X1 ; comment (with parens)\r\n",
+      "; only a comment",
+      "(only a comment)",
+      "",
+  ]
+
+  def test_native_tokenizer_matches_regex_tokenizer(self):
+    for message in self.messages:
+      self.assertEqual(native_tokenize(message), _tokenize(message), message)
@@ -0,0 +1,43 @@
+from __future__ import absolute_import
+
+import mock
+from .MockPrinter import MockPrinter
+
+
+class M122_Tests(MockPrinter):
+  def setUp(self):
+    self.printer.thermal_loop.get_timing = mock.Mock(
+        return_value={
+            "updates": 120,
+            "mean_lateness": 0.0004,
+            "stddev_lateness": 0.0002,
+            "max_lateness": 0.0031,
+            "passes": 80,
+            "max_pass_time": 0.0012
+        })
+    self.printer.thermal_loop.reset_timing = mock.Mock()
+    self.outputs = self.printer.thermal_loop.outputs
+    self.printer.thermal_loop.outputs = mock.Mock()
+    self.printer.thermal_loop.outputs.get_stats.return_value = {
+        "updates": 50,
+        "transactions": 20,
+        "saved": 30
+    }
+
+  def tearDown(self):
+    del self.printer.thermal_loop.get_timing
+    del self.printer.thermal_loop.reset_timing
+    self.printer.thermal_loop.outputs = self.outputs
+
+  def test_gcodes_M122(self):
+    g = self.execute_gcode("M122")
+    self.assertEqual(
+        g.answer, "ok updates:120 late avg:0.4ms sd:0.2ms max:3.1ms "
+        "passes:80 slowest pass:1.2ms pwm updates:50 i2c writes:20 saved:30")
+    self.printer.thermal_loop.reset_timing.assert_not_called()
+    self.printer.thermal_loop.outputs.reset_stats.assert_not_called()
+
+  def test_gcodes_M122_R(self):
+    self.execute_gcode("M122 R")
+    self.printer.thermal_loop.reset_timing.assert_called_once_with()
+    self.printer.thermal_loop.outputs.reset_stats.assert_called_once_with()
@@ -0,0 +1,37 @@
+from __future__ import absolute_import
+
+import mock
+from .MockPrinter import MockPrinter
+
+
+class M123_Tests(MockPrinter):
+  def setUp(self):
+    self.printer.path_planner.get_queue_stats = mock.Mock(
+        return_value={
+            "paths_added": 1200,
+            "paths_removed": 1180,
+            "consumer_commits": 3,
+            "contentions": 7,
+            "producer_waits": 950,
+            "consumer_waits": 2,
+            "max_planning_time": 0.000125,
+            "max_pop_time": 0.0000042,
+            "safe_speed_stops": 5
+        })
+    self.printer.path_planner.reset_queue_stats = mock.Mock()
+
+  def tearDown(self):
+    del self.printer.path_planner.get_queue_stats
+    del self.printer.path_planner.reset_queue_stats
+
+  def test_gcodes_M123(self):
+    g = self.execute_gcode("M123")
+    self.assertEqual(
+        g.answer, "ok added:1200 removed:1180 planner commits:3 contentions:7 "
+        "full waits:950 empty waits:2 slowest plan:0.125ms slowest pop:0.004ms "
+        "safe speed stops:5")
+    self.printer.path_planner.reset_queue_stats.assert_not_called()
+
+  def test_gcodes_M123_R(self):
+    self.execute_gcode("M123 R")
+    self.printer.path_planner.reset_queue_stats.assert_called_once_with()
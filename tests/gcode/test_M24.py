@@ -0,0 +1,37 @@
+from __future__ import absolute_import
+
+import mock
+import os
+import tempfile
+
+from .MockPrinter import MockPrinter
+from redeem.Gcode import Gcode
+from redeem.gcodes.M2x import FILE_READ_LINES
+
+
+class M24_Tests(MockPrinter):
+  def setUp(self):
+    fd, self.file_name = tempfile.mkstemp(suffix=".gcode")
+    with os.fdopen(fd, "w") as f:
+      f.write("".join("G1 X{}\n".format(i % 100) for i in range(4 * FILE_READ_LINES)))
+    self.printer.sd_card_manager.load_file(self.file_name)
+
+  def tearDown(self):
+    self.printer.sd_card_manager.set_status(False)
+    self.printer.sd_card_manager.gcode_file.close()
+    os.remove(self.file_name)
+
+  def print_file(self, enqueue_batch):
+    g = Gcode({"message": "M24"})
+    g.prot = 'testing_noret'
+    with mock.patch.object(self.printer.processor, "enqueue_batch", side_effect=enqueue_batch) as m:
+      self.printer.processor.gcodes["M24"].process_gcode(g)
+    return [len(c[0][0]) for c in m.call_args_list]
+
+  def test_gcodes_M24_prints_the_file_in_chunks(self):
+    batches = self.print_file(lambda gcodes: None)
+    self.assertEqual(batches, [FILE_READ_LINES] * 4)
+
+  def test_gcodes_M24_pauses_between_chunks(self):
+    batches = self.print_file(lambda gcodes: self.execute_gcode("M25"))
+    self.assertEqual(batches, [FILE_READ_LINES])
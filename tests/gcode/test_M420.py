@@ -0,0 +1,60 @@
+from __future__ import absolute_import
+
+import json
+
+from .MockPrinter import MockPrinter
+
+
+class M420_Tests(MockPrinter):
+  def setUp(self):
+    self.printer.bed_mesh = None
+    self.printer.path_planner.update_bed_mesh.reset_mock()
+    # a 3x2 grid, probed in the order G29.2 uses
+    self.printer.probe_points = [{
+        "X": x,
+        "Y": y,
+        "Z": 6.0
+    } for x in (0.0, 90.0, 180.0) for y in (10.0, 100.0)]
+    self.printer.probe_heights = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0, 0, 0]
+
+  def test_M420_properties(self):
+    self.assertGcodeProperties("M420", is_buffered=True)
+
+  def test_gcodes_M420_U_makes_mesh_from_probe_data(self):
+    self.execute_gcode("M420 U")
+    self.assertEqual(
+        self.printer.bed_mesh, {
+            "min_x": 0.0,
+            "min_y": 10.0,
+            "step_x": 90.0,
+            "step_y": 90.0,
+            "heights": [[0.1, 0.3, 0.5], [0.2, 0.4, 0.6]]
+        })
+    self.printer.path_planner.update_bed_mesh.assert_called_once_with()
+
+  def test_gcodes_M420_U_needs_a_grid(self):
+    self.printer.probe_points[1]["X"] = 45.0
+    self.execute_gcode("M420 U")
+    self.assertIsNone(self.printer.bed_mesh)
+    self.printer.path_planner.update_bed_mesh.assert_not_called()
+
+  def test_gcodes_M420_U_needs_evenly_spaced_points(self):
+    for point in self.printer.probe_points:
+      if point["X"] == 90.0:
+        point["X"] = 60.0
+    self.execute_gcode("M420 U")
+    self.assertIsNone(self.printer.bed_mesh)
+
+  def test_gcodes_M420_R_clears_mesh(self):
+    self.execute_gcode("M420 U")
+    self.execute_gcode("M420 R")
+    self.assertIsNone(self.printer.bed_mesh)
+    self.assertEqual(self.printer.path_planner.update_bed_mesh.call_count, 2)
+
+  def test_gcodes_M420_shows_mesh(self):
+    self.execute_gcode("M420 U")
+    g = self.execute_gcode("M420")
+    prot, message = self.printer.send_message.call_args[0]
+    self.assertEqual(prot, g.prot)
+    self.assertTrue(message.startswith("Current bed mesh: "))
+    self.assertEqual(json.loads(message[len("Current bed mesh: "):]), self.printer.bed_mesh)
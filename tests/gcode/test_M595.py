@@ -0,0 +1,31 @@
+from __future__ import absolute_import
+
+import mock
+from .MockPrinter import MockPrinter
+
+
+class M595_Tests(MockPrinter):
+  def setUp(self):
+    self.printer.lookahead_time = 500
+    self.printer.lookahead_distance = 100
+    self.printer.max_buffered_move_time = 1000
+    self.printer.path_planner.update_lookahead = mock.Mock()
+
+  def tearDown(self):
+    del self.printer.path_planner.update_lookahead
+
+  def test_gcodes_M595_shows_the_lookahead(self):
+    g = self.execute_gcode("M595")
+    self.assertEqual(g.answer, "ok T:500 D:100 B:1000")
+    self.printer.path_planner.update_lookahead.assert_not_called()
+
+  def test_gcodes_M595_sets_the_lookahead(self):
+    self.execute_gcode("M595 T250 D-5")
+    self.assertEqual(self.printer.lookahead_time, 250)
+    self.assertEqual(self.printer.lookahead_distance, 0)
+    self.assertEqual(self.printer.max_buffered_move_time, 1000)
+    self.printer.path_planner.update_lookahead.assert_called_once_with()
+
+  def test_gcodes_M595_sets_the_buffered_time(self):
+    self.execute_gcode("M595 B2000")
+    self.assertEqual(self.printer.max_buffered_move_time, 2000)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+Microbenchmark for the G-code tokenizer.
+
+Compares the native tokenizer (_GcodeLexer, built by setup.py) against the
+regular expression tokenizer in Gcode.py, both on their own and as part of
+building a Gcode and reading its X/Y/Z/E/F values like G1 does.
+
+Usage: python tools/gcode_lexer_benchmark.py [lines]
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "redeem"))
+
+import Gcode
+
+LINES = [
+    "G1 X107.458 Y93.207 E5.49231",
+    "G1 X107.918 Y92.813 E5.51246 F1800",
+    "N1234 G1 X108.330 Y92.371 E5.53262*100",
+    "G0 F7200 X98.2 Y103.651 Z0.3",
+    "M104 S210 T0 ; set temperature",
+    "G1 Z0.500 F7800.000 (lift)",
+    "M117 Printing layer 3",
+]
+
+
+class _Printer(object):
+  unit_factor = 1.0
+
+
+def parse(lines):
+  for line in lines:
+    g = Gcode.Gcode({"message": line})
+    if g.is_valid() and g.gcode in ("G0", "G1"):
+      for letter in "XYZEF":
+        g.get_distance_by_letter(letter, None)
+
+
+def run(name, tokenize, lines):
+  Gcode.tokenize = tokenize
+  lexer = min(timeit.repeat(lambda: [tokenize(line) for line in lines], number=1, repeat=5))
+  full = min(timeit.repeat(lambda: parse(lines), number=1, repeat=5))
+  print("{:<8} tokenize: {:8.0f} lines/s   Gcode + lookups: {:8.0f} lines/s".format(
+      name,
+      len(lines) / lexer,
+      len(lines) / full))
+  return full
+
+
+if __name__ == '__main__':
+  count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+  lines = (LINES * (count // len(LINES) + 1))[:count]
+  Gcode.Gcode.printer = _Printer()
+
+  regex = run("regex", Gcode._tokenize, lines)
+  try:
+    from _GcodeLexer import tokenize
+  except ImportError:
+    print("native   _GcodeLexer is not built, run setup.py build_ext first")
+  else:
+    native = run("native", tokenize, lines)
+    print("speedup: {:.2f}x".format(regex / native))
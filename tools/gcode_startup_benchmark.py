@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""
+Startup benchmark for the G-code handlers.
+
+Each measurement runs in a fresh interpreter, so module imports are paid again:
+
+  lazy   make the GCodeProcessor and resolve a G1, which is all Redeem
+         does with the handlers when it starts now
+  eager  make the GCodeProcessor and every handler, and import docutils,
+         which is what starting Redeem used to cost
+  help   render the long description of M20 (the help of "M20?") twice,
+         the first time imports docutils, the second comes from the cache
+
+Off the BeagleBone, MockPrinter stands in for the hardware and the native
+path planner. Its imports are done before the clock starts.
+
+Usage: python tools/gcode_startup_benchmark.py [--repeat N]
+"""
+
+from __future__ import print_function
+
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import time
+
+TOOLS = os.path.dirname(os.path.abspath(__file__))
+TESTS = os.path.join(TOOLS, "..", "tests")
+
+
+def measure(mode):
+  """ Runs in the child interpreter, prints the seconds the mode took """
+  sys.path.insert(0, os.path.join(TESTS, ".."))
+  os.chdir(TESTS)
+  try:
+    from redeem import PathPlannerNative
+  except ImportError:
+    import tests.gcode.MockPrinter
+  from redeem.Gcode import Gcode
+  from redeem.GCodeProcessor import GCodeProcessor
+  logging.disable(logging.CRITICAL)
+
+  class _Printer(object):
+    pass
+
+  printer = _Printer()
+  results = []
+  start = time.time()
+  processor = GCodeProcessor(printer)
+  if mode == "lazy":
+    processor.resolve(Gcode({"message": "G1 X10", "prot": "benchmark"}))
+  elif mode == "eager":
+    for name in processor.gcodes:
+      processor.gcodes[name]
+    import docutils.core
+    import redeem.TextWriter
+  elif mode == "help":
+    m20 = processor.gcodes["M20"]
+    start = time.time()
+    m20.get_long_description()
+    results.append(time.time() - start)
+    start = time.time()
+    m20.get_long_description()
+  results.append(time.time() - start)
+  print(" ".join(str(result) for result in results))
+
+
+def run(mode, repeat):
+  """ Best of repeat fresh interpreters """
+  best = None
+  for _ in range(repeat):
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--child", mode])
+    results = [float(result) for result in output.split()]
+    best = results if best is None else [min(a, b) for a, b in zip(best, results)]
+  return best
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="G-code handler startup benchmark")
+  parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per measurement")
+  parser.add_argument("--child", help=argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  if args.child:
+    measure(args.child)
+    sys.exit(0)
+
+  lazy = run("lazy", args.repeat)[0]
+  eager = run("eager", args.repeat)[0]
+  first_help, cached_help = run("help", args.repeat)
+  print("processor and first G1:             {:8.1f} ms".format(lazy * 1000))
+  print("processor and every handler:        {:8.1f} ms".format(eager * 1000))
+  print("first long description (docutils):  {:8.1f} ms".format(first_help * 1000))
+  print("cached long description:            {:8.3f} ms".format(cached_help * 1000))
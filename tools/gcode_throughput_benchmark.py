@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+"""
+End-to-end G-code throughput benchmark.
+
+Replays generated G-code corpora (tiny segments of curved walls, a vase mode
+spiral, the same segments on a delta and a CNC job of G2/G3 arcs) through
+GCodeProcessor.enqueue, the buffered command queue, PathPlanner.add_path and
+the native path planner, which runs the moves on the simulated PRU as fast as
+it can. When the native path planner isn't built, a stand-in that only keeps
+the state takes its place, so the benchmark still covers the Python side.
+
+For each corpus it reports lines/s, moves/s, step commands/s, how full the
+native planner's queue was and the 99th percentile latency from enqueueing a
+line until the path planner has taken it. The results are compared with the
+baselines stored in gcode_throughput_baselines.json next to this script, and
+the benchmark exits with status 1 when a corpus is slower than its baseline by
+more than the tolerance.
+
+The machine running the benchmark is rarely the one the baselines were
+recorded on, so a fixed reference workload in plain Python is timed right
+before each run of a corpus. What's compared with the baselines is the lines
+of G-code per reference operation and the p99 latency in reference
+operations, rather than the absolute numbers.
+
+Build the native path planner with "python setup.py build_ext --inplace" to
+measure it, and pass --require-native to fail when it isn't built.
+
+Usage: python tools/gcode_throughput_benchmark.py [--lines N] [--tolerance F]
+                                                   [--latency-tolerance F]
+                                                   [--require-native]
+                                                   [--update-baselines]
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import time
+
+TOOLS = os.path.dirname(os.path.abspath(__file__))
+TESTS = os.path.join(TOOLS, "..", "tests")
+BASELINES = os.path.join(TOOLS, "gcode_throughput_baselines.json")
+sys.path.insert(0, os.path.join(TESTS, ".."))
+os.chdir(TESTS)
+
+try:
+  # built with "python setup.py build_ext --inplace". MockPrinter replaces the native module
+  # with a mock, so this has to come first
+  import _PathPlannerNative
+  NATIVE = True
+except ImportError:
+  NATIVE = False
+
+from six.moves import queue, reload_module
+from tests.gcode.MockPrinter import MockPrinter
+import redeem.PathPlanner
+
+if NATIVE:
+  # put the native module back where MockPrinter put its mock, for the path planner
+  sys.modules["redeem._PathPlannerNative"] = _PathPlannerNative
+  reload_module(redeem.PathPlanner)
+
+from redeem.Gcode import Gcode
+from redeem.PathPlanner import PathPlanner
+from redeem.Printer import Printer
+
+
+class _Watchdog(object):
+  def reset(self):
+    pass
+
+
+class _NativePlanner(object):
+  """ Stands in for the native path planner, it only keeps the state """
+  def __init__(self, slots):
+    self.state = (0.0, ) * Printer.MAX_AXES
+    self.slots = slots
+
+  def setAxisConfig(self, axis_config):
+    pass
+
+  def setState(self, state):
+    self.state = tuple(state)
+
+  def getState(self):
+    return self.state
+
+  def queueMove(self, end_pos, *args):
+    self.state = tuple(end_pos)
+
+  def queueArc(self, start_pos, end_pos, *args):
+    self.state = tuple(end_pos)
+
+  def queueMoves(self, end_positions, *args):
+    self.state = tuple(end_positions[-1])
+    return self.state
+
+  def getLastQueueMoveStatus(self):
+    return False
+
+  def getAvailablePathSlots(self):
+    return self.slots
+
+  def getStepCommandsSent(self):
+    return 0
+
+  def waitUntilFinished(self):
+    pass
+
+
+def segments(count, center, z=0.2, layer_height=0.0):
+  """ A 20mm circle in 0.1mm segments, rising by layer_height every turn """
+  per_turn = int(2 * math.pi * 20.0 / 0.1)
+  lines = ["G92 X{:.3f} Y{:.3f} Z{:.3f} E0".format(center[0] + 20.0, center[1], z), "G1 F3000"]
+  e = 0.0
+  for i in range(count):
+    angle = 2 * math.pi * (i + 1) / per_turn
+    e += 0.1 * 0.033
+    x = center[0] + 20.0 * math.cos(angle)
+    y = center[1] + 20.0 * math.sin(angle)
+    if layer_height:
+      z += layer_height / per_turn
+      lines.append("G1 X{:.3f} Y{:.3f} Z{:.4f} E{:.5f}".format(x, y, z, e))
+    else:
+      lines.append("G1 X{:.3f} Y{:.3f} E{:.5f}".format(x, y, e))
+  return lines
+
+
+def arcs(count):
+  """ Pockets cut with G2/G3 arcs, with rapids and plunges in between """
+  lines = ["G92 X0 Y0 Z5", "G1 F600"]
+  while len(lines) < count:
+    n = len(lines)
+    x = 50.0 + (n % 40)
+    y = 50.0 + (n // 40) % 40
+    lines.append("G0 X{:.3f} Y{:.3f} Z1".format(x, y))
+    lines.append("G1 Z-1")
+    lines.append("G2 X{:.3f} Y{:.3f} I5 J0".format(x + 10.0, y))
+    lines.append("G3 X{:.3f} Y{:.3f} I-5 J0".format(x, y))
+    lines.append("G0 Z1")
+  return lines[:count]
+
+
+CORPORA = [
+    ("segments", Printer.AXIS_CONFIG_XY, lambda count: segments(count, (100.0, 100.0))),
+    ("vase", Printer.AXIS_CONFIG_XY, lambda count: segments(count,
+                                                            (100.0, 100.0), layer_height=0.2)),
+    ("delta", Printer.AXIS_CONFIG_DELTA, lambda count: segments(count, (0.0, 0.0))),
+    ("arcs", Printer.AXIS_CONFIG_XY, arcs),
+]
+
+
+def make_path_planner(printer):
+  planner = PathPlanner(printer, None)
+  if NATIVE:
+    printer.simulate_pru = True
+    printer.simulated_pru_speed = 0.0
+    planner._init_path_planner()
+  else:
+    planner.native_planner = _NativePlanner(int(printer.move_cache_size))
+  return planner
+
+
+def reference_speed(iterations=50000):
+  """ Operations/s of a fixed workload that doesn't use Redeem """
+  start = time.time()
+  total = 0.0
+  words = {}
+  for i in range(iterations):
+    total += float("{:.3f}".format(i * 0.001))
+    words["XYZE"[i % 4]] = total
+  return iterations / (time.time() - start)
+
+
+def percentile(values, fraction):
+  values = sorted(values)
+  return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(printer, axis_config, lines):
+  printer.axis_config = axis_config
+  planner = make_path_planner(printer)
+  native = planner.native_planner
+  processor = printer.processor
+  slots = float(printer.move_cache_size)
+
+  paths = [0]
+  add_path = planner.add_path
+
+  def counting_add_path(path):
+    paths[0] += 1
+    add_path(path)
+
+  planner.add_path = counting_add_path
+
+  latencies = []
+  occupancy = []
+  start = time.time()
+  for line in lines:
+    before = time.time()
+    processor.enqueue(Gcode({"message": line}))
+    # run the buffered commands like Redeem's loop does
+    for commands in (printer.commands, printer.unbuffered_commands):
+      while True:
+        try:
+          gcode = commands.get_nowait()
+        except queue.Empty:
+          break
+        processor.execute(gcode)
+    latencies.append(time.time() - before)
+    occupancy.append(1.0 - native.getAvailablePathSlots() / slots)
+  planner.wait_until_done()
+  elapsed = time.time() - start
+
+  step_commands = native.getStepCommandsSent()
+  if NATIVE:
+    planner.force_exit()
+
+  return {
+      "lines_per_second": len(lines) / elapsed,
+      "moves_per_second": paths[0] / elapsed,
+      "step_commands_per_second": step_commands / elapsed,
+      "mean_queue_occupancy": sum(occupancy) / len(occupancy),
+      "max_queue_occupancy": max(occupancy),
+      "p99_latency": percentile(latencies, 0.99),
+  }
+
+
+def compare(name, result, baseline, tolerance, latency_tolerance):
+  """ Returns the regressions of a result against its baseline, relative to the reference """
+  regressions = []
+  if result["lines_per_reference"] < baseline["lines_per_reference"] * (1.0 - tolerance):
+    regressions.append("{}: {:.4f} lines per reference operation, the baseline is {:.4f}".format(
+        name, result["lines_per_reference"], baseline["lines_per_reference"]))
+  if result["p99_in_references"] > baseline["p99_in_references"] * (1.0 + latency_tolerance):
+    regressions.append(
+        "{}: p99 latency of {:.0f} reference operations, the baseline is {:.0f}".format(
+            name, result["p99_in_references"], baseline["p99_in_references"]))
+  return regressions
+
+
+def main():
+  parser = argparse.ArgumentParser(description="End-to-end G-code throughput benchmark")
+  parser.add_argument("--lines", type=int, default=20000, help="lines of G-code per corpus")
+  parser.add_argument("--tolerance",
+                      type=float,
+                      default=0.25,
+                      help="allowed slowdown compared to the baselines")
+  # a few slow lines move the p99 latency a lot, so it needs more room
+  parser.add_argument("--latency-tolerance",
+                      type=float,
+                      default=1.0,
+                      help="allowed increase of the p99 latency compared to the baselines")
+  parser.add_argument("--require-native",
+                      action="store_true",
+                      help="fail when the native path planner isn't built")
+  parser.add_argument("--update-baselines",
+                      action="store_true",
+                      help="store the results as the new baselines")
+  args = parser.parse_args()
+
+  if args.require_native and not NATIVE:
+    print("the native path planner isn't built, run python setup.py build_ext --inplace")
+    return 1
+
+  logging.disable(logging.WARNING)
+
+  MockPrinter.setUpClass()
+  printer = MockPrinter.printer
+  printer.unit_factor = 1.0
+  printer.swd = _Watchdog()
+
+  mode = "native" if NATIVE else "python"
+  print("path planner: {}".format(
+      "native, on the simulated PRU" if NATIVE else "not built, measuring the Python side"))
+  print("{:<10} {:>10} {:>10} {:>12} {:>10} {:>10}".format("corpus", "lines/s", "moves/s",
+                                                           "steps/s", "queue", "p99"))
+
+  results = {}
+  try:
+    for name, axis_config, generate in CORPORA:
+      # the best of three runs, for each number, and the best of the reference timed right before
+      # each of them, so that both see the machine in the same state
+      runs = []
+      reference = 0.0
+      for _ in range(3):
+        reference = max(reference, reference_speed())
+        runs.append(run(printer, axis_config, generate(args.lines)))
+      result = {key: max(r[key] for r in runs) for key in runs[0]}
+      result["p99_latency"] = min(r["p99_latency"] for r in runs)
+      result["lines_per_reference"] = result["lines_per_second"] / reference
+      result["p99_in_references"] = result["p99_latency"] * reference
+      results[name] = result
+      # the stand-in doesn't generate steps or fill up
+      steps = "{:.0f}".format(result["step_commands_per_second"]) if NATIVE else "-"
+      occupancy = "{:.0f}%".format(result["mean_queue_occupancy"] * 100.0) if NATIVE else "-"
+      print("{:<10} {:>10.0f} {:>10.0f} {:>12} {:>10} {:>8.3f}ms".format(
+          name, result["lines_per_second"], result["moves_per_second"], steps, occupancy,
+          result["p99_latency"] * 1000.0))
+  finally:
+    MockPrinter.tearDownClass()
+
+  baselines = {}
+  if os.path.exists(BASELINES):
+    with open(BASELINES) as f:
+      baselines = json.load(f)
+
+  if args.update_baselines:
+    baselines[mode] = results
+    with open(BASELINES, "w") as f:
+      json.dump(baselines, f, indent=2, separators=(",", ": "), sort_keys=True)
+      f.write("\n")
+    print("baselines updated")
+    return 0
+
+  if mode not in baselines:
+    print("no {} baselines to compare with".format(mode))
+    return 0
+
+  regressions = []
+  for name, result in sorted(results.items()):
+    if name in baselines[mode]:
+      regressions += compare(name, result, baselines[mode][name], args.tolerance,
+                             args.latency_tolerance)
+
+  for regression in regressions:
+    print("regression - " + regression)
+  if not regressions:
+    print("no regressions against the {} baselines".format(mode))
+  return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Generate redeem/gcodes/index.py, the map from G-code handler names to the
+modules that define them. GCodeProcessor looks handlers up in it, so it only
+has to import a handler's module when the handler is first used.
+
+Run it after adding, renaming or removing a handler. test_GCodeProcessor
+fails while the index is out of date.
+
+Usage: python tools/generate_gcode_index.py [--check]
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+
+TOOLS = os.path.dirname(os.path.abspath(__file__))
+TESTS = os.path.join(TOOLS, "..", "tests")
+INDEX = os.path.join(TOOLS, "..", "redeem", "gcodes", "index.py")
+sys.path.insert(0, os.path.join(TESTS, ".."))
+os.chdir(TESTS)
+
+try:
+  # Off the BeagleBone, MockPrinter stands in for the hardware the handlers import
+  from redeem import PathPlannerNative
+except ImportError:
+  import tests.gcode.MockPrinter
+
+from redeem.GCodeProcessor import find_gcode_classes
+
+HEADER = '''"""
+The module in redeem.gcodes that defines each G-code handler.
+
+Generated by tools/generate_gcode_index.py, don't edit it by hand.
+"""
+
+GCODE_MODULES = {
+'''
+
+
+def natural_key(name):
+  return (name[0], int(name[1:]) if name[1:].isdigit() else name[1:])
+
+
+def make_index():
+  classes = find_gcode_classes()
+  lines = [
+      '    "{}": "{}",\n'.format(name, classes[name]) for name in sorted(classes, key=natural_key)
+  ]
+  return HEADER + "".join(lines) + "}\n"
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Generate redeem/gcodes/index.py")
+  parser.add_argument("--check",
+                      action="store_true",
+                      help="only check that the index is up to date")
+  args = parser.parse_args()
+
+  index = make_index()
+  with open(INDEX) as f:
+    current = f.read()
+
+  if args.check:
+    if current != index:
+      print("redeem/gcodes/index.py is out of date, run tools/generate_gcode_index.py")
+      sys.exit(1)
+  elif current != index:
+    with open(INDEX, "w") as f:
+      f.write(index)
+    print("Updated redeem/gcodes/index.py")
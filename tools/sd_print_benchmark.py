@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Benchmark for printing from file (M24).
+
+Compares reading and enqueueing a file one line at a time, like M24 used to,
+with the streaming mode that reads the file in chunks and hands runs of
+G0/G1 moves to the path planner in batches. The printer is the one used by
+the unit tests with Redeem's own path planner. Like the G-code throughput
+benchmark, that runs the native path planner on a simulated PRU when it's
+built (python setup.py build_ext --inplace), and a stand-in that only keeps
+the state when it isn't, which leaves the Python side of a print: reading,
+parsing, resolving, building paths and queueing them.
+
+Usage: python tools/sd_print_benchmark.py [lines]
+"""
+
+from __future__ import print_function
+
+import logging
+import os
+import sys
+import tempfile
+import time
+
+# sets up the paths and the native path planner, if it's built
+from gcode_throughput_benchmark import NATIVE, make_path_planner, _Watchdog
+from tests.gcode.MockPrinter import MockPrinter
+from redeem.Gcode import Gcode
+from redeem.Printer import Printer
+
+
+def write_file(count):
+  """ Tiny segments like a finely tesselated curve, with the odd comment """
+  fd, file_name = tempfile.mkstemp(suffix=".gcode")
+  with os.fdopen(fd, "w") as f:
+    for i in range(count):
+      if i % 100 == 0:
+        f.write(";LAYER:{}\n".format(i // 100))
+      f.write("G1 X{:.3f} Y{:.3f} E{:.5f}\n".format(100 + (i % 200) * 0.05, 100 + (i % 50) * 0.05,
+                                                    i * 0.002))
+  return file_name
+
+
+def line_at_a_time(printer):
+  for line in printer.sd_card_manager:
+    line = line.strip()
+    if not line or line.startswith(';'):
+      continue
+    printer.processor.enqueue(Gcode({"message": line}))
+
+
+def streaming(printer):
+  printer.processor.gcodes["M24"].process_gcode(Gcode({"message": "M24"}))
+
+
+def run(name, printer, file_name, func):
+  best = None
+  lines = None
+  for _ in range(3):
+    printer.path_planner = make_path_planner(printer)
+    printer.sd_card_manager.load_file(file_name)
+    printer.sd_card_manager.set_status(True)
+    lines = printer.sd_card_manager.file_line_size
+    start = time.time()
+    func(printer)
+    printer.path_planner.wait_until_done()
+    elapsed = time.time() - start
+    if NATIVE:
+      printer.path_planner.force_exit()
+    best = elapsed if best is None else min(best, elapsed)
+  print("{:<16} {:8.0f} lines/s".format(name, lines / best))
+  return best
+
+
+if __name__ == '__main__':
+  count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+  logging.disable(logging.WARNING)
+
+  MockPrinter.setUpClass()
+  printer = MockPrinter.printer
+  printer.unit_factor = 1.0
+  printer.swd = _Watchdog()
+  printer.axis_config = Printer.AXIS_CONFIG_XY
+  # replies to the lines of a file go nowhere, without MockPrinter's mock that records them
+  del printer.send_message
+  file_name = write_file(count)
+  print("path planner: {}".format(
+      "native, on the simulated PRU" if NATIVE else "not built, measuring the Python side"))
+  try:
+    line = run("line at a time", printer, file_name, line_at_a_time)
+    stream = run("streaming", printer, file_name, streaming)
+    print("speedup: {:.2f}x".format(line / stream))
+  finally:
+    os.remove(file_name)
+    MockPrinter.tearDownClass()